@@ -23,7 +23,13 @@ from src.app.core.db import Base
 import src.models.user  # noqa: F401
 import src.models.resource  # noqa: F401
 import src.models.message  # noqa: F401
+import src.models.message_key  # noqa: F401
 import src.models.dialog  # noqa: F401
+import src.models.worker_lease  # noqa: F401
+import src.models.tg_dialog  # noqa: F401
+import src.models.tg_bot_update  # noqa: F401
+import src.models.embedding_cache  # noqa: F401
+import src.models.usage_daily  # noqa: F401
 
 target_metadata = Base.metadata
 
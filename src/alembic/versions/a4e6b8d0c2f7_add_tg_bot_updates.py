@@ -0,0 +1,34 @@
+"""add tg_bot_updates (webhook queue)
+
+Revision ID: a4e6b8d0c2f7
+Revises: f2c7a1d9e3b5
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "a4e6b8d0c2f7"
+down_revision = "f2c7a1d9e3b5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tg_bot_updates",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), primary_key=True, nullable=False),
+        sa.Column("resource_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(
+            ["resource_id"], ["resources.id"], ondelete="CASCADE", name="fk_tg_bot_updates_resource"
+        ),
+    )
+    op.create_index("ix_tg_bot_updates_resource_id", "tg_bot_updates", ["resource_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tg_bot_updates_resource_id", table_name="tg_bot_updates")
+    op.drop_table("tg_bot_updates")
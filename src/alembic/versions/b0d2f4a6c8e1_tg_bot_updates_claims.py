@@ -0,0 +1,27 @@
+"""tg_bot_updates: claimed_at / claimed_by (delete after handling)
+
+Revision ID: b0d2f4a6c8e1
+Revises: f1b3d5e7a9c2
+Create Date: 2026-10-19
+
+Апдейт больше не удаляется при выборке: botworker помечает его
+claimed_at/claimed_by и удаляет после обработки. Claim старше
+CLAIM_LEASE_SEC (упавший процесс) забирается повторно.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "b0d2f4a6c8e1"
+down_revision = "f1b3d5e7a9c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("tg_bot_updates", sa.Column("claimed_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("tg_bot_updates", sa.Column("claimed_by", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("tg_bot_updates", "claimed_by")
+    op.drop_column("tg_bot_updates", "claimed_at")
@@ -0,0 +1,30 @@
+"""add embedding_cache
+
+Revision ID: b8d1f3a5c7e9
+Revises: a4e6b8d0c2f7
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+revision = "b8d1f3a5c7e9"
+down_revision = "a4e6b8d0c2f7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_cache",
+        sa.Column("model", sa.String(length=64), nullable=False),
+        sa.Column("text_hash", sa.String(length=64), nullable=False),
+        sa.Column("embedding", Vector(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("model", "text_hash", name="pk_embedding_cache"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("embedding_cache")
@@ -0,0 +1,30 @@
+"""add partial index for per-dialog semantic retrieval
+
+Revision ID: c2e4a6b8d0f1
+Revises: b8d1f3a5c7e9
+Create Date: 2026-10-19
+
+HNSW-индекс ix_messages_embedding_hnsw уже есть (a1b2c3d4e5f6) — он для
+поиска по всем сообщениям. Долгая память диалога ищет внутри одного
+dialog_id: кандидатов отбирает этот частичный индекс, KNN — точный.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "c2e4a6b8d0f1"
+down_revision = "b8d1f3a5c7e9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_messages_dialog_embedded",
+        "messages",
+        ["dialog_id", "created_at"],
+        postgresql_where=sa.text("embedding IS NOT NULL AND is_internal = false"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_dialog_embedded", table_name="messages")
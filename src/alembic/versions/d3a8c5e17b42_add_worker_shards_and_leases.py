@@ -0,0 +1,41 @@
+"""add worker_shards and resource_leases (botworker sharding)
+
+Revision ID: d3a8c5e17b42
+Revises: b7e4f2a91c03
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "d3a8c5e17b42"
+down_revision = "b7e4f2a91c03"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "worker_shards",
+        sa.Column("shard_id", sa.Text(), primary_key=True, nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        "resource_leases",
+        sa.Column("resource_id", postgresql.UUID(as_uuid=True), primary_key=True, nullable=False),
+        sa.Column("shard_id", sa.Text(), nullable=False),
+        sa.Column("lease_until", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(
+            ["resource_id"], ["resources.id"], ondelete="CASCADE", name="fk_resource_leases_resource"
+        ),
+    )
+    op.create_index("ix_resource_leases_shard", "resource_leases", ["shard_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_resource_leases_shard", table_name="resource_leases")
+    op.drop_table("resource_leases")
+    op.drop_table("worker_shards")
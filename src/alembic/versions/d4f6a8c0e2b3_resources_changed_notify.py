@@ -0,0 +1,52 @@
+"""notify on resource config changes
+
+Revision ID: d4f6a8c0e2b3
+Revises: c2e4a6b8d0f1
+Create Date: 2026-10-19
+
+dialog_service держит кэш настроек ресурсов (транспорт, PROMPT, api_keys).
+Триггер шлёт NOTIFY resources_changed с id ресурса, когда меняются
+meta_json / status / provider или ресурс удаляется — ловит запись из любого
+места (роутеры, legacy, ручной SQL). Счётчики usage_today/last_activity,
+которые пишутся на каждое сообщение, уведомлений не порождают.
+"""
+from alembic import op
+
+revision = "d4f6a8c0e2b3"
+down_revision = "c2e4a6b8d0f1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    CREATE OR REPLACE FUNCTION notify_resources_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('resources_changed', OLD.id::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_resources_changed_update
+    AFTER UPDATE ON resources
+    FOR EACH ROW
+    WHEN (
+        OLD.meta_json IS DISTINCT FROM NEW.meta_json
+        OR OLD.status IS DISTINCT FROM NEW.status
+        OR OLD.provider IS DISTINCT FROM NEW.provider
+    )
+    EXECUTE FUNCTION notify_resources_changed();
+    """)
+    op.execute("""
+    CREATE TRIGGER trg_resources_changed_delete
+    AFTER DELETE ON resources
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_resources_changed();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_resources_changed_delete ON resources;")
+    op.execute("DROP TRIGGER IF EXISTS trg_resources_changed_update ON resources;")
+    op.execute("DROP FUNCTION IF EXISTS notify_resources_changed();")
@@ -0,0 +1,44 @@
+"""updates_seen: account_id (tg_accounts) -> resource_id (resources)
+
+Revision ID: e5b9d2c4a8f1
+Revises: d3a8c5e17b42
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+
+revision = "e5b9d2c4a8f1"
+down_revision = "d3a8c5e17b42"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Таблица не использовалась; старые записи ссылаются на tg_accounts
+    op.execute("DELETE FROM updates_seen")
+    op.drop_constraint("fk_updates_seen_account", "updates_seen", type_="foreignkey")
+    op.alter_column("updates_seen", "account_id", new_column_name="resource_id")
+    op.create_foreign_key(
+        "fk_updates_seen_resource",
+        "updates_seen",
+        "resources",
+        ["resource_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_index("ix_updates_seen_resource_seen_at", "updates_seen", ["resource_id", "seen_at"])
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM updates_seen")
+    op.drop_index("ix_updates_seen_resource_seen_at", table_name="updates_seen")
+    op.drop_constraint("fk_updates_seen_resource", "updates_seen", type_="foreignkey")
+    op.alter_column("updates_seen", "resource_id", new_column_name="account_id")
+    op.create_foreign_key(
+        "fk_updates_seen_account",
+        "updates_seen",
+        "tg_accounts",
+        ["account_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
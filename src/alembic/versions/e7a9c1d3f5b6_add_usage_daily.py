@@ -0,0 +1,44 @@
+"""add usage_daily ledger, drop resources.usage_today/cost_today
+
+Revision ID: e7a9c1d3f5b6
+Revises: d4f6a8c0e2b3
+Create Date: 2026-10-19
+
+Расход AI пишется батчами (core/usage_ledger) в usage_daily по
+(resource_id, model, day). resources.usage_today/cost_today больше не
+хранятся: ORM считает их из usage_daily (Resource.usage_today/cost_today),
+строка resources на каждый ответ не обновляется.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "e7a9c1d3f5b6"
+down_revision = "d4f6a8c0e2b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "usage_daily",
+        sa.Column("resource_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("resources.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("model", sa.String(64), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("requests", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("prompt_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("completion_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("total_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("cost_usd", sa.Float(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_index("ix_usage_daily_day", "usage_daily", ["day"])
+    op.drop_column("resources", "cost_today")
+    op.drop_column("resources", "usage_today")
+
+
+def downgrade() -> None:
+    op.add_column("resources", sa.Column("usage_today", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("resources", sa.Column("cost_today", sa.Float(), nullable=False, server_default="0"))
+    op.drop_index("ix_usage_daily_day", table_name="usage_daily")
+    op.drop_table("usage_daily")
@@ -0,0 +1,121 @@
+"""partition messages by month (created_at), dedup keys in message_keys
+
+Revision ID: f1b3d5e7a9c2
+Revises: e7a9c1d3f5b6
+Create Date: 2026-10-19
+
+messages → RANGE-партиционированная по created_at таблица с помесячными
+секциями messages_yYYYYmMM (+ messages_default на всякий случай).
+- PK становится (id, created_at): ключ секционирования обязан входить в PK/UNIQUE.
+- Глобальной уникальности (provider, resource_id, external_chat_id,
+  external_msg_id) в секционированной таблице быть не может — дедуп входящих
+  переезжает в message_keys (обычная таблица, вставка в том же запросе).
+- Индексы и FK (resource, dialog, service — fk_messages_service из
+  20250908_avito_flru) создаются на родителе (каждая секция получает свои).
+- Секции вперёд и архивацию старых ведёт core/message_retention.
+
+Данные копируются INSERT … SELECT внутри миграции: на больших базах
+запускать в окно обслуживания.
+"""
+from alembic import op
+
+revision = "f1b3d5e7a9c2"
+down_revision = "e7a9c1d3f5b6"
+branch_labels = None
+depends_on = None
+
+# секции на столько месяцев вперёд от текущего (дальше — message_retention)
+MONTHS_AHEAD = 2
+
+_CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    m date;
+    last_m date := date_trunc('month', now() AT TIME ZONE 'UTC')::date + interval '{ahead} months';
+BEGIN
+    SELECT COALESCE(date_trunc('month', min(created_at) AT TIME ZONE 'UTC')::date,
+                    date_trunc('month', now() AT TIME ZONE 'UTC')::date)
+      INTO m FROM {source};
+    WHILE m <= last_m LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+            'messages_y' || to_char(m, 'YYYY') || 'm' || to_char(m, 'MM'),
+            (m::timestamp AT TIME ZONE 'UTC'),
+            ((m + interval '1 month')::timestamp AT TIME ZONE 'UTC')
+        );
+        m := (m + interval '1 month')::date;
+    END LOOP;
+END $$;
+"""
+
+_INDEXES = """
+CREATE INDEX ix_messages_service_created ON messages (service_id, created_at);
+CREATE INDEX ix_messages_dialog_created_at ON messages (dialog_id, created_at);
+CREATE INDEX ix_messages_dialog_embedded ON messages (dialog_id, created_at)
+    WHERE embedding IS NOT NULL AND is_internal = false;
+CREATE INDEX ix_messages_resource_peer_created_at ON messages (resource_id, peer_id, created_at);
+CREATE INDEX ix_messages_embedding_hnsw ON messages USING hnsw (embedding vector_cosine_ops);
+"""
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned;")
+    op.execute("""
+    CREATE TABLE messages (
+        LIKE messages_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+        CONSTRAINT pk_messages PRIMARY KEY (id, created_at),
+        CONSTRAINT fk_messages_resource FOREIGN KEY (resource_id)
+            REFERENCES resources (id) ON DELETE CASCADE,
+        CONSTRAINT fk_messages_dialog FOREIGN KEY (dialog_id)
+            REFERENCES dialogs (id) ON DELETE SET NULL,
+        CONSTRAINT fk_messages_service FOREIGN KEY (service_id)
+            REFERENCES service_accounts (id) ON DELETE SET NULL
+    ) PARTITION BY RANGE (created_at);
+    """)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT;")
+    op.execute(_CREATE_MONTHLY_PARTITIONS.format(ahead=MONTHS_AHEAD, source="messages_unpartitioned"))
+
+    op.execute("INSERT INTO messages SELECT * FROM messages_unpartitioned;")
+
+    op.execute("""
+    CREATE TABLE message_keys (
+        provider text NOT NULL,
+        resource_id uuid NOT NULL REFERENCES resources (id) ON DELETE CASCADE,
+        external_chat_id text NOT NULL,
+        external_msg_id text NOT NULL,
+        message_id uuid NOT NULL,
+        created_at timestamptz NOT NULL DEFAULT now(),
+        CONSTRAINT pk_message_keys PRIMARY KEY (provider, resource_id, external_chat_id, external_msg_id)
+    );
+    """)
+    op.execute("CREATE INDEX ix_message_keys_created_at ON message_keys (created_at);")
+    op.execute("""
+    INSERT INTO message_keys (provider, resource_id, external_chat_id, external_msg_id, message_id, created_at)
+    SELECT provider, resource_id, external_chat_id, external_msg_id, id, created_at
+    FROM messages_unpartitioned
+    WHERE provider IS NOT NULL AND external_chat_id IS NOT NULL AND external_msg_id IS NOT NULL
+    ON CONFLICT DO NOTHING;
+    """)
+
+    op.execute("DROP TABLE messages_unpartitioned;")
+    op.execute(_INDEXES)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned;")
+    op.execute("""
+    CREATE TABLE messages (
+        LIKE messages_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+        CONSTRAINT messages_pkey PRIMARY KEY (id),
+        CONSTRAINT uq_messages_provider_resource_chat_msg
+            UNIQUE (provider, resource_id, external_chat_id, external_msg_id),
+        FOREIGN KEY (resource_id) REFERENCES resources (id) ON DELETE CASCADE,
+        FOREIGN KEY (dialog_id) REFERENCES dialogs (id) ON DELETE SET NULL,
+        CONSTRAINT fk_messages_service FOREIGN KEY (service_id)
+            REFERENCES service_accounts (id) ON DELETE SET NULL
+    );
+    """)
+    op.execute("INSERT INTO messages SELECT * FROM messages_partitioned ON CONFLICT DO NOTHING;")
+    op.execute("DROP TABLE messages_partitioned CASCADE;")
+    op.execute("DROP TABLE message_keys;")
+    op.execute(_INDEXES)
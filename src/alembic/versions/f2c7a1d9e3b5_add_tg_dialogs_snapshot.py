@@ -0,0 +1,48 @@
+"""add tg_dialogs and tg_dialog_snapshots
+
+Revision ID: f2c7a1d9e3b5
+Revises: e5b9d2c4a8f1
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "f2c7a1d9e3b5"
+down_revision = "e5b9d2c4a8f1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tg_dialogs",
+        sa.Column("resource_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("peer_id", sa.BigInteger(), nullable=False),
+        sa.Column("kind", sa.Text(), nullable=False),
+        sa.Column("name", sa.Text(), nullable=False),
+        sa.Column("username", sa.Text(), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("resource_id", "peer_id", name="pk_tg_dialogs"),
+        sa.ForeignKeyConstraint(["resource_id"], ["resources.id"], ondelete="CASCADE", name="fk_tg_dialogs_resource"),
+    )
+    op.create_index(
+        "ix_tg_dialogs_resource_last_message_at", "tg_dialogs", ["resource_id", "last_message_at"]
+    )
+    op.create_table(
+        "tg_dialog_snapshots",
+        sa.Column("resource_id", postgresql.UUID(as_uuid=True), primary_key=True, nullable=False),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("refresh_requested_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["resource_id"], ["resources.id"], ondelete="CASCADE", name="fk_tg_dialog_snapshots_resource"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("tg_dialog_snapshots")
+    op.drop_index("ix_tg_dialogs_resource_last_message_at", table_name="tg_dialogs")
+    op.drop_table("tg_dialogs")
@@ -0,0 +1,317 @@
+"""
+src/app/core/ai_resilience.py
+────────────────────────────────────────────────────────────
+Устойчивый вызов AI поверх ai_transport: дедлайн, повторы, circuit breaker,
+цепочка фолбэков и hedged-запросы.
+
+- Дедлайн (ChatPolicy.deadline_sec) — на весь вызов, включая повторы и
+  фолбэки: слот семафора PromptWorker / лок диалога не держится дольше.
+- Повтор — только для временных ошибок (таймаут, обрыв, 408/409/425/429, 5xx —
+  ai_transport.is_retryable_error), с экспоненциальной задержкой и full jitter.
+- Circuit breaker на (провайдер, отпечаток ключа): после BREAKER_FAILURES
+  временных ошибок подряд кандидат пропускается BREAKER_OPEN_SEC, затем
+  один пробный вызов (half-open).
+- Фолбэки — упорядоченный список AIChatConfig (например groq → openai):
+  следующий берётся, когда текущий исчерпал повторы, получил постоянную
+  ошибку (ключ/модель) или его breaker открыт.
+- Hedging (hedge_after_sec): если ответа нет за это время, параллельно
+  уходит запрос к следующему кандидату (или дубль к тому же), берётся
+  первый успешный. Только для chat: начатый стрим не переиграть.
+
+Итог в result.raw: attempts, provider — кто ответил, fallback — его индекс.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from src.app.core.ai_transport import (
+    AIChatConfig,
+    AIChatDelta,
+    AIChatResult,
+    chat,
+    chat_stream,
+    key_fingerprint,
+)
+
+AI_DEADLINE_SEC = float(os.getenv("AI_DEADLINE_SEC", "45"))
+AI_RETRIES = int(os.getenv("AI_RETRIES", "2"))
+AI_RETRY_BASE_SEC = 0.5
+AI_RETRY_MAX_SEC = 8.0
+BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+BREAKER_OPEN_SEC = float(os.getenv("AI_BREAKER_OPEN_SEC", "30"))
+
+
+@dataclass(frozen=True)
+class ChatPolicy:
+    deadline_sec: float = AI_DEADLINE_SEC
+    retries: int = AI_RETRIES
+    hedge_after_sec: Optional[float] = None
+
+
+def backoff_delay(attempt: int, *, rnd: Callable[[], float] = random.random) -> float:
+    """Full jitter: случайно в [0, min(max, base * 2^attempt)]."""
+    return rnd() * min(AI_RETRY_MAX_SEC, AI_RETRY_BASE_SEC * (2 ** attempt))
+
+
+def _retryable(result: AIChatResult) -> bool:
+    return bool((result.raw or {}).get("retryable"))
+
+
+def _with_raw(result: AIChatResult, **extra) -> AIChatResult:
+    return AIChatResult(
+        ok=result.ok, text=result.text, usage=result.usage, error=result.error,
+        raw={**(result.raw or {}), **extra},
+    )
+
+
+# ────────────────────────────────────────────────────────────────
+# Circuit breaker
+# ────────────────────────────────────────────────────────────────
+
+@dataclass
+class _Breaker:
+    failures: int = 0
+    opened_at: Optional[float] = None
+    probe_at: Optional[float] = None   # half-open: когда пропущен пробный вызов
+    trips: int = 0
+
+
+@dataclass
+class CircuitBreakers:
+    failures: int = BREAKER_FAILURES
+    open_sec: float = BREAKER_OPEN_SEC
+    clock: Callable[[], float] = time.monotonic
+    _state: Dict[tuple[str, str], _Breaker] = field(default_factory=dict)
+
+    @staticmethod
+    def key(cfg: AIChatConfig) -> tuple[str, str]:
+        return cfg.provider.value, key_fingerprint(cfg.api_key)
+
+    def allow(self, cfg: AIChatConfig) -> bool:
+        b = self._state.get(self.key(cfg))
+        if b is None or b.opened_at is None:
+            return True
+        now = self.clock()
+        if now - b.opened_at < self.open_sec:
+            return False
+        # half-open: один пробный вызов; если он пропал (отменён) — новый через open_sec
+        if b.probe_at is not None and now - b.probe_at < self.open_sec:
+            return False
+        b.probe_at = now
+        return True
+
+    def record(self, cfg: AIChatConfig, result: AIChatResult) -> None:
+        b = self._state.setdefault(self.key(cfg), _Breaker())
+        probing, b.probe_at = b.probe_at is not None, None
+        if result.ok or not _retryable(result):
+            # постоянная ошибка (400/401) — про запрос/ключ, не про доступность
+            b.failures, b.opened_at = 0, None
+            return
+        b.failures += 1
+        if probing or b.failures >= self.failures:
+            if b.opened_at is None or probing:
+                b.trips += 1
+                print(f"[AI_RESILIENCE] breaker open {self.key(cfg)[0]} failures={b.failures}", flush=True)
+            b.opened_at = self.clock()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        for (provider, _), b in self._state.items():
+            s = out.setdefault(provider, {"keys": 0, "open": 0, "trips": 0})
+            s["keys"] += 1
+            s["open"] += int(b.opened_at is not None and self.clock() - b.opened_at < self.open_sec)
+            s["trips"] += b.trips
+        return out
+
+
+breakers = CircuitBreakers()
+
+
+# ────────────────────────────────────────────────────────────────
+# chat
+# ────────────────────────────────────────────────────────────────
+
+def _timeout_result(cfg: AIChatConfig) -> AIChatResult:
+    return AIChatResult(
+        ok=False, text="", usage={"provider": cfg.provider.value, "model": cfg.model},
+        error="AI_DEADLINE_EXCEEDED", raw={"status": None, "retryable": True},
+    )
+
+
+def _circuit_open_result(cfg: AIChatConfig) -> AIChatResult:
+    return AIChatResult(
+        ok=False, text="", usage={"provider": cfg.provider.value, "model": cfg.model},
+        error="AI_CIRCUIT_OPEN", raw={"status": None, "retryable": True},
+    )
+
+
+class _Attempts:
+    """Общий счётчик попыток и дедлайн на весь вызов."""
+
+    def __init__(self, deadline_sec: float) -> None:
+        self.deadline = time.monotonic() + max(0.0, float(deadline_sec))
+        self.count = 0
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+async def _call_once(cfg: AIChatConfig, messages: List[Dict[str, str]], budget: _Attempts) -> AIChatResult:
+    budget.count += 1
+    remaining = budget.remaining()
+    if remaining <= 0:
+        return _timeout_result(cfg)
+    try:
+        result = await asyncio.wait_for(chat(cfg=cfg, messages=messages), timeout=remaining)
+    except asyncio.TimeoutError:
+        result = _timeout_result(cfg)
+    breakers.record(cfg, result)
+    return result
+
+
+async def _call_with_retries(
+    cfg: AIChatConfig, messages: List[Dict[str, str]], policy: ChatPolicy, budget: _Attempts
+) -> AIChatResult:
+    result = _circuit_open_result(cfg)
+    for attempt in range(max(0, policy.retries) + 1):
+        if not breakers.allow(cfg):
+            return _circuit_open_result(cfg)
+        result = await _call_once(cfg, messages, budget)
+        if result.ok or not _retryable(result):
+            return result
+        delay = backoff_delay(attempt)
+        if attempt >= policy.retries or budget.remaining() <= delay:
+            break
+        await asyncio.sleep(delay)
+    return result
+
+
+async def _race(first: asyncio.Task, start_second: Callable[[], asyncio.Task], after: float):
+    """
+    first; если нет ответа за after — параллельно second.
+    → (результат, индекс кандидата, был ли запущен second): первый успешный
+    или последний неуспешный.
+    """
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=after)
+        if done:
+            return (*first.result(), False)
+        pending.add(start_second())
+        last = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                last = t.result()
+                if last[0].ok:
+                    return (*last, True)
+        return (*last, True)
+    finally:
+        # успех, ошибка или отмена вызывающего — проигравшие не живут дальше
+        for p in pending:
+            p.cancel()
+
+
+async def resilient_chat(
+    *,
+    cfg: AIChatConfig,
+    messages: List[Dict[str, str]],
+    fallbacks: Sequence[AIChatConfig] = (),
+    policy: ChatPolicy = ChatPolicy(),
+) -> AIChatResult:
+    """chat с дедлайном, повторами, breaker и фолбэками (см. модуль)."""
+    candidates = [cfg, *fallbacks]
+    budget = _Attempts(policy.deadline_sec)
+
+    async def run(index: int) -> tuple[AIChatResult, int]:
+        return await _call_with_retries(candidates[index], messages, policy, budget), index
+
+    result, used = _circuit_open_result(cfg), 0
+    index = 0
+    while index < len(candidates) and budget.remaining() > 0:
+        if policy.hedge_after_sec is None:
+            result, used = await run(index)
+            index += 1
+        else:
+            # хедж — к следующему кандидату, на последнем — дубль к нему же
+            hedge_index = min(index + 1, len(candidates) - 1)
+            result, used, hedged = await _race(
+                asyncio.create_task(run(index)),
+                lambda: asyncio.create_task(run(hedge_index)),
+                max(0.0, policy.hedge_after_sec),
+            )
+            index = (hedge_index if hedged else index) + 1
+        if result.ok:
+            break
+    return _with_raw(result, attempts=budget.count, provider=candidates[used].provider.value, fallback=used)
+
+
+# ────────────────────────────────────────────────────────────────
+# chat_stream
+# ────────────────────────────────────────────────────────────────
+
+async def resilient_chat_stream(
+    *,
+    cfg: AIChatConfig,
+    messages: List[Dict[str, str]],
+    fallbacks: Sequence[AIChatConfig] = (),
+    policy: ChatPolicy = ChatPolicy(),
+) -> AsyncIterator[AIChatDelta]:
+    """
+    chat_stream с теми же правилами, пока пользователю ничего не показано:
+    повтор/фолбэк возможен только до первой дельты. Дедлайн — на весь поток.
+    """
+    candidates = [cfg, *fallbacks]
+    budget = _Attempts(policy.deadline_sec)
+    result = _circuit_open_result(cfg)
+    used = 0
+    for index, candidate in enumerate(candidates):
+        for attempt in range(max(0, policy.retries) + 1):
+            if not breakers.allow(candidate):
+                result = _circuit_open_result(candidate)
+                break
+            budget.count += 1
+            used = index
+            shown = False
+            result = _timeout_result(candidate)
+            stream = chat_stream(cfg=candidate, messages=messages)
+            try:
+                while True:
+                    remaining = budget.remaining()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    delta = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                    if delta.result is not None:
+                        result = delta.result
+                        continue
+                    if delta.text:
+                        shown = True
+                        yield delta
+            except StopAsyncIteration:
+                pass
+            except asyncio.TimeoutError:
+                result = _timeout_result(candidate)
+            finally:
+                await stream.aclose()
+            breakers.record(candidate, result)
+            if result.ok or shown:
+                yield AIChatDelta(result=_with_raw(
+                    result, attempts=budget.count, provider=candidate.provider.value, fallback=index,
+                ))
+                return
+            if not _retryable(result):
+                break
+            delay = backoff_delay(attempt)
+            if attempt >= policy.retries or budget.remaining() <= delay:
+                break
+            await asyncio.sleep(delay)
+        if budget.remaining() <= 0:
+            break
+    yield AIChatDelta(result=_with_raw(
+        result, attempts=budget.count, provider=candidates[used].provider.value, fallback=used,
+    ))
@@ -6,15 +6,32 @@ src/app/core/ai_transport.py
 Задача:
 - по key_field понять провайдера
 - отправить messages -> получить text/usage
+- chat_stream: то же, но текст приходит дельтами (прогрессивный ответ)
 - (позже) добавить STT/TTS для провайдеров где нужно
+
+OpenAI и совместимые — через SDK openai; Anthropic (Messages API) и Gemini
+(generateContent) — нативный REST на httpx из того же пула клиентов.
+usage у всех приводится к одному виду (_usage / _anthropic_usage / _gemini_usage).
+
+SDK-клиенты не создаются на каждый вызов: ProviderClients (ai_clients) держит
+по клиенту на (провайдер, base_url, отпечаток ключа) с общим httpx-пулом
+и keep-alive — повторный запрос не платит за TCP/TLS. Неиспользуемые клиенты
+закрываются через AI_CLIENT_IDLE_SEC, все — при остановке процесса (close).
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
+import httpx
 from openai import AsyncOpenAI
 
 
@@ -30,6 +47,10 @@ class AIProvider(str, Enum):
     unknown = "unknown"
 
 
+OPENAI_COMPAT_PROVIDERS = frozenset({
+    AIProvider.openai, AIProvider.groq, AIProvider.deepseek, AIProvider.mistral, AIProvider.xai,
+})
+
 OPENAI_COMPAT_BASE_URL: dict[AIProvider, str] = {
     AIProvider.groq: "https://api.groq.com/openai/v1",
     AIProvider.deepseek: "https://api.deepseek.com/v1",
@@ -37,6 +58,18 @@ OPENAI_COMPAT_BASE_URL: dict[AIProvider, str] = {
     AIProvider.xai: "https://api.x.ai/v1",
 }
 
+# Нативные REST-бэкенды (не openai-совместимые)
+NATIVE_PROVIDERS = frozenset({AIProvider.anthropic, AIProvider.gemini})
+
+NATIVE_BASE_URL: dict[AIProvider, str] = {
+    AIProvider.anthropic: os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com"),
+    AIProvider.gemini: os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+}
+
+ANTHROPIC_VERSION = "2023-06-01"
+# Messages API требует max_tokens; ответы менеджера и классификация короче
+ANTHROPIC_MAX_TOKENS = int(os.getenv("ANTHROPIC_MAX_TOKENS", "1024"))
+
 PROVIDER_BY_KEY_FIELD: dict[str, AIProvider] = {
     "creds.openai_api_key": AIProvider.openai,
     "creds.openai_admin_key": AIProvider.openai,
@@ -67,53 +100,555 @@ class AIChatResult:
     raw: Optional[Dict[str, Any]] = None
 
 
+@dataclass(frozen=True)
+class AIChatDelta:
+    text: str = ""
+    result: Optional[AIChatResult] = None   # только в последнем элементе потока
+
+
 def provider_from_key_field(key_field: str) -> AIProvider:
     return PROVIDER_BY_KEY_FIELD.get((key_field or "").strip(), AIProvider.unknown)
 
 
+# ────────────────────────────────────────────────────────────────
+# История латентности (in-process): EMA по (provider, model)
+# Используется для оценок (dry-run backscan), не для логики вызовов.
+# ────────────────────────────────────────────────────────────────
+
+LATENCY_EMA_ALPHA = 0.2
+
+_latency_ms: dict[tuple[str, str], tuple[int, float]] = {}
+
+
+def record_latency(provider: str, model: str, ms: float) -> None:
+    key = (provider, model)
+    count, avg = _latency_ms.get(key, (0, 0.0))
+    avg = float(ms) if count == 0 else avg + LATENCY_EMA_ALPHA * (float(ms) - avg)
+    _latency_ms[key] = (count + 1, avg)
+
+
+def observed_latency_ms(provider: str, model: str) -> float | None:
+    """Средняя (EMA) латентность успешных вызовов или None, если истории нет."""
+    entry = _latency_ms.get((provider, model))
+    return entry[1] if entry else None
+
+
+# ────────────────────────────────────────────────────────────────
+# Реестр клиентов: keep-alive пулы по (provider, base_url, ключ)
+# ────────────────────────────────────────────────────────────────
+
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "10"))
+AI_HTTP_KEEPALIVE_SEC = float(os.getenv("AI_HTTP_KEEPALIVE_SEC", "60"))
+AI_HTTP_TIMEOUT_SEC = float(os.getenv("AI_HTTP_TIMEOUT_SEC", "120"))
+AI_CLIENT_IDLE_SEC = float(os.getenv("AI_CLIENT_IDLE_SEC", "600"))
+AI_CLIENTS_MAX = 64
+# Вытесненный по лимиту клиент закрываем не сразу: на нём может идти ответ
+_RETIRE_GRACE_SEC = AI_HTTP_TIMEOUT_SEC
+
+ClientKey = tuple[str, str, str]   # (provider, base_url, key fingerprint)
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Отпечаток ключа для реестра/логов (сам ключ не хранится в ключе словаря)."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _make_client(provider: str, api_key: str, base_url: Optional[str]) -> Any:
+    """AsyncOpenAI для openai-совместимых, httpx.AsyncClient с ключом в заголовках — для нативных."""
+    limits = httpx.Limits(
+        max_connections=AI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=AI_HTTP_KEEPALIVE_SEC,
+    )
+    timeout = httpx.Timeout(AI_HTTP_TIMEOUT_SEC, connect=10.0)
+    if provider == AIProvider.anthropic.value:
+        headers = {"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION}
+        return httpx.AsyncClient(base_url=base_url or "", headers=headers, limits=limits, timeout=timeout)
+    if provider == AIProvider.gemini.value:
+        headers = {"x-goog-api-key": api_key}
+        return httpx.AsyncClient(base_url=base_url or "", headers=headers, limits=limits, timeout=timeout)
+    http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+
+@dataclass
+class _Pooled:
+    client: Any
+    provider: str
+    last_used: float
+    uses: int = 0
+
+
+@dataclass
+class _ProviderStats:
+    created: int = 0
+    reused: int = 0
+    evicted_idle: int = 0
+    evicted_lru: int = 0
+
+
+class ProviderClients:
+    def __init__(
+        self,
+        *,
+        factory: Callable[[str, str, Optional[str]], Any] = _make_client,
+        idle_sec: float = AI_CLIENT_IDLE_SEC,
+        max_clients: int = AI_CLIENTS_MAX,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._factory = factory
+        self.idle_sec = float(idle_sec)
+        self.max_clients = max(1, int(max_clients))
+        self._clock = clock
+        self._clients: OrderedDict[ClientKey, _Pooled] = OrderedDict()
+        self._retired: List[tuple[float, _Pooled]] = []
+        self._stats: Dict[str, _ProviderStats] = {}
+        self._task: asyncio.Task | None = None
+
+    def _log(self, msg: str) -> None:
+        print(f"[AI_CLIENTS] {msg}", flush=True)
+
+    def get(self, provider: str, api_key: str, *, base_url: Optional[str] = None) -> Any:
+        """Клиент из пула (создаётся при первом обращении)."""
+        key = (provider, base_url or "", key_fingerprint(api_key))
+        st = self._stats.setdefault(provider, _ProviderStats())
+        now = self._clock()
+        pooled = self._clients.get(key)
+        if pooled is None:
+            pooled = _Pooled(client=self._factory(provider, api_key, base_url), provider=provider, last_used=now)
+            self._clients[key] = pooled
+            st.created += 1
+            while len(self._clients) > self.max_clients:
+                _, old = self._clients.popitem(last=False)
+                self._stats.setdefault(old.provider, _ProviderStats()).evicted_lru += 1
+                self._retired.append((now + _RETIRE_GRACE_SEC, old))
+        else:
+            self._clients.move_to_end(key)
+            st.reused += 1
+        pooled.last_used = now
+        pooled.uses += 1
+        self._ensure_started()
+        return pooled.client
+
+    def _ensure_started(self) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        interval = max(1.0, min(self.idle_sec / 2, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                self._log(f"sweep error: {e!r}")
+
+    async def _close_client(self, pooled: _Pooled) -> None:
+        try:
+            # AsyncOpenAI.close() / httpx.AsyncClient.aclose()
+            close = getattr(pooled.client, "aclose", None) or pooled.client.close
+            await close()
+        except Exception as e:
+            self._log(f"close {pooled.provider} error: {e!r}")
+
+    async def sweep(self) -> int:
+        """Закрыть клиенты без обращений дольше idle_sec и отслужившие вытесненные."""
+        now = self._clock()
+        idle = [k for k, p in self._clients.items() if now - p.last_used >= self.idle_sec]
+        closing = [self._clients.pop(k) for k in idle]
+        for p in closing:
+            self._stats.setdefault(p.provider, _ProviderStats()).evicted_idle += 1
+        due = [p for at, p in self._retired if at <= now]
+        self._retired = [(at, p) for at, p in self._retired if at > now]
+        for p in closing + due:
+            await self._close_client(p)
+        if closing:
+            self._log(f"idle evicted={len(closing)} open={len(self._clients)}")
+        return len(closing) + len(due)
+
+    async def close(self) -> None:
+        """Остановка процесса: закрыть все пулы соединений."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        pooled = list(self._clients.values()) + [p for _, p in self._retired]
+        self._clients.clear()
+        self._retired = []
+        for p in pooled:
+            await self._close_client(p)
+        if pooled:
+            self._log(f"closed {len(pooled)} clients")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """По провайдерам: открытые клиенты, обращения, создано/переиспользовано/вытеснено."""
+        out: Dict[str, Dict[str, int]] = {}
+        for provider, st in self._stats.items():
+            mine = [p for p in self._clients.values() if p.provider == provider]
+            out[provider] = {
+                "open": len(mine),
+                "uses": sum(p.uses for p in mine),
+                "created": st.created,
+                "reused": st.reused,
+                "evicted_idle": st.evicted_idle,
+                "evicted_lru": st.evicted_lru,
+            }
+        return out
+
+
+ai_clients = ProviderClients()
+
+
+def _client_for(cfg: AIChatConfig) -> Any:
+    base_url = NATIVE_BASE_URL.get(cfg.provider) or OPENAI_COMPAT_BASE_URL.get(cfg.provider)
+    return ai_clients.get(cfg.provider.value, cfg.api_key, base_url=base_url)
+
+
+def _usage(cfg: AIChatConfig, usage_obj: Any) -> Dict[str, Any]:
+    details = getattr(usage_obj, "prompt_tokens_details", None) if usage_obj else None
+    return {
+        "prompt_tokens": int(getattr(usage_obj, "prompt_tokens", 0) if usage_obj else 0),
+        "completion_tokens": int(getattr(usage_obj, "completion_tokens", 0) if usage_obj else 0),
+        "total_tokens": int(getattr(usage_obj, "total_tokens", 0) if usage_obj else 0),
+        "cached_tokens": int(getattr(details, "cached_tokens", 0) or 0) if details else 0,
+        "provider": cfg.provider.value,
+        "model": cfg.model,
+    }
+
+
+# 408/409/425/429 и 5xx — временные: повтор/фолбэк имеют смысл (ai_resilience)
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429})
+
+
+def error_status(e: BaseException) -> Optional[int]:
+    for attr in ("status_code", "status"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(e, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable_error(e: BaseException) -> bool:
+    """Таймауты, обрывы соединения, 408/409/425/429, 5xx."""
+    status = error_status(e)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    if isinstance(e, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    # openai.APITimeoutError / APIConnectionError (без status_code)
+    return type(e).__name__ in ("APITimeoutError", "APIConnectionError")
+
+
+def _failed(cfg: AIChatConfig, e: BaseException) -> AIChatResult:
+    """Ошибка вызова; raw["status"/"retryable"] — для повторов и circuit breaker."""
+    return AIChatResult(
+        ok=False,
+        text="",
+        usage={"provider": cfg.provider.value, "model": cfg.model},
+        error=str(e) or type(e).__name__,
+        raw={"status": error_status(e), "retryable": is_retryable_error(e)},
+    )
+
+
+# ────────────────────────────────────────────────────────────────
+# Нативные бэкенды: Anthropic Messages API, Gemini generateContent
+# ────────────────────────────────────────────────────────────────
+
+class ProviderHTTPError(Exception):
+    """Ответ провайдера не 2xx (или ошибка внутри потока)."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"Error code: {status} - {message}")
+        self.status = status
+        self.message = message
+
+
+def _raise_for_status(status: int, body: bytes) -> None:
+    if status < 400:
+        return
+    try:
+        err = json.loads(body or b"{}").get("error") or {}
+        message = err.get("message") if isinstance(err, dict) else str(err)
+    except ValueError:
+        message = None
+    raise ProviderHTTPError(status, message or (body or b"").decode("utf-8", "replace")[:300])
+
+
+def _split_system(messages: List[Dict[str, str]]) -> tuple[str, List[tuple[str, str]]]:
+    """system отдельно, остальное — [(user|assistant, text)] с склейкой подряд идущих ролей."""
+    system: List[str] = []
+    turns: List[tuple[str, str]] = []
+    for m in messages:
+        content = str(m.get("content") or "").strip()
+        if not content:
+            continue
+        role = m.get("role")
+        if role == "system":
+            system.append(content)
+            continue
+        role = "assistant" if role == "assistant" else "user"
+        if turns and turns[-1][0] == role:
+            turns[-1] = (role, turns[-1][1] + "\n\n" + content)
+        else:
+            turns.append((role, content))
+    return "\n\n".join(system), turns
+
+
+def _anthropic_body(cfg: AIChatConfig, messages: List[Dict[str, str]], *, stream: bool = False) -> Dict[str, Any]:
+    system, turns = _split_system(messages)
+    body: Dict[str, Any] = {
+        "model": cfg.model,
+        "max_tokens": ANTHROPIC_MAX_TOKENS,
+        "temperature": cfg.temperature,
+        "messages": [{"role": role, "content": content} for role, content in turns],
+    }
+    if system:
+        # prompt caching: промпт ресурса повторяется из запроса в запрос;
+        # короче минимального размера Anthropic просто не кэширует
+        body["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+    if stream:
+        body["stream"] = True
+    return body
+
+
+def _anthropic_usage(cfg: AIChatConfig, u: Dict[str, Any]) -> Dict[str, Any]:
+    cache_read = int(u.get("cache_read_input_tokens") or 0)
+    prompt = int(u.get("input_tokens") or 0) + int(u.get("cache_creation_input_tokens") or 0) + cache_read
+    completion = int(u.get("output_tokens") or 0)
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+        "cached_tokens": cache_read,
+        "provider": cfg.provider.value,
+        "model": cfg.model,
+    }
+
+
+def _gemini_body(cfg: AIChatConfig, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    system, turns = _split_system(messages)
+    body: Dict[str, Any] = {
+        "contents": [
+            {"role": "model" if role == "assistant" else "user", "parts": [{"text": content}]}
+            for role, content in turns
+        ],
+        "generationConfig": {"temperature": cfg.temperature},
+    }
+    if system:
+        body["systemInstruction"] = {"parts": [{"text": system}]}
+    return body
+
+
+def _gemini_usage(cfg: AIChatConfig, u: Dict[str, Any]) -> Dict[str, Any]:
+    prompt = int(u.get("promptTokenCount") or 0)
+    # thinking-модели считают «мысли» отдельно, оплачиваются как выход
+    completion = int(u.get("candidatesTokenCount") or 0) + int(u.get("thoughtsTokenCount") or 0)
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": int(u.get("totalTokenCount") or 0) or prompt + completion,
+        "cached_tokens": int(u.get("cachedContentTokenCount") or 0),
+        "provider": cfg.provider.value,
+        "model": cfg.model,
+    }
+
+
+def _gemini_text(data: Dict[str, Any]) -> str:
+    """Текст ответа/чанка; заблокированный промпт — ошибка, как у прочих провайдеров."""
+    block = (data.get("promptFeedback") or {}).get("blockReason")
+    if block:
+        raise ProviderHTTPError(400, f"prompt blocked: {block}")
+    parts = (((data.get("candidates") or [{}])[0].get("content") or {}).get("parts")) or []
+    return "".join(p.get("text") or "" for p in parts if not p.get("thought"))
+
+
+async def _sse_events(resp: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    """JSON из строк `data: …` server-sent events."""
+    async for line in resp.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        payload = line[5:].strip()
+        if not payload or payload == "[DONE]":
+            continue
+        yield json.loads(payload)
+
+
+async def _native_chat(cfg: AIChatConfig, messages: List[Dict[str, str]]) -> tuple[str, Dict[str, Any]]:
+    client = _client_for(cfg)
+    if cfg.provider == AIProvider.anthropic:
+        resp = await client.post("/v1/messages", json=_anthropic_body(cfg, messages))
+        _raise_for_status(resp.status_code, resp.content)
+        data = resp.json()
+        text = "".join(b.get("text") or "" for b in data.get("content") or () if b.get("type") == "text")
+        return text.strip(), _anthropic_usage(cfg, data.get("usage") or {})
+
+    resp = await client.post(f"/v1beta/models/{cfg.model}:generateContent", json=_gemini_body(cfg, messages))
+    _raise_for_status(resp.status_code, resp.content)
+    data = resp.json()
+    return _gemini_text(data).strip(), _gemini_usage(cfg, data.get("usageMetadata") or {})
+
+
+async def _native_stream(cfg: AIChatConfig, messages: List[Dict[str, str]]) -> AsyncIterator[tuple[str, Any]]:
+    """("text", piece) по мере генерации и ("usage", dict) в конце."""
+    client = _client_for(cfg)
+    if cfg.provider == AIProvider.anthropic:
+        req = client.stream("POST", "/v1/messages", json=_anthropic_body(cfg, messages, stream=True))
+    else:
+        req = client.stream(
+            "POST", f"/v1beta/models/{cfg.model}:streamGenerateContent",
+            params={"alt": "sse"}, json=_gemini_body(cfg, messages),
+        )
+    async with req as resp:
+        if resp.status_code >= 400:
+            _raise_for_status(resp.status_code, await resp.aread())
+        if cfg.provider == AIProvider.anthropic:
+            usage: Dict[str, Any] = {}
+            async for ev in _sse_events(resp):
+                kind = ev.get("type")
+                if kind == "message_start":
+                    usage.update((ev.get("message") or {}).get("usage") or {})
+                elif kind == "content_block_delta":
+                    piece = (ev.get("delta") or {}).get("text")
+                    if piece:
+                        yield "text", piece
+                elif kind == "message_delta":
+                    usage.update(ev.get("usage") or {})
+                elif kind == "error":
+                    raise ProviderHTTPError(500, str((ev.get("error") or {}).get("message") or ev))
+            yield "usage", _anthropic_usage(cfg, usage)
+        else:
+            meta: Dict[str, Any] = {}
+            async for ev in _sse_events(resp):
+                piece = _gemini_text(ev)
+                if piece:
+                    yield "text", piece
+                meta = ev.get("usageMetadata") or meta   # накопительный, последний — итог
+            yield "usage", _gemini_usage(cfg, meta)
+
+
+# ────────────────────────────────────────────────────────────────
+# Публичный API
+# ────────────────────────────────────────────────────────────────
+
 async def chat(
     *,
     cfg: AIChatConfig,
     messages: List[Dict[str, str]],
 ) -> AIChatResult:
     """
-    Единая точка для текстового чата.
-    Сейчас реально работает:
-      - OpenAI
-      - OpenAI-compatible (groq/deepseek/mistral/xai)
-    Остальные провайдеры — заглушки (эндпоинты заложены, наполним позже).
+    Единая точка для текстового чата:
+      - OpenAI и OpenAI-compatible (groq/deepseek/mistral/xai) — SDK openai;
+      - Anthropic, Gemini — нативный REST.
+    Ошибка провайдера → ok=False, error=str(исключения), как в OpenAI-ветке.
     """
     if not messages:
         return AIChatResult(ok=False, text="", usage={}, error="EMPTY_MESSAGES")
 
-    if cfg.provider in {AIProvider.openai, AIProvider.groq, AIProvider.deepseek, AIProvider.mistral, AIProvider.xai}:
-        base_url = OPENAI_COMPAT_BASE_URL.get(cfg.provider)  # None для openai
-        client = AsyncOpenAI(api_key=cfg.api_key, base_url=base_url)
+    if cfg.provider in OPENAI_COMPAT_PROVIDERS:
+        client = _client_for(cfg)
+        t0 = time.perf_counter()
         try:
             resp = await client.chat.completions.create(
                 model=cfg.model,
                 temperature=cfg.temperature,
                 messages=messages,
             )
+            record_latency(cfg.provider.value, cfg.model, (time.perf_counter() - t0) * 1000)
             text = (resp.choices[0].message.content or "").strip()
-            usage_obj = getattr(resp, "usage", None)
-            usage = {
-                "prompt_tokens": int(getattr(usage_obj, "prompt_tokens", 0) if usage_obj else 0),
-                "completion_tokens": int(getattr(usage_obj, "completion_tokens", 0) if usage_obj else 0),
-                "total_tokens": int(getattr(usage_obj, "total_tokens", 0) if usage_obj else 0),
-                "provider": cfg.provider.value,
-                "model": cfg.model,
-            }
+            usage = _usage(cfg, getattr(resp, "usage", None))
             return AIChatResult(ok=True, text=text, usage=usage, raw=None)
         except Exception as e:
-            return AIChatResult(ok=False, text="", usage={"provider": cfg.provider.value, "model": cfg.model}, error=str(e))
+            return _failed(cfg, e)
+
+    if cfg.provider in NATIVE_PROVIDERS:
+        t0 = time.perf_counter()
+        try:
+            text, usage = await _native_chat(cfg, messages)
+        except Exception as e:
+            return _failed(cfg, e)
+        record_latency(cfg.provider.value, cfg.model, (time.perf_counter() - t0) * 1000)
+        return AIChatResult(ok=True, text=text, usage=usage, raw=None)
 
-    # Заглушки: провайдеры есть в keys, но реализацию добавим отдельными итерациями.
-    if cfg.provider == AIProvider.gemini:
-        return AIChatResult(ok=False, text="", usage={"provider": "gemini"}, error="NOT_IMPLEMENTED_GEMINI_CHAT")
-    if cfg.provider == AIProvider.anthropic:
-        return AIChatResult(ok=False, text="", usage={"provider": "anthropic"}, error="NOT_IMPLEMENTED_ANTHROPIC_CHAT")
     if cfg.provider == AIProvider.deepgram:
         return AIChatResult(ok=False, text="", usage={"provider": "deepgram"}, error="DEEPGRAM_IS_NOT_CHAT_PROVIDER_YET")
 
     return AIChatResult(ok=False, text="", usage={}, error="UNKNOWN_PROVIDER")
+
+
+async def chat_stream(
+    *,
+    cfg: AIChatConfig,
+    messages: List[Dict[str, str]],
+) -> AsyncIterator[AIChatDelta]:
+    """
+    Потоковый chat: AIChatDelta(text=...) по мере генерации, последним —
+    AIChatDelta(result=AIChatResult) с полным текстом и usage.
+    result.raw["ttft_ms"] — время до первого токена.
+    Провайдеры без стриминга отдают весь текст одной дельтой (через chat).
+    """
+    streaming = OPENAI_COMPAT_PROVIDERS | NATIVE_PROVIDERS
+    if not messages or cfg.provider not in streaming:
+        result = await chat(cfg=cfg, messages=messages)
+        if result.ok and result.text:
+            yield AIChatDelta(text=result.text)
+        yield AIChatDelta(result=result)
+        return
+
+    t0 = time.perf_counter()
+    ttft_ms: Optional[float] = None
+    parts: List[str] = []
+    usage: Dict[str, Any] = {}
+    try:
+        if cfg.provider in NATIVE_PROVIDERS:
+            async for kind, value in _native_stream(cfg, messages):
+                if kind == "usage":
+                    usage = value
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+                parts.append(value)
+                yield AIChatDelta(text=value)
+        else:
+            client = _client_for(cfg)
+            # usage в последнем чанке гарантированно отдаёт только OpenAI
+            extra = {"stream_options": {"include_usage": True}} if cfg.provider == AIProvider.openai else {}
+            usage_obj: Any = None
+            stream = await client.chat.completions.create(
+                model=cfg.model,
+                temperature=cfg.temperature,
+                messages=messages,
+                stream=True,
+                **extra,
+            )
+            async for chunk in stream:
+                usage_obj = getattr(chunk, "usage", None) or usage_obj
+                for choice in getattr(chunk, "choices", None) or ():
+                    piece = getattr(getattr(choice, "delta", None), "content", None)
+                    if not piece:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - t0) * 1000
+                    parts.append(piece)
+                    yield AIChatDelta(text=piece)
+            usage = _usage(cfg, usage_obj)
+    except Exception as e:
+        yield AIChatDelta(result=_failed(cfg, e))
+        return
+
+    record_latency(cfg.provider.value, cfg.model, (time.perf_counter() - t0) * 1000)
+    yield AIChatDelta(result=AIChatResult(
+        ok=True,
+        text="".join(parts).strip(),
+        usage=usage,
+        raw={"ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None},
+    ))
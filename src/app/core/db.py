@@ -5,6 +5,7 @@ src/app/core/db.py — подключение к базе данных PostgreSQ
 
 import os
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 # -----------------------------------------------------------------------------
@@ -27,6 +28,14 @@ DATABASE_URL = f"postgresql+psycopg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT
 engine = create_engine(DATABASE_URL, echo=False, future=True, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Async-движок (тот же psycopg v3, свой пул) — для горячего пути обработки
+# сообщений, чтобы не гонять каждый запрос через asyncio.to_thread.
+# Подключение ленивое: процессы, которые его не используют, соединений не держат.
+async_engine = create_async_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 
 # -----------------------------------------------------------------------------
 # Базовый класс для ORM-моделей
@@ -14,6 +14,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
+from src.app.core.pricing import count_tokens
+
 
 @dataclass(frozen=True)
 class AIRequest:
@@ -30,20 +32,69 @@ class AIResponse:
     raw: Optional[Dict[str, Any]] = None     # по желанию
 
 
+# Служебные токены чат-формата на одно сообщение (role, разделители)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Обрезанный кусок меньше этого не отправляем — только шум
+MIN_TRUNCATED_TOKENS = 32
+TRUNCATION_MARK = " …"
+# Место под ответ модели в окне контекста
+REPLY_RESERVE_TOKENS = 1024
+
+
+def _tokens(m: Dict[str, Any], content: str) -> int:
+    """Кэшированное число токенов сообщения (m["tokens"]) или оценка."""
+    cached = m.get("tokens")
+    return int(cached) if isinstance(cached, int) and cached >= 0 else count_tokens(content)
+
+
+def _fit(content: str, tokens: int, limit: int) -> Optional[tuple[str, int, bool]]:
+    """(текст, токены, обрезан?) в пределах limit или None, если не влезает даже кусок."""
+    if tokens <= limit:
+        return content, tokens, False
+    if limit < MIN_TRUNCATED_TOKENS:
+        return None
+    cut = content[: max(1, int(len(content) * limit / max(tokens, 1)) - len(TRUNCATION_MARK))]
+    cut = cut.rstrip() + TRUNCATION_MARK
+    n = count_tokens(cut)
+    while n > limit and len(cut) > len(TRUNCATION_MARK) + 1:
+        cut = cut[: int(len(cut) * 0.9)].rstrip() + TRUNCATION_MARK
+        n = count_tokens(cut)
+    return cut, n, True
+
+
 def build_request(
     *,
     thread_id: str,
     user_text: str,
     system_prompt: str,
     drive_context: str,
-    history: List[Dict[str, str]],
+    history: List[Dict[str, Any]],
     state: Dict[str, Any],
+    memory: Optional[List[Dict[str, Any]]] = None,
+    summary: str = "",
+    token_budget: Optional[int] = None,
+    max_message_tokens: Optional[int] = None,
+    context_window: Optional[int] = None,
 ) -> AIRequest:
     """
     Формируем messages для AI.
 
     Важно:
-    - history уже должен быть обрезан снаружи (по PROMPT.history_pairs).
+    - history — последние реплики (role/content, опционально tokens — кэш
+      из messages.meta_json), в хронологии.
+    - summary — скользящее резюме старой части диалога (dialog_summary),
+      history тогда — только последние реплики после него.
+    - memory — найденные по смыслу старые сообщения диалога (dialog_memory),
+      идут в system отдельным блоком, чтобы не ломать порядок реплик;
+      rank задаёт приоритет при нехватке бюджета.
+    - token_budget — потолок диалоговой части (pricing.context_token_budget):
+      вход всегда, затем история от новых к старым, затем memory. System в
+      бюджет не входит — большой промпт не вытесняет историю. Реплика
+      истории/memory длиннее max_message_tokens (по умолчанию четверть
+      бюджета) обрезается. None — без бюджета (всё как есть).
+    - context_window — окно модели (pricing.model_context_tokens): весь
+      запрос плюс REPLY_RESERVE_TOKENS в него влезает; вход пользователя
+      обрезается только им, не бюджетом.
     - здесь нет никакой БД/телеги/ключей.
     """
     user_text = (user_text or "").strip()
@@ -56,22 +107,107 @@ def build_request(
         if drive_context:
             sys = (sys + "\n\n" if sys else "") + "KNOWLEDGE:\n" + drive_context
 
+    summary = (summary or "").strip()
+    if summary:
+        sys = (sys + "\n\n" if sys else "") + "DIALOG SUMMARY:\n" + summary
+
+    budget = int(token_budget) if token_budget is not None else None
+    window = int(context_window) if context_window else None
+    per_msg = int(max_message_tokens or (max(MIN_TRUNCATED_TOKENS, budget // 4) if budget else 0)) or None
+    truncated = 0
+    dropped = 0
+
+    sys_tokens = count_tokens(sys) + (MESSAGE_OVERHEAD_TOKENS if sys else 0)
+    room = (window - sys_tokens - MESSAGE_OVERHEAD_TOKENS - REPLY_RESERVE_TOKENS) if window is not None else None
+
+    # вход пользователя: всегда, режется только окном модели
+    user_tokens = count_tokens(user_text)
+    if room is not None:
+        fitted = _fit(user_text, user_tokens, max(MIN_TRUNCATED_TOKENS, room))
+        if fitted is not None:
+            user_text, user_tokens, cut = fitted
+            truncated += int(cut)
+
+    left = (budget - user_tokens - MESSAGE_OVERHEAD_TOKENS) if budget is not None else None
+    if room is not None:
+        left = min(left, room - user_tokens) if left is not None else room - user_tokens
+
+    def _take(m: Dict[str, Any], content: str, extra: int) -> Optional[tuple[str, int]]:
+        nonlocal left, truncated
+        tokens = _tokens(m, content)
+        if left is None:
+            return content, tokens
+        room = left - extra
+        if per_msg is not None:
+            room = min(room, per_msg)
+        fitted = _fit(content, tokens, room)
+        if fitted is None:
+            return None
+        content, tokens, cut = fitted
+        truncated += int(cut)
+        left -= tokens + extra
+        return content, tokens
+
+    # история: от новых к старым, пока есть бюджет
+    picked: List[Dict[str, str]] = []
+    history_tokens = 0
+    items = [
+        (m, (m.get("role") or "").strip(), (m.get("content") or "").strip())
+        for m in history or []
+    ]
+    items = [(m, role, content) for m, role, content in items if role in {"user", "assistant"} and content]
+    for i, (m, role, content) in enumerate(reversed(items)):
+        got = _take(m, content, MESSAGE_OVERHEAD_TOKENS)
+        if got is None:
+            dropped += len(items) - i
+            break
+        picked.append({"role": role, "content": got[0]})
+        history_tokens += got[1]
+    picked.reverse()
+
+    # memory: по rank, в system — в исходном (хронологическом) порядке
+    mem = [
+        (idx, m, (m.get("content") or "").strip())
+        for idx, m in enumerate(memory or [])
+        if (m.get("content") or "").strip()
+    ]
+    chosen: Dict[int, str] = {}
+    memory_tokens = 0
+    for idx, m, content in sorted(mem, key=lambda x: (x[1].get("rank", x[0]), x[0])):
+        got = _take(m, content, 2)
+        if got is None:
+            dropped += 1
+            continue
+        chosen[idx] = f"{m.get('role')}: {got[0]}"
+        memory_tokens += got[1]
+    earlier = [chosen[idx] for idx, _, _ in mem if idx in chosen]
+    if earlier:
+        block = "EARLIER IN THIS DIALOG:\n" + "\n".join(earlier)
+        sys = (sys + "\n\n" if sys else "") + block
+        sys_tokens += count_tokens(block) + 2
+
     messages: List[Dict[str, str]] = []
     if sys:
         messages.append({"role": "system", "content": sys})
-
-    # history (ожидаем уже в формате role/content)
-    for m in history or []:
-        role = (m.get("role") or "").strip()
-        content = (m.get("content") or "").strip()
-        if role in {"user", "assistant"} and content:
-            messages.append({"role": role, "content": content})
-
+    messages.extend(picked)
     messages.append({"role": "user", "content": user_text})
 
     meta = {
         "thread_id": thread_id,
-        "history_count": len(history or []),
+        "history_count": len(picked),
+        "memory_count": len(earlier),
+        "has_summary": bool(summary),
+        "tokens": {
+            "budget": budget,
+            "used": sys_tokens + history_tokens + user_tokens
+            + MESSAGE_OVERHEAD_TOKENS * (len(picked) + 1),
+            "system": sys_tokens,
+            "history": history_tokens,
+            "memory": memory_tokens,
+            "user": user_tokens,
+            "truncated": truncated,
+            "dropped": dropped,
+        },
         "turn": int((state or {}).get("turn", 0)) + 1,
     }
     return AIRequest(messages=messages, meta=meta)
@@ -3,13 +3,22 @@ src/app/core/dialog_lock.py
 ─────────────────────────────────────────────────────────────────────────────
 Гарантия строгой последовательности: 1 диалог = 1 обработчик одновременно.
 
-Реализация: PostgreSQL advisory lock по dialog_id.
-Лок держится на уровне соединения, поэтому DB-сессия должна жить весь runtime.
+Реализация:
+- acquire/release/dialog_lock — PostgreSQL advisory lock по dialog_id на уровне
+  соединения (DB-сессия должна жить весь runtime);
+- DialogLockManager (dialog_locks) — локальные asyncio-локи для диалогов своих
+  ресурсов, advisory только когда ресурсом может владеть другой процесс.
 """
 
 from __future__ import annotations
 
-from contextlib import contextmanager
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterable, Optional
 from uuid import UUID
 
 from sqlalchemy import text
@@ -55,3 +64,237 @@ def dialog_lock(db: Session, dialog_id: UUID):
         except Exception:
             # если соединение уже умерло — ок, лок и так будет сброшен
             pass
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Гибридный менеджер: локальные asyncio-локи + advisory только при необходимости
+# ─────────────────────────────────────────────────────────────────────────────
+#
+# Диалоги ресурса, которым владеет этот процесс (воркер ресурса запущен здесь,
+# при шардировании — есть подтверждённая аренда), сериализуются таблицей
+# asyncio.Lock в памяти: без round trip в Postgres и без занятого соединения
+# из пула на время ожидания. Для чужих ресурсов (или пока владение не
+# подтверждено) grant.advisory=True — вызывающий берёт pg_advisory_xact_lock
+# в своих транзакциях, как раньше.
+#
+# Владение сообщает worker_entry (set_owned) на каждом проходе цикла; при
+# шардировании оно действительно ~0.8 LEASE_TTL — раньше, чем аренду сможет
+# забрать другой шард.
+
+# auto — локально для своих ресурсов; local — всегда локально (один процесс);
+# advisory — всегда через Postgres
+DIALOG_LOCK_MODE = os.getenv("DIALOG_LOCK_MODE", "auto").strip().lower()
+DIALOG_LOCK_SHARDS = 64
+# Ожидание дольше — в лог уходит, кто держит лок и сколько
+DIALOG_LOCK_WARN_SEC = float(os.getenv("DIALOG_LOCK_WARN_SEC", "30"))
+
+
+class DialogLockDeadlock(RuntimeError):
+    """Ожидание лока замкнуло бы цикл (или повторный вход той же задачи)."""
+
+
+@dataclass(frozen=True)
+class LockGrant:
+    key: str
+    advisory: bool            # True — нужен pg_advisory_xact_lock в транзакциях
+    wait_ms: float
+
+
+class _Entry:
+    __slots__ = ("lock", "refs", "holder", "held_since")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.refs = 0
+        self.holder: Optional[asyncio.Task] = None
+        self.held_since = 0.0
+
+
+def _task_name(task: Optional[asyncio.Task]) -> str:
+    return task.get_name() if task is not None else "-"
+
+
+class DialogLockManager:
+    def __init__(
+        self,
+        *,
+        mode: str = DIALOG_LOCK_MODE,
+        shards: int = DIALOG_LOCK_SHARDS,
+        warn_sec: float = DIALOG_LOCK_WARN_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.mode = mode if mode in ("auto", "local", "advisory") else "auto"
+        self._shards: list[dict[str, _Entry]] = [{} for _ in range(max(1, int(shards)))]
+        self.warn_sec = float(warn_sec)
+        self._clock = clock
+        self._owned: frozenset[str] = frozenset()
+        self._owned_until: Optional[float] = None   # None — без срока
+        # граф ожиданий для диагностики дедлоков: задача -> ключ, которого ждёт
+        self._waiting: dict[asyncio.Task, str] = {}
+        self.acquired = 0
+        self.contended = 0
+        self.advisory = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.deadlocks = 0
+
+    def _log(self, msg: str) -> None:
+        print(f"[DIALOG_LOCK] {msg}", flush=True)
+
+    # ── владение ─────────────────────────────────────────────────────────────
+
+    def set_owned(self, resource_ids: Iterable[str], *, valid_sec: Optional[float] = None) -> None:
+        self._owned = frozenset(str(r) for r in resource_ids)
+        self._owned_until = None if valid_sec is None else self._clock() + float(valid_sec)
+
+    def is_local(self, resource_id: object) -> bool:
+        if self.mode == "local":
+            return True
+        if self.mode == "advisory":
+            return False
+        if self._owned_until is not None and self._clock() >= self._owned_until:
+            return False
+        return str(resource_id) in self._owned
+
+    # ── таблица локов ───────────────────────────────────────────────────────
+
+    def _shard(self, key: str) -> dict[str, _Entry]:
+        h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=4).digest(), "big")
+        return self._shards[h % len(self._shards)]
+
+    def _entry(self, key: str) -> Optional[_Entry]:
+        return self._shard(key).get(key)
+
+    def _check_deadlock(self, me: Optional[asyncio.Task], key: str) -> None:
+        """Идём по цепочке «держатель ключа ждёт другой ключ»; вернулись к себе — цикл."""
+        if me is None:
+            return
+        chain = [key]
+        entry = self._entry(key)
+        holder = entry.holder if entry else None
+        seen: set[asyncio.Task] = set()
+        while holder is not None and holder not in seen:
+            if holder is me:
+                self.deadlocks += 1
+                path = " -> ".join(chain)
+                self._log(f"deadlock task={_task_name(me)} chain={path}")
+                raise DialogLockDeadlock(f"DIALOG_LOCK_DEADLOCK: {path}")
+            seen.add(holder)
+            next_key = self._waiting.get(holder)
+            if next_key is None:
+                return
+            chain.append(next_key)
+            nxt = self._entry(next_key)
+            holder = nxt.holder if nxt else None
+
+    async def _acquire_local(self, key: str) -> float:
+        me = asyncio.current_task()
+        shard = self._shard(key)
+        entry = shard.get(key)
+        if entry is None:
+            entry = shard[key] = _Entry()
+        entry.refs += 1
+        t0 = self._clock()
+        try:
+            if entry.lock.locked():
+                self._check_deadlock(me, key)
+                self.contended += 1
+                if me is not None:
+                    self._waiting[me] = key
+                try:
+                    await self._wait_logged(entry, key, t0)
+                finally:
+                    if me is not None:
+                        self._waiting.pop(me, None)
+            else:
+                await entry.lock.acquire()
+        except BaseException:
+            self._release_ref(key, entry)
+            raise
+        entry.holder = me
+        entry.held_since = self._clock()
+        return (entry.held_since - t0) * 1000
+
+    async def _wait_logged(self, entry: _Entry, key: str, t0: float) -> None:
+        """acquire с периодическим логом долгого ожидания (одна заявка в очереди лока)."""
+        acq = asyncio.ensure_future(entry.lock.acquire())
+        try:
+            while True:
+                done, _ = await asyncio.wait({acq}, timeout=self.warn_sec)
+                if done:
+                    acq.result()
+                    return
+                self._log(
+                    f"slow wait key={key} waited={self._clock() - t0:.1f}s "
+                    f"holder={_task_name(entry.holder)} "
+                    f"held={self._clock() - entry.held_since:.1f}s waiters={entry.refs - 1}"
+                )
+        except BaseException:
+            if acq.done() and not acq.cancelled() and acq.exception() is None:
+                entry.lock.release()
+            else:
+                acq.cancel()
+            raise
+
+    def _release_ref(self, key: str, entry: _Entry) -> None:
+        entry.refs -= 1
+        if entry.refs <= 0:
+            self._shard(key).pop(key, None)
+
+    def _release_local(self, key: str) -> None:
+        entry = self._entry(key)
+        if entry is None:
+            return
+        entry.holder = None
+        entry.lock.release()
+        self._release_ref(key, entry)
+
+    @asynccontextmanager
+    async def hold(self, key: str, *, resource_id: object) -> AsyncIterator[LockGrant]:
+        """
+        Сериализует обработку ключа (диалога) внутри процесса на время блока.
+        grant.advisory — нужно ли дополнительно брать advisory-лок в Postgres.
+        """
+        wait_ms = await self._acquire_local(key)
+        advisory = not self.is_local(resource_id)
+        self.acquired += 1
+        self.advisory += int(advisory)
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        try:
+            yield LockGrant(key=key, advisory=advisory, wait_ms=wait_ms)
+        finally:
+            self._release_local(key)
+
+    def diagnostics(self, *, older_than_sec: float = 0.0) -> list[dict[str, object]]:
+        """Удерживаемые локи (старше older_than_sec): кто держит, сколько ждут."""
+        now = self._clock()
+        out: list[dict[str, object]] = []
+        for shard in self._shards:
+            for key, e in shard.items():
+                if not e.lock.locked() or now - e.held_since < older_than_sec:
+                    continue
+                out.append({
+                    "key": key,
+                    "holder": _task_name(e.holder),
+                    "held_sec": round(now - e.held_since, 3),
+                    "waiters": max(0, e.refs - 1),
+                })
+        out.sort(key=lambda d: -float(d["held_sec"]))
+        return out
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "mode": self.mode,
+            "owned": len(self._owned),
+            "held": sum(1 for s in self._shards for e in s.values() if e.lock.locked()),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "advisory": self.advisory,
+            "wait_ms_avg": round(self.wait_ms_total / self.acquired, 2) if self.acquired else None,
+            "wait_ms_max": round(self.wait_ms_max, 2),
+            "deadlocks": self.deadlocks,
+        }
+
+
+dialog_locks = DialogLockManager()
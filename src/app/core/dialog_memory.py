@@ -0,0 +1,160 @@
+"""
+src/app/core/dialog_memory.py
+────────────────────────────────────────────────────────────
+Долгая память диалога: короткое окно последних сообщений + top-k
+семантически близких старых сообщений того же диалога (messages.embedding).
+
+- Окно recency (PROMPT.history_pairs) идёт в history как раньше.
+- Retrieval: ближайшие по косинусу к входящему тексту сообщения диалога,
+  не попавшие в окно; слишком далёкие (> MEMORY_MAX_DISTANCE) отбрасываются.
+- Бюджет токенов применяет dialog_graph.build_request: сначала окно (от новых
+  к старым), остаток — найденным (rank = близость); найденные идут в system
+  как EARLIER IN THIS DIALOG в хронологическом порядке.
+- Число токенов сообщения кэшируется в messages.meta_json["tok"] при вставке
+  (dialog_store), здесь читается вместе с текстом.
+
+Поиск идёт только по сообщениям одного диалога: их немного, поэтому точный
+KNN по кандидатам (индекс ix_messages_dialog_embedded) быстрее и точнее,
+чем общий HNSW-индекс с фильтром по dialog_id (он теряет recall).
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.app.core.embedding_cache import vector_literal
+from src.app.core.pricing import cached_tokens
+
+MEMORY_MAX_DISTANCE = float(os.getenv("MEMORY_MAX_DISTANCE", "0.6"))
+DEFAULT_RETRIEVAL_K = 6
+
+
+@dataclass(frozen=True)
+class MemoryItem:
+    id: UUID
+    direction: str            # in | out
+    text: str
+    created_at: Optional[datetime] = None
+    distance: Optional[float] = None
+    tokens: Optional[int] = None          # кэш из meta_json["tok"]
+
+    @property
+    def role(self) -> str:
+        return "user" if self.direction == "in" else "assistant"
+
+
+_SQL_RECENT = text("""
+SELECT id, direction, text, created_at, meta_json->'tok' AS tok
+FROM messages
+WHERE dialog_id = :dialog_id
+  AND is_internal = false
+  AND text IS NOT NULL
+  AND length(text) > 0
+  AND NOT (id = ANY(CAST(:exclude AS uuid[])))
+  AND (
+    CAST(:after_at AS timestamptz) IS NULL
+    OR (created_at, id) > (CAST(:after_at AS timestamptz), CAST(:after_id AS uuid))
+  )
+ORDER BY created_at DESC
+LIMIT :limit;
+""")
+
+_SQL_RETRIEVE = text("""
+WITH cand AS MATERIALIZED (
+    SELECT id, direction, text, created_at, meta_json->'tok' AS tok, embedding
+    FROM messages
+    WHERE dialog_id = :dialog_id
+      AND is_internal = false
+      AND embedding IS NOT NULL
+      AND text IS NOT NULL
+      AND length(text) > 0
+      AND NOT (id = ANY(CAST(:exclude AS uuid[])))
+)
+SELECT id, direction, text, created_at, tok, embedding <=> CAST(:query AS vector) AS distance
+FROM cand
+ORDER BY distance
+LIMIT :k;
+""")
+
+
+async def load_recent(
+    db: AsyncSession,
+    dialog_id: UUID,
+    *,
+    limit: int,
+    exclude: Iterable[UUID] = (),
+    after: Optional[tuple[str, str]] = None,
+) -> List[MemoryItem]:
+    """
+    Последние limit сообщений диалога, от новых к старым.
+    after — (created_at, id) high-water mark резюме: старше него не берём.
+    """
+    if limit <= 0:
+        return []
+    rows = (await db.execute(_SQL_RECENT, {
+        "dialog_id": str(dialog_id),
+        "limit": int(limit),
+        "exclude": [str(x) for x in exclude],
+        "after_at": after[0] if after else None,
+        "after_id": after[1] if after else None,
+    })).all()
+    return [
+        MemoryItem(id=r[0], direction=r[1], text=r[2], created_at=r[3], tokens=cached_tokens(r[4]))
+        for r in rows
+    ]
+
+
+async def retrieve_relevant(
+    db: AsyncSession,
+    dialog_id: UUID,
+    query_vec: Sequence[float],
+    *,
+    k: int,
+    exclude: Iterable[UUID] = (),
+    max_distance: float = MEMORY_MAX_DISTANCE,
+) -> List[MemoryItem]:
+    """top-k ближайших сообщений диалога (по возрастанию расстояния)."""
+    if k <= 0:
+        return []
+    rows = (await db.execute(_SQL_RETRIEVE, {
+        "dialog_id": str(dialog_id),
+        "query": vector_literal(query_vec),
+        "k": int(k),
+        "exclude": [str(x) for x in exclude],
+    })).all()
+    return [
+        MemoryItem(
+            id=r[0], direction=r[1], text=r[2], created_at=r[3],
+            tokens=cached_tokens(r[4]), distance=float(r[5]),
+        )
+        for r in rows
+        if r[5] is not None and float(r[5]) <= max_distance
+    ]
+
+
+def as_history(recent: Sequence[MemoryItem]) -> List[Dict[str, object]]:
+    """recent (от новых к старым) → history для build_request, в хронологии."""
+    history: List[Dict[str, object]] = []
+    for m in reversed(recent):
+        content = m.text.strip()
+        if history and history[-1]["content"] == content:
+            continue
+        history.append({"role": m.role, "content": content, "tokens": m.tokens})
+    return history
+
+
+def as_memory(retrieved: Sequence[MemoryItem], *, skip: Iterable[UUID] = ()) -> List[Dict[str, object]]:
+    """retrieved (от ближних к дальним) → memory: хронология, rank = близость."""
+    skip_ids = set(skip)
+    ranked = [(rank, m) for rank, m in enumerate(retrieved) if m.id not in skip_ids]
+    ranked.sort(key=lambda x: (x[1].created_at is None, x[1].created_at))
+    return [
+        {"role": m.role, "content": m.text.strip(), "tokens": m.tokens, "rank": rank}
+        for rank, m in ranked
+    ]
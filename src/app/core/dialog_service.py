@@ -5,33 +5,66 @@ src/app/core/dialog_service.py
 
 Задача:
 - get_or_create dialogs
-- запрет параллельной обработки в одном dialog (pg_advisory_xact_lock)
+- запрет параллельной обработки в одном dialog (dialog_locks; pg_advisory_xact_lock —
+  только если ресурсом может владеть другой процесс)
 - дедуп входящих (уникальность messages)
 - load prompt + load api_keys + выбрать провайдера/ключ/модель
-- history -> dialog_graph.build_request -> ai_transport.chat -> dialog_graph.apply_response
-- записать messages(out) + обновить dialogs.graph_state/version/last_message_at + usage_today
+  (resource_resolver: кэш на процесс, сброс по NOTIFY resources_changed)
+- history -> dialog_graph.build_request -> ai_resilience.resilient_chat -> dialog_graph.apply_response
+  (дедлайн, повторы, circuit breaker, ai.fallbacks и ai.hedge_after_ms ресурса)
+- с reply (stream_reply.ProgressiveReply): resilient_chat_stream, ответ
+  появляется в Telegram по мере генерации; в БД пишется один раз, целиком
+  (spawn_reply — вызов из TelegramBotWorker/TelegramWorker, если у ресурса есть prompt_id)
+- ошибка AI: пользователю — AI_ERROR_TEXT, подробности — в лог и meta исходящего
+- записать messages(out) + обновить dialogs.graph_state/version/last_message_at
+- расход токенов/стоимости — usage_ledger (батчами в usage_daily, не в resources)
+- в фоне: эмбеддинги (embedding_service; только OpenAI-ключом — ResolvedResource.embedding_key)
+  и резюме старых реплик (dialog_summary)
+
+БД — AsyncSession (async_engine, psycopg async) прямо в event loop, без
+asyncio.to_thread; на сообщение: 2 короткие транзакции (настройки ресурса — из кэша).
+Диалог обрабатывается целиком под dialog_locks (core/dialog_lock.py).
 """
 
 from __future__ import annotations
 
 import asyncio
 import json
+import os
 import time
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
 
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 
-from src.app.core.db import SessionLocal
+from src.app.core.db import AsyncSessionLocal
 from src.models.resource import Resource
 
 from src.app.core.dialog_graph import AIResponse, apply_response, build_request
-from src.app.core.ai_transport import AIChatConfig, chat, provider_from_key_field
-from src.app.core.embedding_service import get_embedding
-from src.app.core.dialog_store import insert_message, DuplicateExternalMessage
+from src.app.core.ai_resilience import ChatPolicy, resilient_chat, resilient_chat_stream
+from src.app.core.ai_transport import AIChatConfig, AIChatResult, AIProvider, provider_from_key_field
+from src.app.core.pricing import context_token_budget, model_context_tokens
+from src.app.core.embedding_service import embedding_batcher, get_embedding
+from src.app.core.dialog_summary import dialog_summarizer, summary_hwm, summary_text, window_limit
+from src.app.core.dialog_memory import (
+    DEFAULT_RETRIEVAL_K,
+    MemoryItem,
+    as_history,
+    as_memory,
+    load_recent,
+    retrieve_relevant,
+)
+from src.app.core.dialog_store import insert_message_async, external_thread_key, DuplicateExternalMessage
+from src.app.core.dialog_lock import dialog_locks
+from src.app.core.message_bus import MessageEvent
+from src.app.core.stream_reply import ProgressiveReply
+from src.app.core.usage_ledger import usage_ledger
+
+
+# Текст пользователю при ошибке AI: сырые ошибки провайдера (ключи, квоты) — только в лог
+AI_ERROR_TEXT = "⚠️ Не удалось получить ответ. Попробуйте ещё раз чуть позже."
 
 
 # ────────────────────────────────────────────────────────────────
@@ -66,6 +99,35 @@ def _uuid(v: Any) -> Optional[uuid.UUID]:
         return None
 
 
+def _ms(since: float, at: Optional[float] = None) -> int:
+    """Миллисекунды от since (time.monotonic) до at (по умолчанию — сейчас)."""
+    return int(((time.monotonic() if at is None else at) - since) * 1000)
+
+
+async def _stream_chat(
+    cfg: AIChatConfig,
+    messages: List[Dict[str, str]],
+    reply: ProgressiveReply,
+    *,
+    fallbacks: Sequence[AIChatConfig] = (),
+    policy: ChatPolicy = ChatPolicy(),
+) -> AIChatResult:
+    """resilient_chat_stream → правки плейсхолдера; возвращает итоговый результат."""
+    await reply.start()
+    result: Optional[AIChatResult] = None
+    async for delta in resilient_chat_stream(cfg=cfg, messages=messages, fallbacks=fallbacks, policy=policy):
+        if delta.result is not None:
+            result = delta.result
+        elif delta.text:
+            await reply.push(delta.text)
+    return result or AIChatResult(ok=False, text="", usage={}, error="EMPTY_STREAM")
+
+
+def thread_key_lock(rid: uuid.UUID, thread_key: str) -> str:
+    """Ключ локального лока: диалог ещё может не существовать, thread_key — уже есть."""
+    return f"{rid}:{thread_key}"
+
+
 def _uuid_to_pg_lock_key(u: uuid.UUID) -> int:
     # 64-bit signed
     key = (u.int >> 64) & ((1 << 64) - 1)
@@ -74,66 +136,38 @@ def _uuid_to_pg_lock_key(u: uuid.UUID) -> int:
     return int(key)
 
 
-def _rows_to_history(rows: List[Tuple[str, str]]) -> List[Dict[str, str]]:
-    hist: List[Dict[str, str]] = []
-    for direction, txt in rows:
-        t = (txt or "").strip()
-        if not t:
-            continue
-        role = "user" if direction == "in" else "assistant"
-        if hist and hist[-1]["content"] == t:
-            continue
-        hist.append({"role": role, "content": t})
-    return hist
-
-
 # ────────────────────────────────────────────────────────────────
 # SQL
 # ────────────────────────────────────────────────────────────────
 
+# upsert диалога + advisory-lock на всю транзакцию за один round trip;
+# ключ лока = старшие 64 бита UUID (как _uuid_to_pg_lock_key)
+_SQL_GET_OR_CREATE_DIALOG_LOCKED = text("""
+WITH d AS (
+  INSERT INTO dialogs (resource_id, thread_key, peer_type, peer_id, chat_id)
+  VALUES (:resource_id, :thread_key, :peer_type, :peer_id, :chat_id)
+  ON CONFLICT (resource_id, thread_key)
+  DO UPDATE SET updated_at = now()
+  RETURNING id, graph_state, version, summary
+)
+SELECT d.id, d.graph_state, d.version, d.summary,
+       pg_advisory_xact_lock(
+         CAST(CAST('x' || left(replace(CAST(d.id AS text), '-', ''), 16) AS bit(64)) AS bigint)
+       )
+FROM d;
+""")
+
+# то же без лока — диалог уже сериализован локальным локом (dialog_locks)
 _SQL_GET_OR_CREATE_DIALOG = text("""
 INSERT INTO dialogs (resource_id, thread_key, peer_type, peer_id, chat_id)
 VALUES (:resource_id, :thread_key, :peer_type, :peer_id, :chat_id)
 ON CONFLICT (resource_id, thread_key)
 DO UPDATE SET updated_at = now()
-RETURNING id, graph_state, version;
+RETURNING id, graph_state, version, summary;
 """)
 
 _SQL_LOCK_DIALOG = text("SELECT pg_advisory_xact_lock(:key);")
 
-_SQL_INSERT_MESSAGE = text("""
-INSERT INTO messages (
-  id, resource_id, dialog_id,
-  peer_id, peer_type, chat_id, msg_id,
-  direction, msg_type, text,
-  tokens_in, tokens_out, latency_ms,
-  provider, external_chat_id, external_msg_id,
-  is_internal, meta_json, created_at
-)
-VALUES (
-  :id, :resource_id, :dialog_id,
-  :peer_id, :peer_type, :chat_id, :msg_id,
-  :direction, :msg_type, :text,
-  :tokens_in, :tokens_out, :latency_ms,
-  :provider, :external_chat_id, :external_msg_id,
-  :is_internal, CAST(:meta_json AS jsonb), now()
-)
-ON CONFLICT ON CONSTRAINT uq_messages_provider_resource_chat_msg
-DO NOTHING
-RETURNING id;
-""")
-
-_SQL_LOAD_HISTORY = text("""
-SELECT direction, text
-FROM messages
-WHERE dialog_id = :dialog_id
-  AND is_internal = false
-  AND text IS NOT NULL
-  AND length(text) > 0
-ORDER BY created_at DESC
-LIMIT :limit;
-""")
-
 _SQL_UPDATE_DIALOG = text("""
 UPDATE dialogs
 SET graph_state = CAST(:graph_state AS jsonb),
@@ -143,14 +177,6 @@ SET graph_state = CAST(:graph_state AS jsonb),
 WHERE id = :dialog_id;
 """)
 
-_SQL_UPDATE_RESOURCE_USAGE = text("""
-UPDATE resources
-SET usage_today = usage_today + :tokens,
-    last_activity = :ts,
-    updated_at = now()
-WHERE id = :resource_id;
-""")
-
 _SQL_ATTACH_OUT_IDS = text("""
 UPDATE messages
 SET msg_id = COALESCE(:msg_id, msg_id),
@@ -169,6 +195,8 @@ class PromptRuntime:
     system_prompt: str
     history_pairs: int
     google_source: str
+    retrieval_k: int = DEFAULT_RETRIEVAL_K
+    token_budget: int = 0                 # 0 — по модели (pricing.context_token_budget)
 
 
 def _parse_prompt_resource(prompt_res: Resource) -> PromptRuntime:
@@ -178,14 +206,265 @@ def _parse_prompt_resource(prompt_res: Resource) -> PromptRuntime:
     system_prompt = (p.get("system_prompt") or "").strip()
     google_source = (p.get("google_source") or "").strip()
 
-    # важно: history_pairs живёт в PROMPT
-    hp = p.get("history_pairs")
-    try:
-        history_pairs = max(0, int(hp if hp is not None else 20))
-    except Exception:
-        history_pairs = 20
+    def _int(key: str, default: int) -> int:
+        raw = p.get(key)
+        try:
+            return max(0, int(raw if raw is not None else default))
+        except Exception:
+            return default
+
+    # долгая память (dialog_memory); 0 — выключена
+    retrieval_k = _int("retrieval_k", DEFAULT_RETRIEVAL_K)
+    token_budget = _int("token_budget", 0)
+
+    # важно: history_pairs живёт в PROMPT; с retrieval короткого окна достаточно
+    history_pairs = _int("history_pairs", 5 if retrieval_k else 20)
 
-    return PromptRuntime(system_prompt=system_prompt, history_pairs=history_pairs, google_source=google_source)
+    return PromptRuntime(
+        system_prompt=system_prompt,
+        history_pairs=history_pairs,
+        google_source=google_source,
+        retrieval_k=retrieval_k,
+        token_budget=token_budget,
+    )
+
+
+# ────────────────────────────────────────────────────────────────
+# Resolver: ресурс → (PROMPT, ключ, модель, температура), кэш на процесс
+# ────────────────────────────────────────────────────────────────
+
+# Страховка на случай пропущенного NOTIFY (LISTEN-соединение упало)
+RESOLVER_TTL_SEC = float(os.getenv("RESOLVER_TTL_SEC", "300"))
+RESOURCES_CHANGED_CHANNEL = "resources_changed"  # триггер на resources (d4f6a8c0e2b3)
+# эмбеддинги — только OpenAI: ключ модели, если он OpenAI, иначе этот из того же api_keys
+EMBEDDING_KEY_FIELD = "creds.openai_api_key"
+
+
+@dataclass(frozen=True)
+class ResolvedResource:
+    resource_id: uuid.UUID
+    keys_id: uuid.UUID
+    prompt_id: uuid.UUID
+    key_field: str
+    api_key: str
+    model: str                        # "" — модель должен передать транспорт (model_text)
+    temperature: float
+    prompt: Optional[PromptRuntime]   # None — PROMPT-ресурс не найден
+    # ai.fallbacks: [(key_field, api_key, model)] по порядку — из того же api_keys
+    fallbacks: tuple[tuple[str, str, str], ...] = ()
+    hedge_after_sec: Optional[float] = None   # ai.hedge_after_ms
+    embedding_key: str = ""                   # OpenAI-ключ для эмбеддингов; "" — без retrieval/эмбеддингов
+
+    def fallback_configs(self, temperature: float) -> List[AIChatConfig]:
+        return [
+            AIChatConfig(provider=provider_from_key_field(key_field), api_key=key, model=model, temperature=temperature)
+            for key_field, key, model in self.fallbacks
+        ]
+
+    @property
+    def depends_on(self) -> frozenset[uuid.UUID]:
+        return frozenset({self.resource_id, self.keys_id, self.prompt_id})
+
+
+def _parse_fallbacks(items: Any, keys_meta: Dict[str, Any]) -> tuple[tuple[str, str, str], ...]:
+    """
+    ai.fallbacks: [{"api_key_field": "creds.openai_api_key", "model": "gpt-4o-mini"}, ...].
+    Ключ — из того же api_keys-ресурса; пункт без ключа/модели пропускается.
+    """
+    out: List[tuple[str, str, str]] = []
+    for item in items if isinstance(items, list) else ():
+        if not isinstance(item, dict):
+            continue
+        key_field = str(item.get("api_key_field") or "").strip()
+        model = str(item.get("model") or "").strip()
+        key = str(_dot_get(keys_meta, key_field) or "").strip() if key_field else ""
+        if key and model:
+            out.append((key_field, key, model))
+        else:
+            print(f"[DIALOG] fallback skipped: field={key_field!r} model={model!r}", flush=True)
+    return tuple(out)
+
+
+async def _load_resolved(rid: uuid.UUID) -> ResolvedResource:
+    """Три ORM-загрузки в одной сессии; ошибки конфигурации — RuntimeError(код)."""
+    async with AsyncSessionLocal() as db:
+        resource = await db.get(Resource, rid)
+        if not resource:
+            raise RuntimeError("RESOURCE_NOT_FOUND")
+        if (resource.status or "") != "active":
+            raise RuntimeError("RESOURCE_NOT_ACTIVE")
+
+        m = resource.meta_json or {}
+        prompt_id = _uuid(m.get("prompt_id") or _dot_get(m, "prompt_id"))
+        keys_id = _uuid(
+            _dot_get(m, "ai.api_keys_resource_id") or m.get("ai_keys_resource_id")
+        )
+        ai_key_field = (
+            _dot_get(m, "ai.api_key_field") or m.get("ai_key_field") or ""
+        ).strip()
+
+        if not prompt_id:
+            raise RuntimeError("PROMPT_NOT_SET_IN_RESOURCE")
+        if not keys_id or not ai_key_field:
+            raise RuntimeError("AI_KEYS_NOT_SET_IN_RESOURCE")
+
+        model = (
+            _dot_get(m, "ai.model_text")
+            or _dot_get(m, "ai.model")
+            or m.get("model")
+            or m.get("model_text")
+            or ""
+        ).strip()
+
+        raw_t = _dot_get(m, "ai.temperature") or m.get("temperature")
+        try:
+            temperature = float(raw_t if raw_t is not None else 0.7)
+        except Exception:
+            temperature = 0.7
+
+        keys_res = await db.get(Resource, keys_id)
+        if not keys_res or keys_res.provider != "api_keys":
+            raise RuntimeError("API_KEYS_RESOURCE_NOT_FOUND")
+        api_key_val = (_dot_get(keys_res.meta_json or {}, ai_key_field) or "").strip()
+        if not api_key_val:
+            raise RuntimeError("API_KEY_FIELD_EMPTY")
+
+        fallbacks = _parse_fallbacks(_dot_get(m, "ai.fallbacks"), keys_res.meta_json or {})
+        if provider_from_key_field(ai_key_field) is AIProvider.openai:
+            embedding_key = api_key_val
+        else:
+            # ключ Groq/Anthropic/Gemini… в api.openai.com не отправляем
+            embedding_key = (_dot_get(keys_res.meta_json or {}, EMBEDDING_KEY_FIELD) or "").strip()
+        raw_hedge = _dot_get(m, "ai.hedge_after_ms")
+        try:
+            hedge_after_sec = float(raw_hedge) / 1000 if raw_hedge not in (None, "") else None
+        except (TypeError, ValueError):
+            hedge_after_sec = None
+
+        prompt_res = await db.get(Resource, prompt_id)
+
+    return ResolvedResource(
+        resource_id=rid,
+        keys_id=keys_id,
+        prompt_id=prompt_id,
+        key_field=ai_key_field,
+        api_key=api_key_val,
+        model=model,
+        temperature=temperature,
+        prompt=(
+            _parse_prompt_resource(prompt_res)
+            if prompt_res is not None and prompt_res.provider == "prompt"
+            else None
+        ),
+        fallbacks=fallbacks,
+        hedge_after_sec=hedge_after_sec,
+        embedding_key=embedding_key,
+    )
+
+
+class ResourceResolver:
+    """
+    Кэш ResolvedResource по resource_id.
+
+    Инвалидация — NOTIFY resources_changed (триггер на resources): запись
+    сбрасывается, если изменился сам ресурс, его PROMPT или api_keys.
+    После переподключения LISTEN кэш очищается целиком (уведомления могли
+    потеряться), TTL — последняя страховка. Ошибки конфигурации не кэшируются.
+    """
+
+    def __init__(
+        self,
+        *,
+        load: Callable[[uuid.UUID], Awaitable[ResolvedResource]] = _load_resolved,
+        ttl_sec: float = RESOLVER_TTL_SEC,
+        listen: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._load = load
+        self.ttl_sec = float(ttl_sec)
+        self._listen_enabled = listen
+        self._clock = clock
+        self._items: dict[uuid.UUID, tuple[float, ResolvedResource]] = {}
+        # растёт на каждую инвалидацию: загрузка, начатая до неё, в кэш не попадает
+        self._generation = 0
+        self._listener: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _log(self, msg: str) -> None:
+        print(f"[RESOLVER] {msg}", flush=True)
+
+    async def get(self, rid: uuid.UUID) -> ResolvedResource:
+        self._ensure_listening()
+        entry = self._items.get(rid)
+        if entry is not None and self._clock() - entry[0] < self.ttl_sec:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        generation = self._generation
+        resolved = await self._load(rid)
+        if generation == self._generation:
+            self._items[rid] = (self._clock(), resolved)
+        return resolved
+
+    def invalidate(self, changed_id: uuid.UUID) -> int:
+        self._generation += 1
+        stale = [rid for rid, (_, r) in self._items.items() if changed_id in r.depends_on]
+        for rid in stale:
+            self._items.pop(rid, None)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._items.clear()
+
+    def _ensure_listening(self) -> None:
+        if self._listen_enabled and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        from src.app.core.db import DATABASE_URL
+
+        dsn = DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(dsn, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {RESOURCES_CHANGED_CHANNEL}")
+                    self.clear()
+                    async for n in conn.notifies():
+                        changed = _uuid(n.payload)
+                        if changed is not None:
+                            self.invalidate(changed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._log(f"listen error: {e!r}")
+                await asyncio.sleep(5)
+
+    async def close(self) -> None:
+        if self._listener and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._listener = None
+        self.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+resource_resolver = ResourceResolver()
 
 
 # ────────────────────────────────────────────────────────────────
@@ -206,12 +485,17 @@ async def process_incoming(
     drive_context: str = "",           # пока пусто, RAG добавим позже
     model_text: Optional[str] = None,  # модель выбирается в ресурсе-транспорте (Telegram), но ядро её применяет
     temperature: Optional[float] = None,
+    reply: Optional[ProgressiveReply] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     Возвращает:
-      {"text": "...", "dialog_id": "...", "out_message_id": "...", "meta": {...}}
+      {"text": "...", "dialog_id": "...", "out_message_id": "...", "meta": {...}, "delivered": bool}
     или None (если дубль/пусто).
+
+    reply — прогрессивный ответ в чат (TelegramBotWorker/TelegramWorker.progressive_reply):
+    ответ стримится в плейсхолдер, delivered=True и отправлять text повторно не нужно.
     """
+    t_start = time.monotonic()
     rid = _uuid(resource_id)
     if not rid:
         raise ValueError("BAD_RESOURCE_ID")
@@ -224,144 +508,129 @@ async def process_incoming(
         raise ValueError("MISSING_EXTERNAL_IDS")
 
     # thread_key: стабильно идентифицирует диалог внутри ресурса
-    thread_key = f"{provider}:{external_chat_id}"
+    thread_key = external_thread_key(provider=provider, external_chat_id=external_chat_id)
 
-    # 1) загрузим ресурс + api_key (вне транзакции)
-    def _load_resource_sync() -> tuple[Resource, str, str, str, str, float]:
-        """Возвращает (resource, prompt_id_str, api_key_val, ai_key_field, model, temperature)."""
-        db = SessionLocal()
-        try:
-            r = db.get(Resource, rid)
-            if not r:
-                raise RuntimeError("RESOURCE_NOT_FOUND")
-            if (r.status or "") != "active":
-                raise RuntimeError("RESOURCE_NOT_ACTIVE")
-
-            m = r.meta_json or {}
-            p_id = _uuid(m.get("prompt_id") or _dot_get(m, "prompt_id"))
-            keys_id = _uuid(
-                _dot_get(m, "ai.api_keys_resource_id") or m.get("ai_keys_resource_id")
-            )
-            key_field = (
-                _dot_get(m, "ai.api_key_field") or m.get("ai_key_field") or ""
-            ).strip()
-
-            if not p_id:
-                raise RuntimeError("PROMPT_NOT_SET_IN_RESOURCE")
-            if not keys_id or not key_field:
-                raise RuntimeError("AI_KEYS_NOT_SET_IN_RESOURCE")
-
-            mdl = (
-                model_text
-                or _dot_get(m, "ai.model_text")
-                or _dot_get(m, "ai.model")
-                or m.get("model")
-                or m.get("model_text")
-                or ""
-            ).strip()
-            if not mdl:
-                raise RuntimeError("MODEL_NOT_SET_IN_RESOURCE")
-
-            raw_t = _dot_get(m, "ai.temperature") or m.get("temperature")
-            try:
-                temp = float(raw_t if raw_t is not None else 0.7) if temperature is None else float(temperature)
-            except Exception:
-                temp = 0.7
-
-            keys_res = db.get(Resource, keys_id)
-            if not keys_res or keys_res.provider != "api_keys":
-                raise RuntimeError("API_KEYS_RESOURCE_NOT_FOUND")
-            keys_meta = keys_res.meta_json or {}
-            key_val = (_dot_get(keys_meta, key_field) or "").strip()
-            if not key_val:
-                raise RuntimeError("API_KEY_FIELD_EMPTY")
-
-            return r, str(p_id), key_val, key_field, mdl, temp
-        finally:
-            db.close()
-
-    resource, prompt_id_str, api_key_val, ai_key_field, model, temperature = \
-        await asyncio.to_thread(_load_resource_sync)
-    prompt_id = _uuid(prompt_id_str)
+    # 1) ресурс + api_keys + prompt — из resource_resolver (без запросов в БД на hit)
+    resolved = await resource_resolver.get(rid)
+    model = (model_text or resolved.model).strip()
+    if not model:
+        raise RuntimeError("MODEL_NOT_SET_IN_RESOURCE")
+    try:
+        temperature = resolved.temperature if temperature is None else float(temperature)
+    except Exception:
+        temperature = 0.7
+    api_key_val = resolved.api_key
+    ai_key_field = resolved.key_field
+    embedding_key = resolved.embedding_key
+    prompt_rt = resolved.prompt
 
     user_text = (text_value or "").strip()
 
-    # 3) генерируем эмбеддинг входящего сообщения (async, до транзакции)
-    in_embedding = await get_embedding(user_text, api_key_val) if user_text else None
-
-    # 4) транзакция: dialog + lock + дедуп + история + запись IN
-    def _tx_sync(emb_in: list | None) -> Optional[Dict[str, Any]]:
-        db: Session = SessionLocal()
-        try:
-            # 4.1 get_or_create dialog
-            row = db.execute(_SQL_GET_OR_CREATE_DIALOG, {
-                "resource_id": str(rid),
-                "thread_key": thread_key,
-                "peer_type": peer_type,
-                "peer_id": int(peer_id),
-                "chat_id": int(chat_id) if chat_id is not None else None,
-            }).first()
-            dialog_id = uuid.UUID(str(row[0]))
-            graph_state = row[1] or {}
-            lock_key = _uuid_to_pg_lock_key(dialog_id)
-
-            # 4.2 запрет параллели в одном диалоге (на всю транзакцию)
-            db.execute(_SQL_LOCK_DIALOG, {"key": lock_key})
-
-            # 4.3 дедуп/запись IN через единую точку dialog_store
-            try:
-                insert_message(
-                    db,
-                    resource_id=rid,
-                    dialog_id=dialog_id,
-                    peer_type=peer_type,
-                    peer_id=peer_id,
-                    chat_id=chat_id,
-                    direction="in",
-                    text_value=user_text or "",
-                    msg_type="text",
-                    msg_id=msg_id,
-                    provider=provider,
-                    external_chat_id=external_chat_id,
-                    external_msg_id=external_msg_id,
-                    is_internal=False,
-                    meta_json={"phase": "incoming"},
-                    embedding=emb_in,
-                )
-            except DuplicateExternalMessage:
-                db.rollback()
-                return None  # дубль
-
-            if not user_text:
-                db.commit()
-                return None
-
-            # 4.4 load prompt
-            prompt_res = db.get(Resource, prompt_id)
-            if not prompt_res or prompt_res.provider != "prompt":
-                raise RuntimeError("PROMPT_RESOURCE_NOT_FOUND")
-            prompt_rt = _parse_prompt_resource(prompt_res)
-
-            # 4.5 history (limit из PROMPT)
-            limit_msgs = int(prompt_rt.history_pairs) * 2
-            rows = db.execute(_SQL_LOAD_HISTORY, {"dialog_id": str(dialog_id), "limit": limit_msgs}).all()
-            history = _rows_to_history([(r[0], r[1]) for r in list(reversed(list(rows)))])
-
-            # 4.6 graph -> request
-            thread_id = f"{provider}:{rid}:{dialog_id}"
+    # 3) вектор входящего текста для retrieval — параллельно с транзакцией
+    #    (embedding_cache: повторяющиеся тексты не идут в API)
+    query_vec_task: Optional[asyncio.Task] = None
+    if user_text and embedding_key and prompt_rt is not None and prompt_rt.retrieval_k > 0:
+        query_vec_task = asyncio.create_task(get_embedding(user_text, embedding_key))
+
+    # 4..8) под локом диалога: локальный asyncio-лок, если ресурс наш;
+    #       иначе ещё и pg_advisory_xact_lock в обеих транзакциях (grant.advisory)
+    async with dialog_locks.hold(thread_key_lock(rid, thread_key), resource_id=rid) as grant:
+        # 4) транзакция: dialog + lock (один запрос) → запись IN → окно истории
+        async def _tx_in() -> Optional[Dict[str, Any]]:
+            async with AsyncSessionLocal() as db:
+                try:
+                    row = (await db.execute(
+                        _SQL_GET_OR_CREATE_DIALOG_LOCKED if grant.advisory else _SQL_GET_OR_CREATE_DIALOG,
+                        {
+                            "resource_id": str(rid),
+                            "thread_key": thread_key,
+                            "peer_type": peer_type,
+                            "peer_id": int(peer_id),
+                            "chat_id": int(chat_id) if chat_id is not None else None,
+                        },
+                    )).first()
+                    dialog_id = uuid.UUID(str(row[0]))
+                    graph_state = row[1] or {}
+                    dialog_summary = row[3] or {}
+
+                    try:
+                        in_id = await insert_message_async(
+                            db,
+                            resource_id=rid,
+                            dialog_id=dialog_id,
+                            peer_type=peer_type,
+                            peer_id=peer_id,
+                            chat_id=chat_id,
+                            direction="in",
+                            text_value=user_text or "",
+                            msg_type="text",
+                            msg_id=msg_id,
+                            provider=provider,
+                            external_chat_id=external_chat_id,
+                            external_msg_id=external_msg_id,
+                            is_internal=False,
+                            meta_json={"phase": "incoming"},
+                        )
+                    except DuplicateExternalMessage:
+                        await db.rollback()
+                        return None  # дубль
+
+                    if not user_text:
+                        await db.commit()
+                        return None
+
+                    if prompt_rt is None:
+                        raise RuntimeError("PROMPT_RESOURCE_NOT_FOUND")
+
+                    # окно истории (limit из PROMPT; с резюме — всё после его hwm),
+                    # само входящее не дублируем
+                    keep_recent = int(prompt_rt.history_pairs) * 2
+                    recent = await load_recent(
+                        db,
+                        dialog_id,
+                        limit=window_limit(keep_recent, dialog_summary),
+                        exclude=[in_id],
+                        after=summary_hwm(dialog_summary),
+                    )
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+
+            # эмбеддинг IN — в фоне, строка уже закоммичена с NULL
+            embedding_batcher.submit(in_id, user_text, embedding_key)
+
+            # долгая память: top-k близких старых сообщений вне окна
+            retrieved: List[MemoryItem] = []
+            query_vec = await query_vec_task if query_vec_task is not None else None
+            if query_vec:
+                async with AsyncSessionLocal() as db:
+                    retrieved = await retrieve_relevant(
+                        db,
+                        dialog_id,
+                        query_vec,
+                        k=prompt_rt.retrieval_k,
+                        exclude=[in_id, *(m.id for m in recent)],
+                    )
+            history = as_history(recent)
+            memory = as_memory(retrieved, skip=(m.id for m in recent))
+
+            # graph -> request (только CPU)
             req = build_request(
-                thread_id=thread_id,
+                thread_id=f"{provider}:{rid}:{dialog_id}",
                 user_text=user_text,
                 system_prompt=prompt_rt.system_prompt,
                 drive_context=drive_context,
                 history=history,
                 state=graph_state or {},
+                memory=memory,
+                summary=summary_text(dialog_summary),
+                token_budget=prompt_rt.token_budget or context_token_budget(model),
+                context_window=model_context_tokens(model),
             )
             if not req.messages:
-                db.commit()
                 return None
 
-            db.commit()
             return {
                 "dialog_id": dialog_id,
                 "graph_state": graph_state or {},
@@ -371,111 +640,188 @@ async def process_incoming(
                 "model": model,
                 "temperature": float(temperature or 0.7),
                 "prompt_google_source": prompt_rt.google_source,
+                "keep_recent": keep_recent,
             }
-        except Exception:
-            db.rollback()
-            raise
-        finally:
-            db.close()
 
-    prepared = await asyncio.to_thread(_tx_sync, in_embedding)
-    if prepared is None:
-        return None
+        try:
+            prepared = await _tx_in()
+        finally:
+            if query_vec_task is not None and not query_vec_task.done():
+                query_vec_task.cancel()
+        if prepared is None:
+            return None
 
-    # 5) async вызов AI (вне DB tx)
-    prov = provider_from_key_field(prepared["key_field"])
-    result = await chat(
-        cfg=AIChatConfig(
+        # 5) async вызов AI (вне DB tx)
+        prov = provider_from_key_field(prepared["key_field"])
+        ai_cfg = AIChatConfig(
             provider=prov,
             api_key=api_key_val,
             model=prepared["model"],
             temperature=prepared["temperature"],
-        ),
-        messages=prepared["req_messages"],
-    )
-
-    if not result.ok:
-        answer_text = f"⚠️ AI error: {result.error}"
-        usage = result.usage or {"provider": prov.value, "model": prepared["model"]}
-    else:
-        answer_text = (result.text or "").strip()
-        usage = result.usage or {}
-
-    # 6) apply graph (обновляем graph_state)
-    answer_text, new_state, graph_meta = apply_response(
-        state=prepared["graph_state"],
-        request_meta=prepared["req_meta"],
-        ai_response=AIResponse(text=answer_text, usage=usage, raw=result.raw),
-    )
-
-    # 7) генерируем эмбеддинг исходящего сообщения (async, до транзакции)
-    out_embedding = await get_embedding(answer_text, api_key_val) if answer_text else None
+        )
+        fallbacks = resolved.fallback_configs(prepared["temperature"])
+        policy = ChatPolicy(hedge_after_sec=resolved.hedge_after_sec)
+        t_ai = time.monotonic()
+        if reply is None:
+            result = await resilient_chat(
+                cfg=ai_cfg, messages=prepared["req_messages"], fallbacks=fallbacks, policy=policy,
+            )
+        else:
+            result = await _stream_chat(
+                ai_cfg, prepared["req_messages"], reply, fallbacks=fallbacks, policy=policy,
+            )
+        ai_ms = _ms(t_ai)
 
-    # 8) записываем OUT + update dialogs + usage
-    def _tx_save_out_sync(emb_out: list | None) -> Dict[str, Any]:
-        db: Session = SessionLocal()
-        t0 = time.perf_counter()
-        try:
-            dialog_id = prepared["dialog_id"]
-            lock_key = _uuid_to_pg_lock_key(dialog_id)
-            db.execute(_SQL_LOCK_DIALOG, {"key": lock_key})
-
-            latency_ms = int((time.perf_counter() - t0) * 1000)
-            out_meta = {
-                "phase": "outgoing",
-                "prompt_google_source": prepared["prompt_google_source"],
-                "provider": prov.value,
-                "model": prepared["model"],
-                "usage": usage,
-                "graph": graph_meta.get("graph") if isinstance(graph_meta, dict) else {},
-            }
+        if not result.ok:
+            print(
+                f"[DIALOG] AI error rid={rid} thread={thread_key} "
+                f"provider={(result.raw or {}).get('provider') or prov.value}: {result.error}",
+                flush=True,
+            )
+            answer_text = AI_ERROR_TEXT
+            usage = result.usage or {"provider": prov.value, "model": prepared["model"]}
+        else:
+            answer_text = (result.text or "").strip()
+            usage = result.usage or {}
+
+        # 6) apply graph (обновляем graph_state)
+        answer_text, new_state, graph_meta = apply_response(
+            state=prepared["graph_state"],
+            request_meta=prepared["req_meta"],
+            ai_response=AIResponse(text=answer_text, usage=usage, raw=result.raw),
+        )
+
+        # 7) финальный текст в чат — до записи в БД, пользователь не ждёт commit
+        reply_ids: List[Any] = []
+        if reply is not None:
+            reply_ids = await reply.finish(answer_text)
+
+        # латентность: ai — вызов модели, ttft — первый токен от модели,
+        # first_visible — от входящего до первого видимого текста в чате
+        latency = {
+            "ai_ms": ai_ms,
+            "ttft_ms": (result.raw or {}).get("ttft_ms"),
+            "first_visible_ms": (
+                _ms(t_start, reply.first_visible_at)
+                if reply is not None and reply.first_visible_at is not None
+                else None
+            ),
+            "total_ms": _ms(t_start),
+            "streamed": reply is not None,
+        }
+
+        # 8) записываем OUT + update dialogs/usage (lock, insert, один UPDATE-CTE)
+        async with AsyncSessionLocal() as db:
+            try:
+                dialog_id = prepared["dialog_id"]
+                if grant.advisory:
+                    await db.execute(_SQL_LOCK_DIALOG, {"key": _uuid_to_pg_lock_key(dialog_id)})
+
+                out_meta = {
+                    "phase": "outgoing",
+                    "prompt_google_source": prepared["prompt_google_source"],
+                    "provider": usage.get("provider") or prov.value,
+                    "model": usage.get("model") or prepared["model"],
+                    "usage": usage,
+                    "ai_attempts": (result.raw or {}).get("attempts"),
+                    "ai_error": result.error if not result.ok else None,
+                    "graph": graph_meta.get("graph") if isinstance(graph_meta, dict) else {},
+                    "latency": latency,
+                }
+                if len(reply_ids) > 1:
+                    out_meta["tg_message_ids"] = reply_ids
+                first_reply_id = reply_ids[0] if reply_ids else None
+
+                out_id = await insert_message_async(
+                    db,
+                    resource_id=rid,
+                    dialog_id=dialog_id,
+                    peer_type=peer_type,
+                    peer_id=peer_id,
+                    chat_id=chat_id,
+                    direction="out",
+                    text_value=answer_text,
+                    msg_type="text",
+                    msg_id=first_reply_id,
+                    provider=provider,
+                    external_chat_id=external_chat_id,
+                    external_msg_id=str(first_reply_id) if first_reply_id is not None else None,
+                    is_internal=False,
+                    meta_json=out_meta,
+                    tokens_out=int(usage.get("total_tokens") or 0),
+                    latency_ms=ai_ms,
+                )
 
-            out_id = insert_message(
-                db,
+                await db.execute(_SQL_UPDATE_DIALOG, {
+                    "dialog_id": str(dialog_id),
+                    "graph_state": _json(new_state),
+                    "ts": _now_utc(),
+                })
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+        embedding_batcher.submit(out_id, answer_text, embedding_key)
+        if result.ok:
+            # с фолбэком ответила другая модель — учёт по фактической
+            usage_ledger.record(rid, usage, model=usage.get("model") or prepared["model"])
+        # сворачивание старых реплик в dialogs.summary — в фоне, после ответа
+        if result.ok:
+            dialog_summarizer.schedule(
+                dialog_id,
+                AIChatConfig(provider=prov, api_key=api_key_val, model=prepared["model"], temperature=0.2),
+                keep_recent=prepared["keep_recent"],
                 resource_id=rid,
-                dialog_id=dialog_id,
-                peer_type=peer_type,
-                peer_id=peer_id,
-                chat_id=chat_id,
-                direction="out",
-                text_value=answer_text,
-                msg_type="text",
-                provider=provider,
-                external_chat_id=external_chat_id,
-                external_msg_id=None,
-                is_internal=False,
-                meta_json=out_meta,
-                tokens_out=int(usage.get("total_tokens") or 0),
-                latency_ms=latency_ms,
-                embedding=emb_out,
             )
 
-            ts = _now_utc()
-            db.execute(_SQL_UPDATE_DIALOG, {
-                "dialog_id": str(dialog_id),
-                "graph_state": _json(new_state),
-                "ts": ts,
-            })
-            db.execute(_SQL_UPDATE_RESOURCE_USAGE, {
-                "resource_id": str(rid),
-                "tokens": int(usage.get("total_tokens") or 0),
-                "ts": ts,
-            })
-
-            db.commit()
-            return {
-                "text": answer_text,
-                "dialog_id": str(dialog_id),
-                "out_message_id": str(out_id),
-                "meta": out_meta,
-            }
-        except Exception:
-            db.rollback()
-            raise
-        finally:
-            db.close()
+        return {
+            "text": answer_text,
+            "dialog_id": str(dialog_id),
+            "out_message_id": str(out_id),
+            "meta": out_meta,
+            "delivered": bool(reply_ids),
+        }
+
+
+def reply_enabled(meta: Optional[Dict[str, Any]]) -> bool:
+    """Ресурс-транспорт отвечает в диалоге сам: в meta задан PROMPT (prompt_id)."""
+    return bool((meta or {}).get("prompt_id"))
+
 
-    return await asyncio.to_thread(_tx_save_out_sync, out_embedding)
+_reply_tasks: set[asyncio.Task] = set()
+
+
+async def _answer_event(evt: MessageEvent, reply: ProgressiveReply) -> Optional[Dict[str, Any]]:
+    try:
+        return await process_incoming(
+            resource_id=evt.source_rid,
+            provider=evt.source_type,
+            peer_type=evt.peer_type,
+            peer_id=evt.peer_id,
+            chat_id=evt.chat_id,
+            external_chat_id=evt.external_chat_id,
+            external_msg_id=evt.external_msg_id,
+            msg_id=evt.msg_id,
+            text_value=evt.text,
+            reply=reply,
+        )
+    except Exception as e:
+        print(f"[DIALOG] reply error rid={evt.source_rid} chat={evt.external_chat_id}: {e!r}", flush=True)
+        if reply.message_id is not None and not reply.finished:
+            await reply.finish(AI_ERROR_TEXT)  # не оставляем висящий плейсхолдер
+        return None
+
+
+def spawn_reply(evt: MessageEvent, reply: ProgressiveReply) -> asyncio.Task:
+    """
+    process_incoming(reply=...) для входящего из транспорта — отдельной задачей:
+    обработчик апдейтов (webhook _drain, catch-up) не ждёт ответа модели.
+    """
+    task = asyncio.create_task(_answer_event(evt, reply))
+    _reply_tasks.add(task)
+    task.add_done_callback(_reply_tasks.discard)
+    return task
 
 
 async def attach_outgoing_ids(
@@ -488,19 +834,10 @@ async def attach_outgoing_ids(
     if not mid:
         raise ValueError("BAD_MESSAGE_ID")
 
-    def _sync():
-        db = SessionLocal()
-        try:
-            db.execute(_SQL_ATTACH_OUT_IDS, {
-                "message_id": str(mid),
-                "msg_id": int(msg_id) if msg_id is not None else None,
-                "external_msg_id": (external_msg_id or None),
-            })
-            db.commit()
-        except Exception:
-            db.rollback()
-            raise
-        finally:
-            db.close()
-
-    await asyncio.to_thread(_sync)
+    async with AsyncSessionLocal() as db:
+        await db.execute(_SQL_ATTACH_OUT_IDS, {
+            "message_id": str(mid),
+            "msg_id": int(msg_id) if msg_id is not None else None,
+            "external_msg_id": (external_msg_id or None),
+        })
+        await db.commit()
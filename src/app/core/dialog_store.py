@@ -7,21 +7,30 @@ DB-слой для dialogs/messages.
 Стратегия:
 - dialog резолвим по (resource_id, thread_key) -> dialogs.id (UUID).
 - историю грузим по messages.dialog_id (последние K*2 сообщений).
-- дубль inbound режем уникальностью messages (provider+resource_id+external_chat_id+external_msg_id).
+- дубль inbound режем уникальностью message_keys (provider+resource_id+external_chat_id+external_msg_id):
+  messages секционирована по created_at, глобальный UNIQUE на ней невозможен;
+  ключ вставляется тем же запросом, что и сообщение.
+- импорт/бэкфилл — bulk_ingest_messages: COPY в staging, диалоги и сообщения
+  одним проходом, дубли пропускаются без исключений.
 """
 
 from __future__ import annotations
 
 import json
+import time
+import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
 from uuid import UUID
 
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from src.app.core.pricing import count_tokens, token_cache_entry
+
 
 @dataclass(frozen=True)
 class DialogRow:
@@ -42,6 +51,11 @@ def make_thread_key(*, peer_type: str, peer_id: int, chat_id: Optional[int]) ->
     return f"{peer_type}:{int(peer_id)}:{int(chat_id or 0)}"
 
 
+def external_thread_key(*, provider: str, external_chat_id: str) -> str:
+    """thread_key живого пути (dialog_service.process_incoming) — им же пишет импорт."""
+    return f"{provider}:{external_chat_id}"
+
+
 def get_or_create_dialog(
     db: Session,
     *,
@@ -138,15 +152,21 @@ def load_history(
     return out
 
 
-def insert_message(
-    db: Session,
+_MESSAGE_COLUMNS = (
+    "id", "resource_id", "dialog_id", "peer_id", "peer_type", "chat_id", "msg_id",
+    "direction", "msg_type", "text", "tokens_in", "tokens_out", "latency_ms",
+    "is_internal", "meta_json", "provider", "external_chat_id", "external_msg_id",
+)
+
+
+def _build_insert_message(
     *,
     resource_id: UUID,
     dialog_id: UUID,
     peer_type: str,
     peer_id: int,
     chat_id: Optional[int],
-    direction: str,                 # "in" | "out"
+    direction: str,
     text_value: str,
     msg_type: str = "text",
     msg_id: Optional[int] = None,
@@ -159,68 +179,33 @@ def insert_message(
     tokens_out: Optional[int] = None,
     latency_ms: Optional[int] = None,
     embedding: Optional[List[float]] = None,
-) -> UUID:
-    """
-    Единая точка вставки сообщений в БД.
-    Возвращает message_id (UUID).
-
-    embedding — вектор из embedding_service.get_embedding(); None если не вычислен.
-    Если ловим unique-ошибку по external ключам — кидаем DuplicateExternalMessage.
-    """
-    import uuid
-
+) -> Tuple[Any, Dict[str, Any], UUID]:
+    """INSERT messages: (statement, params, message_id) — общий для sync и async."""
     mid = uuid.uuid4()
-    meta_json = meta_json or {}
-    meta_s = json.dumps(meta_json, ensure_ascii=False)
+    text_value = (text_value or "").strip()
+    # кэш числа токенов для сборки истории (dialog_graph.build_request)
+    meta_json = dict(meta_json or {})
+    meta_json.setdefault("tok", token_cache_entry(count_tokens(text_value)))
 
-    emb_col = ", embedding" if embedding is not None else ""
-    emb_val = ", :embedding" if embedding is not None else ""
+    columns = list(_MESSAGE_COLUMNS)
+    values = [
+        "CAST(:meta_json AS jsonb)" if c == "meta_json" else f":{c}"
+        for c in columns
+    ]
+    if embedding is not None:
+        columns.append("embedding")
+        values.append(":embedding")
 
-    q = text(
-        f"""
-        INSERT INTO messages (
-            id,
-            resource_id,
-            dialog_id,
-            peer_id,
-            peer_type,
-            chat_id,
-            msg_id,
-            direction,
-            msg_type,
-            text,
-            tokens_in,
-            tokens_out,
-            latency_ms,
-            is_internal,
-            meta_json,
-            provider,
-            external_chat_id,
-            external_msg_id
-            {emb_col}
-        ) VALUES (
-            :id,
-            :resource_id,
-            :dialog_id,
-            :peer_id,
-            :peer_type,
-            :chat_id,
-            :msg_id,
-            :direction,
-            :msg_type,
-            :text,
-            :tokens_in,
-            :tokens_out,
-            :latency_ms,
-            :is_internal,
-            :meta_json::jsonb,
-            :provider,
-            :external_chat_id,
-            :external_msg_id
-            {emb_val}
+    sql = f"INSERT INTO messages ({', '.join(columns)}) VALUES ({', '.join(values)})"
+    if provider and external_chat_id and external_msg_id:
+        # дубль → unique violation на pk_message_keys → DuplicateExternalMessage
+        sql = (
+            "WITH k AS (INSERT INTO message_keys "
+            "(provider, resource_id, external_chat_id, external_msg_id, message_id) "
+            "VALUES (:provider, :resource_id, :external_chat_id, :external_msg_id, :id)) "
+            + sql
         )
-        """
-    )
+    q = text(sql)
     params: Dict[str, Any] = {
         "id": str(mid),
         "resource_id": str(resource_id),
@@ -231,24 +216,46 @@ def insert_message(
         "msg_id": (int(msg_id) if msg_id is not None else None),
         "direction": direction,
         "msg_type": msg_type,
-        "text": (text_value or "").strip(),
+        "text": text_value,
         "tokens_in": (int(tokens_in) if tokens_in is not None else None),
         "tokens_out": (int(tokens_out) if tokens_out is not None else None),
         "latency_ms": (int(latency_ms) if latency_ms is not None else None),
         "is_internal": bool(is_internal),
-        "meta_json": meta_s,
+        "meta_json": json.dumps(meta_json, ensure_ascii=False),
         "provider": provider,
         "external_chat_id": external_chat_id,
         "external_msg_id": external_msg_id,
     }
     if embedding is not None:
         params["embedding"] = embedding
+    return q, params, mid
 
+
+def insert_message(db: Session, **fields: Any) -> UUID:
+    """
+    Единая точка вставки сообщений в БД.
+    Возвращает message_id (UUID).
+
+    Поля — см. _build_insert_message (direction: "in" | "out").
+    embedding — вектор из embedding_service.get_embedding(); None если не вычислен.
+    Если ловим unique-ошибку по external ключам — кидаем DuplicateExternalMessage.
+    """
+    q, params, mid = _build_insert_message(**fields)
     try:
         db.execute(q, params)
         return mid
     except IntegrityError as e:
-        # Дубль по uq_messages_provider_resource_chat_msg
+        # Дубль по pk_message_keys
+        raise DuplicateExternalMessage() from e
+
+
+async def insert_message_async(db: AsyncSession, **fields: Any) -> UUID:
+    """То же, что insert_message, на AsyncSession (без to_thread)."""
+    q, params, mid = _build_insert_message(**fields)
+    try:
+        await db.execute(q, params)
+        return mid
+    except IntegrityError as e:
         raise DuplicateExternalMessage() from e
 
 
@@ -270,7 +277,7 @@ def bump_graph_state(db: Session, *, dialog_id: UUID, graph_state: Dict[str, Any
         text(
             """
             UPDATE dialogs
-            SET graph_state = :gs::jsonb,
+            SET graph_state = CAST(:gs AS jsonb),
                 version = version + 1,
                 updated_at = now()
             WHERE id = :id
@@ -278,3 +285,199 @@ def bump_graph_state(db: Session, *, dialog_id: UUID, graph_state: Dict[str, Any
         ),
         {"id": str(dialog_id), "gs": state_s},
     )
+
+
+# ────────────────────────────────────────────────────────────────
+# Bulk ingest (импорт истории, реплей событий)
+# ────────────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class BulkIngestResult:
+    received: int
+    inserted: int
+    duplicates: int
+    dialogs_created: int
+    elapsed_sec: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.received / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+
+# порядок колонок COPY (= порядок значений _ingest_row)
+_INGEST_COLUMNS = (
+    "ord", "id", "resource_id", "thread_key", "peer_id", "peer_type", "chat_id", "msg_id",
+    "direction", "msg_type", "text", "tokens_in", "tokens_out", "latency_ms",
+    "is_internal", "meta_json", "created_at", "provider", "external_chat_id", "external_msg_id",
+)
+
+_SQL_INGEST_STAGE = text("""
+CREATE TEMP TABLE _ingest_messages (
+  ord bigint NOT NULL,
+  id uuid NOT NULL,
+  resource_id uuid NOT NULL,
+  thread_key text NOT NULL,
+  peer_id bigint NOT NULL,
+  peer_type text NOT NULL,
+  chat_id bigint,
+  msg_id bigint,
+  direction text NOT NULL,
+  msg_type text NOT NULL,
+  text text,
+  tokens_in int,
+  tokens_out int,
+  latency_ms int,
+  is_internal boolean NOT NULL,
+  meta_json jsonb NOT NULL,
+  created_at timestamptz,
+  provider text,
+  external_chat_id text,
+  external_msg_id text
+) ON COMMIT DROP
+""")
+
+# диалоги пачкой; peer_* — по последнему сообщению треда
+_SQL_INGEST_DIALOGS = text("""
+INSERT INTO dialogs (resource_id, thread_key, peer_type, peer_id, chat_id)
+SELECT resource_id, thread_key, peer_type, peer_id, chat_id
+FROM (
+  SELECT DISTINCT ON (resource_id, thread_key) resource_id, thread_key, peer_type, peer_id, chat_id
+  FROM _ingest_messages
+  ORDER BY resource_id, thread_key, created_at DESC NULLS LAST, ord DESC
+) AS t
+ORDER BY resource_id, thread_key
+ON CONFLICT (resource_id, thread_key) DO NOTHING
+""")
+
+# дубль (в базе или внутри пачки) не получает ключ → сообщение не вставляется
+_SQL_INGEST_MERGE = text("""
+WITH k AS (
+  INSERT INTO message_keys (provider, resource_id, external_chat_id, external_msg_id, message_id, created_at)
+  SELECT provider, resource_id, external_chat_id, external_msg_id, id, COALESCE(created_at, now())
+  FROM _ingest_messages
+  WHERE provider IS NOT NULL AND external_chat_id IS NOT NULL AND external_msg_id IS NOT NULL
+  ORDER BY ord
+  ON CONFLICT DO NOTHING
+  RETURNING message_id
+),
+m AS (
+  INSERT INTO messages (
+    id, resource_id, dialog_id, peer_id, peer_type, chat_id, msg_id, direction, msg_type, text,
+    tokens_in, tokens_out, latency_ms, is_internal, meta_json, created_at,
+    provider, external_chat_id, external_msg_id
+  )
+  SELECT s.id, s.resource_id, d.id, s.peer_id, s.peer_type, s.chat_id, s.msg_id, s.direction, s.msg_type, s.text,
+         s.tokens_in, s.tokens_out, s.latency_ms, s.is_internal, s.meta_json, COALESCE(s.created_at, now()),
+         s.provider, s.external_chat_id, s.external_msg_id
+  FROM _ingest_messages s
+  JOIN dialogs d ON d.resource_id = s.resource_id AND d.thread_key = s.thread_key
+  WHERE s.provider IS NULL OR s.external_chat_id IS NULL OR s.external_msg_id IS NULL
+     OR s.id IN (SELECT message_id FROM k)
+  RETURNING dialog_id, created_at
+)
+UPDATE dialogs d
+SET last_message_at = GREATEST(d.last_message_at, x.last_at),
+    updated_at = now()
+FROM (
+  SELECT dialog_id, max(created_at) AS last_at, count(*) AS n
+  FROM m
+  GROUP BY dialog_id
+) AS x
+WHERE d.id = x.dialog_id
+RETURNING x.n
+""")
+
+_SQL_INGEST_DROP = text("DROP TABLE IF EXISTS _ingest_messages")
+
+
+def _ingest_row(ord_: int, r: Mapping[str, Any]) -> tuple:
+    """Строка COPY из словаря с полями insert_message (+ created_at, thread_key)."""
+    peer_type = r["peer_type"]
+    peer_id = int(r["peer_id"])
+    chat_id = int(r["chat_id"]) if r.get("chat_id") is not None else None
+    text_value = (r.get("text") or r.get("text_value") or "").strip()
+    meta_json = dict(r.get("meta_json") or {})
+    meta_json.setdefault("tok", token_cache_entry(count_tokens(text_value)))
+    provider = (r.get("provider") or "").strip()
+    external_chat_id = (r.get("external_chat_id") or "").strip()
+    thread_key = r.get("thread_key")
+    if not thread_key:
+        if not provider or not external_chat_id:
+            raise ValueError("MISSING_THREAD_KEY")
+        thread_key = external_thread_key(provider=provider, external_chat_id=external_chat_id)
+    created_at = r.get("created_at")
+    if isinstance(created_at, datetime) and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (
+        ord_,
+        r.get("id") or uuid.uuid4(),
+        r["resource_id"],
+        thread_key,
+        peer_id,
+        peer_type,
+        chat_id,
+        int(r["msg_id"]) if r.get("msg_id") is not None else None,
+        r["direction"],
+        r.get("msg_type") or "text",
+        text_value,
+        r.get("tokens_in"),
+        r.get("tokens_out"),
+        r.get("latency_ms"),
+        bool(r.get("is_internal") or False),
+        json.dumps(meta_json, ensure_ascii=False),
+        created_at,
+        provider or None,
+        external_chat_id or None,
+        r.get("external_msg_id"),
+    )
+
+
+def bulk_ingest_messages(db: Session, rows: Iterable[Mapping[str, Any]]) -> BulkIngestResult:
+    """
+    Массовая вставка сообщений (импорт/бэкфилл) в текущей транзакции db.
+
+    rows — словари с полями insert_message (text или text_value) и, опционально,
+    created_at (исторический момент) и thread_key. Без thread_key диалог —
+    тот же, что у живого пути: provider:external_chat_id (иначе ValueError).
+    Строки идут COPY в temp-таблицу,
+    затем одним проходом: недостающие диалоги, ключи message_keys, сообщения
+    и dialogs.last_message_at. Дубли (уже в базе или повторы внутри rows)
+    не вставляются и не бросают исключений — только считаются.
+
+    embedding не заполняется: векторы досчитывает бэкфилл embedding_batcher.
+    Коммит — за вызывающим.
+    """
+    started = time.perf_counter()
+    db.execute(_SQL_INGEST_DROP)
+    db.execute(_SQL_INGEST_STAGE)
+
+    raw = db.connection().connection.driver_connection  # psycopg.Connection
+    received = 0
+    with raw.cursor() as cur:
+        with cur.copy(f"COPY _ingest_messages ({', '.join(_INGEST_COLUMNS)}) FROM STDIN") as copy:
+            for r in rows:
+                copy.write_row(_ingest_row(received, r))
+                received += 1
+
+    if not received:
+        db.execute(_SQL_INGEST_DROP)
+        return BulkIngestResult(0, 0, 0, 0, time.perf_counter() - started)
+
+    dialogs_created = db.execute(_SQL_INGEST_DIALOGS).rowcount or 0
+    inserted = sum(int(n) for (n,) in db.execute(_SQL_INGEST_MERGE).all())
+    db.execute(_SQL_INGEST_DROP)
+
+    result = BulkIngestResult(
+        received=received,
+        inserted=inserted,
+        duplicates=received - inserted,
+        dialogs_created=dialogs_created,
+        elapsed_sec=time.perf_counter() - started,
+    )
+    print(
+        f"[DIALOG_STORE] bulk ingest: {result.inserted}/{result.received} inserted, "
+        f"dup={result.duplicates} dialogs+={result.dialogs_created} "
+        f"{result.rows_per_sec:.0f} rows/s",
+        flush=True,
+    )
+    return result
@@ -0,0 +1,234 @@
+"""
+src/app/core/dialog_summary.py
+────────────────────────────────────────────────────────────
+Скользящее резюме диалога (dialogs.summary).
+
+- После ответа process_incoming ставит диалог в очередь (schedule) —
+  задача идёт в фоне и не добавляет задержки пользователю.
+- Если за high-water mark накопилось больше SUMMARY_TRIGGER_MSGS сообщений
+  сверх окна истории (keep_recent), самые старые из них (до SUMMARY_MAX_BATCH
+  за проход) сворачиваются в резюме вместе с прошлым резюме.
+- High-water mark — (created_at, id) последнего свёрнутого сообщения;
+  запись условная (по прошлому hwm), поэтому два процесса не затрут друг друга.
+
+dialogs.summary: {"text", "hwm_id", "hwm_at", "covered", "tokens", "model", "updated_at"}
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import text
+
+from src.app.core.ai_transport import AIChatConfig, chat
+from src.app.core.usage_ledger import usage_ledger
+
+SUMMARY_TRIGGER_MSGS = int(os.getenv("SUMMARY_TRIGGER_MSGS", "20"))
+SUMMARY_MAX_BATCH = int(os.getenv("SUMMARY_MAX_BATCH", "60"))
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "250"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "2"))
+# Сколько проходов подряд за одну задачу (догон длинного диалога)
+SUMMARY_MAX_PASSES = 5
+
+_SUMMARY_INSTRUCTIONS = (
+    "Ты ведёшь краткое резюме переписки менеджера (assistant) с клиентом (user). "
+    "Обнови резюме с учётом новых сообщений: сохрани факты о клиенте (имя, контакты, "
+    "адреса, предпочтения, бюджет), договорённости, обещания и открытые вопросы. "
+    "Без приветствий и воды, не более {words} слов. Ответь только текстом резюме."
+)
+
+
+def summary_text(summary: Dict[str, Any] | None) -> str:
+    return str((summary or {}).get("text") or "").strip()
+
+
+def summary_hwm(summary: Dict[str, Any] | None) -> Optional[tuple[str, str]]:
+    """(hwm_at, hwm_id) или None, если резюме ещё нет."""
+    s = summary or {}
+    if s.get("hwm_at") and s.get("hwm_id"):
+        return str(s["hwm_at"]), str(s["hwm_id"])
+    return None
+
+
+def window_limit(keep_recent: int, summary: Dict[str, Any] | None, *, trigger_msgs: int = SUMMARY_TRIGGER_MSGS) -> int:
+    """
+    Сколько последних сообщений грузить в окно. С резюме — всё после hwm
+    (до keep_recent + trigger_msgs, больше несвёрнутых не бывает), чтобы
+    между резюме и окном не было «дыры».
+    """
+    return int(keep_recent) + (int(trigger_msgs) if summary_hwm(summary) else 0)
+
+
+def build_summary_messages(
+    previous: str, turns: Sequence[tuple[str, str]], *, max_words: int = SUMMARY_MAX_WORDS
+) -> List[Dict[str, str]]:
+    """turns — [(direction, text)] в хронологии."""
+    lines = [
+        f"{'user' if direction == 'in' else 'assistant'}: {(txt or '').strip()}"
+        for direction, txt in turns
+        if (txt or "").strip()
+    ]
+    body = (
+        f"Текущее резюме:\n{previous.strip() or '(пусто)'}\n\n"
+        f"Новые сообщения:\n" + "\n".join(lines)
+    )
+    return [
+        {"role": "system", "content": _SUMMARY_INSTRUCTIONS.format(words=max_words)},
+        {"role": "user", "content": body},
+    ]
+
+
+_SQL_LOAD_SUMMARY = text("SELECT summary FROM dialogs WHERE id = :dialog_id")
+
+_SQL_PENDING = text("""
+SELECT id, direction, text, created_at, count(*) OVER () AS total
+FROM messages
+WHERE dialog_id = :dialog_id
+  AND is_internal = false
+  AND text IS NOT NULL
+  AND length(text) > 0
+  AND (
+    CAST(:hwm_at AS timestamptz) IS NULL
+    OR (created_at, id) > (CAST(:hwm_at AS timestamptz), CAST(:hwm_id AS uuid))
+  )
+ORDER BY created_at, id
+LIMIT :limit;
+""")
+
+_SQL_SAVE_SUMMARY = text("""
+UPDATE dialogs
+SET summary = CAST(:summary AS jsonb),
+    updated_at = now()
+WHERE id = :dialog_id
+  AND COALESCE(summary->>'hwm_id', '') = :prev_hwm_id;
+""")
+
+
+class DialogSummarizer:
+    """Фоновые задачи сворачивания; не больше одной на диалог в процессе."""
+
+    def __init__(
+        self,
+        *,
+        trigger_msgs: int = SUMMARY_TRIGGER_MSGS,
+        max_batch: int = SUMMARY_MAX_BATCH,
+        concurrency: int = SUMMARY_CONCURRENCY,
+    ) -> None:
+        self.trigger_msgs = int(trigger_msgs)
+        self.max_batch = max(1, int(max_batch))
+        self.concurrency = max(1, int(concurrency))
+        self._inflight: dict[UUID, asyncio.Task] = {}
+        self._sem: asyncio.Semaphore | None = None
+        self.runs = 0
+        self.compacted = 0
+
+    def _log(self, msg: str) -> None:
+        print(f"[DIALOG_SUMMARY] {msg}", flush=True)
+
+    def schedule(
+        self,
+        dialog_id: UUID,
+        cfg: AIChatConfig,
+        *,
+        keep_recent: int,
+        resource_id: Optional[UUID] = None,
+    ) -> bool:
+        """
+        Поставить диалог в очередь (не блокирует). False — уже в работе.
+        resource_id — на чей счёт писать расход (usage_ledger).
+        """
+        task = self._inflight.get(dialog_id)
+        if task is not None and not task.done():
+            return False
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        task = asyncio.create_task(self._run(dialog_id, cfg, int(keep_recent), resource_id))
+        self._inflight[dialog_id] = task
+        task.add_done_callback(lambda _t, d=dialog_id: self._inflight.pop(d, None))
+        return True
+
+    async def _run(
+        self, dialog_id: UUID, cfg: AIChatConfig, keep_recent: int, resource_id: Optional[UUID]
+    ) -> None:
+        async with self._sem:
+            try:
+                for _ in range(SUMMARY_MAX_PASSES):
+                    if not await self.compact_once(
+                        dialog_id, cfg, keep_recent=keep_recent, resource_id=resource_id
+                    ):
+                        break
+            except Exception as e:
+                self._log(f"{dialog_id} error: {e!r}")
+
+    async def compact_once(
+        self,
+        dialog_id: UUID,
+        cfg: AIChatConfig,
+        *,
+        keep_recent: int,
+        resource_id: Optional[UUID] = None,
+    ) -> bool:
+        """Один проход. True — резюме обновлено (может быть ещё что сворачивать)."""
+        from src.app.core.db import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            summary = (await db.execute(_SQL_LOAD_SUMMARY, {"dialog_id": str(dialog_id)})).scalar() or {}
+            rows = (await db.execute(_SQL_PENDING, {
+                "dialog_id": str(dialog_id),
+                "hwm_at": summary.get("hwm_at"),
+                "hwm_id": summary.get("hwm_id"),
+                "limit": self.max_batch + keep_recent,
+            })).all()
+
+        total = int(rows[0][4]) if rows else 0
+        foldable = total - keep_recent
+        if foldable < self.trigger_msgs:
+            return False
+        batch = rows[: min(foldable, self.max_batch)]
+
+        result = await chat(
+            cfg=cfg,
+            messages=build_summary_messages(summary_text(summary), [(r[1], r[2]) for r in batch]),
+        )
+        if result.ok and resource_id is not None:
+            usage_ledger.record(resource_id, result.usage or {}, model=cfg.model)
+        new_text = (result.text or "").strip()
+        if not result.ok or not new_text:
+            self._log(f"{dialog_id} summarize failed: {result.error}")
+            return False
+
+        last = batch[-1]
+        new_summary = {
+            "text": new_text,
+            "hwm_id": str(last[0]),
+            "hwm_at": last[3].isoformat() if isinstance(last[3], datetime) else str(last[3]),
+            "covered": int(summary.get("covered") or 0) + len(batch),
+            "tokens": int(summary.get("tokens") or 0) + int((result.usage or {}).get("total_tokens") or 0),
+            "model": cfg.model,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        async with AsyncSessionLocal() as db:
+            res = await db.execute(_SQL_SAVE_SUMMARY, {
+                "dialog_id": str(dialog_id),
+                "summary": json.dumps(new_summary, ensure_ascii=False),
+                "prev_hwm_id": str(summary.get("hwm_id") or ""),
+            })
+            await db.commit()
+        if not res.rowcount:
+            return False  # другой процесс успел раньше
+
+        self.runs += 1
+        self.compacted += len(batch)
+        self._log(f"{dialog_id} folded {len(batch)} msgs, covered={new_summary['covered']}")
+        return True
+
+    def stats(self) -> dict[str, int]:
+        return {"inflight": len(self._inflight), "runs": self.runs, "compacted": self.compacted}
+
+
+dialog_summarizer = DialogSummarizer()
+
@@ -0,0 +1,204 @@
+"""
+src/app/core/embedding_cache.py
+────────────────────────────────────────────────────────────
+Контентно-адресуемый кэш эмбеддингов: ключ (model, sha256(normalize(text))).
+
+- Фронт — LRU в памяти процесса (векторы в array('f'), ~6 КБ на запись).
+- Бэк — таблица embedding_cache в Postgres (общая для web и botworker).
+- embedding_service.get_embeddings сначала спрашивает кэш и идёт в API
+  только за промахами, затем кладёт новые векторы в оба уровня.
+
+Приветствия, FAQ и одинаковые ответы бота считаются один раз; бэкфилл и
+пересчёт после смены модели становятся инкрементальными (ключ включает модель).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable
+
+from sqlalchemy import text
+
+DEFAULT_MAXSIZE = int(os.getenv("EMBED_CACHE_SIZE", "2000"))
+
+# Как часто (сек) печатать hit-rate в лог
+STATS_LOG_INTERVAL_SEC = 300.0
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(value: str) -> str:
+    """NFC + casefold + схлопнутые пробелы: «Привет!» и « привет! » — один ключ."""
+    return _WS.sub(" ", unicodedata.normalize("NFC", value or "")).strip().casefold()
+
+
+def text_hash(value: str) -> str:
+    return hashlib.sha256(normalize_text(value).encode("utf-8")).hexdigest()
+
+
+_SQL_LOAD = text("""
+SELECT text_hash, CAST(embedding AS text)
+FROM embedding_cache
+WHERE model = :model AND text_hash = ANY(CAST(:hashes AS text[]))
+""")
+
+_SQL_SAVE = text("""
+INSERT INTO embedding_cache (model, text_hash, embedding)
+SELECT :model, h, CAST(e AS vector)
+FROM unnest(CAST(:hashes AS text[]), CAST(:embs AS text[])) AS x(h, e)
+ON CONFLICT (model, text_hash) DO NOTHING
+""")
+
+
+def vector_literal(vec: Iterable[float]) -> str:
+    return "[" + ",".join(repr(float(v)) for v in vec) + "]"
+
+
+async def _load_db(model: str, hashes: list[str]) -> dict[str, list[float]]:
+    from src.app.core.db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(_SQL_LOAD, {"model": model, "hashes": hashes})).all()
+    return {r[0]: json.loads(r[1]) for r in rows}
+
+
+async def _save_db(model: str, items: dict[str, list[float]]) -> None:
+    from src.app.core.db import AsyncSessionLocal
+
+    hashes = list(items)
+    async with AsyncSessionLocal() as db:
+        await db.execute(_SQL_SAVE, {
+            "model": model,
+            "hashes": hashes,
+            "embs": [vector_literal(items[h]) for h in hashes],
+        })
+        await db.commit()
+
+
+LoadFn = Callable[[str, list[str]], Awaitable[dict[str, list[float]]]]
+SaveFn = Callable[[str, dict[str, list[float]]], Awaitable[None]]
+
+
+class EmbeddingCache:
+    """LRU в памяти + таблица в Postgres. Не потокобезопасен (один event loop)."""
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = DEFAULT_MAXSIZE,
+        load: LoadFn | None = _load_db,
+        save: SaveFn | None = _save_db,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = int(maxsize)
+        self._load = load
+        self._save = save
+        self._clock = clock
+        self._items: OrderedDict[tuple[str, str], array] = OrderedDict()
+        self.lookups = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.db_errors = 0
+        self._last_log = clock()
+
+    def _log(self, msg: str) -> None:
+        print(f"[EMBED_CACHE] {msg}", flush=True)
+
+    def _remember(self, key: tuple[str, str], vec: Iterable[float]) -> None:
+        self._items[key] = array("f", vec)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    async def get_many(self, model: str, texts: Iterable[str]) -> dict[str, list[float]]:
+        """text -> вектор для найденных (память, затем БД). Промахи отсутствуют в ответе."""
+        by_hash: dict[str, list[str]] = {}
+        for t in texts:
+            by_hash.setdefault(text_hash(t), []).append(t)
+        self.lookups += len(by_hash)
+
+        found: dict[str, list[float]] = {}
+        missing: list[str] = []
+        for h, originals in by_hash.items():
+            vec = self._items.get((model, h))
+            if vec is None:
+                missing.append(h)
+                continue
+            self._items.move_to_end((model, h))
+            self.memory_hits += 1
+            for t in originals:
+                found[t] = vec.tolist()
+
+        if missing and self._load is not None:
+            try:
+                loaded = await self._load(model, missing)
+            except Exception as e:
+                self.db_errors += 1
+                self._log(f"load error: {e!r}")
+                loaded = {}
+            for h, vec in loaded.items():
+                self._remember((model, h), vec)
+                self.db_hits += 1
+                for t in by_hash.get(h, ()):
+                    found[t] = list(vec)
+            missing = [h for h in missing if h not in loaded]
+
+        self.misses += len(missing)
+        self._maybe_log()
+        return found
+
+    async def put_many(self, model: str, items: dict[str, list[float]]) -> None:
+        """Положить text -> вектор в память и (без ожидания конфликтов) в БД."""
+        by_hash = {text_hash(t): vec for t, vec in items.items()}
+        for h, vec in by_hash.items():
+            self._remember((model, h), vec)
+        if by_hash and self._save is not None:
+            try:
+                await self._save(model, by_hash)
+            except Exception as e:
+                self.db_errors += 1
+                self._log(f"save error: {e!r}")
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict[str, Any]:
+        hits = self.memory_hits + self.db_hits
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "lookups": self.lookups,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / self.lookups, 4) if self.lookups else None,
+            # каждый hit — текст, который не ушёл в embeddings API
+            "api_calls_avoided": hits,
+            "db_errors": self.db_errors,
+        }
+
+    def _maybe_log(self) -> None:
+        now = self._clock()
+        if now - self._last_log < STATS_LOG_INTERVAL_SEC:
+            return
+        self._last_log = now
+        s = self.stats()
+        self._log(
+            f"size={s['size']} lookups={s['lookups']} mem_hits={s['memory_hits']} "
+            f"db_hits={s['db_hits']} misses={s['misses']} hit_rate={s['hit_rate']} "
+            f"api_calls_avoided={s['api_calls_avoided']}"
+        )
+
+
+# Глобальный singleton процесса
+embedding_cache = EmbeddingCache()
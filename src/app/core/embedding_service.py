@@ -5,13 +5,52 @@ src/app/core/embedding_service.py
 
 Используется OpenAI text-embedding-3-small (1536 dims).
 Ключ берётся из api_keys-ресурса пользователя — тенант-разделение гарантировано.
+
+Эмбеддинги сообщений считаются вне критического пути ответа:
+- сообщение пишется в БД сразу с embedding = NULL;
+- EmbeddingBatcher копит тексты по API-ключу и отправляет их одним
+  multi-input запросом (до EMBED_MAX_BATCH текстов или через EMBED_MAX_WAIT_SEC);
+- уже посчитанные тексты берутся из embedding_cache (память + Postgres);
+- результат дописывается в messages.embedding одним UPDATE на пачку.
+Очередь живёт в памяти процесса: при рестарте недосчитанные строки
+остаются с NULL (поиск по эмбеддингам такие строки просто пропускает).
 """
 from __future__ import annotations
 
-from openai import AsyncOpenAI
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from sqlalchemy import text
+
+from src.app.core.ai_transport import AIProvider, ai_clients
+from src.app.core.embedding_cache import vector_literal, embedding_cache
 
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_SEC = float(os.getenv("EMBED_MAX_WAIT_SEC", "0.5"))
+# Больше — новые тексты отбрасываются (embedding останется NULL)
+EMBED_MAX_PENDING = int(os.getenv("EMBED_MAX_PENDING", "10000"))
+
+
+async def get_embeddings(texts: list[str], api_key: str) -> list[list[float]]:
+    """
+    Векторы для пачки текстов; порядок результата = порядок texts.
+    Сначала embedding_cache, в API (одним запросом) — только промахи.
+    """
+    cached = await embedding_cache.get_many(EMBEDDING_MODEL, texts)
+    todo = list(dict.fromkeys(t for t in texts if t not in cached))
+    if todo:
+        resp = await ai_clients.get(AIProvider.openai.value, api_key).embeddings.create(model=EMBEDDING_MODEL, input=todo)
+        fresh = {todo[d.index]: d.embedding for d in resp.data}
+        await embedding_cache.put_many(EMBEDDING_MODEL, fresh)
+        cached.update(fresh)
+    return [cached[t] for t in texts]
+
 
 async def get_embedding(text: str, api_key: str) -> list[float] | None:
     """
@@ -23,12 +62,165 @@ async def get_embedding(text: str, api_key: str) -> list[float] | None:
     if not (api_key or "").strip():
         return None
     try:
-        client = AsyncOpenAI(api_key=api_key)
-        resp = await client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text.strip(),
-        )
-        return resp.data[0].embedding
+        return (await get_embeddings([text.strip()], api_key))[0]
     except Exception as e:
         print(f"[EMBEDDING] get_embedding error: {e!r}")
         return None
+
+
+# ────────────────────────────────────────────────────────────────
+# Фоновый батчер
+# ────────────────────────────────────────────────────────────────
+
+_SQL_BACKFILL = text("""
+UPDATE messages m
+SET embedding = CAST(x.e AS vector)
+FROM unnest(CAST(:ids AS uuid[]), CAST(:embs AS text[])) AS x(id, e)
+WHERE m.id = x.id AND m.embedding IS NULL
+""")
+
+
+async def store_embeddings(pairs: list[tuple[UUID, list[float]]]) -> None:
+    from src.app.core.db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(_SQL_BACKFILL, {
+            "ids": [str(mid) for mid, _ in pairs],
+            "embs": [vector_literal(vec) for _, vec in pairs],
+        })
+        await db.commit()
+
+
+@dataclass
+class _Pending:
+    message_id: UUID
+    text: str
+    at: float
+
+
+EmbedFn = Callable[[list[str], str], Awaitable[list[list[float]]]]
+StoreFn = Callable[[list[tuple[UUID, list[float]]]], Awaitable[None]]
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        *,
+        embed: EmbedFn = get_embeddings,
+        store: StoreFn = store_embeddings,
+        max_batch: int = EMBED_MAX_BATCH,
+        max_wait_sec: float = EMBED_MAX_WAIT_SEC,
+        max_pending: int = EMBED_MAX_PENDING,
+    ) -> None:
+        self._embed = embed
+        self._store = store
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_sec = float(max_wait_sec)
+        self.max_pending = int(max_pending)
+        # api_key -> очередь текстов (ключ нужен для запроса, в логи не попадает)
+        self._queues: dict[str, list[_Pending]] = {}
+        self._size = 0
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.requests = 0
+        self.embedded = 0
+        self.dropped = 0
+
+    def _log(self, msg: str) -> None:
+        print(f"[EMBEDDING] {msg}", flush=True)
+
+    @property
+    def pending(self) -> int:
+        return self._size
+
+    def submit(self, message_id: UUID, text_value: str, api_key: str) -> bool:
+        """Поставить сообщение в очередь на эмбеддинг. Не блокирует."""
+        t = (text_value or "").strip()
+        if not t or not (api_key or "").strip():
+            return False
+        if self._size >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._queues.setdefault(api_key, []).append(_Pending(message_id, t, time.monotonic()))
+        self._size += 1
+        self._ensure_started()
+        self._wake.set()  # цикл пересчитает дедлайн / заберёт полную пачку
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _take_ready(self, *, force: bool = False) -> list[tuple[str, list[_Pending]]]:
+        now = time.monotonic()
+        ready: list[tuple[str, list[_Pending]]] = []
+        for key in list(self._queues):
+            queue = self._queues[key]
+            while queue and (
+                force or len(queue) >= self.max_batch or now - queue[0].at >= self.max_wait_sec
+            ):
+                batch, queue[:] = queue[: self.max_batch], queue[self.max_batch:]
+                self._size -= len(batch)
+                ready.append((key, batch))
+            if not queue:
+                del self._queues[key]
+        return ready
+
+    def _next_deadline(self) -> float | None:
+        if not self._queues:
+            return None
+        oldest = min(q[0].at for q in self._queues.values())
+        return max(0.0, oldest + self.max_wait_sec - time.monotonic())
+
+    async def _process(self, api_key: str, batch: list[_Pending]) -> None:
+        # одинаковые тексты в пачке считаем один раз
+        texts = list(dict.fromkeys(p.text for p in batch))
+        try:
+            vectors = await self._embed(texts, api_key)
+            by_text = dict(zip(texts, vectors))
+            await self._store([(p.message_id, by_text[p.text]) for p in batch])
+            self.requests += 1
+            self.embedded += len(batch)
+        except Exception as e:
+            self._log(f"batch error ({len(batch)} texts): {e!r}")
+
+    async def _run(self) -> None:
+        while True:
+            timeout = self._next_deadline()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            ready = self._take_ready()
+            if ready:
+                await asyncio.gather(*(self._process(k, b) for k, b in ready))
+
+    async def flush(self) -> None:
+        """Отправить всё накопленное сейчас (тесты, остановка процесса)."""
+        ready = self._take_ready(force=True)
+        if ready:
+            await asyncio.gather(*(self._process(k, b) for k, b in ready))
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        await self.flush()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self._size,
+            "requests": self.requests,
+            "embedded": self.embedded,
+            "dropped": self.dropped,
+        }
+
+
+embedding_batcher = EmbeddingBatcher()
@@ -0,0 +1,180 @@
+"""
+src/app/core/entity_cache.py
+────────────────────────────────────────────────────────────
+Общий LRU+TTL кэш метаданных Telegram-сущностей (пользователи, группы, каналы).
+
+Ключ — peer id в формате Telethon (utils.get_peer_id: -100… для каналов).
+Храним только то, что нужно для MessageEvent: username, отображаемое имя,
+флаг бота, название чата. Объекты Telethon не держим.
+
+Используется TelegramWorker (вместо get_sender/get_chat на каждое сообщение),
+backscan и поиском chat_base. Прогревается из get_dialogs при старте сессии.
+Кэш — singleton процесса: воркеры сессий делят его внутри botworker,
+backscan и chat_base — внутри web.
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from telethon import utils
+
+DEFAULT_MAXSIZE = 20_000
+DEFAULT_TTL_SEC = 6 * 3600.0
+
+# Как часто (сек) печатать hit-rate в лог
+STATS_LOG_INTERVAL_SEC = 300.0
+
+
+@dataclass(frozen=True)
+class EntityInfo:
+    peer_id: int
+    username: str | None = None       # @username (пользователя или чата) без "@"
+    display_name: str | None = None   # "Имя Фамилия" для пользователей
+    is_bot: bool = False
+    title: str | None = None          # название группы/канала
+
+    @property
+    def sender_name(self) -> str | None:
+        """То, что TelegramWorker кладёт в MessageEvent.sender_username."""
+        return self.username or self.display_name
+
+
+def _peer_id(entity: Any) -> int | None:
+    try:
+        return int(utils.get_peer_id(entity))
+    except Exception:
+        pid = getattr(entity, "id", None)
+        return int(pid) if pid is not None else None
+
+
+def entity_info(entity: Any) -> EntityInfo | None:
+    """Снимок метаданных из User/Chat/Channel (duck typing)."""
+    if entity is None:
+        return None
+    peer_id = _peer_id(entity)
+    if peer_id is None:
+        return None
+    fname = getattr(entity, "first_name", None)
+    lname = getattr(entity, "last_name", None)
+    display_name = " ".join(filter(None, [fname, lname])) or None
+    return EntityInfo(
+        peer_id=peer_id,
+        username=getattr(entity, "username", None) or None,
+        display_name=display_name,
+        is_bot=bool(getattr(entity, "bot", False)),
+        title=getattr(entity, "title", None) or None,
+    )
+
+
+class EntityCache:
+    """LRU по числу записей + TTL на запись. Не потокобезопасен (один event loop)."""
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = DEFAULT_MAXSIZE,
+        ttl_sec: float = DEFAULT_TTL_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = int(maxsize)
+        self.ttl_sec = float(ttl_sec)
+        self._clock = clock
+        self._items: OrderedDict[int, tuple[float, EntityInfo]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._last_log = clock()
+
+    def get(self, peer_id: int | None) -> EntityInfo | None:
+        if peer_id is None:
+            return None
+        key = int(peer_id)
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            self._maybe_log()
+            return None
+        stored_at, info = item
+        if self._clock() - stored_at > self.ttl_sec:
+            del self._items[key]
+            self.expired += 1
+            self.misses += 1
+            self._maybe_log()
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        self._maybe_log()
+        return info
+
+    def put(self, entity: Any) -> EntityInfo | None:
+        """Кладёт Telethon-сущность (или готовый EntityInfo). Возвращает снимок."""
+        info = entity if isinstance(entity, EntityInfo) else entity_info(entity)
+        if info is None:
+            return None
+        self._items[info.peer_id] = (self._clock(), info)
+        self._items.move_to_end(info.peer_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+        return info
+
+    def warm(self, entities: Iterable[Any]) -> int:
+        n = 0
+        for entity in entities:
+            if self.put(entity) is not None:
+                n += 1
+        return n
+
+    async def resolve(
+        self,
+        peer_id: int | None,
+        fetch: Callable[[], Awaitable[Any]],
+    ) -> EntityInfo | None:
+        """Из кэша, а при промахе — fetch() (get_sender/get_chat) и запись в кэш."""
+        info = self.get(peer_id)
+        if info is not None:
+            return info
+        entity = await fetch()
+        return self.put(entity)
+
+    def invalidate(self, peer_id: int) -> None:
+        self._items.pop(int(peer_id), None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+    def _maybe_log(self) -> None:
+        now = self._clock()
+        if now - self._last_log < STATS_LOG_INTERVAL_SEC:
+            return
+        self._last_log = now
+        s = self.stats()
+        print(
+            f"[ENTITY_CACHE] size={s['size']} hits={s['hits']} "
+            f"misses={s['misses']} hit_rate={s['hit_rate']} "
+            f"expired={s['expired']} evictions={s['evictions']}",
+            flush=True,
+        )
+
+
+# Глобальный singleton процесса
+entity_cache = EntityCache()
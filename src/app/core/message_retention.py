@@ -0,0 +1,261 @@
+"""
+src/app/core/message_retention.py
+────────────────────────────────────────────────────────────
+Обслуживание секционированной messages (помесячно по created_at, f1b3d5e7a9c2).
+
+За проход (MessageRetentionJob.run_once, раз в RETENTION_INTERVAL_SEC):
+1) секции на MESSAGES_PARTITIONS_AHEAD месяцев вперёд (вставка не должна
+   попадать в messages_default);
+2) retention ресурса: resources.meta_json["messages_retention_days"] —
+   сообщения ресурса старше N дней удаляются батчами из горячих секций;
+3) архивация: секции старше MESSAGES_HOT_MONTHS выгружаются COPY в
+   MESSAGES_ARCHIVE_DIR/<секция>.csv.gz (без embedding — он пересчитываем и
+   занимает основную часть строки), затем DETACH + DROP — без DELETE,
+   без vacuum и раздувания индексов;
+4) ключи дедупа message_keys старше горячего окна удаляются.
+
+Проход защищён pg_try_advisory_lock: при нескольких botworker (шардах)
+работу делает один, остальные пропускают.
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+MESSAGES_HOT_MONTHS = int(os.getenv("MESSAGES_HOT_MONTHS", "6"))
+MESSAGES_PARTITIONS_AHEAD = 2
+MESSAGES_ARCHIVE_DIR = os.getenv("MESSAGES_ARCHIVE_DIR", "archive/messages")
+RETENTION_INTERVAL_SEC = float(os.getenv("MESSAGES_RETENTION_INTERVAL_SEC", str(6 * 3600)))
+RETENTION_DELETE_BATCH = 5000
+
+RETENTION_META_KEY = "messages_retention_days"
+# pg_try_advisory_lock: один исполнитель на кластер
+_RETENTION_LOCK_KEY = 0x6D73675F726574  # "msg_ret"
+
+# В архив — всё, кроме embedding
+ARCHIVE_COLUMNS = (
+    "id", "resource_id", "dialog_id", "peer_id", "peer_type", "chat_id", "msg_id",
+    "direction", "msg_type", "text", "tokens_in", "tokens_out", "latency_ms",
+    "is_internal", "meta_json", "created_at", "service_id", "provider",
+    "external_chat_id", "external_msg_id",
+)
+
+_PARTITION_RE = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.year * 12 + (d.month - 1) + n, 12)
+    return date(y, m + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+
+def parse_partition_name(name: str) -> Optional[date]:
+    m = _PARTITION_RE.match(name or "")
+    return date(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+
+def months_to_create(today: date, ahead: int = MESSAGES_PARTITIONS_AHEAD) -> List[date]:
+    first = month_start(today)
+    return [add_months(first, i) for i in range(ahead + 1)]
+
+
+def archivable(names: Iterable[str], today: date, hot_months: int = MESSAGES_HOT_MONTHS) -> List[str]:
+    """Секции, целиком старше горячего окна (текущий месяц + hot_months прошлых)."""
+    oldest_hot = add_months(month_start(today), -int(hot_months))
+    out = [(parse_partition_name(n), n) for n in names]
+    return [n for month, n in sorted(o for o in out if o[0] is not None) if month < oldest_hot]
+
+
+def retention_days(meta: Dict[str, Any] | None) -> Optional[int]:
+    """Срок хранения сообщений ресурса в днях или None (бессрочно, до архивации)."""
+    raw = (meta or {}).get(RETENTION_META_KEY)
+    try:
+        days = int(raw)
+    except (TypeError, ValueError):
+        return None
+    return days if days > 0 else None
+
+
+def _utc(month: date) -> str:
+    return f"{month.isoformat()} 00:00:00+00"
+
+
+_SQL_TRY_LOCK = text("SELECT pg_try_advisory_lock(:key)")
+_SQL_UNLOCK = text("SELECT pg_advisory_unlock(:key)")
+
+_SQL_LIST_PARTITIONS = text("""
+SELECT c.relname
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'messages'::regclass
+""")
+
+_SQL_RETENTION_RESOURCES = text("""
+SELECT id, meta_json
+FROM resources
+WHERE meta_json ? :meta_key
+""")
+
+_SQL_DELETE_EXPIRED = text("""
+DELETE FROM messages m
+USING (
+  SELECT id, created_at
+  FROM messages
+  WHERE resource_id = :resource_id AND created_at < :cutoff
+  LIMIT :batch
+) AS x
+WHERE m.id = x.id AND m.created_at = x.created_at
+""")
+
+_SQL_DELETE_EXPIRED_KEYS = text("""
+DELETE FROM message_keys k
+USING (
+  SELECT provider, resource_id, external_chat_id, external_msg_id
+  FROM message_keys
+  WHERE created_at < :cutoff
+    AND (CAST(:resource_id AS uuid) IS NULL OR resource_id = CAST(:resource_id AS uuid))
+  LIMIT :batch
+) AS x
+WHERE (k.provider, k.resource_id, k.external_chat_id, k.external_msg_id)
+    = (x.provider, x.resource_id, x.external_chat_id, x.external_msg_id)
+""")
+
+
+class MessageRetentionJob:
+    def __init__(
+        self,
+        *,
+        hot_months: int = MESSAGES_HOT_MONTHS,
+        archive_dir: str = MESSAGES_ARCHIVE_DIR,
+        interval_sec: float = RETENTION_INTERVAL_SEC,
+    ) -> None:
+        self.hot_months = max(1, int(hot_months))
+        self.archive_dir = Path(archive_dir)
+        self.interval_sec = float(interval_sec)
+        self.last_run: Dict[str, Any] = {}
+
+    def _log(self, msg: str) -> None:
+        print(f"[MSG_RETENTION] {msg}", flush=True)
+
+    # ── шаги (conn — SQLAlchemy Connection в AUTOCOMMIT) ─────────────────────
+
+    def _ensure_partitions(self, conn, today: date, existing: set[str]) -> int:
+        created = 0
+        for month in months_to_create(today):
+            name = partition_name(month)
+            if name in existing:
+                continue
+            try:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+                    f"FOR VALUES FROM ('{_utc(month)}') TO ('{_utc(add_months(month, 1))}')"
+                ))
+                created += 1
+            except Exception as e:
+                # например, строки этого месяца уже лежат в messages_default
+                self._log(f"create {name} error: {e!r}")
+        return created
+
+    def _delete_batched(self, conn, stmt, params: Dict[str, Any]) -> int:
+        total = 0
+        while True:
+            n = conn.execute(stmt, {**params, "batch": RETENTION_DELETE_BATCH}).rowcount or 0
+            total += n
+            if n < RETENTION_DELETE_BATCH:
+                return total
+
+    def _apply_resource_retention(self, conn, now: datetime) -> int:
+        deleted = 0
+        for rid, meta in conn.execute(_SQL_RETENTION_RESOURCES, {"meta_key": RETENTION_META_KEY}).all():
+            days = retention_days(meta)
+            if days is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            deleted += self._delete_batched(conn, _SQL_DELETE_EXPIRED, {"resource_id": str(rid), "cutoff": cutoff})
+            self._delete_batched(conn, _SQL_DELETE_EXPIRED_KEYS, {"resource_id": str(rid), "cutoff": cutoff})
+        return deleted
+
+    def _archive_partition(self, conn, name: str) -> int:
+        """COPY секции в gzip-CSV, затем DETACH + DROP. Повторный запуск перезапишет файл."""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"{name}.csv.gz"
+        tmp = path.with_name(path.name + ".tmp")
+        raw = conn.connection.driver_connection  # psycopg.Connection
+        with raw.cursor() as cur, gzip.open(tmp, "wb") as out:
+            with cur.copy(
+                f"COPY (SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {name} ORDER BY created_at) "
+                f"TO STDOUT WITH (FORMAT csv, HEADER true)"
+            ) as copy:
+                for chunk in copy:
+                    out.write(chunk)
+            rows = cur.rowcount
+        os.replace(tmp, path)
+        conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        self._log(f"archived {name}: {rows} rows -> {path}")
+        return rows
+
+    # ── проход ──────────────────────────────────────────────────────────────
+
+    def run_once(self, *, now: Optional[datetime] = None) -> Dict[str, Any]:
+        from src.app.core.db import engine
+
+        now = now or datetime.now(timezone.utc)
+        today = now.date()
+        stats: Dict[str, Any] = {"skipped": True}
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if not conn.execute(_SQL_TRY_LOCK, {"key": _RETENTION_LOCK_KEY}).scalar():
+                return stats  # другой процесс уже обслуживает
+            try:
+                existing = {r[0] for r in conn.execute(_SQL_LIST_PARTITIONS).all()}
+                stats = {
+                    "skipped": False,
+                    "created": self._ensure_partitions(conn, today, existing),
+                    "deleted": self._apply_resource_retention(conn, now),
+                    "archived": [],
+                    "archived_rows": 0,
+                }
+                for name in archivable(existing, today, self.hot_months):
+                    try:
+                        stats["archived_rows"] += self._archive_partition(conn, name)
+                        stats["archived"].append(name)
+                    except Exception as e:
+                        self._log(f"archive {name} error: {e!r}")
+                oldest_hot = add_months(month_start(today), -self.hot_months)
+                stats["keys_deleted"] = self._delete_batched(conn, _SQL_DELETE_EXPIRED_KEYS, {
+                    "resource_id": None,
+                    "cutoff": datetime(oldest_hot.year, oldest_hot.month, 1, tzinfo=timezone.utc),
+                })
+            finally:
+                conn.execute(_SQL_UNLOCK, {"key": _RETENTION_LOCK_KEY})
+        self.last_run = {**stats, "at": now.isoformat()}
+        self._log(
+            f"created={stats['created']} deleted={stats['deleted']} "
+            f"archived={len(stats['archived'])} ({stats['archived_rows']} rows) keys_deleted={stats['keys_deleted']}"
+        )
+        return stats
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                self._log(f"run error: {e!r}")
+            await asyncio.sleep(self.interval_sec)
+
+
+message_retention = MessageRetentionJob()
@@ -0,0 +1,119 @@
+"""
+src/app/core/pricing.py
+────────────────────────────────────────────────────────────
+Цены моделей и грубая оценка токенов (без токенизатора).
+
+Цены — USD за 1M токенов (input, output), по публичным прайсам провайдеров.
+Неизвестная модель → стоимость None (не угадываем).
+"""
+from __future__ import annotations
+
+import os
+import re
+
+# model -> (input_usd_per_1m, output_usd_per_1m)
+MODEL_PRICING: dict[str, tuple[float, float]] = {
+    # OpenAI
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1": (2.00, 8.00),
+    # Google
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+    # Anthropic
+    "claude-3-5-haiku-latest": (0.80, 4.00),
+    "claude-3-5-sonnet-latest": (3.00, 15.00),
+    # OpenAI-compatible
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "deepseek-chat": (0.27, 1.10),
+    "mistral-small-latest": (0.10, 0.30),
+    "grok-2-1212": (2.00, 10.00),
+}
+
+# Оценка ближе к BPE (o200k/cl100k) без токенизатора: слово латиницей
+# ≈ 1 токен на 4 символа, кириллицей ≈ на 3, числа — на 3 цифры,
+# прочие непробельные символы (пунктуация, эмодзи) — по токену.
+# Версия — в кэше messages.meta_json["tok"]: смена формулы = пересчёт.
+TOKEN_ESTIMATOR_VERSION = 1
+
+_TOKEN_PIECES = re.compile(r"([A-Za-z]+)|([\u0400-\u04FF]+)|(\d+)|(\S)")
+
+
+def count_tokens(text: str) -> int:
+    """Быстрая локальная оценка токенов (один проход регуляркой)."""
+    n = 0
+    for latin, cyr, digits, _other in _TOKEN_PIECES.findall(text or ""):
+        if latin:
+            n += (len(latin) + 3) // 4
+        elif cyr:
+            n += (len(cyr) + 2) // 3
+        elif digits:
+            n += (len(digits) + 2) // 3
+        else:
+            n += 1
+    return n
+
+
+def token_cache_entry(count: int) -> dict[str, int]:
+    """Значение messages.meta_json["tok"]."""
+    return {"n": int(count), "v": TOKEN_ESTIMATOR_VERSION}
+
+
+def cached_tokens(tok: object) -> int | None:
+    """Число из meta_json["tok"], если оно посчитано текущей версией оценки."""
+    if isinstance(tok, dict) and tok.get("v") == TOKEN_ESTIMATOR_VERSION:
+        try:
+            return int(tok["n"])
+        except (KeyError, TypeError, ValueError):
+            return None
+    return None
+
+
+# Окно контекста моделей (токены). Неизвестная модель → DEFAULT_CONTEXT_TOKENS.
+MODEL_CONTEXT_TOKENS: dict[str, int] = {
+    "gpt-4o-mini": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4.1-mini": 1_000_000,
+    "gpt-4.1-nano": 1_000_000,
+    "gpt-4.1": 1_000_000,
+    "gemini-2.0-flash": 1_000_000,
+    "gemini-1.5-flash": 1_000_000,
+    "claude-3-5-haiku-latest": 200_000,
+    "claude-3-5-sonnet-latest": 200_000,
+    "llama-3.1-8b-instant": 128_000,
+    "llama-3.3-70b-versatile": 128_000,
+    "deepseek-chat": 64_000,
+    "mistral-small-latest": 32_000,
+    "grok-2-1212": 131_072,
+}
+DEFAULT_CONTEXT_TOKENS = 16_000
+
+# Диалоговая часть запроса (вход + история + memory) — доля окна модели.
+# CONTEXT_TOKEN_CAP > 0 — общий потолок (цена и задержка), 0 — без потолка.
+CONTEXT_SHARE = 0.25
+CONTEXT_TOKEN_CAP = int(os.getenv("CONTEXT_TOKEN_CAP", "0"))
+
+
+def model_context_tokens(model: str) -> int:
+    return MODEL_CONTEXT_TOKENS.get((model or "").strip(), DEFAULT_CONTEXT_TOKENS)
+
+
+def context_token_budget(model: str) -> int:
+    budget = int(model_context_tokens(model) * CONTEXT_SHARE)
+    return min(CONTEXT_TOKEN_CAP, budget) if CONTEXT_TOKEN_CAP > 0 else budget
+
+
+def model_price(model: str) -> tuple[float, float] | None:
+    return MODEL_PRICING.get((model or "").strip())
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float | None:
+    """Стоимость в USD или None, если цены модели нет в таблице."""
+    price = model_price(model)
+    if price is None:
+        return None
+    inp, out = price
+    return (int(prompt_tokens) * inp + int(completion_tokens) * out) / 1_000_000
@@ -0,0 +1,185 @@
+"""
+src/app/core/progress.py
+────────────────────────────────────────────────────────────
+Канал прогресса длительных задач (in-memory async pub/sub).
+
+Фоновые задачи web-процесса (backscan PROMPT, поиск chat_base) публикуют
+сюда снимки прогресса через ProgressTracker. SSE-эндпоинты подписываются
+через progress.listen(key) и стримят события в UI — без поллинга /status.
+
+Ключ канала: "<kind>:<resource_id>", например "backscan:<uuid>".
+Последний снимок хранится, поэтому поздний подписчик сразу видит состояние.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator
+
+from sse_starlette.sse import EventSourceResponse
+
+FINAL_STATUSES = frozenset({"done", "error", "stopped"})
+
+# Как часто (сек) публиковать промежуточные снимки — UI не нужно чаще
+PUBLISH_INTERVAL_SEC = 0.5
+
+_QUEUE_SIZE = 64
+
+
+def progress_key(kind: str, resource_id: str) -> str:
+    return f"{kind}:{resource_id}"
+
+
+class ProgressChannel:
+    """
+    Простой брокер снимков прогресса.
+
+    publish(key, snapshot) — неблокирующий; медленный подписчик теряет
+    старые снимки (важно только последнее состояние), а не тормозит задачу.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._last: dict[str, dict[str, Any]] = {}
+
+    def publish(self, key: str, snapshot: dict[str, Any]) -> None:
+        self._last[key] = snapshot
+        for q in list(self._subscribers.get(key, ())):
+            if q.full():
+                try:
+                    q.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            q.put_nowait(snapshot)
+
+    def last(self, key: str) -> dict[str, Any] | None:
+        return self._last.get(key)
+
+    async def listen(self, key: str) -> AsyncIterator[dict[str, Any]]:
+        """
+        Отдаёт снимки до финального статуса (done/error/stopped).
+        Первым идёт последний известный снимок (если есть).
+        """
+        q: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        self._subscribers.setdefault(key, set()).add(q)
+        try:
+            snap = self._last.get(key)
+            if snap is not None:
+                yield snap
+                if snap.get("status") in FINAL_STATUSES:
+                    return
+            while True:
+                snap = await q.get()
+                yield snap
+                if snap.get("status") in FINAL_STATUSES:
+                    return
+        finally:
+            subs = self._subscribers.get(key)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    self._subscribers.pop(key, None)
+
+    def subscriber_count(self, key: str) -> int:
+        return len(self._subscribers.get(key, ()))
+
+
+class ProgressTracker:
+    """
+    Счётчики одного прогона + расчёт скорости и ETA.
+
+    chats_* — единицы работы (чаты backscan / запросы chat_base),
+    по ним считается ETA; messages — просканированные элементы
+    (сообщения / кандидаты), по ним считается скорость.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        *,
+        channel: ProgressChannel | None = None,
+        chats_total: int = 0,
+    ) -> None:
+        self.key = key
+        self._channel = channel if channel is not None else progress
+        self._started = time.monotonic()
+        self._last_publish = 0.0
+        self.status = "running"
+        self.message: str | None = None
+        self.chats_total = int(chats_total)
+        self.chats_done = 0
+        self.messages = 0
+        self.ai_calls = 0
+        self.matches = 0
+        self.result: dict[str, Any] | None = None  # итог задачи (отчёт dry-run) в финальном снимке
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        remaining = max(self.chats_total - self.chats_done, 0)
+        eta: float | None = None
+        if self.finished:
+            eta = 0.0
+        elif self.chats_done > 0:
+            eta = round(elapsed / self.chats_done * remaining, 1)
+        snap = {
+            "status": self.status,
+            "message": self.message,
+            "chats_total": self.chats_total,
+            "chats_done": self.chats_done,
+            "chats_remaining": remaining,
+            "messages": self.messages,
+            "messages_per_sec": round(self.messages / elapsed, 2),
+            "ai_calls": self.ai_calls,
+            "matches": self.matches,
+            "elapsed_sec": round(elapsed, 1),
+            "eta_sec": eta,
+        }
+        if self.result is not None:
+            snap["result"] = self.result
+        return snap
+
+    def publish(self, *, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_publish < PUBLISH_INTERVAL_SEC:
+            return
+        self._last_publish = now
+        self._channel.publish(self.key, self.snapshot())
+
+    def finish(self, status: str, message: str | None = None) -> None:
+        self.status = status
+        self.message = message
+        self.publish(force=True)
+
+
+# Глобальный singleton — общий для задач и SSE-эндпоинтов web-процесса
+progress = ProgressChannel()
+
+
+def mark_queued(key: str) -> None:
+    """
+    Вызывается эндпоинтом запуска до BackgroundTasks: SSE-клиент, открывший
+    стрим сразу после POST, дождётся первого снимка задачи, а не получит
+    финальный снимок прошлого прогона.
+    """
+    progress.publish(key, {"status": "queued"})
+
+
+def progress_stream(key: str, *, running: bool) -> EventSourceResponse:
+    """SSE-ответ со снимками прогресса (event: progress, data: JSON)."""
+
+    async def _events() -> AsyncIterator[dict[str, str]]:
+        last = progress.last(key)
+        active = running or (last or {}).get("status") in ("queued", "running")
+        if not active:
+            snap = last or {"status": "idle"}
+            yield {"event": "progress", "data": json.dumps(snap, ensure_ascii=False)}
+            return
+        async for snap in progress.listen(key):
+            yield {"event": "progress", "data": json.dumps(snap, ensure_ascii=False)}
+
+    return EventSourceResponse(_events(), ping=15)
@@ -0,0 +1,185 @@
+"""
+src/app/core/stream_reply.py
+────────────────────────────────────────────────────────────
+Прогрессивный ответ в Telegram: плейсхолдер + правки по мере стриминга.
+
+- start() сразу отправляет плейсхолдер — пользователь видит, что ответ идёт.
+- push(delta) копит текст; правка уходит не чаще interval секунд и только
+  если добавилось не меньше min_chars символов (лимиты Telegram на правки:
+  ~1/сек в личке, ~20/мин в группе).
+- RetryAfter / FloodWait сдвигают следующую правку на указанное время,
+  прочие ошибки правки не роняют ответ — финальный текст всё равно уйдёт.
+- finish(text) — последняя правка полным текстом; длиннее TG_TEXT_LIMIT —
+  хвост досылается отдельными сообщениями.
+
+Отправка/правка — колбэки транспорта (aiogram Bot или Telethon client),
+их дают TelegramBotWorker.progressive_reply / TelegramWorker.progressive_reply.
+Текст идёт без parse_mode: недописанная разметка ломала бы правки.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+STREAM_EDIT_INTERVAL_SEC = float(os.getenv("STREAM_EDIT_INTERVAL_SEC", "1.0"))
+STREAM_EDIT_INTERVAL_GROUP_SEC = float(os.getenv("STREAM_EDIT_INTERVAL_GROUP_SEC", "3.0"))
+STREAM_MIN_EDIT_CHARS = 24
+# Финальную правку после RetryAfter ждём не дольше (иначе шлём новым сообщением)
+FINAL_EDIT_MAX_WAIT_SEC = 10.0
+
+PLACEHOLDER = "…"
+CURSOR = " ▍"
+TG_TEXT_LIMIT = 4096
+
+SendFn = Callable[[str], Awaitable[Any]]        # text -> id отправленного сообщения
+EditFn = Callable[[Any, str], Awaitable[None]]  # (id, text)
+
+
+def edit_interval(peer_type: str) -> float:
+    return STREAM_EDIT_INTERVAL_SEC if peer_type == "private" else STREAM_EDIT_INTERVAL_GROUP_SEC
+
+
+def split_text(value: str, limit: int = TG_TEXT_LIMIT) -> List[str]:
+    """Куски не длиннее limit, по возможности по переносу строки."""
+    rest = value or ""
+    parts: List[str] = []
+    while len(rest) > limit:
+        cut = rest.rfind("\n", 0, limit)
+        if cut <= limit // 2:
+            cut = limit
+        parts.append(rest[:cut])
+        rest = rest[cut:].lstrip("\n")
+    parts.append(rest)
+    return parts
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    # aiogram TelegramRetryAfter.retry_after / Telethon FloodWaitError.seconds
+    for attr in ("retry_after", "seconds"):
+        value = getattr(e, attr, None)
+        if isinstance(value, (int, float)) and value > 0:
+            return float(value)
+    return None
+
+
+class ProgressiveReply:
+    def __init__(
+        self,
+        *,
+        send: SendFn,
+        edit: EditFn,
+        interval: float = STREAM_EDIT_INTERVAL_SEC,
+        min_chars: int = STREAM_MIN_EDIT_CHARS,
+        placeholder: str = PLACEHOLDER,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._send = send
+        self._edit = edit
+        self.interval = float(interval)
+        self.min_chars = int(min_chars)
+        self.placeholder = placeholder
+        self._clock = clock
+        self.message_id: Any = None
+        self.message_ids: List[Any] = []
+        self._text = ""
+        self._shown = ""
+        self._next_edit_at = 0.0
+        self._retry_wait: Optional[float] = None
+        self.first_visible_at: Optional[float] = None
+        self.edits = 0
+        self.edit_errors = 0
+        self.finished = False
+
+    def _log(self, msg: str) -> None:
+        print(f"[STREAM_REPLY] {msg}", flush=True)
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    async def start(self) -> None:
+        try:
+            self.message_id = await self._send(self.placeholder)
+            self.message_ids = [self.message_id]
+        except Exception as e:
+            self._log(f"placeholder error: {e!r}")
+            self.message_id = None
+        self._next_edit_at = self._clock() + self.interval
+
+    async def _try_edit(self, value: str) -> bool:
+        self._retry_wait = None
+        try:
+            await self._edit(self.message_id, value)
+        except Exception as e:
+            self.edit_errors += 1
+            wait = _retry_after(e)
+            if wait is not None:
+                self._retry_wait = wait
+                self._next_edit_at = self._clock() + wait
+            else:
+                self._log(f"edit error: {e!r}")
+            return False
+        self.edits += 1
+        self._shown = value
+        if self.first_visible_at is None:
+            self.first_visible_at = self._clock()
+        return True
+
+    async def push(self, delta: str) -> None:
+        if not delta:
+            return
+        self._text += delta
+        if self.message_id is None:
+            return
+        now = self._clock()
+        if now < self._next_edit_at:
+            return
+        if self._shown and len(self._text) - len(self._shown) < self.min_chars:
+            return
+        preview = self._text.strip()
+        if not preview:
+            return
+        if len(preview) + len(CURSOR) > TG_TEXT_LIMIT:
+            preview = preview[: TG_TEXT_LIMIT - len(CURSOR)]
+        self._next_edit_at = now + self.interval
+        await self._try_edit(preview + CURSOR)
+
+    async def _final_edit(self, value: str) -> bool:
+        if self.message_id is None:
+            return False
+        if value == self._shown:
+            return True  # Telegram отвечает ошибкой на правку тем же текстом
+        if await self._try_edit(value):
+            return True
+        wait = self._retry_wait
+        if wait is not None and wait <= FINAL_EDIT_MAX_WAIT_SEC:
+            await asyncio.sleep(wait)
+            return await self._try_edit(value)
+        return False
+
+    async def finish(self, final_text: str) -> List[Any]:
+        """Финальный текст (правка плейсхолдера + досылка хвоста). Возвращает id сообщений."""
+        self.finished = True
+        parts = split_text((final_text or "").strip() or self.placeholder)
+        if not await self._final_edit(parts[0]):
+            # плейсхолдер не ушёл / правка не прошла — шлём заново
+            try:
+                self.message_id = await self._send(parts[0])
+                self.message_ids = [self.message_id]
+                if self.first_visible_at is None:
+                    self.first_visible_at = self._clock()
+            except Exception as e:
+                self._log(f"final send error: {e!r}")
+                return self.message_ids
+        for part in parts[1:]:
+            try:
+                self.message_ids.append(await self._send(part))
+            except Exception as e:
+                self._log(f"tail send error: {e!r}")
+                break
+        return self.message_ids
+
+    def stats(self) -> dict[str, int]:
+        return {"edits": self.edits, "edit_errors": self.edit_errors, "messages": len(self.message_ids)}
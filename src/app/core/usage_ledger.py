@@ -0,0 +1,211 @@
+"""
+src/app/core/usage_ledger.py
+────────────────────────────────────────────────────────────
+Учёт расхода AI: токены и стоимость по (ресурс, модель, день UTC).
+
+- record() только складывает дельты в памяти процесса (без БД, без локов);
+- раз в USAGE_FLUSH_SEC накопленное уходит одним запросом: upsert в
+  usage_daily (+= к существующей строке) и last_activity ресурсов;
+- стоимость — pricing.estimate_cost; модель без цены → cost_usd NULL.
+
+Раньше каждый ответ делал UPDATE resources SET usage_today = usage_today + …:
+параллельные диалоги одного ресурса толкались на одной строке, а cost_today
+не заполнялся. Теперь resources.usage_today/cost_today — производные от
+usage_daily (см. models/resource.py).
+
+При ошибке записи дельты возвращаются в очередь; при аварийном падении
+процесса теряется не больше одного интервала.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import text
+
+from src.app.core.pricing import estimate_cost
+
+USAGE_FLUSH_SEC = float(os.getenv("USAGE_FLUSH_SEC", "10"))
+
+UsageKey = tuple[UUID, str, date]
+
+
+@dataclass
+class UsageDelta:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    cost_usd: Optional[float] = None
+    last_at: Optional[datetime] = None
+
+    def add(self, other: "UsageDelta") -> None:
+        self.requests += other.requests
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.total_tokens += other.total_tokens
+        if other.cost_usd is not None:
+            self.cost_usd = (self.cost_usd or 0.0) + other.cost_usd
+        if other.last_at is not None and (self.last_at is None or other.last_at > self.last_at):
+            self.last_at = other.last_at
+
+
+_SQL_FLUSH = text("""
+WITH d AS (
+  SELECT *
+  FROM unnest(
+    CAST(:rids AS uuid[]), CAST(:models AS text[]), CAST(:days AS date[]),
+    CAST(:requests AS int[]), CAST(:prompt AS bigint[]), CAST(:completion AS bigint[]),
+    CAST(:total AS bigint[]), CAST(:cost AS float8[]), CAST(:last_at AS timestamptz[])
+  ) AS x(resource_id, model, day, requests, prompt_tokens, completion_tokens, total_tokens, cost_usd, last_at)
+  -- ресурс могли удалить, пока дельта лежала в памяти
+  WHERE EXISTS (SELECT 1 FROM resources r WHERE r.id = x.resource_id)
+),
+ins AS (
+  INSERT INTO usage_daily AS u (
+    resource_id, model, day, requests, prompt_tokens, completion_tokens, total_tokens, cost_usd, updated_at
+  )
+  SELECT resource_id, model, day, requests, prompt_tokens, completion_tokens, total_tokens, cost_usd, now()
+  FROM d
+  ON CONFLICT (resource_id, model, day) DO UPDATE SET
+    requests = u.requests + EXCLUDED.requests,
+    prompt_tokens = u.prompt_tokens + EXCLUDED.prompt_tokens,
+    completion_tokens = u.completion_tokens + EXCLUDED.completion_tokens,
+    total_tokens = u.total_tokens + EXCLUDED.total_tokens,
+    cost_usd = CASE
+      WHEN EXCLUDED.cost_usd IS NULL THEN u.cost_usd
+      ELSE COALESCE(u.cost_usd, 0) + EXCLUDED.cost_usd
+    END,
+    updated_at = now()
+)
+UPDATE resources r
+SET last_activity = GREATEST(r.last_activity, a.last_at)
+FROM (SELECT resource_id, max(last_at) AS last_at FROM d GROUP BY resource_id) AS a
+WHERE r.id = a.resource_id;
+""")
+
+
+async def _store_db(rows: List[tuple[UsageKey, UsageDelta]]) -> None:
+    from src.app.core.db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(_SQL_FLUSH, {
+            "rids": [str(k[0]) for k, _ in rows],
+            "models": [k[1] for k, _ in rows],
+            "days": [k[2] for k, _ in rows],
+            "requests": [d.requests for _, d in rows],
+            "prompt": [d.prompt_tokens for _, d in rows],
+            "completion": [d.completion_tokens for _, d in rows],
+            "total": [d.total_tokens for _, d in rows],
+            "cost": [d.cost_usd for _, d in rows],
+            "last_at": [d.last_at for _, d in rows],
+        })
+        await db.commit()
+
+
+StoreFn = Callable[[List[tuple[UsageKey, UsageDelta]]], Awaitable[None]]
+
+
+class UsageLedger:
+    def __init__(
+        self,
+        *,
+        store: StoreFn = _store_db,
+        flush_sec: float = USAGE_FLUSH_SEC,
+        now: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ) -> None:
+        self._store = store
+        self.flush_sec = float(flush_sec)
+        self._now = now
+        self._pending: Dict[UsageKey, UsageDelta] = {}
+        self._task: asyncio.Task | None = None
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.errors = 0
+
+    def _log(self, msg: str) -> None:
+        print(f"[USAGE] {msg}", flush=True)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(
+        self,
+        resource_id: UUID,
+        usage: Dict[str, Any],
+        *,
+        model: Optional[str] = None,
+        at: Optional[datetime] = None,
+    ) -> UsageDelta:
+        """Учесть один вызов модели (usage — как в AIChatResult.usage). Не блокирует."""
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        total = int(usage.get("total_tokens") or 0) or prompt + completion
+        model_name = ((model or usage.get("model") or "").strip() or "unknown")[:64]
+        at = at or self._now()
+        delta = UsageDelta(
+            requests=1,
+            prompt_tokens=prompt,
+            completion_tokens=completion,
+            total_tokens=total,
+            cost_usd=estimate_cost(model_name, prompt, completion),
+            last_at=at,
+        )
+        key = (resource_id, model_name, at.astimezone(timezone.utc).date())
+        self._pending.setdefault(key, UsageDelta()).add(delta)
+        self._ensure_started()
+        return delta
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_sec)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Записать накопленное одним запросом. Возвращает число строк."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        # фиксированный порядок ключей — два процесса не дедлочатся на upsert
+        rows = sorted(batch.items(), key=lambda kv: (str(kv[0][0]), kv[0][1], kv[0][2]))
+        try:
+            await self._store(rows)
+        except Exception as e:
+            self.errors += 1
+            self._log(f"flush error ({len(rows)} rows): {e!r}")
+            for key, delta in rows:
+                self._pending.setdefault(key, UsageDelta()).add(delta)
+            return 0
+        self.flushes += 1
+        self.flushed_rows += len(rows)
+        return len(rows)
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        await self.flush()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "errors": self.errors,
+        }
+
+
+usage_ledger = UsageLedger()
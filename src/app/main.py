@@ -8,12 +8,19 @@ from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 
 from src.app import providers
+from src.app.core.ai_transport import ai_clients
 from src.app.core.config import SESSION_SECRET, STATIC_DIR
 from src.app.core.db import SessionLocal
+from src.app.core.dialog_service import resource_resolver
+from src.app.core.embedding_service import embedding_batcher
 from src.app.core.middleware import _authflow_trace
 from src.app.core.templates import build_page_context, render_i18n, template_to_page_key, templates
+from src.app.core.usage_ledger import usage_ledger
 from src.app.modules.bot.router import router as bot_router
 from src.app.modules.qr.router import router as qr_router
+from src.app.modules.usage.router import router as usage_router
+from src.app.resources.telegram_bot.pool import bot_pool
+from src.app.resources.telegram_bot.router import webhook_router as tg_webhook_router
 from src.app.routes.auth_routes import router as auth_router
 from src.app.web_routes import router as web_router
 
@@ -40,8 +47,10 @@ app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 # ─────────────────────────────────────────────────────────────────────────────
 app.include_router(qr_router)
 app.include_router(bot_router)
+app.include_router(usage_router)
 app.include_router(auth_router)
 app.include_router(web_router)
+app.include_router(tg_webhook_router)
 providers.load_all_providers()
 app.include_router(providers.router)
 
@@ -62,6 +71,21 @@ for name in providers.PROVIDERS.keys():
         print(f"[MAIN] ⚠️ Ошибка подключения провайдера {name}: {e}")
 
 
+# -----------------------------------------------------------------------------
+@app.on_event("shutdown")
+async def _shutdown():
+    """
+    Фоновые синглтоны ядра (webhook-ответы идут из web): сбросить буферы
+    embedding_batcher и usage_ledger, затем закрыть keep-alive пулы
+    AI-провайдеров, Bot-сессии bot_pool и LISTEN resource_resolver.
+    """
+    await embedding_batcher.close()
+    await usage_ledger.close()
+    await ai_clients.close()
+    await bot_pool.close()
+    await resource_resolver.close()
+
+
 # -----------------------------------------------------------------------------
 @app.get("/health")
 def health():
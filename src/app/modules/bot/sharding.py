@@ -0,0 +1,220 @@
+# src/app/modules/bot/sharding.py
+"""
+Шардирование botworker: N процессов делят ресурсы (telegram / telegram_bot / prompt).
+
+- Членство: каждый процесс пишет heartbeat в worker_shards; живые — те,
+  у кого heartbeat свежее MEMBER_TTL_SEC. Вход/выход процесса меняет кольцо.
+- Владелец: консистентное хеширование (HashRing, виртуальные узлы) по ключу
+  ресурса. При смене состава кольца переезжает только ~1/N ресурсов.
+- Co-location: PROMPT общается с сессией (MessageBus) и ботом (bot_registry)
+  внутри процесса, поэтому prompt + его сессия + его бот образуют группу
+  с общим ключом (минимальный rid группы). Отключается BOT_SHARD_COLOCATE=0 —
+  только если между процессами есть шина и доставка уведомлений.
+- Аренда: ресурс запускается только при наличии строки в resource_leases.
+  Чужая аренда перехватывается лишь после release или истечения lease_until,
+  поэтому одна Telethon-сессия никогда не запускается в двух процессах.
+
+Включается BOT_SHARDING=1; без него botworker работает как один процесс.
+"""
+from __future__ import annotations
+
+import bisect
+import hashlib
+import os
+import socket
+from typing import Iterable
+
+from sqlalchemy import text
+
+from src.app.core.db import SessionLocal
+from src.models.resource import Resource
+
+SHARDING_ENABLED = os.getenv("BOT_SHARDING", "0") == "1"
+SHARD_ID = os.getenv("BOT_SHARD_ID") or f"{socket.gethostname()}:{os.getpid()}"
+COLOCATE = os.getenv("BOT_SHARD_COLOCATE", "1") != "0"
+
+MEMBER_TTL_SEC = float(os.getenv("BOT_SHARD_MEMBER_TTL", "15"))
+LEASE_TTL_SEC = float(os.getenv("BOT_SHARD_LEASE_TTL", "30"))
+# Записи мёртвых процессов удаляем с запасом (для диагностики)
+PRUNE_AFTER_SEC = MEMBER_TTL_SEC * 20
+VNODES = 64
+
+
+def _hash(s: str) -> int:
+    return int.from_bytes(hashlib.sha1(s.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Консистентное хеширование с виртуальными узлами."""
+
+    def __init__(self, members: Iterable[str], *, vnodes: int = VNODES) -> None:
+        self.members = sorted(set(members))
+        points: list[tuple[int, str]] = []
+        for m in self.members:
+            for v in range(vnodes):
+                points.append((_hash(f"{m}#{v}"), m))
+        points.sort()
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[i]
+
+
+def colocation_keys(rows: Iterable[Resource], *, colocate: bool = COLOCATE) -> dict[str, str]:
+    """
+    rid -> ключ шардирования.
+    Без co-location ключ = rid. С co-location prompt склеивается со своей
+    сессией и ботом (union-find), ключ группы — минимальный rid в ней.
+    """
+    rows = list(rows)
+    parent: dict[str, str] = {str(r.id): str(r.id) for r in rows}
+    if not colocate:
+        return dict(parent)
+
+    def find(x: str) -> str:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a: str, b: str) -> None:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            lo, hi = sorted((ra, rb))
+            parent[hi] = lo
+
+    for r in rows:
+        if r.provider != "prompt":
+            continue
+        sources = (r.meta_json or {}).get("sources") or {}
+        for key in ("telegram_session_rid", "telegram_bot_rid"):
+            linked = sources.get(key)
+            if linked and str(linked) in parent:
+                union(str(r.id), str(linked))
+
+    return {rid: find(rid) for rid in parent}
+
+
+_SQL_HEARTBEAT = text("""
+INSERT INTO worker_shards (shard_id, started_at, heartbeat_at)
+VALUES (:shard, now(), now())
+ON CONFLICT (shard_id) DO UPDATE SET heartbeat_at = now()
+""")
+
+_SQL_MEMBERS = text("""
+SELECT shard_id FROM worker_shards
+WHERE heartbeat_at > now() - make_interval(secs => :ttl)
+ORDER BY shard_id
+""")
+
+_SQL_PRUNE_SHARDS = text("""
+DELETE FROM worker_shards
+WHERE heartbeat_at < now() - make_interval(secs => :ttl)
+""")
+
+# Захват/продление: чужую аренду берём только если она истекла
+_SQL_ACQUIRE = text("""
+INSERT INTO resource_leases (resource_id, shard_id, lease_until, updated_at)
+SELECT rid, :shard, now() + make_interval(secs => :ttl), now()
+FROM unnest(CAST(:ids AS uuid[])) AS rid
+ON CONFLICT (resource_id) DO UPDATE
+SET shard_id = EXCLUDED.shard_id,
+    lease_until = EXCLUDED.lease_until,
+    updated_at = now()
+WHERE resource_leases.shard_id = EXCLUDED.shard_id
+   OR resource_leases.lease_until < now()
+RETURNING resource_id
+""")
+
+_SQL_MY_LEASES = text("SELECT resource_id FROM resource_leases WHERE shard_id = :shard")
+
+_SQL_RELEASE = text("""
+DELETE FROM resource_leases
+WHERE shard_id = :shard AND resource_id = ANY(CAST(:ids AS uuid[]))
+""")
+
+_SQL_LEAVE_LEASES = text("DELETE FROM resource_leases WHERE shard_id = :shard")
+_SQL_LEAVE_SHARD = text("DELETE FROM worker_shards WHERE shard_id = :shard")
+
+
+class ShardCoordinator:
+    """Состояние шарда одного процесса botworker."""
+
+    def __init__(self, shard_id: str = SHARD_ID, *, colocate: bool = COLOCATE) -> None:
+        self.shard_id = shard_id
+        self.colocate = colocate
+        self.ring = HashRing([shard_id])
+
+    def _log(self, msg: str) -> None:
+        print(f"[SHARD] {self.shard_id} {msg}", flush=True)
+
+    def heartbeat(self) -> HashRing:
+        """Обновить heartbeat и кольцо. Логирует rebalance при смене состава."""
+        db = SessionLocal()
+        try:
+            db.execute(_SQL_HEARTBEAT, {"shard": self.shard_id})
+            db.execute(_SQL_PRUNE_SHARDS, {"ttl": PRUNE_AFTER_SEC})
+            members = [row[0] for row in db.execute(_SQL_MEMBERS, {"ttl": MEMBER_TTL_SEC})]
+            db.commit()
+        finally:
+            db.close()
+        if self.shard_id not in members:
+            members.append(self.shard_id)
+        if sorted(set(members)) != self.ring.members:
+            self._log(f"rebalance: members {self.ring.members} -> {sorted(set(members))}")
+            self.ring = HashRing(members)
+        return self.ring
+
+    def owned(self, rows: Iterable[Resource]) -> set[str]:
+        """rid ресурсов, которые по кольцу принадлежат этому шарду."""
+        keys = colocation_keys(rows, colocate=self.colocate)
+        return {rid for rid, key in keys.items() if self.ring.owner(key) == self.shard_id}
+
+    def acquire(self, rids: Iterable[str]) -> set[str]:
+        """Захватить/продлить аренду. Возвращает rid, которые можно запускать."""
+        ids = sorted(set(rids))
+        if not ids:
+            return set()
+        db = SessionLocal()
+        try:
+            got = {str(row[0]) for row in db.execute(
+                _SQL_ACQUIRE, {"shard": self.shard_id, "ttl": LEASE_TTL_SEC, "ids": ids}
+            )}
+            db.commit()
+            return got
+        finally:
+            db.close()
+
+    def leased(self) -> set[str]:
+        db = SessionLocal()
+        try:
+            return {str(row[0]) for row in db.execute(_SQL_MY_LEASES, {"shard": self.shard_id})}
+        finally:
+            db.close()
+
+    def release(self, rids: Iterable[str]) -> None:
+        ids = sorted(set(rids))
+        if not ids:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(_SQL_RELEASE, {"shard": self.shard_id, "ids": ids})
+            db.commit()
+        finally:
+            db.close()
+        self._log(f"released {len(ids)} leases")
+
+    def leave(self) -> None:
+        """Корректный выход: отдать все аренды и убрать себя из кольца."""
+        db = SessionLocal()
+        try:
+            db.execute(_SQL_LEAVE_LEASES, {"shard": self.shard_id})
+            db.execute(_SQL_LEAVE_SHARD, {"shard": self.shard_id})
+            db.commit()
+        finally:
+            db.close()
+        self._log("left")
@@ -0,0 +1,128 @@
+# src/app/modules/bot/startup.py
+"""
+Планировщик запусков botworker: не даёт стартовать сотням Telethon-сессий
+и aiogram-ботов в один тик (FloodWait, DC-миграции при рестарте).
+
+- Token bucket: BOT_CONNECT_RATE запусков в секунду, всплеск до BOT_CONNECT_BURST.
+- Между запусками — случайная пауза до BOT_CONNECT_JITTER_SEC.
+- Очерёдность: сначала ресурсы, от которых зависят активные PROMPT
+  (их сессии и боты), затем остальные.
+- Метрика: время от появления очереди до момента, когда все желаемые
+  сессии и боты в состоянии running (time-to-all-running), — в лог.
+
+Запуск не блокирует цикл worker_entry: что не влезло в бюджет тика,
+стартует на следующих тиках.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from typing import Callable, Iterable
+
+from src.models.resource import Resource
+
+CONNECT_RATE = float(os.getenv("BOT_CONNECT_RATE", "2.0"))
+CONNECT_BURST = float(os.getenv("BOT_CONNECT_BURST", "3"))
+CONNECT_JITTER_SEC = float(os.getenv("BOT_CONNECT_JITTER_SEC", "0.5"))
+
+# Как часто (сек) печатать прогресс, пока не всё запущено
+PROGRESS_LOG_SEC = 30.0
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = max(float(rate), 0.001)
+        self.burst = max(float(burst), 1.0)
+        self._clock = clock
+        self._tokens = self.burst
+        self._at = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._at) * self.rate)
+        self._at = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+def prompt_dependencies(prompts: Iterable[Resource]) -> set[str]:
+    """rid сессий и ботов, на которые ссылаются активные PROMPT."""
+    deps: set[str] = set()
+    for r in prompts:
+        sources = (r.meta_json or {}).get("sources") or {}
+        for key in ("telegram_session_rid", "telegram_bot_rid"):
+            if sources.get(key):
+                deps.add(str(sources[key]))
+    return deps
+
+
+def startup_order(rids: Iterable[str], priority: set[str]) -> list[str]:
+    """Сначала приоритетные, внутри групп — стабильный порядок."""
+    return sorted(rids, key=lambda rid: (rid not in priority, rid))
+
+
+class StartupScheduler:
+    def __init__(
+        self,
+        *,
+        rate: float = CONNECT_RATE,
+        burst: float = CONNECT_BURST,
+        jitter_sec: float = CONNECT_JITTER_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self.jitter_sec = float(jitter_sec)
+        self._clock = clock
+        self._wave_started: float | None = None
+        self._last_progress_log = 0.0
+        self.last_time_to_all_running: float | None = None
+
+    def take(self, pending: list[str]) -> list[str]:
+        """Сколько из очереди (уже упорядоченной) можно запустить в этот тик."""
+        allowed: list[str] = []
+        for rid in pending:
+            if not self.bucket.try_acquire():
+                break
+            allowed.append(rid)
+        return allowed
+
+    async def jitter(self) -> None:
+        if self.jitter_sec > 0:
+            await asyncio.sleep(random.uniform(0, self.jitter_sec))
+
+    def observe(self, desired: int, running: int) -> None:
+        """Учёт волны запуска: от первой очереди до «все running»."""
+        now = self._clock()
+        if running < desired:
+            if self._wave_started is None:
+                self._wave_started = now
+                self._last_progress_log = now
+            elif now - self._last_progress_log >= PROGRESS_LOG_SEC:
+                self._last_progress_log = now
+                print(
+                    f"[BOT_WORKER] startup: running {running}/{desired} "
+                    f"after {now - self._wave_started:.1f}s",
+                    flush=True,
+                )
+            return
+        if self._wave_started is not None:
+            self.last_time_to_all_running = now - self._wave_started
+            self._wave_started = None
+            print(
+                f"[BOT_WORKER] startup: all {desired} running, "
+                f"time_to_all_running={self.last_time_to_all_running:.1f}s",
+                flush=True,
+            )
@@ -3,13 +3,23 @@ import asyncio
 import os
 import json
 import hashlib
+import time
 
+from src.app.core.ai_transport import ai_clients
 from src.app.core.db import SessionLocal
+from src.app.core.dialog_lock import dialog_locks
+from src.app.core.dialog_service import resource_resolver
+from src.app.core.embedding_service import embedding_batcher
+from src.app.core.message_retention import message_retention
+from src.app.core.usage_ledger import usage_ledger
 from src.models.resource import Resource
 from src.models.user import User
 from src.app.resources.telegram.telegram import session_registry
 from src.app.resources.telegram_bot.bot import bot_registry
+from src.app.resources.telegram_bot.pool import bot_pool
 from src.app.resources.prompt.prompt_worker import prompt_registry
+from src.app.modules.bot.sharding import LEASE_TTL_SEC, SHARDING_ENABLED, ShardCoordinator
+from src.app.modules.bot.startup import StartupScheduler, prompt_dependencies, startup_order
 
 POLL_SECONDS = float(os.getenv("BOT_POLL_SECONDS", "2.0"))
 
@@ -28,9 +38,68 @@ def _conf_sig(r: Resource) -> str:
     return hashlib.sha1(s.encode("utf-8")).hexdigest()
 
 
+def _apply_sharding(
+    coordinator: ShardCoordinator,
+    *desired: dict[str, Resource],
+) -> set[str]:
+    """
+    Оставляет в desired-словарях только ресурсы этого шарда с подтверждённой арендой.
+    Возвращает множество арендованных rid.
+    """
+    coordinator.heartbeat()
+    rows = [r for d in desired for r in d.values()]
+    granted = coordinator.acquire(coordinator.owned(rows))
+    for d in desired:
+        for rid in list(d.keys()):
+            if rid not in granted:
+                d.pop(rid)
+    return granted
+
+
+def _count_up(registry, rids: set[str]) -> tuple[int, int]:
+    """
+    (running, expected) для метрики запуска. Воркер, чей таск завершился
+    сам (paused / not authorized), не ждём — он не станет running.
+    """
+    running = 0
+    expected = 0
+    for rid in rids:
+        w = registry.get(rid)
+        if w is None:
+            expected += 1
+            continue
+        if w.is_running:
+            running += 1
+            expected += 1
+        elif w.is_alive:
+            expected += 1
+    return running, expected
+
+
 async def main() -> None:
     print(f"[BOT_WORKER] boot. poll={POLL_SECONDS}s", flush=True)
+    coordinator = ShardCoordinator() if SHARDING_ENABLED else None
+    if coordinator:
+        print(f"[BOT_WORKER] sharding on: shard_id={coordinator.shard_id}", flush=True)
+    # секции/retention/архив messages; при нескольких шардах работает один (advisory lock)
+    retention_task = asyncio.create_task(message_retention.run_forever())
+    try:
+        await _loop(coordinator)
+    finally:
+        retention_task.cancel()
+        await embedding_batcher.close()
+        await usage_ledger.close()
+        await ai_clients.close()
+        await bot_pool.close()
+        await resource_resolver.close()
+        if coordinator:
+            try:
+                coordinator.leave()
+            except Exception as e:
+                print(f"[BOT_WORKER] shard leave error: {e!r}", flush=True)
 
+
+async def _loop(coordinator: ShardCoordinator | None) -> None:
     # Раздельные наборы для каждого типа воркеров
     running_tg:      set[str] = set()
     running_bot:     set[str] = set()
@@ -41,6 +110,8 @@ async def main() -> None:
     prev_desired_tg:     set[str] | None = None
     prev_desired_bot:    set[str] | None = None
     prev_desired_prompt: set[str] | None = None
+    lease_ok_at = time.monotonic()
+    scheduler = StartupScheduler()
 
     while True:
         desired_tg:     dict[str, Resource] = {}
@@ -68,6 +139,29 @@ async def main() -> None:
         finally:
             db.close()
 
+        # ── Шардирование: только свои ресурсы с арендой ───────────────────
+        granted: set[str] | None = None
+        if coordinator:
+            try:
+                granted = _apply_sharding(coordinator, desired_tg, desired_bot, desired_prompt)
+                lease_ok_at = time.monotonic()
+                # диалоги арендованных ресурсов — под локальными локами, пока аренда свежая
+                dialog_locks.set_owned(granted, valid_sec=LEASE_TTL_SEC * 0.8)
+            except Exception as e:
+                print(f"[BOT_WORKER] shard lease error: {e!r}", flush=True)
+                if time.monotonic() - lease_ok_at < LEASE_TTL_SEC * 0.8:
+                    # Аренды ещё действуют — держим текущее состояние
+                    await asyncio.sleep(POLL_SECONDS)
+                    continue
+                # Аренды вот-вот истекут и их заберут другие шарды — останавливаем всё
+                desired_tg.clear()
+                desired_bot.clear()
+                desired_prompt.clear()
+                dialog_locks.set_owned(())
+        else:
+            # без шардирования botworker один и ведёт все свои ресурсы
+            dialog_locks.set_owned([*desired_tg, *desired_bot])
+
         # ── Telegram user-sessions ────────────────────────────────────────
         tg_ids = set(desired_tg.keys())
         if prev_desired_tg is None or tg_ids != prev_desired_tg:
@@ -84,7 +178,11 @@ async def main() -> None:
                 running_tg.discard(rid)
                 sig_tg.pop(rid, None)
 
-        for rid in sorted(tg_ids - running_tg):
+        # Сессии и боты, от которых зависят PROMPT, стартуют первыми
+        priority = prompt_dependencies(desired_prompt.values())
+
+        for rid in scheduler.take(startup_order(tg_ids - running_tg, priority)):
+            await scheduler.jitter()
             try:
                 await session_registry.ensure_started(desired_tg[rid])
                 print(f"[BOT_WORKER] +ON telegram rid={rid}", flush=True)
@@ -128,7 +226,8 @@ async def main() -> None:
                 running_bot.discard(rid)
                 sig_bot.pop(rid, None)
 
-        for rid in sorted(bot_ids - running_bot):
+        for rid in scheduler.take(startup_order(bot_ids - running_bot, priority)):
+            await scheduler.jitter()
             try:
                 await bot_registry.ensure_started(desired_bot[rid])
                 print(f"[BOT_WORKER] +ON telegram_bot rid={rid}", flush=True)
@@ -200,6 +299,17 @@ async def main() -> None:
                 running_prompt.discard(rid)
                 sig_prompt.pop(rid, None)
 
+        tg_up, tg_expected = _count_up(session_registry, tg_ids)
+        bot_up, bot_expected = _count_up(bot_registry, bot_ids)
+        scheduler.observe(tg_expected + bot_expected, tg_up + bot_up)
+
+        # Отдаём аренды ресурсов, которые уже остановлены (переехали к другому шарду)
+        if coordinator and granted is not None:
+            try:
+                coordinator.release(coordinator.leased() - granted)
+            except Exception as e:
+                print(f"[BOT_WORKER] shard release error: {e!r}", flush=True)
+
         await asyncio.sleep(POLL_SECONDS)
 
 
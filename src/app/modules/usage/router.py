@@ -0,0 +1,75 @@
+"""
+src/app/modules/usage/router.py - Расход AI пользователя (usage_daily).
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session as SASession
+
+from src.app.core.auth import get_current_user
+from src.app.core.db import get_db
+
+router = APIRouter(tags=["Usage"])
+
+USAGE_MAX_DAYS = 366
+
+_SQL_USER_USAGE = text("""
+SELECT u.day, u.resource_id, r.label, r.provider, u.model,
+       u.requests, u.prompt_tokens, u.completion_tokens, u.total_tokens, u.cost_usd
+FROM usage_daily u
+JOIN resources r ON r.id = u.resource_id
+WHERE r.user_id = :user_id AND u.day >= :since
+ORDER BY u.day DESC, u.total_tokens DESC
+""")
+
+
+def summarize_usage(rows: list[dict]) -> dict:
+    """Итоги и разбивка по дням для строк usage_daily."""
+    totals = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost_usd": 0.0}
+    by_day: dict[str, dict] = {}
+    for row in rows:
+        day = by_day.setdefault(row["day"], {"day": row["day"], "total_tokens": 0, "cost_usd": 0.0})
+        day["total_tokens"] += row["total_tokens"]
+        day["cost_usd"] += row["cost_usd"] or 0.0
+        for k in ("requests", "prompt_tokens", "completion_tokens", "total_tokens"):
+            totals[k] += row[k]
+        totals["cost_usd"] += row["cost_usd"] or 0.0
+    totals["cost_usd"] = round(totals["cost_usd"], 6)
+    for day in by_day.values():
+        day["cost_usd"] = round(day["cost_usd"], 6)
+    # модели без цены (cost_usd = NULL) — чтобы «0$» не выглядел как бесплатно
+    totals["unpriced_models"] = sorted({r["model"] for r in rows if r["cost_usd"] is None})
+    return {"totals": totals, "by_day": list(by_day.values())}
+
+
+@router.get("/api/usage")
+async def api_usage(
+    request: Request,
+    days: int = Query(30, ge=1, le=USAGE_MAX_DAYS),
+    db: SASession = Depends(get_db),
+):
+    user = get_current_user(request, db)
+    if not user:
+        return JSONResponse({"ok": False}, status_code=401)
+
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    rows = [
+        {
+            "day": r[0].isoformat(),
+            "resource_id": str(r[1]),
+            "label": r[2],
+            "provider": r[3],
+            "model": r[4],
+            "requests": int(r[5]),
+            "prompt_tokens": int(r[6]),
+            "completion_tokens": int(r[7]),
+            "total_tokens": int(r[8]),
+            "cost_usd": float(r[9]) if r[9] is not None else None,
+        }
+        for r in db.execute(_SQL_USER_USAGE, {"user_id": user.id, "since": since}).all()
+    ]
+    return {"ok": True, "since": since.isoformat(), "rows": rows, **summarize_usage(rows)}
@@ -5,8 +5,6 @@ import logging
 from typing import Any
 from uuid import UUID
 
-from aiogram import Bot
-from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.types import (
     CallbackQuery,
@@ -15,6 +13,7 @@ from aiogram.types import (
 )
 
 from src.app.core.db import SessionLocal
+from src.app.resources.telegram_bot.pool import bot_pool
 from src.app.resources.chat_base.meta import (
     accept_candidate,
     normalize_meta,
@@ -89,7 +88,7 @@ def _find_resource_by_pending(
 
 
 class ChatBaseNotifier:
-    """Отправка карточек через Bot API; callback — в telegram_bot botworker."""
+    """Отправка карточек через Bot API (пул клиентов); callback — в telegram_bot botworker."""
 
     async def send_candidate(
         self,
@@ -100,26 +99,20 @@ class ChatBaseNotifier:
         pending_id: str,
         candidate: dict[str, Any],
     ) -> None:
-        bot = Bot(
-            token=bot_token,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-        )
-        try:
+        async with bot_pool.use(bot_token) as bot:
             await bot.send_message(
                 owner_id,
                 _format_card(candidate),
                 reply_markup=_keyboard(str(resource_id), pending_id),
                 parse_mode=ParseMode.HTML,
             )
-            logger.info(
-                "chat_base card sent rid=%s pending=%s owner=%s eid=%s",
-                resource_id,
-                pending_id,
-                owner_id,
-                candidate.get("external_id"),
-            )
-        finally:
-            await bot.session.close()
+        logger.info(
+            "chat_base card sent rid=%s pending=%s owner=%s eid=%s",
+            resource_id,
+            pending_id,
+            owner_id,
+            candidate.get("external_id"),
+        )
 
 
 async def route_callback_query(cq: CallbackQuery) -> None:
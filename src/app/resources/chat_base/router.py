@@ -15,6 +15,7 @@ from sqlalchemy.orm import Session as SASession
 
 from src.app.core.auth import get_current_user
 from src.app.core.db import get_db
+from src.app.core.progress import mark_queued, progress_key, progress_stream
 from src.app.resources.chat_base.assist import generate_queries_ai
 from src.app.resources.chat_base.meta import (
     default_meta,
@@ -188,10 +189,25 @@ async def start_run(
     db.add(row)
     db.commit()
 
+    mark_queued(progress_key("chat_base", str(row.id)))
     background_tasks.add_task(run_search, str(row.id))
     return {"ok": True, "message": "run_started", "running": True}
 
 
+@router.get("/{rid}/run/stream")
+async def stream_run(
+    rid: str,
+    db: SASession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """SSE: прогресс поиска (запросы, чаты/сек, отправленные карточки, ETA)."""
+    row = _get_owned(db, user, rid)
+    return progress_stream(
+        progress_key("chat_base", str(row.id)),
+        running=is_running(str(row.id)),
+    )
+
+
 @router.post("/{rid}/stop")
 async def stop_run(
     rid: str,
@@ -12,6 +12,7 @@ from telethon.sessions import StringSession
 from telethon.tl.functions.contacts import SearchRequest
 from telethon.tl.types import Channel, Chat
 
+from src.app.core.entity_cache import entity_cache
 from src.app.resources.chat_base.filters import GroupCandidate
 from src.models.resource import Resource
 
@@ -120,11 +121,17 @@ async def search_by_name_queries(
     *,
     pause_sec: float = 3.0,
     should_stop: Callable[[], bool] | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
 ) -> tuple[list[GroupCandidate], list[str]]:
+    """
+    on_progress(queries_done, chats_scanned) — вызывается после каждого
+    просмотренного чата и каждого завершённого запроса (для SSE-прогресса).
+    """
     app_id, app_hash, string_session = creds
     client = TelegramClient(StringSession(string_session), app_id, app_hash)
     found: dict[str, GroupCandidate] = {}
     completed: list[str] = []
+    scanned = 0
     await client.connect()
     try:
         for query in queries:
@@ -140,6 +147,7 @@ async def search_by_name_queries(
                 continue
 
             chats = list(getattr(result, "chats", []) or [])
+            entity_cache.warm(chats)
             for chat in chats:
                 if should_stop and should_stop():
                     break
@@ -173,7 +181,12 @@ async def search_by_name_queries(
                     week_message_count=week_count,
                     query=q,
                 )
+                scanned += 1
+                if on_progress:
+                    on_progress(len(completed), scanned)
             completed.append(q)
+            if on_progress:
+                on_progress(len(completed), scanned)
             if should_stop and should_stop():
                 break
             await asyncio.sleep(pause_sec)
@@ -7,6 +7,7 @@ from typing import Any
 from uuid import UUID
 
 from src.app.core.db import SessionLocal
+from src.app.core.progress import ProgressTracker, progress_key
 from src.app.resources.chat_base.meta import (
     add_pending,
     is_blocked,
@@ -55,11 +56,23 @@ async def run_search(
 
     clear_stop(rid)
     mark_running(rid)
+    tracker = ProgressTracker(progress_key("chat_base", rid))
+    tracker.publish(force=True)
+    result: dict[str, Any] = {"ok": False, "error": "SEARCH_FAILED"}
     try:
-        return await _run_search_impl(rid, pause_sec=pause_sec)
+        result = await _run_search_impl(
+            rid, pause_sec=pause_sec, tracker=tracker
+        )
+        return result
     finally:
         unmark_running(rid)
         clear_stop(rid)
+        if result.get("stopped"):
+            tracker.finish("stopped", "stopped")
+        elif result.get("ok"):
+            tracker.finish("done", None)
+        else:
+            tracker.finish("error", result.get("detail") or result.get("error"))
 
 
 def _should_stop(rid: str) -> bool:
@@ -104,7 +117,9 @@ def _finish_run(
         db.close()
 
 
-async def _run_search_impl(rid: str, *, pause_sec: float) -> dict[str, Any]:
+async def _run_search_impl(
+    rid: str, *, pause_sec: float, tracker: ProgressTracker
+) -> dict[str, Any]:
     db = SessionLocal()
     try:
         row = db.get(Resource, UUID(rid))
@@ -173,12 +188,23 @@ async def _run_search_impl(rid: str, *, pause_sec: float) -> dict[str, Any]:
     cancelled = False
     completed_queries: list[str] = []
 
+    tracker.chats_total = len(todo)
+    tracker.message = "search"
+    tracker.publish(force=True)
+
+    def _on_search_progress(queries_done: int, chats_scanned: int) -> None:
+        force = queries_done != tracker.chats_done
+        tracker.chats_done = queries_done
+        tracker.messages = chats_scanned
+        tracker.publish(force=force)
+
     try:
         candidates, completed_queries = await search_by_name_queries(
             creds,
             todo,
             pause_sec=pause_sec,
             should_stop=lambda: _should_stop(rid),
+            on_progress=_on_search_progress,
         )
     except Exception as e:
         db = SessionLocal()
@@ -198,6 +224,9 @@ async def _run_search_impl(rid: str, *, pause_sec: float) -> dict[str, Any]:
     if _should_stop(rid):
         cancelled = True
 
+    tracker.message = "send"
+    tracker.publish(force=True)
+
     for cand in candidates:
         if _should_stop(rid):
             cancelled = True
@@ -241,6 +270,8 @@ async def _run_search_impl(rid: str, *, pause_sec: float) -> dict[str, Any]:
                 candidate=cand.to_dict(),
             )
             sent += 1
+            tracker.matches = sent
+            tracker.publish()
             await asyncio.sleep(1.0)
         finally:
             db.close()
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Any
 from uuid import UUID
@@ -10,13 +11,20 @@ from telethon import TelegramClient, utils
 from telethon.sessions import StringSession
 from telethon.tl.types import Channel, Chat, User
 
+from src.app.core.ai_transport import observed_latency_ms, provider_from_key_field
 from src.app.core.db import SessionLocal
+from src.app.core.entity_cache import entity_cache
 from src.app.core.message_bus import MessageEvent
+from src.app.core.pricing import MODEL_PRICING, estimate_cost, count_tokens
+from src.app.core.progress import ProgressTracker, progress_key
 from src.app.resources.chat_base.search import resolve_tg_creds
 from src.app.resources.prompt.prompt_worker import (
     PromptWorker,
+    _build_full_system,
+    _condition_decision,
     _norm_filter_entry,
     _passes_filters,
+    _source_info,
 )
 from src.models.resource import Resource
 
@@ -24,6 +32,11 @@ _running: set[str] = set()
 MAX_DAYS = 30
 MAX_MSGS_PER_CHAT = 500
 PAUSE_BETWEEN_CHATS_SEC = 2.0
+PAUSE_BETWEEN_MSGS_SEC = 0.3
+
+# Dry-run: допущения для оценки (ответ модели заранее неизвестен)
+DRY_RUN_COMPLETION_TOKENS = 150
+DRY_RUN_DEFAULT_LATENCY_MS = 1500.0
 
 
 def is_running(prompt_rid: str) -> bool:
@@ -85,8 +98,15 @@ def _message_event(
     if chat_id is None:
         return None
 
-    sender_id = getattr(sender, "id", None) or chat_id
-    sender_username = getattr(sender, "username", None) if sender else None
+    # Отправитель есть в ответе iter_messages — кладём в общий кэш;
+    # если Telethon его не отдал, пробуем кэш по sender_id.
+    if sender is not None:
+        sender_info = entity_cache.put(sender)
+    else:
+        sender_info = entity_cache.get(getattr(msg, "sender_id", None))
+
+    sender_id = getattr(sender, "id", None) or getattr(msg, "sender_id", None) or chat_id
+    sender_username = sender_info.username if sender_info else None
     chat_username = getattr(entity, "username", None)
 
     return MessageEvent(
@@ -107,6 +127,15 @@ def _message_event(
     )
 
 
+def _whitelist_target(entry: str) -> str | int:
+    target = entry
+    if target.lstrip("-").isdigit():
+        return int(target)
+    if not target.startswith("@"):
+        return f"@{_norm_filter_entry(target)}"
+    return target
+
+
 def _update_backscan_meta(
     prompt_rid: str, *, status: str, message: str | None, processed: int = 0
 ) -> None:
@@ -135,6 +164,24 @@ async def run_backscan(prompt_rid: str, *, days: int) -> dict[str, Any]:
 
     days = max(1, min(int(days), MAX_DAYS))
     _running.add(rid)
+    tracker = ProgressTracker(progress_key("backscan", rid))
+    tracker.publish(force=True)
+    result: dict[str, Any] = {"ok": False, "error": "BACKSCAN_FAILED"}
+
+    try:
+        result = await _run_backscan_impl(rid, days=days, tracker=tracker)
+        return result
+    finally:
+        _running.discard(rid)
+        if result.get("ok"):
+            tracker.finish("done", f"processed={result.get('processed', 0)}")
+        else:
+            tracker.finish("error", result.get("detail") or result.get("error"))
+
+
+async def _run_backscan_impl(
+    rid: str, *, days: int, tracker: ProgressTracker
+) -> dict[str, Any]:
     processed = 0
 
     try:
@@ -184,6 +231,9 @@ async def run_backscan(prompt_rid: str, *, days: int) -> dict[str, Any]:
         _update_backscan_meta(
             rid, status="running", message=f"days={days}", processed=0
         )
+        tracker.chats_total = len(whitelist)
+        tracker.message = f"days={days}"
+        tracker.publish(force=True)
 
         since = datetime.now(timezone.utc) - timedelta(days=days)
         worker = PromptWorker(row)
@@ -196,14 +246,12 @@ async def run_backscan(prompt_rid: str, *, days: int) -> dict[str, Any]:
         try:
             for entry in whitelist:
                 try:
-                    target = entry
-                    if target.lstrip("-").isdigit():
-                        target = int(target)
-                    elif not target.startswith("@"):
-                        target = f"@{_norm_filter_entry(target)}"
-                    entity = await client.get_entity(target)
+                    entity = await client.get_entity(_whitelist_target(entry))
+                    entity_cache.put(entity)
                 except Exception as e:
                     print(f"[BACKSCAN] skip {entry!r}: {e!r}", flush=True)
+                    tracker.chats_done += 1
+                    tracker.publish(force=True)
                     continue
 
                 chat_processed = 0
@@ -218,6 +266,9 @@ async def run_backscan(prompt_rid: str, *, days: int) -> dict[str, Any]:
                     if msg_dt < since:
                         break
 
+                    tracker.messages += 1
+                    tracker.publish()
+
                     event = _message_event(
                         session_rid=str(session_rid),
                         session_label=session_label,
@@ -231,15 +282,22 @@ async def run_backscan(prompt_rid: str, *, days: int) -> dict[str, Any]:
                     ):
                         continue
 
+                    notified_before = worker.stats["notified"]
                     await worker.process_event(event, ignore_status=True)
                     processed += 1
                     chat_processed += 1
-                    await asyncio.sleep(0.3)
+                    tracker.ai_calls = worker.stats["ai_calls"]
+                    if worker.stats["notified"] > notified_before:
+                        tracker.matches += 1
+                    tracker.publish()
+                    await asyncio.sleep(PAUSE_BETWEEN_MSGS_SEC)
 
                 print(
                     f"[BACKSCAN] {entry!r}: processed {chat_processed} msgs",
                     flush=True,
                 )
+                tracker.chats_done += 1
+                tracker.publish(force=True)
                 await asyncio.sleep(PAUSE_BETWEEN_CHATS_SEC)
         finally:
             await client.disconnect()
@@ -254,5 +312,270 @@ async def run_backscan(prompt_rid: str, *, days: int) -> dict[str, Any]:
             rid, status="error", message=str(e), processed=processed
         )
         return {"ok": False, "error": "BACKSCAN_FAILED", "detail": str(e)}
+
+
+# ────────────────────────────────────────────────────────────────
+# Dry-run: та же выборка сообщений и фильтры, но без LLM и уведомлений.
+# Condition-шаги вычисляются честно; после первого AI-шага исход неизвестен,
+# поэтому дальнейшие AI-вызовы считаются по верхней границе (все continue).
+# ────────────────────────────────────────────────────────────────
+
+
+def _estimate_event_calls(
+    steps: list[dict], event: MessageEvent, full_system: str
+) -> list[tuple[int, int]]:
+    """
+    AI-вызовы, которые сделал бы пайплайн для события:
+    список (индекс шага, оценка prompt-токенов). [] — отсечено условиями.
+    """
+    incoming_text = event.text or f"[{event.msg_type}]"
+    history_tokens = count_tokens(
+        f"{_source_info(event)}\n\nСообщение:\n{incoming_text}"
+    )
+    system_tokens = count_tokens(full_system)
+    calls: list[tuple[int, int]] = []
+
+    for i, step in enumerate(steps):
+        step_type = (step.get("type") or "condition").lower()
+        step_name = step.get("name") or f"Шаг {i + 1}"
+
+        if step_type == "condition":
+            if calls:
+                continue  # после AI исход неизвестен — верхняя граница
+            _, decision = _condition_decision(step, event, incoming_text)
+            if decision == "stop":
+                return calls
+            continue
+
+        instruction = ""
+        if step_type == "ai":
+            instruction = (step.get("ai_instruction") or "").strip()
+            if not instruction:
+                continue
+        elif step_type == "notify" and (step.get("notify_mode") or "direct").lower() == "ai_formatted":
+            instruction = (
+                step.get("notify_instruction") or "Сформируй краткое уведомление хозяину"
+            ).strip()
+        else:
+            continue
+
+        task_tokens = count_tokens(f"\n\n--- ЗАДАЧА: {step_name} ---\n{instruction}")
+        calls.append((i, system_tokens + task_tokens + history_tokens))
+        history_tokens += DRY_RUN_COMPLETION_TOKENS
+
+        if step_type == "ai" and (step.get("ai_action") or "continue").lower() == "stop":
+            break
+
+    return calls
+
+
+def _dry_run_report(
+    *,
+    events: list[MessageEvent],
+    steps: list[dict],
+    full_system: str,
+    model: str,
+    provider: str,
+    chats: int,
+    messages_fetched: int,
+    fetch_sec: float,
+    days: int,
+) -> dict[str, Any]:
+    by_step: dict[int, dict[str, int]] = {}
+    reaching_ai = 0
+    prompt_tokens = 0
+    ai_calls = 0
+
+    for event in events:
+        calls = _estimate_event_calls(steps, event, full_system)
+        if calls:
+            reaching_ai += 1
+        for idx, tokens in calls:
+            ai_calls += 1
+            prompt_tokens += tokens
+            slot = by_step.setdefault(idx, {"ai_calls": 0, "prompt_tokens": 0})
+            slot["ai_calls"] += 1
+            slot["prompt_tokens"] += tokens
+
+    completion_tokens = ai_calls * DRY_RUN_COMPLETION_TOKENS
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    cost_by_model = {
+        name: round(estimate_cost(name, prompt_tokens, completion_tokens) or 0.0, 6)
+        for name in MODEL_PRICING
+    }
+
+    latency_ms = observed_latency_ms(provider, model)
+    latency_source = "observed"
+    if latency_ms is None:
+        latency_ms = DRY_RUN_DEFAULT_LATENCY_MS
+        latency_source = "default"
+    est_wall_sec = (
+        fetch_sec
+        + chats * PAUSE_BETWEEN_CHATS_SEC
+        + len(events) * PAUSE_BETWEEN_MSGS_SEC
+        + ai_calls * latency_ms / 1000
+    )
+
+    return {
+        "ok": True,
+        "dry_run": True,
+        "days": days,
+        "chats": chats,
+        "messages_fetched": messages_fetched,
+        "messages_passed_filters": len(events),
+        "messages_reaching_ai": reaching_ai,
+        "ai_calls": ai_calls,
+        "tokens": {
+            "prompt": prompt_tokens,
+            "completion": completion_tokens,
+            "total": prompt_tokens + completion_tokens,
+        },
+        "model": model,
+        "cost_usd": round(cost, 6) if cost is not None else None,
+        "cost_by_model": cost_by_model,
+        "by_step": [
+            {
+                "step": idx,
+                "name": steps[idx].get("name") or f"Шаг {idx + 1}",
+                **by_step[idx],
+            }
+            for idx in sorted(by_step)
+        ],
+        "latency_ms": round(latency_ms, 1),
+        "latency_source": latency_source,
+        "est_wall_sec": round(est_wall_sec, 1),
+    }
+
+
+async def run_backscan_dry(prompt_rid: str, *, days: int) -> dict[str, Any]:
+    """
+    Оценка прогона backscan без LLM-вызовов и уведомлений:
+    сколько сообщений дойдёт до AI, токены, стоимость, время.
+    Фоновая задача под тем же _running, что и прогон (одна выборка истории
+    на ресурс); прогресс и итоговый отчёт (snapshot.result) — в канал
+    progress_key("backscan", rid). meta_json.backscan не трогаем.
+    """
+    rid = str(prompt_rid)
+    if rid in _running:
+        return {"ok": False, "error": "ALREADY_RUNNING"}
+
+    days = max(1, min(int(days), MAX_DAYS))
+    _running.add(rid)
+    tracker = ProgressTracker(progress_key("backscan", rid))
+    tracker.message = "dry-run"
+    tracker.publish(force=True)
+    report: dict[str, Any] = {"ok": False, "error": "BACKSCAN_FAILED"}
+
+    try:
+        report = await _run_backscan_dry_impl(rid, days=days, tracker=tracker)
+        return report
     finally:
         _running.discard(rid)
+        tracker.result = report
+        if report.get("ok"):
+            tracker.finish("done", f"dry-run: ai_calls={report.get('ai_calls', 0)}")
+        else:
+            tracker.finish("error", report.get("detail") or report.get("error"))
+
+
+async def _run_backscan_dry_impl(
+    rid: str, *, days: int, tracker: ProgressTracker
+) -> dict[str, Any]:
+    db = SessionLocal()
+    try:
+        row = db.get(Resource, UUID(rid))
+        if not row or row.provider != "prompt":
+            return {"ok": False, "error": "NOT_FOUND"}
+        meta = row.meta_json or {}
+        sources = meta.get("sources") or {}
+        filters = meta.get("filters") or {}
+        ai_cfg = meta.get("ai") or {}
+        prompt_cfg = meta.get("prompt") or {}
+        session_rid = sources.get("telegram_session_rid")
+        if not session_rid:
+            return {"ok": False, "error": "NO_SESSION"}
+        creds = resolve_tg_creds(db, meta)
+        if not creds:
+            return {"ok": False, "error": "NO_CREDS"}
+        whitelist = [
+            str(x).strip()
+            for x in (filters.get("whitelist") or [])
+            if str(x).strip()
+        ]
+        if not whitelist:
+            return {"ok": False, "error": "NO_WHITELIST"}
+        steps = prompt_cfg.get("steps") or []
+        if not steps:
+            return {"ok": False, "error": "NO_STEPS"}
+        session_row = db.get(Resource, UUID(str(session_rid)))
+        session_label = (session_row.label if session_row else None) or "Telegram"
+        label = row.label or rid
+    finally:
+        db.close()
+
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    events: list[MessageEvent] = []
+    fetched = 0
+    app_id, app_hash, string_session = creds
+    t0 = time.monotonic()
+    tracker.chats_total = len(whitelist)
+    tracker.publish(force=True)
+
+    try:
+        client = TelegramClient(StringSession(string_session), app_id, app_hash)
+        await client.connect()
+        try:
+            for entry in whitelist:
+                try:
+                    entity = await client.get_entity(_whitelist_target(entry))
+                    entity_cache.put(entity)
+                except Exception as e:
+                    print(f"[BACKSCAN] dry-run skip {entry!r}: {e!r}", flush=True)
+                    tracker.chats_done += 1
+                    tracker.publish(force=True)
+                    continue
+                async for msg in client.iter_messages(entity, limit=MAX_MSGS_PER_CHAT):
+                    if not msg or not getattr(msg, "date", None):
+                        continue
+                    msg_dt = msg.date
+                    if msg_dt.tzinfo is None:
+                        msg_dt = msg_dt.replace(tzinfo=timezone.utc)
+                    if msg_dt < since:
+                        break
+                    fetched += 1
+                    tracker.messages = fetched
+                    tracker.publish()
+                    event = _message_event(
+                        session_rid=str(session_rid),
+                        session_label=session_label,
+                        entity=entity,
+                        msg=msg,
+                    )
+                    if event and _passes_filters(event, filters, label=label):
+                        events.append(event)
+                tracker.chats_done += 1
+                tracker.publish(force=True)
+        finally:
+            await client.disconnect()
+    except Exception as e:
+        return {"ok": False, "error": "BACKSCAN_FAILED", "detail": str(e)}
+
+    key_field = ai_cfg.get("api_key_field") or ""
+    report = _dry_run_report(
+        events=events,
+        steps=steps,
+        full_system=_build_full_system(prompt_cfg),
+        model=ai_cfg.get("model") or "",
+        provider=provider_from_key_field(key_field).value,
+        chats=len(whitelist),
+        messages_fetched=fetched,
+        fetch_sec=time.monotonic() - t0,
+        days=days,
+    )
+    print(
+        f"[BACKSCAN] dry-run {label}({rid}): fetched={fetched} "
+        f"passed={len(events)} ai_calls={report['ai_calls']} "
+        f"cost={report['cost_usd']}",
+        flush=True,
+    )
+    return report
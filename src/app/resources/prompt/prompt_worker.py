@@ -235,6 +235,69 @@ def _message_link(event: MessageEvent) -> str | None:
     return None
 
 
+def _build_full_system(prompt_cfg: dict) -> str:
+    """Системный промпт: system + контекст + файл контекста + примеры."""
+    system_text = (prompt_cfg.get("system") or "").strip()
+    context_text = (prompt_cfg.get("context") or "").strip()
+    context_file = _read_context_file(prompt_cfg.get("context_file"))
+
+    full_system = system_text
+    if context_text:
+        full_system += f"\n\n--- КОНТЕКСТ ---\n{context_text}"
+    if context_file:
+        full_system += f"\n\n--- ФАЙЛ КОНТЕКСТА ---\n{context_file}"
+
+    examples_block = format_examples_block(get_examples({"prompt": prompt_cfg}))
+    if examples_block:
+        full_system += f"\n\n--- ПРИМЕРЫ ---\n{examples_block}"
+    return full_system
+
+
+def _source_info(event: MessageEvent) -> str:
+    """Читаемая строка источника: "Сессия, Группа, @user" (+ ссылка)."""
+    source_parts: list[str] = []
+    if event.source_label:
+        source_parts.append(event.source_label)
+    if event.chat_name:
+        source_parts.append(event.chat_name)
+    if event.sender_username:
+        source_parts.append(f"@{event.sender_username}")
+    elif event.peer_id:
+        source_parts.append(f"id{event.peer_id}")
+    source_info = ", ".join(source_parts) if source_parts else event.source_type
+    message_link = _message_link(event)
+    if message_link:
+        source_info = f"{source_info}\n🔗 {message_link}"
+    return source_info
+
+
+def _condition_decision(step: dict, event: MessageEvent, incoming_text: str) -> tuple[bool, str]:
+    """Шаг condition (без AI). Возвращает (matched, decision: continue|stop)."""
+    mode = (step.get("condition_mode") or "keywords").lower()
+    on_match = (step.get("on_match") or "continue").lower()
+    on_no_match = (step.get("on_no_match") or "stop").lower()
+    matched = False
+
+    if mode == "keywords":
+        keywords = [k.strip().lower() for k in (step.get("keywords") or []) if k.strip()]
+        if keywords:
+            text_lower = incoming_text.lower()
+            matched = any(kw in text_lower for kw in keywords)
+        else:
+            matched = True  # пустой список → всегда совпадает
+
+    elif mode == "sender":
+        senders = [s.strip().lower().lstrip("@") for s in (step.get("senders") or []) if s.strip()]
+        if senders:
+            uname = (event.sender_username or "").lstrip("@").lower()
+            peer_str = str(event.peer_id)
+            matched = uname in senders or peer_str in senders
+        else:
+            matched = True
+
+    return matched, (on_match if matched else on_no_match)
+
+
 async def _get_api_key_value(api_keys_resource_id: str, api_key_field: str, user_id) -> str | None:
     db = SessionLocal()
     try:
@@ -253,16 +316,39 @@ async def _get_api_key_value(api_keys_resource_id: str, api_key_field: str, user
         db.close()
 
 
+async def _resolve_fallbacks(ai_cfg: dict, user_id) -> list[tuple[str, str, str]]:
+    """
+    ai.fallbacks: [{"api_key_field", "model", "api_keys_resource_id"?}] →
+    [(api_key_field, api_key, model)]; без api_keys_resource_id — тот же, что у основного.
+    """
+    out: list[tuple[str, str, str]] = []
+    for item in ai_cfg.get("fallbacks") or []:
+        if not isinstance(item, dict):
+            continue
+        field = (item.get("api_key_field") or "").strip()
+        model = (item.get("model") or "").strip()
+        keys_rid = item.get("api_keys_resource_id") or ai_cfg.get("api_keys_resource_id")
+        key = await _get_api_key_value(keys_rid, field, user_id) if field and keys_rid else None
+        if key and model:
+            out.append((field, key, model))
+        else:
+            print(f"[PROMPT] fallback skipped: field={field!r} model={model!r}", flush=True)
+    return out
+
+
 async def _call_ai(
     api_key: str,
     api_key_field: str,
     model: str,
     system: str,
     messages: list[dict],
+    fallbacks: list[tuple[str, str, str]] | None = None,
+    hedge_after_sec: float | None = None,
 ) -> str | None:
-    """Вызов AI через ai_transport."""
+    """Вызов AI через ai_resilience: дедлайн (слот семафора не висит), повторы, фолбэки."""
     try:
-        from src.app.core.ai_transport import AIChatConfig, chat, provider_from_key_field
+        from src.app.core.ai_resilience import ChatPolicy, resilient_chat
+        from src.app.core.ai_transport import AIChatConfig, provider_from_key_field
         provider = provider_from_key_field(api_key_field)
         cfg = AIChatConfig(
             provider=provider,
@@ -270,11 +356,20 @@ async def _call_ai(
             model=model,
             temperature=0.3,
         )
+        fallback_cfgs = [
+            AIChatConfig(provider=provider_from_key_field(f), api_key=k, model=m, temperature=0.3)
+            for f, k, m in fallbacks or ()
+        ]
         full_messages: list[dict] = []
         if system:
             full_messages.append({"role": "system", "content": system})
         full_messages.extend(messages)
-        result = await chat(cfg=cfg, messages=full_messages)
+        result = await resilient_chat(
+            cfg=cfg,
+            messages=full_messages,
+            fallbacks=fallback_cfgs,
+            policy=ChatPolicy(hedge_after_sec=hedge_after_sec),
+        )
         if not result.ok:
             print(f"[PROMPT] _call_ai provider error: {result.error}", flush=True)
             return None
@@ -349,6 +444,8 @@ class PromptWorker:
         self._task: asyncio.Task | None = None
         self._running = False
         self._semaphore = asyncio.Semaphore(3)  # не более 3 параллельных обработок
+        # счётчики для прогресса (backscan): вызовы AI и уведомления хозяину
+        self.stats: dict[str, int] = {"ai_calls": 0, "notified": 0}
 
     @property
     def is_running(self) -> bool:
@@ -457,6 +554,8 @@ class PromptWorker:
         api_key: str | None = None
         api_key_field: str | None = None
         model: str | None = None
+        fallbacks: list[tuple[str, str, str]] = []
+        hedge_after_sec: float | None = None
 
         if needs_ai:
             api_keys_rid = ai_cfg.get("api_keys_resource_id")
@@ -469,39 +568,18 @@ class PromptWorker:
             if not api_key:
                 _log(label, rid, "skip: API key not found")
                 return
+            fallbacks = await _resolve_fallbacks(ai_cfg, user_id)
+            try:
+                hedge_after_sec = float(ai_cfg["hedge_after_ms"]) / 1000 if ai_cfg.get("hedge_after_ms") else None
+            except (TypeError, ValueError):
+                hedge_after_sec = None
 
         # Контекст
-        system_text = (prompt_cfg.get("system") or "").strip()
-        context_text = (prompt_cfg.get("context") or "").strip()
-        context_file = _read_context_file(prompt_cfg.get("context_file"))
-
-        full_system = system_text
-        if context_text:
-            full_system += f"\n\n--- КОНТЕКСТ ---\n{context_text}"
-        if context_file:
-            full_system += f"\n\n--- ФАЙЛ КОНТЕКСТА ---\n{context_file}"
-
-        examples_block = format_examples_block(get_examples({"prompt": prompt_cfg}))
-        if examples_block:
-            full_system += f"\n\n--- ПРИМЕРЫ ---\n{examples_block}"
+        full_system = _build_full_system(prompt_cfg)
 
         # Входящее сообщение
         incoming_text = event.text or f"[{event.msg_type}]"
-
-        # Формируем читаемую строку источника: "Сессия, Группа, @user"
-        source_parts: list[str] = []
-        if event.source_label:
-            source_parts.append(event.source_label)
-        if event.chat_name:
-            source_parts.append(event.chat_name)
-        if event.sender_username:
-            source_parts.append(f"@{event.sender_username}")
-        elif event.peer_id:
-            source_parts.append(f"id{event.peer_id}")
-        source_info = ", ".join(source_parts) if source_parts else event.source_type
-        message_link = _message_link(event)
-        if message_link:
-            source_info = f"{source_info}\n🔗 {message_link}"
+        source_info = _source_info(event)
 
         # Накопленный диалог (используется в AI-шагах)
         accumulated: list[dict] = [
@@ -519,29 +597,8 @@ class PromptWorker:
 
             # ── ТИП 1: УСЛОВИЕ (без AI) ──────────────────────────────────────
             if step_type == "condition":
-                mode     = (step.get("condition_mode") or "keywords").lower()
-                on_match = (step.get("on_match")    or "continue").lower()
-                on_no_match = (step.get("on_no_match") or "stop").lower()
-                matched = False
-
-                if mode == "keywords":
-                    keywords = [k.strip().lower() for k in (step.get("keywords") or []) if k.strip()]
-                    if keywords:
-                        text_lower = incoming_text.lower()
-                        matched = any(kw in text_lower for kw in keywords)
-                    else:
-                        matched = True  # пустой список → всегда совпадает
-
-                elif mode == "sender":
-                    senders = [s.strip().lower().lstrip("@") for s in (step.get("senders") or []) if s.strip()]
-                    if senders:
-                        uname = (event.sender_username or "").lstrip("@").lower()
-                        peer_str = str(event.peer_id)
-                        matched = uname in senders or peer_str in senders
-                    else:
-                        matched = True
-
-                decision = on_match if matched else on_no_match
+                mode = (step.get("condition_mode") or "keywords").lower()
+                matched, decision = _condition_decision(step, event, incoming_text)
                 _log(label, rid, f"step[{i}] {step_name} condition={mode} matched={matched} → {decision}")
                 if decision == "stop":
                     return  # игнорируем это сообщение
@@ -559,12 +616,15 @@ class PromptWorker:
                 if instruction:
                     step_system += f"\n\n--- ЗАДАЧА: {step_name} ---\n{instruction}"
 
+                self.stats["ai_calls"] += 1
                 response = await _call_ai(
                     api_key=api_key,  # type: ignore[arg-type]
                     api_key_field=api_key_field,  # type: ignore[arg-type]
                     model=model,  # type: ignore[arg-type]
                     system=step_system,
                     messages=accumulated,
+                    fallbacks=fallbacks,
+                    hedge_after_sec=hedge_after_sec,
                 )
 
                 if not response:
@@ -588,6 +648,7 @@ class PromptWorker:
                             f"💡 {response}"
                         )
                         await _notify_owner(bot_rid, owner_tg_id, notification)
+                        self.stats["notified"] += 1
                         _log(label, rid, f"notified owner tg_id={owner_tg_id}")
                 elif action == "continue":
                     match_result = _extract_ai_match(response)
@@ -636,6 +697,7 @@ class PromptWorker:
                                     from_chat_id=event.chat_id,
                                     msg_id=event.msg_id,
                                     grouped_id=grouped_id,
+                                    media=(event.raw or {}).get("media"),
                                 )
                                 if photos:
                                     # Используем текст из download_album (там подпись точно есть)
@@ -651,20 +713,25 @@ class PromptWorker:
                     if not sent_as_media:
                         notification = f"{header}\n\n{body}"
                         await _notify_owner(bot_rid, owner_tg_id, notification)
+                    self.stats["notified"] += 1
                     _log(label, rid, f"step[{i}] {step_name} notify direct → owner={owner_tg_id}")
 
                 elif notify_mode == "ai_formatted":
                     instruction = (step.get("notify_instruction") or "Сформируй краткое уведомление хозяину").strip()
                     step_system = full_system + f"\n\n--- ЗАДАЧА: {step_name} ---\n{instruction}"
+                    self.stats["ai_calls"] += 1
                     response = await _call_ai(
                         api_key=api_key,  # type: ignore[arg-type]
                         api_key_field=api_key_field,  # type: ignore[arg-type]
                         model=model,  # type: ignore[arg-type]
                         system=step_system,
                         messages=accumulated,
+                        fallbacks=fallbacks,
+                        hedge_after_sec=hedge_after_sec,
                     )
                     if response and _is_deliverable_notify_text(response):
                         await _notify_owner(bot_rid, owner_tg_id, response)
+                        self.stats["notified"] += 1
                         _log(label, rid, f"step[{i}] {step_name} notify ai_formatted → owner={owner_tg_id}")
                     else:
                         _log(label, rid, f"step[{i}] {step_name} notify ai_formatted: skip undeliverable")
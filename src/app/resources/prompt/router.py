@@ -11,10 +11,11 @@ from sqlalchemy.orm import Session as SASession
 
 from src.app.core.auth import get_current_user
 from src.app.core.db import get_db
+from src.app.core.progress import mark_queued, progress_key, progress_stream
 from src.app.resources.chat_base.export import accepted_whitelist_entries
 from src.app.resources.chat_base.meta import normalize_meta as normalize_chat_base_meta
 from src.app.resources.prompt.backscan import is_running as backscan_is_running
-from src.app.resources.prompt.backscan import run_backscan
+from src.app.resources.prompt.backscan import run_backscan, run_backscan_dry
 from src.models.resource import Resource
 
 router = APIRouter(prefix="/api/prompt", tags=["prompt"])
@@ -289,10 +290,32 @@ async def start_backscan(
     except Exception:
         days = 7
     days = max(1, min(days, 30))
+    mark_queued(progress_key("backscan", str(row.id)))
+    if payload.get("dry_run"):
+        # Оценка без LLM и уведомлений — фоном, как прогон; отчёт — в финальном снимке /backscan/stream
+        background_tasks.add_task(run_backscan_dry, str(row.id), days=days)
+        return {"ok": True, "message": "dry_run_started", "days": days}
     background_tasks.add_task(run_backscan, str(row.id), days=days)
     return {"ok": True, "message": "backscan_started", "days": days}
 
 
+@router.get("/{rid}/backscan/stream")
+async def stream_backscan(
+    rid: str,
+    db: SASession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """SSE: прогресс backscan (чаты, сообщения/сек, AI-вызовы, совпадения, ETA)."""
+    rid_uuid = _uuid(rid)
+    row = db.query(Resource).filter(Resource.id == rid_uuid).first()
+    if not row or row.user_id != user.id or row.provider != "prompt":
+        raise HTTPException(status_code=404, detail="NOT_FOUND")
+    return progress_stream(
+        progress_key("backscan", str(row.id)),
+        running=backscan_is_running(str(row.id)),
+    )
+
+
 @router.post("/{rid}/import-chat-base")
 async def import_chat_base_whitelist(
     rid: str,
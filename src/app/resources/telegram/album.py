@@ -0,0 +1,126 @@
+# src/app/resources/telegram/album.py
+"""
+Сборщик альбомов Telegram (сообщения с общим grouped_id).
+
+Telegram присылает альбом как N отдельных NewMessage с одним grouped_id,
+подпись может быть в любом из них. Сборщик копит части в буфере и отдаёт
+альбом целиком, когда новых частей не было ALBUM_WINDOW_SEC
+(но не позже ALBUM_MAX_WAIT_SEC от первой части).
+
+Сроки хранятся в куче (heapq) с ленивым удалением: продление буфера кладёт
+новую запись, устаревшие записи отбрасываются при извлечении.
+Один фоновый таск на воркер; спит до ближайшего срока. close() отдаёт
+недособранные альбомы сразу — при остановке воркера части не теряются.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+ALBUM_WINDOW_SEC = 1.0
+ALBUM_MAX_WAIT_SEC = 5.0
+
+
+@dataclass
+class AlbumBuffer:
+    key: Hashable
+    first_seen: float
+    deadline: float
+    context: Any = None              # данные первой части (шаблон события)
+    parts: list[Any] = field(default_factory=list)
+
+
+class AlbumAggregator:
+    def __init__(
+        self,
+        on_complete: Callable[[AlbumBuffer], Awaitable[None]],
+        *,
+        window_sec: float = ALBUM_WINDOW_SEC,
+        max_wait_sec: float = ALBUM_MAX_WAIT_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._on_complete = on_complete
+        self.window_sec = float(window_sec)
+        self.max_wait_sec = float(max_wait_sec)
+        self._clock = clock
+        self._buffers: dict[Hashable, AlbumBuffer] = {}
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._seq = 0  # tie-breaker для кучи (ключи могут быть несравнимы)
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffers)
+
+    def add(self, key: Hashable, part: Any, context: Any = None) -> bool:
+        """Добавить часть альбома. True — это первая часть (новый буфер)."""
+        now = self._clock()
+        buf = self._buffers.get(key)
+        is_new = buf is None
+        if buf is None:
+            buf = AlbumBuffer(key=key, first_seen=now, deadline=now, context=context)
+            self._buffers[key] = buf
+        buf.parts.append(part)
+        buf.deadline = min(now + self.window_sec, buf.first_seen + self.max_wait_sec)
+
+        self._seq += 1
+        heapq.heappush(self._heap, (buf.deadline, self._seq, key))
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return is_new
+
+    def _pop_due(self, now: float) -> list[AlbumBuffer]:
+        due: list[AlbumBuffer] = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            buf = self._buffers.get(key)
+            if buf is None or buf.deadline != deadline:
+                continue  # буфер уже отдан или продлён — запись устарела
+            due.append(self._buffers.pop(key))
+        return due
+
+    async def _emit(self, buf: AlbumBuffer) -> None:
+        try:
+            await self._on_complete(buf)
+        except Exception as e:
+            print(f"[ALBUM] on_complete error key={buf.key!r}: {e!r}", flush=True)
+
+    async def _run(self) -> None:
+        while self._heap:
+            for buf in self._pop_due(self._clock()):
+                await self._emit(buf)
+            if not self._heap:
+                break
+            wait = max(self._heap[0][0] - self._clock(), 0.0)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def flush(self) -> None:
+        """Отдать все накопленные альбомы немедленно."""
+        bufs = list(self._buffers.values())
+        self._buffers.clear()
+        self._heap.clear()
+        for buf in bufs:
+            await self._emit(buf)
+
+    async def close(self) -> None:
+        """
+        Остановить фоновый таск и отдать недособранные альбомы: их части уже
+        помечены в SeenStore, догонялка после рестарта их не перечитает.
+        """
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        await self.flush()
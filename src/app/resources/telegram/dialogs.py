@@ -0,0 +1,309 @@
+# src/app/resources/telegram/dialogs.py
+"""
+Снимок диалогов Telegram-сессии (tg_dialogs) для выбора чатов в UI.
+
+- Полный снимок: get_dialogs при старте воркера и по запросу обновления
+  (живое соединение воркера, без нового TelegramClient).
+- Инкрементально: каждое входящее сообщение воркера обновляет строку
+  своего чата (название, username, last_message_at) — батчем раз в
+  DIALOGS_FLUSH_SEC.
+- Запрос обновления из web: tg_dialog_snapshots.refresh_requested_at;
+  воркер (botworker) замечает его в том же цикле и перечитывает диалоги.
+  Неудачное обновление (get_dialogs упал) повторяется с экспоненциальной
+  паузой до REFRESH_BACKOFF_MAX_SEC, а не каждые DIALOGS_FLUSH_SEC.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session as SASession
+from telethon import utils
+from telethon.tl.types import Channel, Chat, User
+
+from src.app.core.db import SessionLocal
+from src.app.core.entity_cache import EntityInfo
+
+DIALOGS_LIMIT = 200
+DIALOGS_FLUSH_SEC = 5.0
+# Запрос обновления, не выполненный за это время, web выполняет сам
+REFRESH_STALE_SEC = 60.0
+REFRESH_BACKOFF_MAX_SEC = 600.0
+
+
+@dataclass(frozen=True)
+class DialogRow:
+    peer_id: int
+    kind: str                 # user | group | channel
+    name: str
+    username: str | None = None
+    last_message_at: datetime | None = None
+
+    def as_api(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "username": f"@{self.username}" if self.username else None,
+            "peer_id": str(self.peer_id),
+            "kind": self.kind,
+            "last_message_at": self.last_message_at.isoformat() if self.last_message_at else None,
+        }
+
+
+def dialog_row(entity: Any, last_message_at: datetime | None = None) -> DialogRow | None:
+    """Строка снимка из User/Chat/Channel (боты пропускаются)."""
+    if isinstance(entity, User):
+        if entity.bot:
+            return None
+        name = " ".join(filter(None, [entity.first_name, entity.last_name])) or f"user_{entity.id}"
+        kind = "user"
+    elif isinstance(entity, Chat):
+        name = entity.title or f"chat_{entity.id}"
+        kind = "group"
+    elif isinstance(entity, Channel):
+        name = entity.title or f"channel_{entity.id}"
+        kind = "channel" if entity.broadcast else "group"
+    else:
+        return None
+    return DialogRow(
+        peer_id=int(utils.get_peer_id(entity)),
+        kind=kind,
+        name=name,
+        username=getattr(entity, "username", None) or None,
+        last_message_at=last_message_at,
+    )
+
+
+def dialog_from_info(
+    info: EntityInfo | None, *, peer_id: int, peer_type: str, at: datetime | None
+) -> DialogRow | None:
+    """Строка снимка из кэша сущностей (живое сообщение воркера)."""
+    if info is None or info.is_bot:
+        return None
+    if peer_type == "private":
+        name = info.display_name or info.username or f"user_{peer_id}"
+        kind = "user"
+    elif peer_type in ("group", "channel"):
+        name = info.title or f"chat_{peer_id}"
+        kind = peer_type
+    else:
+        return None
+    return DialogRow(peer_id=int(peer_id), kind=kind, name=name, username=info.username, last_message_at=at)
+
+
+_SQL_UPSERT_DIALOGS = text("""
+INSERT INTO tg_dialogs (resource_id, peer_id, kind, name, username, last_message_at, updated_at)
+SELECT CAST(:rid AS uuid), p, k, n, u, t, now()
+FROM unnest(
+    CAST(:peer_ids AS bigint[]), CAST(:kinds AS text[]), CAST(:names AS text[]),
+    CAST(:usernames AS text[]), CAST(:last_at AS timestamptz[])
+) AS x(p, k, n, u, t)
+ON CONFLICT (resource_id, peer_id) DO UPDATE
+SET kind = EXCLUDED.kind,
+    name = EXCLUDED.name,
+    username = EXCLUDED.username,
+    last_message_at = GREATEST(tg_dialogs.last_message_at, EXCLUDED.last_message_at),
+    updated_at = now()
+""")
+
+_SQL_DELETE_STALE = text("""
+DELETE FROM tg_dialogs
+WHERE resource_id = CAST(:rid AS uuid) AND NOT (peer_id = ANY(CAST(:peer_ids AS bigint[])))
+""")
+
+_SQL_MARK_REFRESHED = text("""
+INSERT INTO tg_dialog_snapshots (resource_id, refreshed_at)
+VALUES (CAST(:rid AS uuid), now())
+ON CONFLICT (resource_id) DO UPDATE SET refreshed_at = now()
+""")
+
+_SQL_REQUEST_REFRESH = text("""
+INSERT INTO tg_dialog_snapshots (resource_id, refresh_requested_at)
+VALUES (CAST(:rid AS uuid), now())
+ON CONFLICT (resource_id) DO UPDATE SET refresh_requested_at = now()
+""")
+
+_SQL_STATE = text("""
+SELECT refreshed_at, refresh_requested_at
+FROM tg_dialog_snapshots WHERE resource_id = CAST(:rid AS uuid)
+""")
+
+_SQL_LIST = text("""
+SELECT peer_id, kind, name, username, last_message_at, count(*) OVER () AS total
+FROM tg_dialogs
+WHERE resource_id = CAST(:rid AS uuid)
+  AND (CAST(:kind AS text) IS NULL OR kind = CAST(:kind AS text))
+  AND (CAST(:q AS text) IS NULL
+       OR name ILIKE CAST(:q AS text) ESCAPE '\\'
+       OR username ILIKE CAST(:q AS text) ESCAPE '\\')
+ORDER BY last_message_at DESC NULLS LAST, name
+OFFSET :offset LIMIT :limit
+""")
+
+
+def upsert_dialogs_sync(resource_id: str, rows: Iterable[DialogRow], *, full: bool) -> int:
+    """full=True — полный снимок: строки не из списка удаляются, refreshed_at = now()."""
+    rows = list({r.peer_id: r for r in rows}.values())
+    params = {
+        "rid": str(resource_id),
+        "peer_ids": [r.peer_id for r in rows],
+        "kinds": [r.kind for r in rows],
+        "names": [r.name for r in rows],
+        "usernames": [r.username for r in rows],
+        "last_at": [r.last_message_at for r in rows],
+    }
+    db = SessionLocal()
+    try:
+        if rows:
+            db.execute(_SQL_UPSERT_DIALOGS, params)
+        if full:
+            db.execute(_SQL_DELETE_STALE, {"rid": params["rid"], "peer_ids": params["peer_ids"]})
+            db.execute(_SQL_MARK_REFRESHED, {"rid": params["rid"]})
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+
+def request_refresh(db: SASession, resource_id: str) -> None:
+    db.execute(_SQL_REQUEST_REFRESH, {"rid": str(resource_id)})
+    db.commit()
+
+
+def snapshot_state(db: SASession, resource_id: str) -> tuple[datetime | None, datetime | None] | None:
+    """(refreshed_at, refresh_requested_at) или None, если снимка ещё не было."""
+    row = db.execute(_SQL_STATE, {"rid": str(resource_id)}).first()
+    return (row[0], row[1]) if row else None
+
+
+def refresh_pending(state: tuple[datetime | None, datetime | None] | None) -> bool:
+    if not state or not state[1]:
+        return False
+    refreshed_at, requested_at = state
+    return refreshed_at is None or requested_at > refreshed_at
+
+
+def like_pattern(q: str) -> str:
+    """Подстрока для ILIKE … ESCAPE '\\': %, _ и \\ из ввода — буквальные."""
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def list_dialogs(
+    db: SASession,
+    resource_id: str,
+    *,
+    q: str | None = None,
+    kind: str | None = None,
+    offset: int = 0,
+    limit: int = DIALOGS_LIMIT,
+) -> tuple[list[dict[str, Any]], int]:
+    q = (q or "").strip().lstrip("@")
+    rows = db.execute(_SQL_LIST, {
+        "rid": str(resource_id),
+        "kind": kind or None,
+        "q": like_pattern(q) if q else None,
+        "offset": max(int(offset), 0),
+        "limit": max(1, min(int(limit), 1000)),
+    }).all()
+    total = int(rows[0][5]) if rows else 0
+    items = [
+        DialogRow(
+            peer_id=int(r[0]), kind=r[1], name=r[2], username=r[3], last_message_at=r[4]
+        ).as_api()
+        for r in rows
+    ]
+    return items, total
+
+
+class DialogSnapshotWriter:
+    """
+    Сторона воркера: копит обновления строк и пишет их батчем;
+    в том же цикле проверяет запрос полного обновления из web.
+
+    on_refresh() → True, если снимок записан; False/исключение — следующая
+    попытка через DIALOGS_FLUSH_SEC * 2^n (до REFRESH_BACKOFF_MAX_SEC).
+    """
+
+    def __init__(
+        self,
+        resource_id: str,
+        on_refresh: Callable[[], Awaitable[bool]],
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.resource_id = str(resource_id)
+        self._on_refresh = on_refresh
+        self._clock = clock
+        self._pending: dict[int, DialogRow] = {}
+        self._task: asyncio.Task | None = None
+        self.refresh_failures = 0
+        self._retry_at = 0.0
+
+    def _log(self, msg: str) -> None:
+        print(f"[TG_DIALOGS] {self.resource_id} {msg}", flush=True)
+
+    def touch(self, row: DialogRow | None) -> None:
+        if row is not None:
+            self._pending[row.peer_id] = row
+
+    async def write_full(self, rows: Iterable[DialogRow]) -> int:
+        return await asyncio.to_thread(upsert_dialogs_sync, self.resource_id, list(rows), full=True)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        rows, self._pending = list(self._pending.values()), {}
+        try:
+            await asyncio.to_thread(upsert_dialogs_sync, self.resource_id, rows, full=False)
+        except Exception as e:
+            self._log(f"flush error ({len(rows)} rows): {e!r}")
+
+    def _refresh_requested_sync(self) -> bool:
+        db = SessionLocal()
+        try:
+            return refresh_pending(snapshot_state(db, self.resource_id))
+        finally:
+            db.close()
+
+    async def check_refresh(self) -> None:
+        """Выполнить запрошенное из web обновление (с паузой после неудач)."""
+        if self._clock() < self._retry_at:
+            return
+        try:
+            if not await asyncio.to_thread(self._refresh_requested_sync):
+                return
+            ok = await self._on_refresh()
+        except Exception as e:
+            self._log(f"refresh error: {e!r}")
+            ok = False
+        if ok:
+            self.refresh_failures, self._retry_at = 0, 0.0
+            return
+        self.refresh_failures += 1
+        delay = min(REFRESH_BACKOFF_MAX_SEC, DIALOGS_FLUSH_SEC * (2 ** self.refresh_failures))
+        self._retry_at = self._clock() + delay
+        self._log(f"refresh failed ({self.refresh_failures} in a row), retry in {delay:.0f}s")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(DIALOGS_FLUSH_SEC)
+            await self.flush()
+            await self.check_refresh()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        await self.flush()
@@ -12,6 +12,16 @@ from sqlalchemy.orm import Session as SASession
 
 from src.app.core.auth import get_current_user
 from src.app.core.db import get_db
+from src.app.resources.telegram.dialogs import (
+    DIALOGS_LIMIT,
+    REFRESH_STALE_SEC,
+    dialog_row,
+    list_dialogs,
+    refresh_pending,
+    request_refresh,
+    snapshot_state,
+    upsert_dialogs_sync,
+)
 from src.models.resource import Resource
 
 # Живые клиенты ожидающие код подтверждения (только в памяти, fallback через БД)
@@ -426,21 +436,13 @@ async def enable_telegram(
     return {"ok": True, "status": row.status, "message": "Ресурс включён"}
 
 
-@router.get("/{rid}/dialogs")
-async def get_telegram_dialogs(
-    rid: str,
-    db: SASession = Depends(get_db),
-    user=Depends(get_current_user),
-):
-    """Возвращает список диалогов (контакты, группы, каналы) из сессии."""
+async def _fetch_dialogs_direct(row: Resource) -> int:
+    """
+    Разовый get_dialogs отдельным клиентом — только когда сессия не запущена
+    в botworker (иначе обновление идёт через живое соединение воркера).
+    """
     from telethon import TelegramClient
     from telethon.sessions import StringSession
-    from telethon.tl.types import User, Chat, Channel
-
-    rid_uuid = _uuid(rid)
-    row = db.query(Resource).filter(Resource.id == rid_uuid).first()
-    if not row or row.user_id != user.id or row.provider != "telegram":
-        raise HTTPException(status_code=404, detail="NOT_FOUND")
 
     creds = _get_creds(row)
     if not creds:
@@ -452,40 +454,11 @@ async def get_telegram_dialogs(
         await asyncio.wait_for(client.connect(), timeout=10)
         if not await asyncio.wait_for(client.is_user_authorized(), timeout=10):
             raise HTTPException(status_code=401, detail="NOT_AUTHORIZED")
-
-        dialogs = await asyncio.wait_for(client.get_dialogs(limit=200), timeout=30)
-
-        result = []
-        for d in dialogs:
-            entity = d.entity
-            if isinstance(entity, User):
-                if entity.bot:
-                    continue
-                name = " ".join(filter(None, [entity.first_name, entity.last_name])) or f"user_{entity.id}"
-                username = entity.username or None
-                kind = "user"
-                peer_id = str(entity.id)
-            elif isinstance(entity, Chat):
-                name = entity.title or f"chat_{entity.id}"
-                username = None
-                kind = "group"
-                peer_id = str(-entity.id)
-            elif isinstance(entity, Channel):
-                name = entity.title or f"channel_{entity.id}"
-                username = entity.username or None
-                kind = "channel" if entity.broadcast else "group"
-                peer_id = str(-1000000000000 - entity.id)
-            else:
-                continue
-
-            result.append({
-                "name": name,
-                "username": f"@{username}" if username else None,
-                "peer_id": peer_id,
-                "kind": kind,
-            })
-
-        return {"ok": True, "dialogs": result}
+        dialogs = await asyncio.wait_for(client.get_dialogs(limit=DIALOGS_LIMIT), timeout=30)
+        rows = [dialog_row(d.entity, getattr(d, "date", None)) for d in dialogs]
+        return await asyncio.to_thread(
+            upsert_dialogs_sync, str(row.id), [r for r in rows if r], full=True
+        )
     finally:
         try:
             await client.disconnect()
@@ -493,6 +466,76 @@ async def get_telegram_dialogs(
             pass
 
 
+def _worker_live(row: Resource) -> bool:
+    return row.status == "active" and row.phase == "running"
+
+
+def _get_owned_session(db: SASession, user, rid: str) -> Resource:
+    row = db.query(Resource).filter(Resource.id == _uuid(rid)).first()
+    if not row or row.user_id != user.id or row.provider != "telegram":
+        raise HTTPException(status_code=404, detail="NOT_FOUND")
+    return row
+
+
+@router.get("/{rid}/dialogs")
+async def get_telegram_dialogs(
+    rid: str,
+    q: str | None = None,
+    kind: str | None = None,
+    offset: int = 0,
+    limit: int = DIALOGS_LIMIT,
+    db: SASession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Диалоги сессии (контакты, группы, каналы) из снимка tg_dialogs.
+    Снимок ведёт воркер сессии; если снимка ещё нет — один раз читаем напрямую.
+    """
+    row = _get_owned_session(db, user, rid)
+
+    state = snapshot_state(db, str(row.id))
+    if state is None or state[0] is None:
+        if not _worker_live(row):
+            await _fetch_dialogs_direct(row)
+            state = snapshot_state(db, str(row.id))
+
+    items, total = list_dialogs(db, str(row.id), q=q, kind=kind, offset=offset, limit=limit)
+    return {
+        "ok": True,
+        "dialogs": items,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "refreshed_at": state[0].isoformat() if state and state[0] else None,
+        "refreshing": refresh_pending(state),
+    }
+
+
+@router.post("/{rid}/dialogs/refresh")
+async def refresh_telegram_dialogs(
+    rid: str,
+    db: SASession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """
+    Полное обновление снимка. Если сессия запущена — просим воркер
+    (живое соединение), иначе читаем напрямую.
+    """
+    row = _get_owned_session(db, user, rid)
+    state = snapshot_state(db, str(row.id))
+
+    stale_request = (
+        refresh_pending(state)
+        and (_utcnow() - state[1]).total_seconds() > REFRESH_STALE_SEC
+    )
+    if _worker_live(row) and not stale_request:
+        request_refresh(db, str(row.id))
+        return {"ok": True, "mode": "live", "refreshing": True}
+
+    count = await _fetch_dialogs_direct(row)
+    return {"ok": True, "mode": "direct", "refreshing": False, "count": count}
+
+
 @router.get("/{rid}/status")
 async def telegram_status(
     rid: str,
@@ -0,0 +1,175 @@
+# src/app/resources/telegram/seen.py
+"""
+Учёт просмотренных сообщений Telegram-сессии (таблица updates_seen).
+
+- Живые сообщения: mark() кладёт (chat_id, msg_id) в буфер, фоновый таск
+  пишет буфер батчем раз в SEEN_FLUSH_SEC (INSERT … ON CONFLICT DO NOTHING).
+- Догонялка после переподключения: last_seen() — последний id по чатам,
+  claim() — атомарно помечает пачку и возвращает только новые пары,
+  поэтому после рестарта одно сообщение не публикуется дважды.
+- Очистка: записи старше SEEN_RETENTION_DAYS удаляются, но последняя
+  запись каждого чата остаётся (иначе догонялка забудет чат).
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from typing import Iterable
+
+from sqlalchemy import text
+
+from src.app.core.db import SessionLocal
+
+SEEN_FLUSH_SEC = 2.0
+SEEN_PRUNE_EVERY_SEC = 3600.0
+SEEN_RETENTION_DAYS = 7
+RECENT_MAX = 5000  # in-memory дедуп (живые + догонялка в одном процессе)
+
+_SQL_INSERT_SEEN = text("""
+INSERT INTO updates_seen (resource_id, chat_id, message_id, seen_at)
+SELECT CAST(:rid AS uuid), c, m, now()
+FROM unnest(CAST(:chats AS bigint[]), CAST(:msgs AS bigint[])) AS t(c, m)
+ON CONFLICT DO NOTHING
+RETURNING chat_id, message_id
+""")
+
+_SQL_LAST_SEEN = text("""
+SELECT chat_id, max(message_id) AS last_id
+FROM updates_seen
+WHERE resource_id = CAST(:rid AS uuid)
+  AND seen_at > now() - make_interval(secs => :max_age)
+GROUP BY chat_id
+ORDER BY max(seen_at) DESC
+LIMIT :limit
+""")
+
+_SQL_PRUNE_SEEN = text("""
+DELETE FROM updates_seen u
+WHERE u.resource_id = CAST(:rid AS uuid)
+  AND u.seen_at < now() - make_interval(days => :days)
+  AND u.message_id < (
+      SELECT max(x.message_id) FROM updates_seen x
+      WHERE x.resource_id = u.resource_id AND x.chat_id = u.chat_id
+  )
+""")
+
+
+class SeenStore:
+    def __init__(self, resource_id: str) -> None:
+        self.resource_id = str(resource_id)
+        self._pending: list[tuple[int, int]] = []
+        self._recent: OrderedDict[tuple[int, int], None] = OrderedDict()
+        self._task: asyncio.Task | None = None
+
+    def _log(self, msg: str) -> None:
+        print(f"[TG_SEEN] {self.resource_id} {msg}", flush=True)
+
+    # ── in-memory ────────────────────────────────────────────────────
+
+    def seen_recently(self, chat_id: int, msg_id: int) -> bool:
+        return (int(chat_id), int(msg_id)) in self._recent
+
+    def _remember(self, key: tuple[int, int]) -> None:
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        while len(self._recent) > RECENT_MAX:
+            self._recent.popitem(last=False)
+
+    def mark(self, chat_id: int, msg_id: int) -> bool:
+        """Пометить живое сообщение. False — уже видели (дубль)."""
+        key = (int(chat_id), int(msg_id))
+        if key in self._recent:
+            return False
+        self._remember(key)
+        self._pending.append(key)
+        return True
+
+    # ── DB (sync, вызываются через asyncio.to_thread) ───────────────
+
+    def _insert_sync(self, pairs: list[tuple[int, int]]) -> set[tuple[int, int]]:
+        db = SessionLocal()
+        try:
+            rows = db.execute(_SQL_INSERT_SEEN, {
+                "rid": self.resource_id,
+                "chats": [p[0] for p in pairs],
+                "msgs": [p[1] for p in pairs],
+            }).all()
+            db.commit()
+            return {(int(r[0]), int(r[1])) for r in rows}
+        finally:
+            db.close()
+
+    def _last_seen_sync(self, max_age_sec: float, limit: int) -> dict[int, int]:
+        db = SessionLocal()
+        try:
+            rows = db.execute(_SQL_LAST_SEEN, {
+                "rid": self.resource_id, "max_age": max_age_sec, "limit": limit,
+            }).all()
+            return {int(r[0]): int(r[1]) for r in rows}
+        finally:
+            db.close()
+
+    def _prune_sync(self) -> int:
+        db = SessionLocal()
+        try:
+            res = db.execute(_SQL_PRUNE_SEEN, {"rid": self.resource_id, "days": SEEN_RETENTION_DAYS})
+            db.commit()
+            return int(res.rowcount or 0)
+        finally:
+            db.close()
+
+    # ── async API ────────────────────────────────────────────────────
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pairs, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self._insert_sync, pairs)
+        except Exception as e:
+            self._log(f"flush error ({len(pairs)} rows): {e!r}")
+
+    async def claim(self, pairs: Iterable[tuple[int, int]]) -> set[tuple[int, int]]:
+        """Пометить пачку и вернуть только те пары, которых раньше не было."""
+        fresh = [
+            (int(c), int(m)) for c, m in pairs
+            if (int(c), int(m)) not in self._recent
+        ]
+        if not fresh:
+            return set()
+        claimed = await asyncio.to_thread(self._insert_sync, fresh)
+        for key in claimed:
+            self._remember(key)
+        return claimed
+
+    async def last_seen(self, *, max_age_sec: float, limit: int) -> dict[int, int]:
+        return await asyncio.to_thread(self._last_seen_sync, max_age_sec, limit)
+
+    async def _run(self) -> None:
+        since_prune = SEEN_PRUNE_EVERY_SEC  # первая очистка сразу после старта
+        while True:
+            await asyncio.sleep(SEEN_FLUSH_SEC)
+            await self.flush()
+            since_prune += SEEN_FLUSH_SEC
+            if since_prune >= SEEN_PRUNE_EVERY_SEC:
+                since_prune = 0.0
+                try:
+                    n = await asyncio.to_thread(self._prune_sync)
+                    if n:
+                        self._log(f"pruned {n} rows")
+                except Exception as e:
+                    self._log(f"prune error: {e!r}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        await self.flush()
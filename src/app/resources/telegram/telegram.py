@@ -2,18 +2,35 @@
 from __future__ import annotations
 
 import asyncio
-import time
-from datetime import datetime, timezone
+import dataclasses
+from datetime import datetime, timedelta, timezone
 
 from telethon import TelegramClient, events
 from telethon.sessions import StringSession
 
 from src.app.core.db import SessionLocal
+from src.app.core.dialog_service import reply_enabled, spawn_reply
+from src.app.core.entity_cache import entity_cache
 from src.app.core.message_bus import MessageEvent, bus
+from src.app.core.stream_reply import ProgressiveReply, edit_interval
+from src.app.resources.telegram.album import AlbumAggregator, AlbumBuffer
+from src.app.resources.telegram.dialogs import (
+    DIALOGS_LIMIT,
+    DialogSnapshotWriter,
+    dialog_from_info,
+    dialog_row,
+)
+from src.app.resources.telegram.seen import SeenStore
 from src.models.resource import Resource
 from src.models.user import User
 
 
+# Догонялка после переподключения (по чатам из updates_seen)
+CATCHUP_MAX_CHATS = 50
+CATCHUP_MAX_MSGS_PER_CHAT = 100
+CATCHUP_MAX_AGE_SEC = 6 * 3600
+
+
 def _utcnow():
     return datetime.now(timezone.utc)
 
@@ -30,7 +47,9 @@ class TelegramWorker:
     Ответственность: подключиться к Telegram, слушать входящие сообщения
     и публиковать их в шину (MessageBus).
 
-    Вся логика правил, фильтрации и AI — в PROMPT-воркере.
+    Правила, фильтрация и уведомления — в PROMPT-воркере. Если у ресурса
+    задан prompt_id — ещё и ответ в личке (dialog_service.spawn_reply
+    с progressive_reply); в группах аккаунт-сессия сам не отвечает.
     """
 
     def __init__(self, resource: Resource):
@@ -40,13 +59,22 @@ class TelegramWorker:
         self._task: asyncio.Task | None = None
         self._running = False
         self._me_id: int | None = None  # ID собственного аккаунта сессии
-        # дедупликация альбомов: grouped_id -> (timestamp, has_text)
-        self._seen_groups: dict[int, tuple[float, bool]] = {}
+        # сборка альбомов: (chat_id, grouped_id) -> все части одним событием
+        self._albums = AlbumAggregator(self._emit_album)
+        # updates_seen: дедуп и догонялка после переподключения
+        self._seen = SeenStore(str(resource.id))
+        # снимок диалогов (tg_dialogs) для UI
+        self._dialogs = DialogSnapshotWriter(str(resource.id), self._refresh_dialogs)
 
     @property
     def is_running(self) -> bool:
         return self._running and self._task is not None and not self._task.done()
 
+    @property
+    def is_alive(self) -> bool:
+        """Ещё может стать running: таск не запускался или не завершился сам (paused / ошибка)."""
+        return self._task is None or not self._task.done()
+
     def update_resource(self, resource: Resource) -> None:
         self.resource = resource
 
@@ -59,6 +87,7 @@ class TelegramWorker:
     async def stop(self) -> None:
         self._stop.set()
         self._running = False
+        await self._albums.close()
         if self.client:
             try:
                 await self.client.disconnect()
@@ -87,6 +116,30 @@ class TelegramWorker:
         finally:
             db.close()
 
+    async def _refresh_dialogs(self) -> bool:
+        """
+        get_dialogs по живому соединению: прогрев кэша сущностей
+        и полный снимок диалогов (tg_dialogs). True — снимок записан.
+        """
+        if not self.client:
+            return False
+        try:
+            dialogs = await asyncio.wait_for(
+                self.client.get_dialogs(limit=DIALOGS_LIMIT), timeout=30
+            )
+        except Exception as e:
+            self._log(f"get_dialogs failed: {e!r}")
+            return False
+        n = entity_cache.warm(d.entity for d in dialogs)
+        rows = [dialog_row(d.entity, getattr(d, "date", None)) for d in dialogs]
+        try:
+            saved = await self._dialogs.write_full(r for r in rows if r)
+        except Exception as e:
+            self._log(f"dialogs snapshot error: {e!r}")
+            return False
+        self._log(f"dialogs loaded: {n} entities cached, {saved} in snapshot")
+        return True
+
     async def start(self) -> None:
         self._log("start() entered")
 
@@ -129,7 +182,7 @@ class TelegramWorker:
             await self._set_state(phase="starting", code=None, message=None)
             self._log("connecting...")
 
-            rid_str = str(self.resource.id)
+            catchup_task: asyncio.Task | None = None
 
             try:
                 self.client = TelegramClient(
@@ -156,6 +209,8 @@ class TelegramWorker:
                 except Exception:
                     self._me_id = None
 
+                await self._refresh_dialogs()
+
                 self._running = True
                 await self._set_state(phase="running", code=None, message=None)
                 self._log("running: authorized; listening NewMessage")
@@ -164,125 +219,14 @@ class TelegramWorker:
                 async def on_message(event):
                     if self._stop.is_set():
                         return
-
-                    # не обрабатываем свои исходящие
-                    if event.out:
-                        return
-
-                    text = (event.raw_text or "").strip()
-                    chat_id = getattr(event, "chat_id", None)
-                    sender_id = getattr(event, "sender_id", None)
-                    msg_id = getattr(getattr(event, "message", None), "id", None)
-
-                    if chat_id is None or msg_id is None:
-                        return
-
-                    # Пропускаем сообщения от своего же аккаунта (пересылки в бота и т.п.)
-                    if self._me_id and sender_id == self._me_id:
-                        return
-
-                    # 1. Определяем тип чата
-                    if getattr(event, "is_private", False):
-                        peer_type = "private"
-                    elif getattr(event, "is_group", False):
-                        peer_type = "group"
-                    elif getattr(event, "is_channel", False):
-                        peer_type = "channel"
-                    else:
-                        peer_type = "chat"
-
-                    # 2. Получаем отправителя
-                    sender_username: str | None = None
-                    is_bot = False
-                    try:
-                        sndr = await event.get_sender()
-                        if sndr:
-                            uname = getattr(sndr, "username", None)
-                            fname = getattr(sndr, "first_name", None)
-                            lname = getattr(sndr, "last_name", None)
-                            is_bot = bool(getattr(sndr, "bot", False))
-                            if uname:
-                                sender_username = uname
-                            elif fname or lname:
-                                sender_username = " ".join(filter(None, [fname, lname]))
-                    except Exception:
-                        pass
-
-                    # Игнорируем сообщения от ботов — предотвращаем петли
-                    if is_bot:
-                        return
-
-                    # Дедупликация альбомов: обрабатываем только первое фото,
-                    # текст подписи будет получен через download_album.
-                    grouped_id = getattr(getattr(event, "message", None), "grouped_id", None)
-                    if grouped_id is not None:
-                        now = time.monotonic()
-                        # чистим устаревшие записи (>60 сек)
-                        self._seen_groups = {
-                            g: v for g, v in self._seen_groups.items()
-                            if now - v[0] < 60
-                        }
-                        if grouped_id in self._seen_groups:
-                            return  # уже обработали первое фото этого альбома
-                        self._seen_groups[grouped_id] = (now, False)
-
-                    # 3. Получаем название и @username группы/канала
-                    chat_name: str | None = None
-                    chat_username: str | None = None
-                    try:
-                        if peer_type in ("group", "channel"):
-                            chat_entity = (
-                                getattr(event, "chat", None) or await event.get_chat()
-                            )
-                            if chat_entity:
-                                chat_name = getattr(chat_entity, "title", None)
-                                cu = getattr(chat_entity, "username", None)
-                                if cu:
-                                    chat_username = cu
-                    except Exception:
-                        pass
-
                     msg = getattr(event, "message", None)
-                    msg_type = "text"
-                    if grouped_id is not None:
-                        msg_type = "album"  # альбом (несколько фото/видео)
-                    elif not text:
-                        if getattr(msg, "voice", None) or getattr(msg, "audio", None):
-                            msg_type = "voice"
-                        elif getattr(msg, "photo", None):
-                            msg_type = "photo"
-                        elif getattr(msg, "document", None) or getattr(msg, "media", None):
-                            msg_type = "file"
-
-                    direction = "OUT" if event.out else "IN"
-                    self._log(
-                        f"{direction} peer_type={peer_type} chat_id={chat_id} "
-                        f"sender_id={sender_id} msg_id={msg_id} "
-                        f"type={msg_type} text={_short_text(text)}"
-                    )
+                    if msg is not None:
+                        await self._handle_message(msg)
 
-                    evt = MessageEvent(
-                        source_type="telegram_session",
-                        source_rid=rid_str,
-                        peer_id=int(sender_id or 0),
-                        peer_type=peer_type,
-                        chat_id=int(chat_id),
-                        sender_username=sender_username,
-                        chat_username=chat_username,
-                        msg_id=int(msg_id),
-                        external_chat_id=str(chat_id),
-                        external_msg_id=str(msg_id),
-                        text=text,
-                        msg_type=msg_type,
-                        source_label=self.resource.label,
-                        chat_name=chat_name,
-                        raw={
-                            "event_type": "new_message",
-                            "grouped_id": grouped_id,
-                        },
-                    )
-
-                    await bus.publish(rid_str, evt)
+                # Фоновые: батч-запись updates_seen и догонялка пропущенного
+                self._seen.start()
+                self._dialogs.start()
+                catchup_task = asyncio.create_task(self._catch_up())
 
                 await self.client.run_until_disconnected()
 
@@ -313,6 +257,10 @@ class TelegramWorker:
                     await asyncio.sleep(5)
             finally:
                 self._running = False
+                if catchup_task and not catchup_task.done():
+                    catchup_task.cancel()
+                await self._seen.close()
+                await self._dialogs.close()
                 if self.client:
                     try:
                         await self.client.disconnect()
@@ -323,17 +271,217 @@ class TelegramWorker:
             await asyncio.sleep(1)
 
 
+    async def _handle_message(self, msg, *, catch_up: bool = False) -> None:
+        """
+        Входящее сообщение (живое или из догонялки) → MessageEvent в шину.
+        msg — Telethon Message (у события NewMessage это event.message).
+        """
+        rid_str = str(self.resource.id)
+        text = (getattr(msg, "raw_text", None) or "").strip()
+        chat_id = getattr(msg, "chat_id", None)
+        sender_id = getattr(msg, "sender_id", None)
+        msg_id = getattr(msg, "id", None)
+
+        if chat_id is None or msg_id is None:
+            return
+
+        # Дедуп: живое сообщение могло уже прийти через догонялку (и наоборот)
+        if not catch_up and not self._seen.mark(chat_id, msg_id):
+            return
+
+        # не обрабатываем свои исходящие
+        if getattr(msg, "out", False):
+            return
+
+        # Пропускаем сообщения от своего же аккаунта (пересылки в бота и т.п.)
+        if self._me_id and sender_id == self._me_id:
+            return
+
+        # 1. Определяем тип чата
+        if getattr(msg, "is_private", False):
+            peer_type = "private"
+        elif getattr(msg, "is_group", False):
+            peer_type = "group"
+        elif getattr(msg, "is_channel", False):
+            peer_type = "channel"
+        else:
+            peer_type = "chat"
+
+        # 2. Получаем отправителя
+        sender_username: str | None = None
+        is_bot = False
+        sndr = None
+        try:
+            sndr = await entity_cache.resolve(sender_id, msg.get_sender)
+            if sndr:
+                is_bot = sndr.is_bot
+                sender_username = sndr.sender_name
+        except Exception:
+            pass
+
+        # Игнорируем сообщения от ботов — предотвращаем петли
+        if is_bot:
+            return
+
+        grouped_id = getattr(msg, "grouped_id", None)
+
+        # 3. Получаем название и @username группы/канала
+        chat_name: str | None = None
+        chat_username: str | None = None
+        chat_info = sndr if peer_type == "private" else None
+        try:
+            if peer_type in ("group", "channel"):
+                chat_info = await entity_cache.resolve(chat_id, msg.get_chat)
+                if chat_info:
+                    chat_name = chat_info.title
+                    chat_username = chat_info.username
+        except Exception:
+            pass
+
+        # Инкрементальное обновление снимка диалогов
+        self._dialogs.touch(dialog_from_info(
+            chat_info, peer_id=int(chat_id), peer_type=peer_type, at=getattr(msg, "date", None),
+        ))
+
+        msg_type = "text"
+        if grouped_id is not None:
+            msg_type = "album"  # альбом (несколько фото/видео)
+        elif not text:
+            if getattr(msg, "voice", None) or getattr(msg, "audio", None):
+                msg_type = "voice"
+            elif getattr(msg, "photo", None):
+                msg_type = "photo"
+            elif getattr(msg, "document", None) or getattr(msg, "media", None):
+                msg_type = "file"
+
+        evt = MessageEvent(
+            source_type="telegram_session",
+            source_rid=rid_str,
+            peer_id=int(sender_id or 0),
+            peer_type=peer_type,
+            chat_id=int(chat_id),
+            sender_username=sender_username,
+            chat_username=chat_username,
+            msg_id=int(msg_id),
+            external_chat_id=str(chat_id),
+            external_msg_id=str(msg_id),
+            text=text,
+            msg_type=msg_type,
+            source_label=self.resource.label,
+            chat_name=chat_name,
+            raw={
+                "event_type": "new_message",
+                "grouped_id": grouped_id,
+                "media": [msg] if msg_type == "photo" else [],
+                "catch_up": catch_up,
+            },
+        )
+
+        # Части альбома копим и публикуем одним событием (_emit_album)
+        if grouped_id is not None:
+            self._albums.add((int(chat_id), grouped_id), msg, evt)
+            return
+
+        direction = "CATCHUP" if catch_up else "IN"
+        self._log(
+            f"{direction} peer_type={peer_type} chat_id={chat_id} "
+            f"sender_id={sender_id} msg_id={msg_id} "
+            f"type={msg_type} text={_short_text(text)}"
+        )
+        await bus.publish(rid_str, evt)
+
+        if text and peer_type == "private" and reply_enabled(self.resource.meta_json):
+            spawn_reply(evt, self.progressive_reply(int(chat_id), peer_type=peer_type))
+
+    async def _catch_up(self) -> None:
+        """
+        После (пере)подключения: по чатам из updates_seen дочитываем сообщения
+        новее последнего увиденного id и публикуем их по порядку.
+        """
+        try:
+            last = await self._seen.last_seen(
+                max_age_sec=CATCHUP_MAX_AGE_SEC, limit=CATCHUP_MAX_CHATS
+            )
+        except Exception as e:
+            self._log(f"catch-up: last_seen error: {e!r}")
+            return
+        if not last:
+            return
+
+        since = _utcnow() - timedelta(seconds=CATCHUP_MAX_AGE_SEC)
+        published = 0
+        for chat_id, last_id in last.items():
+            if self._stop.is_set() or not self.client:
+                return
+            try:
+                msgs = [
+                    m async for m in self.client.iter_messages(
+                        chat_id, min_id=last_id, limit=CATCHUP_MAX_MSGS_PER_CHAT
+                    )
+                ]
+            except Exception as e:
+                self._log(f"catch-up chat_id={chat_id} error: {e!r}")
+                continue
+            msgs = sorted(
+                (m for m in msgs if m and getattr(m, "date", None) and m.date >= since),
+                key=lambda m: m.id,
+            )
+            if not msgs:
+                continue
+            if len(msgs) >= CATCHUP_MAX_MSGS_PER_CHAT:
+                self._log(f"catch-up chat_id={chat_id}: limit {CATCHUP_MAX_MSGS_PER_CHAT} reached")
+            claimed = await self._seen.claim((chat_id, m.id) for m in msgs)
+            for m in msgs:
+                if (int(chat_id), int(m.id)) in claimed:
+                    await self._handle_message(m, catch_up=True)
+                    published += 1
+        self._log(f"catch-up done: chats={len(last)} published={published}")
+
+    async def _emit_album(self, buf: AlbumBuffer) -> None:
+        """Публикует альбом одним событием: все msg_id, подпись, медиа."""
+        msgs = sorted(buf.parts, key=lambda m: m.id)
+        caption = next(
+            ((getattr(m, "message", None) or "").strip() for m in msgs
+             if (getattr(m, "message", None) or "").strip()),
+            "",
+        )
+        media = [m for m in msgs if getattr(m, "photo", None) or getattr(m, "document", None)]
+        first: MessageEvent = buf.context
+        evt = dataclasses.replace(
+            first,
+            msg_id=int(msgs[0].id),
+            external_msg_id=str(msgs[0].id),
+            text=caption,
+            raw={
+                **first.raw,
+                "msg_ids": [int(m.id) for m in msgs],
+                "media": media,
+            },
+        )
+        self._log(
+            f"IN album peer_type={evt.peer_type} chat_id={evt.chat_id} "
+            f"sender_id={evt.peer_id} grouped_id={first.raw.get('grouped_id')} "
+            f"parts={len(msgs)} text={_short_text(caption)}"
+        )
+        await bus.publish(str(self.resource.id), evt)
+
     async def download_album(
         self,
         from_chat_id: int,
         msg_id: int,
         grouped_id: int | None = None,
+        media: list | None = None,
     ) -> tuple[list[bytes], str]:
-        """Скачать все фото альбома. Возвращает (байты фото, текст подписи)."""
+        """
+        Скачать все фото альбома. Возвращает (байты фото, текст подписи).
+        media — сообщения из события (raw["media"]): тогда без get_messages.
+        """
         if not self.client:
             return [], ""
         try:
-            if grouped_id:
+            if media:
+                album_msgs = sorted((m for m in media if m), key=lambda m: m.id)
+            elif grouped_id:
                 nearby = await self.client.get_messages(
                     entity=from_chat_id,
                     min_id=max(1, msg_id - 15),
@@ -364,6 +512,28 @@ class TelegramWorker:
             self._log(f"download_album error: {e!r}")
             return [], ""
 
+    def progressive_reply(
+        self,
+        chat_id: int,
+        *,
+        peer_type: str = "private",
+        reply_to: int | None = None,
+    ) -> ProgressiveReply:
+        """Плейсхолдер + правки для dialog_service.process_incoming(reply=...)."""
+
+        async def send(text: str) -> int:
+            if not self.client:
+                raise RuntimeError("SESSION_NOT_RUNNING")
+            m = await self.client.send_message(chat_id, text, reply_to=reply_to, parse_mode=None)
+            return m.id
+
+        async def edit(message_id: int, text: str) -> None:
+            if not self.client:
+                raise RuntimeError("SESSION_NOT_RUNNING")
+            await self.client.edit_message(chat_id, message_id, text, parse_mode=None)
+
+        return ProgressiveReply(send=send, edit=edit, interval=edit_interval(peer_type))
+
     async def forward_message(self, to_peer: int, from_chat_id: int, msg_id: int) -> bool:
         """Переслать оригинальное сообщение (с медиа) через Telethon."""
         if not self.client:
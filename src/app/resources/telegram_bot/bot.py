@@ -10,7 +10,16 @@ from aiogram.enums import ContentType, ParseMode
 from aiogram.filters import Command
 
 from src.app.core.db import SessionLocal
+from src.app.core.dialog_service import reply_enabled, spawn_reply
 from src.app.core.message_bus import MessageEvent, bus
+from src.app.core.stream_reply import ProgressiveReply, edit_interval
+from src.app.resources.telegram_bot.webhook import (
+    ALLOWED_UPDATES,
+    bot_secret,
+    webhook_enabled,
+    webhook_hub,
+    webhook_url,
+)
 from src.models.resource import Resource
 from src.models.user import User
 
@@ -31,7 +40,9 @@ class TelegramBotWorker:
     Ответственность: подключить бота, слушать входящие сообщения,
     публиковать их в MessageBus.
 
-    Вся логика правил, фильтрации и AI — в PROMPT-воркере.
+    Правила, фильтрация и уведомления — в PROMPT-воркере. Если у ресурса
+    задан prompt_id — ещё и ответ в диалоге (dialog_service.spawn_reply
+    с progressive_reply).
     """
 
     def __init__(self, resource: Resource):
@@ -46,6 +57,11 @@ class TelegramBotWorker:
     def is_running(self) -> bool:
         return self._running and self._task is not None and not self._task.done()
 
+    @property
+    def is_alive(self) -> bool:
+        """Ещё может стать running: таск не запускался или не завершился сам (paused / ошибка)."""
+        return self._task is None or not self._task.done()
+
     def update_resource(self, resource: Resource) -> None:
         self.resource = resource
 
@@ -99,6 +115,32 @@ class TelegramBotWorker:
             self._log(f"send_message error: {e!r}")
             return False
 
+    def progressive_reply(
+        self,
+        chat_id: int | str,
+        *,
+        peer_type: str = "private",
+        reply_to: int | None = None,
+    ) -> ProgressiveReply:
+        """Плейсхолдер + правки для dialog_service.process_incoming(reply=...)."""
+
+        async def send(text: str) -> int:
+            if not self.bot:
+                raise RuntimeError("BOT_NOT_RUNNING")
+            m = await self.bot.send_message(
+                chat_id=chat_id, text=text, parse_mode=None, reply_to_message_id=reply_to,
+            )
+            return m.message_id
+
+        async def edit(message_id: int, text: str) -> None:
+            if not self.bot:
+                raise RuntimeError("BOT_NOT_RUNNING")
+            await self.bot.edit_message_text(
+                text=text, chat_id=chat_id, message_id=message_id, parse_mode=None,
+            )
+
+        return ProgressiveReply(send=send, edit=edit, interval=edit_interval(peer_type))
+
     async def send_media_group(
         self,
         chat_id: int | str,
@@ -122,6 +164,84 @@ class TelegramBotWorker:
             self._log(f"send_media_group error: {e!r}")
             return False
 
+    async def handle_message(self, message: types.Message) -> None:
+        """Входящее сообщение бота (polling или webhook) → MessageEvent в шину."""
+        if self._stop.is_set():
+            return
+
+        # Пересланные сообщения — не обрабатываем
+        if (
+            getattr(message, "forward_origin", None)
+            or getattr(message, "forward_from", None)
+            or getattr(message, "forward_from_chat", None)
+        ):
+            return
+
+        rid_str = str(self.resource.id)
+        chat = message.chat
+        sender = message.from_user
+
+        chat_id = chat.id
+        peer_id = sender.id if sender else 0
+        sender_username = sender.username if sender else None
+
+        text = (message.text or message.caption or "").strip()
+
+        if chat.type == "private":
+            peer_type = "private"
+        elif chat.type in ("group", "supergroup"):
+            peer_type = "group"
+        elif chat.type == "channel":
+            peer_type = "channel"
+        else:
+            peer_type = "chat"
+
+        msg_type = "text"
+        if message.content_type == ContentType.VOICE:
+            msg_type = "voice"
+        elif message.content_type == ContentType.AUDIO:
+            msg_type = "voice"
+        elif message.content_type == ContentType.DOCUMENT:
+            msg_type = "file"
+        elif message.content_type == ContentType.PHOTO:
+            msg_type = "image"
+
+        self._log(
+            f"IN peer_type={peer_type} chat_id={chat_id} "
+            f"sender_id={peer_id} msg_id={message.message_id} "
+            f"type={msg_type} text={_short_text(text)}"
+        )
+
+        evt = MessageEvent(
+            source_type="telegram_bot",
+            source_rid=rid_str,
+            peer_id=peer_id,
+            peer_type=peer_type,
+            chat_id=chat_id,
+            sender_username=sender_username,
+            chat_username=getattr(chat, "username", None),
+            msg_id=message.message_id,
+            external_chat_id=str(chat_id),
+            external_msg_id=str(message.message_id),
+            text=text,
+            msg_type=msg_type,
+            raw={"content_type": message.content_type},
+        )
+        await bus.publish(rid_str, evt)
+
+        if text and msg_type == "text" and peer_type != "channel" and reply_enabled(self.resource.meta_json):
+            spawn_reply(evt, self.progressive_reply(
+                chat_id,
+                peer_type=peer_type,
+                reply_to=message.message_id if peer_type != "private" else None,
+            ))
+
+    async def handle_chat_base_callback(self, cq: types.CallbackQuery) -> None:
+        from src.app.resources.chat_base.notifier import route_callback_query
+
+        self._log(f"chat_base callback data={cq.data!r}")
+        await route_callback_query(cq)
+
     async def start(self) -> None:
         self._log("start() entered")
 
@@ -173,67 +293,7 @@ class TelegramBotWorker:
 
                 @self.dp.message()
                 async def on_message(message: types.Message) -> None:
-                    if self._stop.is_set():
-                        return
-
-                    # Пересланные сообщения — не обрабатываем
-                    if (
-                        getattr(message, "forward_origin", None)
-                        or getattr(message, "forward_from", None)
-                        or getattr(message, "forward_from_chat", None)
-                    ):
-                        return
-
-                    chat = message.chat
-                    sender = message.from_user
-
-                    chat_id = chat.id
-                    peer_id = sender.id if sender else 0
-                    sender_username = sender.username if sender else None
-
-                    text = (message.text or message.caption or "").strip()
-
-                    if chat.type == "private":
-                        peer_type = "private"
-                    elif chat.type in ("group", "supergroup"):
-                        peer_type = "group"
-                    elif chat.type == "channel":
-                        peer_type = "channel"
-                    else:
-                        peer_type = "chat"
-
-                    msg_type = "text"
-                    if message.content_type == ContentType.VOICE:
-                        msg_type = "voice"
-                    elif message.content_type == ContentType.AUDIO:
-                        msg_type = "voice"
-                    elif message.content_type == ContentType.DOCUMENT:
-                        msg_type = "file"
-                    elif message.content_type == ContentType.PHOTO:
-                        msg_type = "image"
-
-                    self._log(
-                        f"IN peer_type={peer_type} chat_id={chat_id} "
-                        f"sender_id={peer_id} msg_id={message.message_id} "
-                        f"type={msg_type} text={_short_text(text)}"
-                    )
-
-                    evt = MessageEvent(
-                        source_type="telegram_bot",
-                        source_rid=rid_str,
-                        peer_id=peer_id,
-                        peer_type=peer_type,
-                        chat_id=chat_id,
-                        sender_username=sender_username,
-                        chat_username=getattr(chat, "username", None),
-                        msg_id=message.message_id,
-                        external_chat_id=str(chat_id),
-                        external_msg_id=str(message.message_id),
-                        text=text,
-                        msg_type=msg_type,
-                        raw={"content_type": message.content_type},
-                    )
-                    await bus.publish(rid_str, evt)
+                    await self.handle_message(message)
 
                 @self.dp.callback_query(
                     lambda cq: (cq.data or "").startswith("cb:")
@@ -241,30 +301,40 @@ class TelegramBotWorker:
                 async def on_chat_base_callback(
                     cq: types.CallbackQuery,
                 ) -> None:
-                    from src.app.resources.chat_base.notifier import (
-                        route_callback_query,
-                    )
-
-                    self._log(f"chat_base callback data={cq.data!r}")
-                    await route_callback_query(cq)
+                    await self.handle_chat_base_callback(cq)
 
                 # Проверяем токен (getMe)
                 me = await self.bot.get_me()
                 self._log(f"authorized as @{me.username} (id={me.id})")
 
-                self._running = True
-                await self._set_state(phase="running", code=None, message=None)
-                self._log("running: polling started")
-
-                await self.dp.start_polling(
-                    self.bot,
-                    handle_signals=False,
-                    allowed_updates=[
-                        "message",
-                        "edited_message",
-                        "callback_query",
-                    ],
-                )
+                if webhook_enabled():
+                    # Push-доставка: апдейты приходят через общий WebhookHub
+                    secret = bot_secret(rid_str, bot_token)
+                    await self.bot.set_webhook(
+                        url=webhook_url(secret),
+                        secret_token=secret,
+                        allowed_updates=ALLOWED_UPDATES,
+                    )
+                    webhook_hub.register(self)
+                    self._running = True
+                    await self._set_state(phase="running", code=None, message=None)
+                    self._log("running: webhook mode")
+                    try:
+                        await self._stop.wait()
+                    finally:
+                        webhook_hub.unregister(self)
+                else:
+                    # Webhook, оставшийся от webhook-режима, блокирует getUpdates
+                    await self.bot.delete_webhook(drop_pending_updates=False)
+                    self._running = True
+                    await self._set_state(phase="running", code=None, message=None)
+                    self._log("running: polling started")
+
+                    await self.dp.start_polling(
+                        self.bot,
+                        handle_signals=False,
+                        allowed_updates=ALLOWED_UPDATES,
+                    )
 
             except asyncio.CancelledError:
                 return
@@ -319,6 +389,9 @@ class BotRegistry:
     def get(self, resource_id: str) -> TelegramBotWorker | None:
         return self._workers.get(str(resource_id))
 
+    def workers(self) -> list[TelegramBotWorker]:
+        return list(self._workers.values())
+
     def status(self) -> dict[str, str]:
         return {rid: "telegram_bot" for rid, w in self._workers.items() if w.is_running}
 
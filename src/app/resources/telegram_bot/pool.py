@@ -0,0 +1,133 @@
+# src/app/resources/telegram_bot/pool.py
+"""
+Пул клиентов aiogram Bot на процесс (ключ — sha256 токена).
+
+- Если в этом процессе запущен TelegramBotWorker с тем же токеном,
+  используется его bot (одно HTTP-соединение на бота).
+- Иначе клиент берётся из пула: aiohttp-сессия с keep-alive живёт между
+  отправками, поэтому N карточек = N запросов, а не N TLS-рукопожатий.
+- Клиент, не использовавшийся BOT_POOL_IDLE_SEC, закрывается при
+  следующем обращении к пулу (занятые клиенты не закрываются).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+POOL_IDLE_SEC = float(os.getenv("BOT_POOL_IDLE_SEC", "300"))
+
+
+def token_key(token: str) -> str:
+    """Ключ пула: токен в открытом виде в памяти/логах не держим."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    bot: Bot
+    last_used: float
+    in_use: int = 0
+
+
+def _live_worker_bot(token: str) -> Bot | None:
+    from src.app.resources.telegram_bot.bot import bot_registry
+
+    for worker in bot_registry.workers():
+        bot = worker.bot
+        if bot is not None and worker.is_running and bot.token == token:
+            return bot
+    return None
+
+
+class BotPool:
+    def __init__(
+        self,
+        *,
+        idle_sec: float = POOL_IDLE_SEC,
+        factory: Callable[[str], Bot] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.idle_sec = float(idle_sec)
+        self._factory = factory or (
+            lambda token: Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        )
+        self._clock = clock
+        self._entries: dict[str, _Entry] = {}
+        self._lock = asyncio.Lock()
+        self.created = 0
+        self.reused_worker = 0
+
+    def _log(self, msg: str) -> None:
+        print(f"[BOT_POOL] {msg}", flush=True)
+
+    async def _close(self, key: str, entry: _Entry) -> None:
+        try:
+            await entry.bot.session.close()
+        except Exception as e:
+            self._log(f"close error key={key[:8]}: {e!r}")
+
+    async def evict_idle(self) -> int:
+        now = self._clock()
+        async with self._lock:
+            stale = [
+                (k, e) for k, e in self._entries.items()
+                if e.in_use == 0 and now - e.last_used >= self.idle_sec
+            ]
+            for k, _ in stale:
+                self._entries.pop(k, None)
+        for k, e in stale:
+            await self._close(k, e)
+        if stale:
+            self._log(f"evicted {len(stale)} idle clients, pooled={len(self._entries)}")
+        return len(stale)
+
+    @asynccontextmanager
+    async def use(self, token: str) -> AsyncIterator[Bot]:
+        """Бот для токена на время блока. Закрывать сессию не нужно."""
+        await self.evict_idle()
+
+        live = _live_worker_bot(token)
+        if live is not None:
+            self.reused_worker += 1
+            yield live
+            return
+
+        key = token_key(token)
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(bot=self._factory(token), last_used=self._clock())
+                self._entries[key] = entry
+                self.created += 1
+            entry.in_use += 1
+        try:
+            yield entry.bot
+        finally:
+            entry.in_use -= 1
+            entry.last_used = self._clock()
+
+    async def close(self) -> None:
+        async with self._lock:
+            entries, self._entries = list(self._entries.items()), {}
+        for k, e in entries:
+            await self._close(k, e)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pooled": len(self._entries),
+            "in_use": sum(e.in_use for e in self._entries.values()),
+            "created": self.created,
+            "reused_worker": self.reused_worker,
+        }
+
+
+bot_pool = BotPool()
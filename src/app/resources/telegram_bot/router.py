@@ -3,14 +3,17 @@ from __future__ import annotations
 
 from uuid import UUID
 
-from fastapi import APIRouter, Body, Depends, Form, HTTPException
+from fastapi import APIRouter, Body, Depends, Form, Header, HTTPException
 from sqlalchemy.orm import Session as SASession
 
 from src.app.core.auth import get_current_user
 from src.app.core.db import get_db
+from src.app.resources.telegram_bot.webhook import WEBHOOK_PATH, enqueue_update, resolve_secret
 from src.models.resource import Resource
 
 router = APIRouter(prefix="/api/telegram_bot", tags=["telegram_bot"])
+# Публичный (без авторизации) приём апдейтов от Telegram, подключается в main.py
+webhook_router = APIRouter(tags=["telegram_bot"])
 
 
 def _uuid(s: str) -> UUID:
@@ -197,3 +200,20 @@ async def bot_status(
         "last_error_code": row.last_error_code,
         "error_message": row.error_message,
     }
+
+
+@webhook_router.post(f"{WEBHOOK_PATH}/{{bot_secret}}")
+async def telegram_webhook(
+    bot_secret: str,
+    update: dict = Body(...),
+    secret_token: str | None = Header(None, alias="X-Telegram-Bot-Api-Secret-Token"),
+    db: SASession = Depends(get_db),
+):
+    """Апдейт от Telegram → очередь tg_bot_updates (обработает botworker)."""
+    if secret_token != bot_secret:
+        raise HTTPException(status_code=403, detail="FORBIDDEN")
+    rid = resolve_secret(db, bot_secret)
+    if not rid:
+        raise HTTPException(status_code=404, detail="NOT_FOUND")
+    enqueue_update(db, rid, update)
+    return {"ok": True}
@@ -0,0 +1,288 @@
+# src/app/resources/telegram_bot/webhook.py
+"""
+Webhook-режим Telegram-ботов (вместо long-polling на каждого бота).
+
+Включается BOT_WEBHOOK_BASE_URL (публичный https-адрес web-приложения).
+
+  Telegram ──POST /tg/webhook/{secret}──▶ web
+      web: проверяет секрет (+ заголовок X-Telegram-Bot-Api-Secret-Token),
+           кладёт апдейт в tg_bot_updates и делает NOTIFY
+  botworker: WebhookHub слушает LISTEN tg_bot_updates, забирает апдейты
+           своих ботов (claimed_at/claimed_by) и скармливает их одному
+           общему Dispatcher; строка удаляется после обработки. Claim
+           упавшего процесса старше CLAIM_LEASE_SEC забирается снова —
+           Telegram уже получил 200, повторить доставку больше некому.
+
+Очередь в Postgres нужна потому, что боты, PROMPT и MessageBus живут
+в botworker (и могут быть разнесены по шардам), а webhook принимает web.
+Простаивающий бот ничего не стоит: нет ни таска, ни HTTP-соединения.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import time
+import uuid
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session as SASession
+
+from src.app.core.db import DATABASE_URL, SessionLocal
+from src.models.resource import Resource
+
+if TYPE_CHECKING:
+    from src.app.resources.telegram_bot.bot import TelegramBotWorker
+
+WEBHOOK_BASE_URL = os.getenv("BOT_WEBHOOK_BASE_URL", "").strip().rstrip("/")
+WEBHOOK_PATH = "/tg/webhook"
+NOTIFY_CHANNEL = "tg_bot_updates"
+
+ALLOWED_UPDATES = ["message", "edited_message", "callback_query"]
+
+# Опрос очереди без NOTIFY (страховка) и срок жизни невостребованных апдейтов
+POLL_FALLBACK_SEC = 2.0
+STALE_UPDATE_SEC = 24 * 3600
+# Как часто web перечитывает таблицу секретов при промахе
+SECRETS_RELOAD_MIN_SEC = 5.0
+
+
+def webhook_enabled() -> bool:
+    return bool(WEBHOOK_BASE_URL)
+
+
+def bot_secret(resource_id: str, token: str) -> str:
+    """Секрет в URL и в secret_token: стабилен для пары (ресурс, токен)."""
+    return hashlib.sha256(f"{resource_id}:{token}".encode("utf-8")).hexdigest()[:48]
+
+
+def webhook_url(secret: str) -> str:
+    return f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}/{secret}"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# web: приём апдейта
+# ─────────────────────────────────────────────────────────────────────────────
+
+_SQL_ENQUEUE = text("""
+INSERT INTO tg_bot_updates (resource_id, payload)
+VALUES (CAST(:rid AS uuid), CAST(:payload AS jsonb))
+""")
+
+_SQL_NOTIFY = text("SELECT pg_notify(:channel, :rid)")
+
+_secrets: dict[str, str] = {}
+_secrets_loaded_at = 0.0
+
+
+def _reload_secrets(db: SASession) -> None:
+    global _secrets, _secrets_loaded_at
+    rows = (
+        db.query(Resource)
+        .filter(Resource.provider == "telegram_bot", Resource.status == "active")
+        .all()
+    )
+    fresh: dict[str, str] = {}
+    for r in rows:
+        token = (((r.meta_json or {}).get("creds") or {}).get("bot_token") or "").strip()
+        if token:
+            fresh[bot_secret(str(r.id), token)] = str(r.id)
+    _secrets = fresh
+    _secrets_loaded_at = time.monotonic()
+
+
+def resolve_secret(db: SASession, secret: str) -> str | None:
+    """rid активного бота по секрету (кэш процесса, перечитка при промахе)."""
+    rid = _secrets.get(secret)
+    if rid is None and time.monotonic() - _secrets_loaded_at >= SECRETS_RELOAD_MIN_SEC:
+        _reload_secrets(db)
+        rid = _secrets.get(secret)
+    return rid
+
+
+def enqueue_update(db: SASession, resource_id: str, update: dict[str, Any]) -> None:
+    db.execute(_SQL_ENQUEUE, {
+        "rid": str(resource_id),
+        "payload": json.dumps(update, ensure_ascii=False),
+    })
+    db.execute(_SQL_NOTIFY, {"channel": NOTIFY_CHANNEL, "rid": str(resource_id)})
+    db.commit()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# botworker: общий диспетчер
+# ─────────────────────────────────────────────────────────────────────────────
+
+_SQL_CLAIM = text("""
+UPDATE tg_bot_updates u
+SET claimed_at = now(), claimed_by = :owner
+FROM (
+    SELECT id FROM tg_bot_updates
+    WHERE resource_id = ANY(CAST(:rids AS uuid[]))
+      AND (claimed_at IS NULL OR claimed_at < now() - make_interval(secs => :lease))
+    ORDER BY id
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+) c
+WHERE u.id = c.id
+RETURNING u.id, u.resource_id, u.payload
+""")
+
+_SQL_ACK = text("""
+DELETE FROM tg_bot_updates WHERE id = :id AND claimed_by = :owner
+""")
+
+_SQL_DROP_STALE = text("""
+DELETE FROM tg_bot_updates WHERE created_at < now() - make_interval(secs => :ttl)
+""")
+
+CLAIM_BATCH = 200
+# claim дольше этого — процесс упал посреди пачки, апдейт забирается снова
+CLAIM_LEASE_SEC = 300.0
+
+
+def _listen_dsn() -> str:
+    return DATABASE_URL.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+class WebhookHub:
+    """
+    Один Dispatcher на все боты процесса. Воркеры регистрируются
+    после set_webhook; апдейты маршрутизируются по resource_id.
+    """
+
+    def __init__(self) -> None:
+        self._workers: dict[str, "TelegramBotWorker"] = {}
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self.dp = None
+        # уникален на запуск: после рестарта (тот же pid в контейнере) свои старые claim'ы не «наши»
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _log(self, msg: str) -> None:
+        print(f"[TG_WEBHOOK] {msg}", flush=True)
+
+    def _build_dispatcher(self):
+        from aiogram import Dispatcher, types
+
+        dp = Dispatcher()
+
+        @dp.message()
+        async def on_message(message: types.Message, worker: "TelegramBotWorker") -> None:
+            await worker.handle_message(message)
+
+        @dp.callback_query(lambda cq: (cq.data or "").startswith("cb:"))
+        async def on_chat_base_callback(cq: types.CallbackQuery, worker: "TelegramBotWorker") -> None:
+            await worker.handle_chat_base_callback(cq)
+
+        return dp
+
+    def register(self, worker: "TelegramBotWorker") -> None:
+        if self.dp is None:
+            self.dp = self._build_dispatcher()
+        self._workers[str(worker.resource.id)] = worker
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wake.set()
+
+    def unregister(self, worker: "TelegramBotWorker") -> None:
+        rid = str(worker.resource.id)
+        if self._workers.get(rid) is worker:
+            self._workers.pop(rid, None)
+
+    def _claim_sync(self, rids: list[str]) -> list[tuple[int, str, dict]]:
+        db = SessionLocal()
+        try:
+            rows = db.execute(_SQL_CLAIM, {
+                "rids": rids, "owner": self.owner, "lease": CLAIM_LEASE_SEC, "limit": CLAIM_BATCH,
+            }).all()
+            db.commit()
+            return sorted(((int(r[0]), str(r[1]), r[2]) for r in rows), key=lambda x: x[0])
+        finally:
+            db.close()
+
+    def _ack_sync(self, update_id: int) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(_SQL_ACK, {"id": int(update_id), "owner": self.owner})
+            db.commit()
+        finally:
+            db.close()
+
+    def _drop_stale_sync(self) -> int:
+        db = SessionLocal()
+        try:
+            res = db.execute(_SQL_DROP_STALE, {"ttl": STALE_UPDATE_SEC})
+            db.commit()
+            return int(res.rowcount or 0)
+        finally:
+            db.close()
+
+    async def _drain(self) -> None:
+        while self._workers:
+            batch = await asyncio.to_thread(self._claim_sync, list(self._workers.keys()))
+            if not batch:
+                return
+            for update_id, rid, payload in batch:
+                worker = self._workers.get(rid)
+                if worker is None or worker.bot is None:
+                    continue  # claim истечёт — заберёт процесс, где бот запущен
+                try:
+                    await self.dp.feed_raw_update(worker.bot, payload, worker=worker)
+                except Exception as e:
+                    # ошибка обработчика — не повод повторять апдейт до бесконечности
+                    self._log(f"update error rid={rid}: {e!r}")
+                await asyncio.to_thread(self._ack_sync, update_id)
+            if len(batch) < CLAIM_BATCH:
+                return
+
+    async def _listen(self) -> None:
+        """LISTEN в отдельном соединении psycopg; NOTIFY будит _run."""
+        import psycopg
+
+        while self._workers:
+            try:
+                async with await psycopg.AsyncConnection.connect(_listen_dsn(), autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    async for _ in conn.notifies():
+                        self._wake.set()
+                        if not self._workers:
+                            return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._log(f"listen error: {e!r}")
+                await asyncio.sleep(5)
+
+    async def _run(self) -> None:
+        self._log("hub started")
+        listener = asyncio.create_task(self._listen())
+        last_cleanup = 0.0
+        try:
+            while self._workers:
+                self._wake.clear()
+                try:
+                    await self._drain()
+                except Exception as e:
+                    self._log(f"drain error: {e!r}")
+                if time.monotonic() - last_cleanup > 3600:
+                    last_cleanup = time.monotonic()
+                    try:
+                        n = await asyncio.to_thread(self._drop_stale_sync)
+                        if n:
+                            self._log(f"dropped {n} stale updates")
+                    except Exception as e:
+                        self._log(f"cleanup error: {e!r}")
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=POLL_FALLBACK_SEC)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            listener.cancel()
+            self._log("hub stopped")
+
+
+webhook_hub = WebhookHub()
@@ -1,19 +1,31 @@
 # src/models/__init__.py
 from .user import User, RoleEnum
 from .message import Message
+from .message_key import MessageKey
 from .lead import Lead
 from .updates_seen import UpdateSeen
 from .alembic_version import AlembicVersion
 from .resource import Resource
 from .dialog import Dialog
+from .worker_lease import WorkerShard, ResourceLease
+from .tg_dialog import TgDialog, TgDialogSnapshot
+from .tg_bot_update import TgBotUpdate
+from .embedding_cache import EmbeddingCacheEntry
+from .usage_daily import UsageDaily
 
 
 __all__ = [
     "User", "RoleEnum",
     "Message",
+    "MessageKey",
     "Lead",
     "UpdateSeen",
     "AlembicVersion",
     "Resource",
     "Dialog",
+    "WorkerShard", "ResourceLease",
+    "TgDialog", "TgDialogSnapshot",
+    "TgBotUpdate",
+    "EmbeddingCacheEntry",
+    "UsageDaily",
 ]
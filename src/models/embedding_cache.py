@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from src.app.core.db import Base
+
+
+class EmbeddingCacheEntry(Base):
+    """Контентно-адресуемый кэш эмбеддингов: (модель, sha256 нормализованного текста)."""
+
+    __tablename__ = "embedding_cache"
+
+    model: Mapped[str] = mapped_column(String(64), primary_key=True)
+    text_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Без фиксированной размерности: смена модели не требует миграции
+    embedding: Mapped[list] = mapped_column(Vector(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
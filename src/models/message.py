@@ -6,7 +6,7 @@ from typing import Optional, Dict, Any
 
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Text, BigInteger, Integer, DateTime, String, ForeignKey, Boolean, Index, UniqueConstraint
+from sqlalchemy import Text, BigInteger, Integer, DateTime, String, ForeignKey, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.sql import func
@@ -59,8 +59,10 @@ class Message(Base):
         default=dict,
     )
 
+    # ключ секционирования (помесячно, f1b3d5e7a9c2) — поэтому входит в PK
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
+        primary_key=True,
         nullable=False,
         server_default=func.now(),
     )
@@ -80,11 +82,14 @@ class Message(Base):
 
         # новые под диалоги/историю
         Index("ix_messages_dialog_created_at", "dialog_id", "created_at"),
+        # кандидаты для долгой памяти диалога (dialog_memory)
+        Index(
+            "ix_messages_dialog_embedded", "dialog_id", "created_at",
+            postgresql_where=sa_text("embedding IS NOT NULL AND is_internal = false"),
+        ),
         Index("ix_messages_resource_peer_created_at", "resource_id", "peer_id", "created_at"),
 
-        # новая уникальность (в миграции заменим старую uq_messages_provider_chat_msg)
-        UniqueConstraint(
-            "provider", "resource_id", "external_chat_id", "external_msg_id",
-            name="uq_messages_provider_resource_chat_msg",
-        ),
+        # уникальность внешнего ключа — в message_keys (в секционированной
+        # таблице UNIQUE без created_at невозможен)
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
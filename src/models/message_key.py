@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Index, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from src.app.core.db import Base
+
+
+class MessageKey(Base):
+    """Дедуп входящих: внешний ключ сообщения → messages.id (messages секционирована)."""
+
+    __tablename__ = "message_keys"
+
+    provider: Mapped[str] = mapped_column(Text, primary_key=True)
+    resource_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("resources.id", ondelete="CASCADE"), primary_key=True
+    )
+    external_chat_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    external_msg_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    message_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_message_keys_created_at", "created_at"),
+    )
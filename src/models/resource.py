@@ -1,12 +1,14 @@
 # src/models/resource.py
 import uuid
 
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Float
+from sqlalchemy import Column, Date, String, Text, DateTime, ForeignKey, Integer, cast, select
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import column_property
 from sqlalchemy.sql import func
 
 from src.app.core.db import Base
+from src.models.usage_daily import UsageDaily
 
 
 class Resource(Base):
@@ -28,9 +30,20 @@ class Resource(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
-    # учёт и метрики для провайдеров
-    usage_today = Column(Integer, nullable=False, server_default="0")  # кол-во токенов за сегодня
-    cost_today = Column(Float, nullable=False, server_default="0")  # стоимость за сегодня
+    # учёт и метрики для провайдеров: расход за сегодня (UTC) — производный от usage_daily
+    # (пишет core/usage_ledger), грузится только при обращении
+    usage_today = column_property(
+        select(func.coalesce(func.sum(UsageDaily.total_tokens), 0))
+        .where(UsageDaily.resource_id == id, UsageDaily.day == cast(func.timezone("UTC", func.now()), Date))
+        .scalar_subquery(),
+        deferred=True,
+    )  # кол-во токенов за сегодня
+    cost_today = column_property(
+        select(func.coalesce(func.sum(UsageDaily.cost_usd), 0.0))
+        .where(UsageDaily.resource_id == id, UsageDaily.day == cast(func.timezone("UTC", func.now()), Date))
+        .scalar_subquery(),
+        deferred=True,
+    )  # стоимость за сегодня
 
     last_activity = Column(DateTime(timezone=True))  # последняя активность провайдера
     error_message = Column(Text)
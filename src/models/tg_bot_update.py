@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from src.app.core.db import Base
+
+
+class TgBotUpdate(Base):
+    """Очередь апдейтов webhook-ботов: web кладёт, botworker забирает (DELETE … RETURNING)."""
+
+    __tablename__ = "tg_bot_updates"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    resource_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("resources.id", ondelete="CASCADE"), nullable=False
+    )
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSONB, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_tg_bot_updates_resource_id", "resource_id", "id"),
+    )
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from src.app.core.db import Base
+
+
+class TgDialog(Base):
+    """Снимок списка диалогов Telegram-сессии (для выбора чатов в UI)."""
+
+    __tablename__ = "tg_dialogs"
+
+    resource_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("resources.id", ondelete="CASCADE"), primary_key=True
+    )
+    peer_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)  # marked id (-100… для каналов)
+    kind: Mapped[str] = mapped_column(Text, nullable=False)             # user | group | channel
+    name: Mapped[str] = mapped_column(Text, nullable=False)
+    username: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_tg_dialogs_resource_last_message_at", "resource_id", "last_message_at"),
+    )
+
+
+class TgDialogSnapshot(Base):
+    """Состояние снимка: когда обновлён целиком и когда запрошено обновление."""
+
+    __tablename__ = "tg_dialog_snapshots"
+
+    resource_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("resources.id", ondelete="CASCADE"), primary_key=True
+    )
+    refreshed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    refresh_requested_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -2,15 +2,22 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import DateTime, BigInteger
+from sqlalchemy import DateTime, BigInteger, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
 from src.app.core.db import Base
 
 class UpdateSeen(Base):
     __tablename__ = "updates_seen"
 
-    # Композитный PK: (account_id, chat_id, message_id)
-    account_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    # Композитный PK: (resource_id, chat_id, message_id); resource — Telegram-сессия
+    resource_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("resources.id", ondelete="CASCADE"), primary_key=True
+    )
     chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     message_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
-    seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_updates_seen_resource_seen_at", "resource_id", "seen_at"),
+    )
@@ -15,7 +15,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const btnRun = $("#btnRun");
 
     let searchRunning = false;
-    let statusPollTimer = null;
+    let runStream = null;
 
     const DEFAULT_MODELS = {
         "creds.openai_api_key": "gpt-4o-mini",
@@ -55,22 +55,37 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
-    function startStatusPoll() {
-        if (statusPollTimer) return;
-        statusPollTimer = setInterval(async () => {
-            try {
-                await loadResource();
-                if (!searchRunning) stopStatusPoll();
-            } catch (_) {
-                stopStatusPoll();
+    function renderRunProgress(p) {
+        if (!statusEl) return;
+        const parts = [`СТАТУС: ${p.status || "—"}`];
+        if (p.chats_total) parts.push(`запросы ${p.chats_done}/${p.chats_total}`);
+        if (p.messages !== undefined) parts.push(`чатов=${p.messages} (${p.messages_per_sec}/с)`);
+        if (p.matches !== undefined) parts.push(`карточек=${p.matches}`);
+        if (p.eta_sec) parts.push(`ETA ~${Math.ceil(p.eta_sec)} с`);
+        statusEl.textContent = parts.join(" | ");
+    }
+
+    function startRunStream() {
+        if (runStream) return;
+        if (typeof EventSource === "undefined") return;
+        runStream = new EventSource(`/api/chat_base/${rid}/run/stream`, { withCredentials: true });
+        runStream.addEventListener("progress", (ev) => {
+            let p = {};
+            try { p = JSON.parse(ev.data); } catch { return; }
+            renderRunProgress(p);
+            if (["done", "error", "stopped", "idle"].includes(p.status)) {
+                stopRunStream();
+                updateRunButton(false);
+                loadResource().catch(() => {});
             }
-        }, 2000);
+        });
+        runStream.onerror = () => stopRunStream();
     }
 
-    function stopStatusPoll() {
-        if (!statusPollTimer) return;
-        clearInterval(statusPollTimer);
-        statusPollTimer = null;
+    function stopRunStream() {
+        if (!runStream) return;
+        runStream.close();
+        runStream = null;
     }
 
     function showMsg(text, ok) {
@@ -163,10 +178,11 @@ document.addEventListener("DOMContentLoaded", () => {
             }, 50);
         }
         const run = meta.run || {};
-        statusEl.textContent = `СТАТУС: ${run.status || data.phase || "—"} | ${run.message || ""}`;
-        updateRunButton(data.running);
-        if (data.running) startStatusPoll();
-        else stopStatusPoll();
+        if (!runStream) {
+            statusEl.textContent = `СТАТУС: ${run.status || data.phase || "—"} | ${run.message || ""}`;
+        }
+        updateRunButton(data.running || !!runStream);
+        if (data.running) startRunStream();
         renderAccepted(meta);
     }
 
@@ -342,7 +358,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 const data = await r.json();
                 if (!r.ok || !data.ok) throw new Error(data.error || "stop error");
                 showMsg("Останавливаем поиск…", true);
-                startStatusPoll();
+                startRunStream();
                 return;
             }
             await saveResource();
@@ -354,7 +370,7 @@ document.addEventListener("DOMContentLoaded", () => {
             if (!r.ok || !data.ok) throw new Error(data.error || "run error");
             updateRunButton(true);
             showMsg("Поиск запущен — смотри бота", true);
-            startStatusPoll();
+            startRunStream();
             setTimeout(loadResource, 1000);
         } catch (e) {
             showMsg(String(e.message || e), false);
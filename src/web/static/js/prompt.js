@@ -18,6 +18,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const btnImportChatBase = $("#btnImportChatBase");
     const inpBackscanDays = $("#inpBackscanDays");
     const btnBackscan = $("#btnBackscan");
+    const btnBackscanDry = $("#btnBackscanDry");
     const backscanStatus = $("#backscanStatus");
     const selApiKeysRes  = $("#selApiKeysResource");
     const selApiKeyField = $("#selApiKeyField");
@@ -653,11 +654,10 @@ document.addEventListener("DOMContentLoaded", () => {
             resStatus.textContent = `РЕСУРС: ${status}${phase} ${icon}`;
             btnToggle.textContent = status === "active" ? "💡 Остановить" : "💡 Включить";
             btnToggle.dataset.enabled = status === "active" ? "1" : "0";
-            renderBackscanStatus(data.backscan || {}, data.backscan_running);
-            if (!data.backscan_running && backscanPollTimer) {
-                clearInterval(backscanPollTimer);
-                backscanPollTimer = null;
+            if (!backscanStream) {
+                renderBackscanStatus(data.backscan || {}, data.backscan_running);
             }
+            if (data.backscan_running) openBackscanStream();
 
             if (data.error_message) showMsg(data.error_message, false);
         } catch {
@@ -870,7 +870,56 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
 
-    let backscanPollTimer = null;
+    let backscanStream = null;
+
+    function renderDryRunReport(data) {
+        const cost = data.cost_usd == null ? "нет цены модели" : `$${data.cost_usd}`;
+        backscanStatus.textContent =
+            `Оценка за ${data.days} дн.: msgs=${data.messages_fetched}` +
+            ` | после фильтров=${data.messages_passed_filters}` +
+            ` | до AI=${data.messages_reaching_ai}` +
+            ` | AI-вызовов≤${data.ai_calls}` +
+            ` | токенов≈${data.tokens.total}` +
+            ` | ${cost}` +
+            ` | ~${Math.round(data.est_wall_sec)} сек`;
+    }
+
+    function renderBackscanProgress(p) {
+        if (!backscanStatus) return;
+        if (p.result?.dry_run) {
+            renderDryRunReport(p.result);
+            return;
+        }
+        const parts = [`Прогон: ${p.status || "—"}`];
+        if (p.chats_total) parts.push(`чаты ${p.chats_done}/${p.chats_total}`);
+        if (p.messages !== undefined) parts.push(`msgs=${p.messages} (${p.messages_per_sec}/с)`);
+        if (p.ai_calls !== undefined) parts.push(`AI=${p.ai_calls}`);
+        if (p.matches !== undefined) parts.push(`совпадений=${p.matches}`);
+        if (p.eta_sec) parts.push(`ETA ~${Math.ceil(p.eta_sec)} с`);
+        if (p.message) parts.push(p.message);
+        backscanStatus.textContent = parts.join(" | ");
+    }
+
+    function closeBackscanStream() {
+        if (!backscanStream) return;
+        backscanStream.close();
+        backscanStream = null;
+    }
+
+    function openBackscanStream() {
+        if (backscanStream || typeof EventSource === "undefined") return;
+        backscanStream = new EventSource(`/api/prompt/${id}/backscan/stream`, { withCredentials: true });
+        backscanStream.addEventListener("progress", (ev) => {
+            let p = {};
+            try { p = JSON.parse(ev.data); } catch { return; }
+            renderBackscanProgress(p);
+            if (["done", "error", "stopped", "idle"].includes(p.status)) {
+                closeBackscanStream();
+                if (!p.result?.dry_run) loadResStatus();  // отчёт оценки не затираем статусом прогона
+            }
+        });
+        backscanStream.onerror = () => closeBackscanStream();
+    }
 
     btnBackscan?.addEventListener("click", async () => {
         const days = parseInt(inpBackscanDays?.value || "7", 10) || 7;
@@ -885,9 +934,29 @@ document.addEventListener("DOMContentLoaded", () => {
             const data = await r.json();
             if (!r.ok || !data.ok) throw new Error(data.error || "backscan failed");
             showMsg(`Прогон истории за ${days} дн. запущен`, true);
-            if (backscanPollTimer) clearInterval(backscanPollTimer);
-            backscanPollTimer = setInterval(loadResStatus, 3000);
-            await loadResStatus();
+            closeBackscanStream();
+            openBackscanStream();
+        } catch (e) {
+            showMsg(String(e.message || e), false);
+        }
+    });
+
+    btnBackscanDry?.addEventListener("click", async () => {
+        const days = parseInt(inpBackscanDays?.value || "7", 10) || 7;
+        try {
+            await saveResource();
+            if (backscanStatus) backscanStatus.textContent = "Оценка: загрузка сообщений…";
+            const r = await fetch(`/api/prompt/${id}/backscan`, {
+                method: "POST",
+                credentials: "same-origin",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ days, dry_run: true }),
+            });
+            const data = await r.json();
+            if (!r.ok || !data.ok) throw new Error(data.detail || data.error || "dry-run failed");
+            // отчёт придёт финальным снимком стрима (p.result)
+            closeBackscanStream();
+            openBackscanStream();
         } catch (e) {
             showMsg(String(e.message || e), false);
         }
@@ -0,0 +1,62 @@
+import asyncio
+
+from src.app.core.ai_transport import ProviderClients, key_fingerprint
+
+
+class _FakeClient:
+    def __init__(self, provider, api_key, base_url):
+        self.provider = provider
+        self.api_key = api_key
+        self.base_url = base_url
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_clients_are_reused_per_provider_base_url_and_key(clock):
+    clients = ProviderClients(factory=_FakeClient, clock=clock)
+    a = clients.get("openai", "sk-1")
+    assert clients.get("openai", "sk-1") is a
+    assert clients.get("openai", "sk-2") is not a
+    assert clients.get("groq", "sk-1", base_url="https://api.groq.com/openai/v1") is not a
+    stats = clients.stats()
+    assert stats["openai"] == {
+        "open": 2, "uses": 3, "created": 2, "reused": 1, "evicted_idle": 0, "evicted_lru": 0,
+    }
+    assert stats["groq"]["open"] == 1
+    assert key_fingerprint("sk-1") != key_fingerprint("sk-2") and "sk-1" not in key_fingerprint("sk-1")
+
+
+def test_idle_sweep_and_close(clock):
+    async def run():
+        clients = ProviderClients(factory=_FakeClient, clock=clock, idle_sec=10)
+        old = clients.get("openai", "sk-old")
+        clock.now = 8
+        fresh = clients.get("openai", "sk-new")
+        clock.now = 12
+        assert await clients.sweep() == 1
+        assert old.closed and not fresh.closed
+        assert clients.get("openai", "sk-old") is not old
+        await clients.close()
+        assert fresh.closed and clients.stats()["openai"]["open"] == 0
+        assert clients.stats()["openai"]["evicted_idle"] == 1
+
+    asyncio.run(run())
+
+
+def test_lru_overflow_closes_after_grace(clock):
+    async def run():
+        clients = ProviderClients(factory=_FakeClient, clock=clock, max_clients=2)
+        first = clients.get("openai", "k1")
+        clients.get("openai", "k2")
+        clients.get("openai", "k3")
+        assert clients.stats()["openai"]["evicted_lru"] == 1
+        await clients.sweep()
+        assert not first.closed  # на вытесненном может идти ответ
+        clock.now = 10_000
+        await clients.sweep()
+        assert first.closed
+        await clients.close()
+
+    asyncio.run(run())
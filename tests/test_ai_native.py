@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.app.core import ai_transport
+from src.app.core.ai_transport import AIChatConfig, AIProvider, ai_clients, chat, chat_stream
+
+_MESSAGES = [
+    {"role": "system", "content": "Ты менеджер."},
+    {"role": "user", "content": "привет"},
+    {"role": "user", "content": "есть доставка?"},
+    {"role": "assistant", "content": "Да."},
+    {"role": "user", "content": "сколько?"},
+]
+
+
+@contextmanager
+def stub_server(routes):
+    """routes: path -> (status, json | [sse events]); запросы пишутся в seen."""
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+            seen.append({"path": self.path, "headers": dict(self.headers), "body": body})
+            status, payload = routes[self.path]
+            if isinstance(payload, list):
+                data = "".join(f"data: {json.dumps(ev)}\n\n" for ev in payload).encode()
+                ctype = "text/event-stream"
+            else:
+                data = json.dumps(payload).encode()
+                ctype = "application/json"
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    saved = dict(ai_transport.NATIVE_BASE_URL)
+    ai_transport.NATIVE_BASE_URL.update({AIProvider.anthropic: url, AIProvider.gemini: url})
+    try:
+        yield seen
+    finally:
+        ai_transport.NATIVE_BASE_URL.clear()
+        ai_transport.NATIVE_BASE_URL.update(saved)
+        server.shutdown()
+        server.server_close()
+
+
+def _run(coro):
+    async def wrapped():
+        try:
+            return await coro
+        finally:
+            await ai_clients.close()
+
+    return asyncio.run(wrapped())
+
+
+async def _collect(cfg):
+    return [d async for d in chat_stream(cfg=cfg, messages=_MESSAGES)]
+
+
+def test_anthropic_chat_usage_and_prompt_cache():
+    cfg = AIChatConfig(provider=AIProvider.anthropic, api_key="ak", model="claude-3-5-haiku-latest")
+    routes = {"/v1/messages": (200, {
+        "content": [{"type": "text", "text": " 500 ₽ "}],
+        "usage": {"input_tokens": 20, "cache_read_input_tokens": 100, "output_tokens": 5},
+    })}
+    with stub_server(routes) as seen:
+        result = _run(chat(cfg=cfg, messages=_MESSAGES))
+    assert result.ok and result.text == "500 ₽"
+    assert result.usage["prompt_tokens"] == 120 and result.usage["total_tokens"] == 125
+    assert result.usage["cached_tokens"] == 100 and result.usage["provider"] == "anthropic"
+    req = seen[0]
+    assert req["headers"]["x-api-key"] == "ak" and req["headers"]["anthropic-version"]
+    assert req["body"]["system"][0]["cache_control"] == {"type": "ephemeral"}
+    assert [m["role"] for m in req["body"]["messages"]] == ["user", "assistant", "user"]
+    assert req["body"]["messages"][0]["content"] == "привет\n\nесть доставка?"
+
+
+def test_gemini_chat_maps_roles_and_usage():
+    cfg = AIChatConfig(provider=AIProvider.gemini, api_key="gk", model="gemini-2.0-flash")
+    routes = {"/v1beta/models/gemini-2.0-flash:generateContent": (200, {
+        "candidates": [{"content": {"parts": [{"text": "500"}, {"text": " ₽"}]}}],
+        "usageMetadata": {"promptTokenCount": 30, "candidatesTokenCount": 4, "totalTokenCount": 34,
+                          "cachedContentTokenCount": 16},
+    })}
+    with stub_server(routes) as seen:
+        result = _run(chat(cfg=cfg, messages=_MESSAGES))
+    assert result.ok and result.text == "500 ₽"
+    assert result.usage == {
+        "prompt_tokens": 30, "completion_tokens": 4, "total_tokens": 34, "cached_tokens": 16,
+        "provider": "gemini", "model": "gemini-2.0-flash",
+    }
+    body = seen[0]["body"]
+    assert seen[0]["headers"]["x-goog-api-key"] == "gk"
+    assert body["systemInstruction"]["parts"][0]["text"] == "Ты менеджер."
+    assert [c["role"] for c in body["contents"]] == ["user", "model", "user"]
+
+
+def test_native_errors_match_openai_semantics():
+    cfg = AIChatConfig(provider=AIProvider.anthropic, api_key="ak", model="m")
+    routes = {"/v1/messages": (429, {"type": "error", "error": {"type": "rate_limit_error", "message": "slow down"}})}
+    with stub_server(routes):
+        result = _run(chat(cfg=cfg, messages=_MESSAGES))
+    assert not result.ok and result.text == ""
+    assert "429" in result.error and "slow down" in result.error
+    assert result.usage == {"provider": "anthropic", "model": "m"}
+
+
+def test_native_streams():
+    anthropic = AIChatConfig(provider=AIProvider.anthropic, api_key="ak", model="m")
+    gemini = AIChatConfig(provider=AIProvider.gemini, api_key="gk", model="g")
+    routes = {
+        "/v1/messages": (200, [
+            {"type": "message_start", "message": {"usage": {"input_tokens": 10, "output_tokens": 1}}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Здрав"}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "ствуйте"}},
+            {"type": "message_delta", "usage": {"output_tokens": 3}},
+            {"type": "message_stop"},
+        ]),
+        "/v1beta/models/g:streamGenerateContent?alt=sse": (200, [
+            {"candidates": [{"content": {"parts": [{"text": "Да"}]}}],
+             "usageMetadata": {"promptTokenCount": 8, "candidatesTokenCount": 1, "totalTokenCount": 9}},
+            {"candidates": [{"content": {"parts": [{"text": ", есть"}]}}],
+             "usageMetadata": {"promptTokenCount": 8, "candidatesTokenCount": 3, "totalTokenCount": 11}},
+        ]),
+    }
+    with stub_server(routes):
+        a = _run(_collect(anthropic))
+        g = _run(_collect(gemini))
+    assert [d.text for d in a[:-1]] == ["Здрав", "ствуйте"]
+    assert a[-1].result.ok and a[-1].result.text == "Здравствуйте"
+    assert a[-1].result.usage["completion_tokens"] == 3 and a[-1].result.raw["ttft_ms"] is not None
+    assert g[-1].result.text == "Да, есть" and g[-1].result.usage["total_tokens"] == 11
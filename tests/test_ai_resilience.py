@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+from src.app.core import ai_resilience
+from src.app.core.ai_resilience import ChatPolicy, CircuitBreakers, backoff_delay, resilient_chat, resilient_chat_stream
+from src.app.core.ai_transport import AIChatConfig, AIChatDelta, AIChatResult, AIProvider
+
+GROQ = AIChatConfig(provider=AIProvider.groq, api_key="gk", model="llama")
+OPENAI = AIChatConfig(provider=AIProvider.openai, api_key="ok", model="gpt")
+MSGS = [{"role": "user", "content": "hi"}]
+
+
+def _ok(cfg, text="ok"):
+    return AIChatResult(ok=True, text=text, usage={"provider": cfg.provider.value, "model": cfg.model})
+
+
+def _fail(cfg, status, retryable):
+    return AIChatResult(
+        ok=False, text="", usage={"provider": cfg.provider.value}, error=f"Error code: {status}",
+        raw={"status": status, "retryable": retryable},
+    )
+
+
+def _patch(monkeypatch, script):
+    """script: provider -> список ответов (AIChatResult или (delay, AIChatResult))."""
+    calls = []
+
+    async def fake_chat(*, cfg, messages):
+        calls.append(cfg.provider.value)
+        step = script[cfg.provider.value].pop(0)
+        delay, result = step if isinstance(step, tuple) else (0, step)
+        await asyncio.sleep(delay)
+        return result
+
+    monkeypatch.setattr(ai_resilience, "chat", fake_chat)
+    monkeypatch.setattr(ai_resilience, "breakers", CircuitBreakers())
+    monkeypatch.setattr(ai_resilience, "backoff_delay", lambda attempt: 0.0)
+    return calls
+
+
+def test_retries_transient_then_succeeds(monkeypatch):
+    calls = _patch(monkeypatch, {"groq": [_fail(GROQ, 503, True), _fail(GROQ, 429, True), _ok(GROQ)]})
+    result = asyncio.run(resilient_chat(cfg=GROQ, messages=MSGS))
+    assert result.ok and calls == ["groq"] * 3
+    assert result.raw["attempts"] == 3 and result.raw["fallback"] == 0
+
+
+def test_permanent_error_goes_to_fallback(monkeypatch):
+    calls = _patch(monkeypatch, {"groq": [_fail(GROQ, 401, False)], "openai": [_ok(OPENAI, "from openai")]})
+    result = asyncio.run(resilient_chat(cfg=GROQ, messages=MSGS, fallbacks=[OPENAI]))
+    assert result.ok and result.text == "from openai"
+    assert calls == ["groq", "openai"]
+    assert result.raw["provider"] == "openai" and result.raw["fallback"] == 1
+
+
+def test_deadline_bounds_the_whole_call(monkeypatch):
+    _patch(monkeypatch, {"groq": [(5, _ok(GROQ))] * 3})
+    t0 = time.monotonic()
+    result = asyncio.run(resilient_chat(cfg=GROQ, messages=MSGS, policy=ChatPolicy(deadline_sec=0.1)))
+    assert not result.ok and result.error == "AI_DEADLINE_EXCEEDED"
+    assert time.monotonic() - t0 < 1
+
+
+def test_hedged_request_takes_first_success(monkeypatch):
+    calls = _patch(monkeypatch, {"groq": [(1.0, _ok(GROQ, "slow"))], "openai": [_ok(OPENAI, "fast")]})
+    policy = ChatPolicy(hedge_after_sec=0.05)
+    t0 = time.monotonic()
+    result = asyncio.run(resilient_chat(cfg=GROQ, messages=MSGS, fallbacks=[OPENAI], policy=policy))
+    assert result.text == "fast" and calls == ["groq", "openai"]
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_cancelled_caller_cancels_hedged_requests(monkeypatch):
+    calls = _patch(monkeypatch, {"groq": [(5, _ok(GROQ))], "openai": [(5, _ok(OPENAI))]})
+    policy = ChatPolicy(hedge_after_sec=0.01)
+
+    async def run():
+        call = asyncio.create_task(resilient_chat(cfg=GROQ, messages=MSGS, fallbacks=[OPENAI], policy=policy))
+        await asyncio.sleep(0.1)
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+    assert calls == ["groq", "openai"]
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    now = [0.0]
+    b = CircuitBreakers(failures=2, open_sec=10, clock=lambda: now[0])
+    b.record(GROQ, _fail(GROQ, 503, True))
+    assert b.allow(GROQ)
+    b.record(GROQ, _fail(GROQ, 503, True))
+    assert not b.allow(GROQ) and b.allow(OPENAI)
+    now[0] = 11
+    assert b.allow(GROQ) and not b.allow(GROQ)  # один пробный вызов
+    b.record(GROQ, _ok(GROQ))
+    assert b.allow(GROQ)
+    assert b.stats()["groq"] == {"keys": 1, "open": 0, "trips": 1}
+
+
+def test_open_breaker_skips_to_fallback(monkeypatch):
+    calls = _patch(monkeypatch, {"openai": [_ok(OPENAI)]})
+    for _ in range(ai_resilience.breakers.failures):
+        ai_resilience.breakers.record(GROQ, _fail(GROQ, 503, True))
+    result = asyncio.run(resilient_chat(cfg=GROQ, messages=MSGS, fallbacks=[OPENAI]))
+    assert result.ok and calls == ["openai"]
+
+
+def test_backoff_is_jittered_and_capped():
+    assert backoff_delay(0, rnd=lambda: 1.0) == ai_resilience.AI_RETRY_BASE_SEC
+    assert backoff_delay(20, rnd=lambda: 1.0) == ai_resilience.AI_RETRY_MAX_SEC
+    assert backoff_delay(3, rnd=lambda: 0.0) == 0.0
+
+
+def test_stream_falls_back_only_before_first_delta(monkeypatch):
+    async def fake_stream(*, cfg, messages):
+        if cfg.provider == AIProvider.groq:
+            yield AIChatDelta(result=_fail(cfg, 500, True))
+            return
+        yield AIChatDelta(text="При")
+        yield AIChatDelta(text="вет")
+        yield AIChatDelta(result=_ok(cfg, "Привет"))
+
+    monkeypatch.setattr(ai_resilience, "chat_stream", fake_stream)
+    monkeypatch.setattr(ai_resilience, "breakers", CircuitBreakers())
+    monkeypatch.setattr(ai_resilience, "backoff_delay", lambda attempt: 0.0)
+
+    async def run():
+        policy = ChatPolicy(retries=1)
+        return [d async for d in resilient_chat_stream(cfg=GROQ, messages=MSGS, fallbacks=[OPENAI], policy=policy)]
+
+    deltas = asyncio.run(run())
+    assert [d.text for d in deltas[:-1]] == ["При", "вет"]
+    final = deltas[-1].result
+    assert final.ok and final.raw["attempts"] == 3 and final.raw["provider"] == "openai"
@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.app.core.message_bus import bus
+from src.app.resources.telegram.album import AlbumAggregator
+from src.app.resources.telegram.telegram import TelegramWorker
+
+
+def test_parts_emitted_once_after_window():
+    async def _run():
+        emitted = []
+
+        async def on_complete(buf):
+            emitted.append((buf.key, list(buf.parts), buf.context))
+
+        agg = AlbumAggregator(on_complete, window_sec=0.05, max_wait_sec=1.0)
+        assert agg.add(("c", 1), 10, context="first") is True
+        assert agg.add(("c", 1), 11, context="ignored") is False
+        agg.add(("c", 2), 20)
+        await asyncio.sleep(0.02)
+        agg.add(("c", 1), 12)  # продлевает окно альбома 1
+        await asyncio.sleep(0.15)
+        assert agg.pending == 0
+        return emitted
+
+    emitted = asyncio.run(_run())
+    assert [e[0] for e in emitted] == [("c", 2), ("c", 1)]
+    assert emitted[1][1] == [10, 11, 12]
+    assert emitted[1][2] == "first"
+
+
+def test_max_wait_caps_debounce():
+    async def _run():
+        emitted = []
+
+        async def on_complete(buf):
+            emitted.append(len(buf.parts))
+
+        agg = AlbumAggregator(on_complete, window_sec=0.05, max_wait_sec=0.08)
+        for i in range(6):
+            agg.add("k", i)
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.1)
+        await agg.close()
+        return emitted
+
+    emitted = asyncio.run(_run())
+    assert len(emitted) >= 2
+    assert sum(emitted) == 6
+
+
+class _Msg:
+    def __init__(self, msg_id, text=""):
+        self.id = msg_id
+        self.chat_id = 42
+        self.sender_id = 42
+        self.out = False
+        self.is_private = True
+        self.grouped_id = 777
+        self.raw_text = text
+        self.message = text
+        self.photo = object()
+        self.date = None
+
+    async def get_sender(self):
+        return None
+
+
+def test_worker_stop_inside_album_window_delivers_album(monkeypatch):
+    published = []
+
+    async def fake_publish(rid, evt):
+        published.append(evt)
+
+    monkeypatch.setattr(bus, "publish", fake_publish)
+    w = TelegramWorker(SimpleNamespace(id="rid-album", label="s", meta_json={}))
+
+    async def run():
+        await w._handle_message(_Msg(1, "две фотки"))
+        await w._handle_message(_Msg(2))
+        assert w._albums.pending == 1 and not published
+        await w.stop()  # до конца ALBUM_WINDOW_SEC
+
+    asyncio.run(run())
+    assert len(published) == 1
+    assert published[0].raw["msg_ids"] == [1, 2] and published[0].text == "две фотки"
+    assert w._albums.pending == 0
@@ -0,0 +1,98 @@
+import asyncio
+
+from src.app.core.message_bus import MessageEvent
+from src.app.core.pricing import count_tokens, estimate_cost
+from src.app.core.progress import progress, progress_key
+from src.app.resources.prompt import backscan
+from src.app.resources.prompt.backscan import (
+    DRY_RUN_COMPLETION_TOKENS,
+    _dry_run_report,
+    _estimate_event_calls,
+)
+
+
+def _event(text: str) -> MessageEvent:
+    return MessageEvent(
+        source_type="telegram_session",
+        source_rid="s1",
+        peer_id=1,
+        peer_type="group",
+        chat_id=-100,
+        sender_username=None,
+        msg_id=1,
+        external_chat_id="-100",
+        external_msg_id="1",
+        text=text,
+    )
+
+
+STEPS = [
+    {"type": "condition", "condition_mode": "keywords", "keywords": ["квартир"]},
+    {"type": "ai", "ai_instruction": "Это запрос на аренду?", "ai_action": "continue"},
+    {"type": "notify", "notify_mode": "ai_formatted"},
+]
+
+
+def test_count_tokens_and_cost():
+    assert count_tokens("") == 0
+    assert count_tokens("abcdefg") == 2
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 0) == 0.15
+    assert estimate_cost("unknown-model", 10, 10) is None
+
+
+def test_condition_stops_before_ai():
+    assert _estimate_event_calls(STEPS, _event("продам машину"), "sys") == []
+
+
+def test_upper_bound_counts_all_ai_steps():
+    calls = _estimate_event_calls(STEPS, _event("сдам квартиру"), "sys")
+    assert [idx for idx, _ in calls] == [1, 2]
+    # второй вызов видит ответ первого в истории
+    assert calls[1][1] > calls[0][1]
+
+
+def test_report_totals():
+    events = [_event("сдам квартиру"), _event("продам машину")]
+    report = _dry_run_report(
+        events=events,
+        steps=STEPS,
+        full_system="sys",
+        model="gpt-4o-mini",
+        provider="openai-test",
+        chats=1,
+        messages_fetched=5,
+        fetch_sec=0.0,
+        days=7,
+    )
+    assert report["messages_passed_filters"] == 2
+    assert report["messages_reaching_ai"] == 1
+    assert report["ai_calls"] == 2
+    assert report["tokens"]["completion"] == 2 * DRY_RUN_COMPLETION_TOKENS
+    assert report["cost_usd"] is not None
+    assert report["latency_source"] == "default"
+    assert "gpt-4o" in report["cost_by_model"]
+
+
+def test_dry_run_shares_running_guard_and_reports_via_progress(monkeypatch):
+    rid = "11111111-2222-3333-4444-555555555555"
+    key = progress_key("backscan", rid)
+    seen_running = []
+
+    async def fake_impl(rid_, *, days, tracker):
+        seen_running.append(backscan.is_running(rid_))
+        return {"ok": True, "dry_run": True, "ai_calls": 3}
+
+    monkeypatch.setattr(backscan, "_run_backscan_dry_impl", fake_impl)
+
+    backscan._running.add(rid)
+    try:
+        assert asyncio.run(backscan.run_backscan_dry(rid, days=7))["error"] == "ALREADY_RUNNING"
+        assert asyncio.run(backscan.run_backscan(rid, days=7))["error"] == "ALREADY_RUNNING"
+    finally:
+        backscan._running.discard(rid)
+
+    report = asyncio.run(backscan.run_backscan_dry(rid, days=7))
+    assert report["ok"] and seen_running == [True]
+    assert not backscan.is_running(rid)
+    final = progress.last(key)
+    assert final["status"] == "done" and final["result"]["ai_calls"] == 3
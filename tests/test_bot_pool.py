@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.app.resources.telegram_bot.pool import BotPool
+
+
+class _Session:
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _fake_bot(token: str):
+    return SimpleNamespace(token=token, session=_Session())
+
+
+def test_pool_reuses_client_and_evicts_idle(clock):
+    pool = BotPool(idle_sec=60, factory=_fake_bot, clock=clock)
+
+    async def run():
+        seen = []
+        for _ in range(5):
+            async with pool.use("1:A") as bot:
+                seen.append(bot)
+        assert len({id(b) for b in seen}) == 1
+        assert pool.stats()["created"] == 1
+
+        async with pool.use("1:A") as busy:
+            clock.now = 120
+            assert await pool.evict_idle() == 0  # занятый клиент не закрываем
+        assert await pool.evict_idle() == 0  # last_used обновился при выходе
+        clock.now = 200
+        assert await pool.evict_idle() == 1
+        assert busy.session.closed is True
+
+        async with pool.use("1:A") as fresh:
+            assert fresh is not busy
+        await pool.close()
+        assert fresh.session.closed is True
+
+    asyncio.run(run())
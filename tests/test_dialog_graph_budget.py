@@ -0,0 +1,78 @@
+from src.app.core import pricing
+from src.app.core.dialog_graph import REPLY_RESERVE_TOKENS, build_request
+from src.app.core.pricing import count_tokens
+
+
+def _req(history, *, budget, memory=None, user_text="и что дальше?", system_prompt="Ты менеджер.", window=None):
+    return build_request(
+        thread_id="t", user_text=user_text, system_prompt=system_prompt,
+        drive_context="", history=history, state={}, memory=memory, token_budget=budget,
+        context_window=window,
+    )
+
+
+def test_count_tokens_scripts():
+    assert count_tokens("") == 0
+    assert count_tokens("hello") == 2
+    assert count_tokens("привет") == 2
+    assert count_tokens("12345, ok") == 4
+
+
+def test_newest_first_within_budget():
+    history = [{"role": "user", "content": f"сообщение номер {i}"} for i in range(50)]
+    req = _req(history, budget=120)
+    tokens = req.meta["tokens"]
+    assert tokens["used"] - tokens["system"] <= 120
+    assert 0 < req.meta["history_count"] < 50
+    assert tokens["dropped"] == 50 - req.meta["history_count"]
+    # остались самые новые, порядок хронологический
+    assert req.messages[-2]["content"] == "сообщение номер 49"
+    assert req.messages[1]["content"] == f"сообщение номер {50 - req.meta['history_count']}"
+
+
+def test_oversized_message_truncated_and_cached_tokens_used():
+    doc = "очень длинный документ " * 500
+    history = [
+        {"role": "user", "content": doc},
+        {"role": "assistant", "content": "принял", "tokens": 1},
+    ]
+    req = _req(history, budget=400)
+    assert req.meta["tokens"]["truncated"] == 1
+    pasted = req.messages[1]["content"]
+    assert pasted.endswith("…") and count_tokens(pasted) <= 100
+    assert req.meta["tokens"]["used"] <= 400
+
+
+def test_no_budget_keeps_everything():
+    history = [{"role": "user", "content": "x " * 1000}]
+    req = _req(history, budget=None)
+    assert req.meta["history_count"] == 1 and req.meta["tokens"]["truncated"] == 0
+
+
+def test_large_system_prompt_keeps_history_and_user_text():
+    system = "правило магазина " * 1500
+    user_text = "вот мой заказ: " + "позиция " * 2000
+    history = [{"role": "user", "content": f"сообщение номер {i}"} for i in range(10)]
+    req = _req(history, budget=pricing.context_token_budget("gpt-4o"), user_text=user_text,
+               system_prompt=system, window=pricing.model_context_tokens("gpt-4o"))
+    assert req.meta["history_count"] == 10
+    assert req.messages[-1]["content"] == user_text.strip()
+    assert req.meta["tokens"]["truncated"] == 0
+
+
+def test_user_text_cut_only_by_model_window():
+    user_text = "позиция " * 3000
+    req = _req([], budget=100, user_text=user_text, window=2000)
+    tokens = req.meta["tokens"]
+    assert tokens["truncated"] == 1
+    assert 100 < tokens["user"] <= 2000 - REPLY_RESERVE_TOKENS
+    assert tokens["used"] + REPLY_RESERVE_TOKENS <= 2000
+
+
+def test_context_budget_scales_with_model_window(monkeypatch):
+    monkeypatch.setattr(pricing, "CONTEXT_TOKEN_CAP", 0)
+    assert pricing.context_token_budget("gpt-4o") == 32_000
+    assert pricing.context_token_budget("gpt-4.1") == 250_000
+    assert pricing.context_token_budget("unknown") == pricing.DEFAULT_CONTEXT_TOKENS // 4
+    monkeypatch.setattr(pricing, "CONTEXT_TOKEN_CAP", 4000)
+    assert pricing.context_token_budget("gpt-4o") == 4000
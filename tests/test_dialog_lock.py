@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from src.app.core.dialog_lock import DialogLockDeadlock, DialogLockManager
+
+
+def test_same_key_is_serialized_and_wait_is_measured():
+    async def run():
+        locks = DialogLockManager(mode="local")
+        order = []
+
+        async def worker(name, key):
+            async with locks.hold(key, resource_id="r"):
+                order.append(f"{name}+")
+                await asyncio.sleep(0.02)
+                order.append(f"{name}-")
+
+        await asyncio.gather(worker("a", "d1"), worker("b", "d1"), worker("c", "d2"))
+        return order, locks.stats()
+
+    order, stats = asyncio.run(run())
+    assert order.index("a-") < order.index("b+")      # d1 строго по очереди
+    assert order.index("c+") < order.index("a-")      # d2 не ждёт d1
+    assert stats["acquired"] == 3 and stats["contended"] == 1
+    assert stats["wait_ms_max"] >= 15 and stats["held"] == 0 and stats["advisory"] == 0
+
+
+def test_advisory_only_for_resources_not_owned_or_expired_ownership():
+    now = [0.0]
+    locks = DialogLockManager(mode="auto", clock=lambda: now[0])
+    locks.set_owned(["r1"], valid_sec=10)
+    assert locks.is_local("r1") and not locks.is_local("r2")
+    now[0] = 11.0
+    assert not locks.is_local("r1")                   # аренда могла уйти другому шарду
+    assert DialogLockManager(mode="advisory").is_local("r1") is False
+
+    async def run():
+        async with locks.hold("k", resource_id="r1") as grant:
+            return grant.advisory
+
+    assert asyncio.run(run()) is True
+
+
+def test_reentry_and_wait_cycle_are_reported_not_hung():
+    async def run():
+        locks = DialogLockManager(mode="local")
+        async with locks.hold("k", resource_id="r"):
+            with pytest.raises(DialogLockDeadlock):
+                async with locks.hold("k", resource_id="r"):
+                    pass
+
+        got_b = asyncio.Event()
+        hold_a = asyncio.Event()
+
+        async def first():
+            async with locks.hold("A", resource_id="r"):
+                hold_a.set()
+                await got_b.wait()
+                async with locks.hold("B", resource_id="r"):
+                    pass
+
+        async def second():
+            await hold_a.wait()
+            async with locks.hold("B", resource_id="r"):
+                got_b.set()
+                await asyncio.sleep(0.01)             # first уже ждёт B
+                assert {d["key"] for d in locks.diagnostics()} == {"A", "B"}
+                async with locks.hold("A", resource_id="r"):
+                    pass
+
+        results = await asyncio.gather(first(), second(), return_exceptions=True)
+        return results, locks.stats()
+
+    results, stats = asyncio.run(run())
+    assert isinstance(results[1], DialogLockDeadlock) and results[0] is None
+    assert stats["deadlocks"] == 2 and stats["held"] == 0
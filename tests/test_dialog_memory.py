@@ -0,0 +1,43 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from src.app.core.dialog_graph import build_request
+from src.app.core.dialog_memory import MemoryItem, as_history, as_memory
+from src.app.core.pricing import cached_tokens, token_cache_entry
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _item(direction, text, minutes, distance=None, tokens=None):
+    return MemoryItem(
+        id=uuid.uuid4(), direction=direction, text=text,
+        created_at=T0 + timedelta(minutes=minutes), distance=distance, tokens=tokens,
+    )
+
+
+def test_history_chronological_and_memory_ranked():
+    recent = [_item("out", "ок", 100, tokens=1), _item("in", "а доставка?", 99)]
+    assert as_history(recent) == [
+        {"role": "user", "content": "а доставка?", "tokens": None},
+        {"role": "assistant", "content": "ок", "tokens": 1},
+    ]
+    near, far = _item("in", "мой адрес Тверская 5", 10, 0.1), _item("in", "люблю синий", 5, 0.3)
+    memory = as_memory([near, far, recent[0]], skip=[recent[0].id])
+    assert [(m["content"], m["rank"]) for m in memory] == [("люблю синий", 1), ("мой адрес Тверская 5", 0)]
+
+
+def test_token_cache_versioned():
+    assert cached_tokens(token_cache_entry(7)) == 7
+    assert cached_tokens({"n": 7, "v": -1}) is None
+    assert cached_tokens(None) is None
+
+
+def test_build_request_puts_memory_in_system():
+    req = build_request(
+        thread_id="t", user_text="куда везти?", system_prompt="Ты менеджер.",
+        drive_context="", history=[], state={},
+        memory=[{"role": "user", "content": "мой адрес Тверская 5"}],
+    )
+    assert req.messages[0]["role"] == "system"
+    assert "EARLIER IN THIS DIALOG:\nuser: мой адрес Тверская 5" in req.messages[0]["content"]
+    assert req.meta["memory_count"] == 1
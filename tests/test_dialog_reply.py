@@ -0,0 +1,117 @@
+import asyncio
+import functools
+from types import SimpleNamespace
+
+from aiogram import types
+
+from src.app.core import dialog_service
+from src.app.core.ai_transport import AIChatConfig, AIChatDelta, AIChatResult, AIProvider
+from src.app.core.message_bus import bus
+from src.app.core.stream_reply import CURSOR, PLACEHOLDER, ProgressiveReply
+from src.app.resources.telegram_bot import bot as bot_module
+from src.app.resources.telegram_bot.bot import TelegramBotWorker
+
+RID = "7b0c5a58-2f4e-4c1e-9d7a-3f1f0b2c9e11"
+CFG = AIChatConfig(provider=AIProvider.openai, api_key="k", model="m")
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+
+    async def send_message(self, *, chat_id, text, parse_mode, reply_to_message_id):
+        self.sent.append(text)
+        return SimpleNamespace(message_id=100 + len(self.sent))
+
+    async def edit_message_text(self, *, text, chat_id, message_id, parse_mode):
+        self.edits.append(text)
+
+
+def _message(text="сколько стоит доставка?"):
+    return types.Message.model_validate({
+        "message_id": 7,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "A"},
+        "text": text,
+    })
+
+
+def _worker(monkeypatch, meta):
+    published = []
+
+    async def fake_publish(rid, evt):
+        published.append(evt)
+
+    monkeypatch.setattr(bus, "publish", fake_publish)
+    w = TelegramBotWorker(SimpleNamespace(id=RID, label="bot", meta_json=meta))
+    w.bot = FakeBot()
+    return w, published
+
+
+async def _drain():
+    await asyncio.gather(*list(dialog_service._reply_tasks))
+
+
+def test_bot_handler_streams_reply_into_one_placeholder(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(bot_module, "ProgressiveReply", functools.partial(ProgressiveReply, clock=lambda: now[0]))
+
+    async def fake_stream(*, cfg, messages, fallbacks, policy):
+        for _ in range(20):          # 20 дельт за 6 секунд
+            now[0] += 0.3
+            yield AIChatDelta(text="слово ")
+        yield AIChatDelta(result=AIChatResult(ok=True, text="слово " * 20, usage={}))
+
+    calls = []
+
+    async def fake_process_incoming(**kw):
+        calls.append(kw)
+        result = await dialog_service._stream_chat(CFG, [{"role": "user", "content": kw["text_value"]}], kw["reply"])
+        await kw["reply"].finish(result.text)
+        return {"delivered": True}
+
+    monkeypatch.setattr(dialog_service, "resilient_chat_stream", fake_stream)
+    monkeypatch.setattr(dialog_service, "process_incoming", fake_process_incoming)
+    w, published = _worker(monkeypatch, {"prompt_id": "p"})
+
+    async def run():
+        await w.handle_message(_message())
+        await _drain()
+
+    asyncio.run(run())
+    assert len(published) == 1
+    assert calls[0]["provider"] == "telegram_bot" and calls[0]["external_chat_id"] == "42"
+    assert w.bot.sent == [PLACEHOLDER]
+    streamed, final = w.bot.edits[:-1], w.bot.edits[-1]
+    assert 1 < len(streamed) < 20 and all(t.endswith(CURSOR) for t in streamed)
+    assert final == ("слово " * 20).strip()
+
+
+def test_reply_error_replaces_placeholder_with_generic_text(monkeypatch):
+    async def failing_process_incoming(**kw):
+        await kw["reply"].start()
+        raise RuntimeError("Error code: 401 - invalid api key sk-...")
+
+    monkeypatch.setattr(dialog_service, "process_incoming", failing_process_incoming)
+    w, _ = _worker(monkeypatch, {"prompt_id": "p"})
+
+    async def run():
+        await w.handle_message(_message())
+        await _drain()
+
+    asyncio.run(run())
+    assert w.bot.sent == [PLACEHOLDER]
+    assert w.bot.edits == [dialog_service.AI_ERROR_TEXT]
+
+
+def test_no_reply_without_prompt(monkeypatch):
+    w, published = _worker(monkeypatch, {})
+
+    async def run():
+        await w.handle_message(_message())
+        await _drain()
+
+    asyncio.run(run())
+    assert len(published) == 1 and w.bot.sent == []
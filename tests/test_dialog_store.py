@@ -0,0 +1,139 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+
+from src.app.core import dialog_service
+from src.app.core.dialog_service import ResolvedResource, _uuid_to_pg_lock_key
+from src.app.core.dialog_store import _INGEST_COLUMNS, BulkIngestResult, _build_insert_message, _ingest_row
+
+
+def test_insert_message_binds_all_params():
+    q, params, mid = _build_insert_message(
+        resource_id=uuid.uuid4(),
+        dialog_id=uuid.uuid4(),
+        peer_type="private",
+        peer_id=1,
+        chat_id=None,
+        direction="in",
+        text_value="  привет ",
+        meta_json={"phase": "incoming"},
+    )
+    assert "CAST(:meta_json AS jsonb)" in q.text
+    assert "embedding" not in q.text
+    assert set(q.compile().params) == set(params)
+    assert params["id"] == str(mid) and params["text"] == "привет"
+
+    q, params, _ = _build_insert_message(
+        resource_id=uuid.uuid4(), dialog_id=uuid.uuid4(), peer_type="private",
+        peer_id=1, chat_id=5, direction="out", text_value="x", embedding=[0.5],
+    )
+    assert set(q.compile().params) == set(params) and params["embedding"] == [0.5]
+    assert "message_keys" not in q.text
+
+
+def test_insert_message_with_external_ids_writes_dedup_key():
+    q, params, mid = _build_insert_message(
+        resource_id=uuid.uuid4(), dialog_id=uuid.uuid4(), peer_type="private",
+        peer_id=1, chat_id=5, direction="in", text_value="x",
+        provider="telegram", external_chat_id="5", external_msg_id="77",
+    )
+    assert q.text.startswith("WITH k AS (INSERT INTO message_keys")
+    assert set(q.compile().params) == set(params) and params["id"] == str(mid)
+
+
+# Postgres: SELECT CAST(CAST('x' || left(replace(CAST(CAST(:u AS uuid) AS text), '-', ''), 16)
+#                               AS bit(64)) AS bigint)
+# bit(64) → bigint — дополнительный код: старший бит = знак.
+PG_LOCK_KEYS = {
+    "00000000-0000-0001-ffff-ffffffffffff": 1,
+    "7fffffff-ffff-ffff-0000-000000000000": 9223372036854775807,
+    "80000000-0000-0000-ffff-ffffffffffff": -9223372036854775808,
+    "ffffffff-ffff-ffff-ffff-ffffffffffff": -1,
+    "123e4567-e89b-12d3-a456-426614174000": 1314564453825188563,
+    "c0a80001-0000-4000-8000-000000000000": -4564398218045014016,
+}
+
+
+def test_lock_key_matches_postgres_fixture():
+    for u, key in PG_LOCK_KEYS.items():
+        assert _uuid_to_pg_lock_key(uuid.UUID(u)) == key, u
+    sql = dialog_service._SQL_GET_OR_CREATE_DIALOG_LOCKED.text
+    assert "CAST(CAST('x' || left(replace(CAST(d.id AS text), '-', ''), 16) AS bit(64)) AS bigint)" in sql
+
+
+def test_ingest_row_matches_copy_columns():
+    rid = uuid.uuid4()
+    row = _ingest_row(3, {
+        "resource_id": rid, "peer_type": "group", "peer_id": 7, "chat_id": -100,
+        "direction": "in", "text": "  hi ", "created_at": datetime(2025, 1, 2, 3, 4),
+        "provider": "telegram", "external_chat_id": "-100", "external_msg_id": "9",
+    })
+    values = dict(zip(_INGEST_COLUMNS, row))
+    assert len(row) == len(_INGEST_COLUMNS)
+    assert values["ord"] == 3 and values["thread_key"] == "telegram:-100"
+    assert values["text"] == "hi" and values["msg_type"] == "text" and values["is_internal"] is False
+    assert values["created_at"].tzinfo is not None
+    assert '"tok"' in values["meta_json"]
+
+
+def test_ingest_row_requires_thread_key_source():
+    with pytest.raises(ValueError):
+        _ingest_row(0, {"resource_id": uuid.uuid4(), "peer_type": "private", "peer_id": 1, "direction": "in"})
+
+
+class _Stop(Exception):
+    pass
+
+
+class _CaptureSession:
+    """AsyncSessionLocal: запоминает параметры первого запроса (get_or_create dialog) и прерывает."""
+
+    def __init__(self, seen):
+        self.seen = seen
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, q, params=None):
+        self.seen.append(params)
+        raise _Stop()
+
+    async def rollback(self):
+        pass
+
+
+def test_ingested_row_lands_in_live_dialog(monkeypatch):
+    rid = uuid.uuid4()
+    row = dict(zip(_INGEST_COLUMNS, _ingest_row(0, {
+        "resource_id": rid, "peer_type": "private", "peer_id": 42, "chat_id": 42, "direction": "in",
+        "text": "старое", "provider": "telegram_bot", "external_chat_id": "42", "external_msg_id": "1",
+    })))
+
+    resolved = ResolvedResource(
+        resource_id=rid, keys_id=uuid.uuid4(), prompt_id=uuid.uuid4(), key_field="creds.openai_api_key",
+        api_key="sk", model="gpt-4o-mini", temperature=0.7, prompt=None,
+    )
+
+    class _Resolver:
+        async def get(self, _rid):
+            return resolved
+
+    seen = []
+    monkeypatch.setattr(dialog_service, "resource_resolver", _Resolver())
+    monkeypatch.setattr(dialog_service, "AsyncSessionLocal", lambda: _CaptureSession(seen))
+    with pytest.raises(_Stop):
+        asyncio.run(dialog_service.process_incoming(
+            resource_id=rid, provider="telegram_bot", peer_type="private", peer_id=42, chat_id=42,
+            external_chat_id="42", external_msg_id="2", text_value="новое",
+        ))
+    assert seen[0]["resource_id"] == str(rid) and seen[0]["thread_key"] == row["thread_key"]
+
+
+def test_bulk_ingest_result_rate():
+    assert BulkIngestResult(1000, 900, 100, 5, 0.5).rows_per_sec == 2000
+    assert BulkIngestResult(0, 0, 0, 0, 0.0).rows_per_sec == 0.0
@@ -0,0 +1,34 @@
+from src.app.core.dialog_graph import build_request
+from src.app.core.dialog_summary import (
+    build_summary_messages,
+    summary_hwm,
+    summary_text,
+    window_limit,
+)
+
+
+def test_summary_prompt_includes_previous_and_turns():
+    msgs = build_summary_messages("Клиент Иван.", [("in", "хочу 2 комнаты"), ("out", "  "), ("out", "есть варианты")])
+    assert msgs[0]["role"] == "system"
+    body = msgs[1]["content"]
+    assert "Клиент Иван." in body
+    assert "user: хочу 2 комнаты\nassistant: есть варианты" in body
+
+
+def test_window_covers_gap_after_hwm():
+    assert summary_hwm({}) is None
+    assert window_limit(10, {}, trigger_msgs=20) == 10
+    s = {"text": "x", "hwm_at": "2026-01-01T00:00:00+00:00", "hwm_id": "00000000-0000-0000-0000-000000000001"}
+    assert summary_hwm(s) == (s["hwm_at"], s["hwm_id"])
+    assert window_limit(10, s, trigger_msgs=20) == 30
+
+
+def test_build_request_sends_summary_block():
+    req = build_request(
+        thread_id="t", user_text="ну что?", system_prompt="", drive_context="",
+        history=[{"role": "assistant", "content": "подберу"}], state={},
+        summary=summary_text({"text": " Клиент ищет 2к квартиру "}),
+    )
+    assert req.messages[0] == {"role": "system", "content": "DIALOG SUMMARY:\nКлиент ищет 2к квартиру"}
+    assert [m["role"] for m in req.messages] == ["system", "assistant", "user"]
+    assert req.meta["has_summary"] is True
@@ -0,0 +1,40 @@
+import asyncio
+import uuid
+
+from src.app.core.embedding_cache import vector_literal
+from src.app.core.embedding_service import EmbeddingBatcher
+
+
+def test_batcher_coalesces_per_key_and_backfills():
+    calls = []
+    stored = []
+
+    async def embed(texts, api_key):
+        calls.append((api_key, list(texts)))
+        return [[float(len(t))] for t in texts]
+
+    async def store(pairs):
+        stored.extend(pairs)
+
+    async def run():
+        b = EmbeddingBatcher(embed=embed, store=store, max_batch=3, max_wait_sec=0.05)
+        ids = [uuid.uuid4() for _ in range(5)]
+        for mid, t in zip(ids[:4], ["a", "bb", "a", "ccc"]):
+            assert b.submit(mid, t, "k1") is True
+        b.submit(ids[4], "dddd", "k2")
+        assert b.submit(uuid.uuid4(), "   ", "k1") is False
+        await asyncio.sleep(0.2)
+        await b.close()
+        return ids, b
+
+    ids, b = asyncio.run(run())
+    # k1: полная пачка из 3 (дубль "a" — один input) + хвост по таймауту; k2 — по таймауту
+    assert ("k1", ["a", "bb"]) in calls
+    assert ("k1", ["ccc"]) in calls and ("k2", ["dddd"]) in calls
+    assert len(calls) == 3
+    assert dict(stored) == {ids[0]: [1.0], ids[1]: [2.0], ids[2]: [1.0], ids[3]: [3.0], ids[4]: [4.0]}
+    assert b.stats()["pending"] == 0 and b.stats()["embedded"] == 5
+
+
+def test_vector_literal():
+    assert vector_literal([1, 0.5]) == "[1.0,0.5]"
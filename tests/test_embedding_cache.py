@@ -0,0 +1,37 @@
+import asyncio
+
+from src.app.core.embedding_cache import EmbeddingCache, normalize_text, text_hash
+
+
+def test_normalized_key():
+    assert normalize_text("  Привет,\n  МИР ") == "привет, мир"
+    assert text_hash("Привет, мир") == text_hash(" привет,  мир")
+
+
+def test_memory_then_db_then_miss():
+    db: dict[tuple[str, str], list[float]] = {}
+
+    async def load(model, hashes):
+        return {h: db[(model, h)] for h in hashes if (model, h) in db}
+
+    async def save(model, items):
+        for h, vec in items.items():
+            db[(model, h)] = vec
+
+    async def run():
+        front = EmbeddingCache(maxsize=10, load=load, save=save)
+        await front.put_many("m1", {"Hello": [1.0, 2.0]})
+        assert await front.get_many("m1", ["hello ", "other"]) == {"hello ": [1.0, 2.0]}
+
+        # другой процесс: пустая память, тот же Postgres
+        other = EmbeddingCache(maxsize=10, load=load, save=save)
+        assert await other.get_many("m1", ["HELLO"]) == {"HELLO": [1.0, 2.0]}
+        assert await other.get_many("m1", ["HELLO"]) == {"HELLO": [1.0, 2.0]}
+        # смена модели — новый ключ
+        assert await other.get_many("m2", ["HELLO"]) == {}
+        return front.stats(), other.stats()
+
+    front, other = asyncio.run(run())
+    assert front["memory_hits"] == 1 and front["misses"] == 1
+    assert other["db_hits"] == 1 and other["memory_hits"] == 1 and other["misses"] == 1
+    assert other["api_calls_avoided"] == 2 and other["hit_rate"] == round(2 / 3, 4)
@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.app.core.entity_cache import EntityCache, entity_info
+
+
+def test_entity_info_user_display_name():
+    info = entity_info(
+        SimpleNamespace(id=5, username=None, first_name="Анна", last_name="К", bot=False)
+    )
+    assert info.display_name == "Анна К"
+    assert info.sender_name == "Анна К"
+
+
+def test_hit_miss_and_ttl(clock):
+    cache = EntityCache(ttl_sec=10, clock=clock)
+    assert cache.get(1) is None
+    cache.put(SimpleNamespace(id=1, username="bob", bot=True))
+    assert cache.get(1).is_bot is True
+    clock.now = 11
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["expired"] == 1
+    assert stats["hit_rate"] == round(1 / 3, 4)
+
+
+def test_lru_eviction():
+    cache = EntityCache(maxsize=2)
+    cache.warm([SimpleNamespace(id=i) for i in (1, 2)])
+    cache.get(1)
+    cache.put(SimpleNamespace(id=3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_resolve_fetches_only_on_miss():
+    cache = EntityCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return SimpleNamespace(id=7, title="Группа", username="grp")
+
+    async def _run():
+        a = await cache.resolve(7, fetch)
+        b = await cache.resolve(7, fetch)
+        return a, b
+
+    a, b = asyncio.run(_run())
+    assert a == b
+    assert a.title == "Группа"
+    assert len(calls) == 1
@@ -0,0 +1,43 @@
+from datetime import date
+
+from src.app.core.message_retention import (
+    add_months,
+    archivable,
+    months_to_create,
+    parse_partition_name,
+    partition_name,
+    retention_days,
+)
+
+
+def test_partition_names_roundtrip():
+    assert partition_name(date(2026, 3, 1)) == "messages_y2026m03"
+    assert parse_partition_name("messages_y2026m03") == date(2026, 3, 1)
+    assert parse_partition_name("messages_default") is None
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+def test_months_to_create_covers_current_and_ahead():
+    assert months_to_create(date(2026, 12, 15), ahead=2) == [
+        date(2026, 12, 1), date(2027, 1, 1), date(2027, 2, 1),
+    ]
+
+
+def test_archivable_keeps_hot_window_and_default():
+    names = [
+        "messages_default",
+        "messages_y2026m04",
+        "messages_y2026m03",
+        "messages_y2026m10",
+        "messages_y2025m12",
+    ]
+    # октябрь + 6 прошлых месяцев (с апреля) горячие
+    assert archivable(names, date(2026, 10, 19), hot_months=6) == ["messages_y2025m12", "messages_y2026m03"]
+
+
+def test_retention_days_from_meta():
+    assert retention_days({"messages_retention_days": "30"}) == 30
+    assert retention_days({"messages_retention_days": 0}) is None
+    assert retention_days({"messages_retention_days": "forever"}) is None
+    assert retention_days(None) is None
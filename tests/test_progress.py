@@ -0,0 +1,58 @@
+import asyncio
+
+from src.app.core.progress import ProgressChannel, ProgressTracker, progress_key
+
+
+def test_progress_key():
+    assert progress_key("backscan", "abc") == "backscan:abc"
+
+
+def test_tracker_snapshot_eta_and_remaining():
+    channel = ProgressChannel()
+    tracker = ProgressTracker("k", channel=channel, chats_total=4)
+    tracker.chats_done = 2
+    tracker.messages = 10
+    snap = tracker.snapshot()
+    assert snap["status"] == "running"
+    assert snap["chats_remaining"] == 2
+    assert snap["eta_sec"] is not None
+    assert snap["messages_per_sec"] > 0
+
+
+def test_tracker_finish_publishes_final():
+    channel = ProgressChannel()
+    tracker = ProgressTracker("k", channel=channel, chats_total=1)
+    tracker.finish("done", "ok")
+    last = channel.last("k")
+    assert last["status"] == "done"
+    assert last["eta_sec"] == 0.0
+
+
+def test_tracker_throttles_intermediate_publish():
+    channel = ProgressChannel()
+    tracker = ProgressTracker("k", channel=channel)
+    tracker.publish(force=True)
+    tracker.messages = 5
+    tracker.publish()
+    assert channel.last("k")["messages"] == 0
+
+
+def test_channel_listen_stops_on_final_status():
+    async def _run() -> list[str]:
+        channel = ProgressChannel()
+        channel.publish("k", {"status": "queued"})
+        seen: list[str] = []
+
+        async def _consume() -> None:
+            async for snap in channel.listen("k"):
+                seen.append(snap["status"])
+
+        task = asyncio.create_task(_consume())
+        await asyncio.sleep(0)
+        channel.publish("k", {"status": "running"})
+        channel.publish("k", {"status": "done"})
+        await asyncio.wait_for(task, timeout=1)
+        assert channel.subscriber_count("k") == 0
+        return seen
+
+    assert asyncio.run(_run()) == ["queued", "running", "done"]
@@ -0,0 +1,114 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from src.app.core import dialog_service
+from src.app.core.dialog_service import PromptRuntime, ResolvedResource, ResourceResolver
+
+RID, KEYS, PROMPT = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+def _resolved(model="gpt-4o-mini"):
+    return ResolvedResource(
+        resource_id=RID, keys_id=KEYS, prompt_id=PROMPT, key_field="creds.openai_api_key",
+        api_key="sk", model=model, temperature=0.7,
+        prompt=PromptRuntime(system_prompt="s", history_pairs=5, google_source=""),
+    )
+
+
+def test_hits_until_dependency_changes():
+    loads = []
+
+    async def load(rid):
+        loads.append(rid)
+        return _resolved()
+
+    async def run():
+        r = ResourceResolver(load=load, listen=False)
+        for _ in range(3):
+            await r.get(RID)
+        assert r.invalidate(uuid.uuid4()) == 0      # чужой ресурс
+        await r.get(RID)
+        assert r.invalidate(KEYS) == 1              # сменились api_keys
+        await r.get(RID)
+        return r.stats()
+
+    stats = asyncio.run(run())
+    assert len(loads) == 2
+    assert stats == {"size": 1, "hits": 3, "misses": 2, "invalidations": 1}
+
+
+def test_load_racing_with_invalidation_is_not_cached_and_errors_not_cached():
+    async def run():
+        r = ResourceResolver(load=None, listen=False)
+
+        async def racing_load(rid):
+            r.invalidate(PROMPT)                    # NOTIFY пришёл во время загрузки
+            return _resolved()
+
+        r._load = racing_load
+        await r.get(RID)
+        assert r.stats()["size"] == 0
+
+        async def broken_load(rid):
+            raise RuntimeError("API_KEY_FIELD_EMPTY")
+
+        r._load = broken_load
+        with pytest.raises(RuntimeError, match="API_KEY_FIELD_EMPTY"):
+            await r.get(RID)
+        assert r.stats()["size"] == 0
+
+    asyncio.run(run())
+
+
+def test_ttl_expires_entries():
+    now = [0.0]
+
+    async def load(rid):
+        return _resolved(model=f"m{now[0]}")
+
+    async def run():
+        r = ResourceResolver(load=load, listen=False, ttl_sec=10, clock=lambda: now[0])
+        first = await r.get(RID)
+        now[0] = 11.0
+        return first, await r.get(RID)
+
+    first, second = asyncio.run(run())
+    assert first.model == "m0.0" and second.model == "m11.0"
+
+
+class _Db:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, rid):
+        return self.rows.get(rid)
+
+
+def _load_with_keys(monkeypatch, key_field, keys_creds):
+    rows = {
+        RID: SimpleNamespace(status="active", meta_json={
+            "prompt_id": str(PROMPT),
+            "ai": {"api_keys_resource_id": str(KEYS), "api_key_field": key_field, "model": "m"},
+        }),
+        KEYS: SimpleNamespace(provider="api_keys", meta_json={"creds": keys_creds}),
+    }
+    monkeypatch.setattr(dialog_service, "AsyncSessionLocal", lambda: _Db(rows))
+    return asyncio.run(dialog_service._load_resolved(RID))
+
+
+def test_embedding_key_is_openai_only(monkeypatch):
+    r = _load_with_keys(monkeypatch, "creds.openai_api_key", {"openai_api_key": "sk-o"})
+    assert r.embedding_key == "sk-o"
+    r = _load_with_keys(monkeypatch, "creds.groq_api_key", {"groq_api_key": "gsk", "openai_api_key": "sk-o"})
+    assert r.api_key == "gsk" and r.embedding_key == "sk-o"
+    r = _load_with_keys(monkeypatch, "creds.anthropic_api_key", {"anthropic_api_key": "ak"})
+    assert r.embedding_key == ""
@@ -0,0 +1,27 @@
+import asyncio
+
+from src.app.resources.telegram.seen import SeenStore
+
+
+def test_mark_dedupes_and_buffers():
+    store = SeenStore("00000000-0000-0000-0000-000000000001")
+    assert store.mark(-100, 5) is True
+    assert store.mark(-100, 5) is False
+    assert store._pending == [(-100, 5)]
+
+
+def test_claim_skips_recent_and_returns_db_new(monkeypatch):
+    store = SeenStore("00000000-0000-0000-0000-000000000001")
+    store.mark(-100, 1)
+    sent: list = []
+
+    def fake_insert(pairs):
+        sent.append(list(pairs))
+        return {p for p in pairs if p[1] != 2}  # (−100, 2) уже есть в БД
+
+    monkeypatch.setattr(store, "_insert_sync", fake_insert)
+    claimed = asyncio.run(store.claim([(-100, 1), (-100, 2), (-100, 3)]))
+    assert sent == [[(-100, 2), (-100, 3)]]
+    assert claimed == {(-100, 3)}
+    assert store.seen_recently(-100, 3)
+    assert store.mark(-100, 3) is False
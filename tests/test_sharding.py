@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from src.app.modules.bot.sharding import HashRing, colocation_keys
+
+
+def _res(rid: str, provider: str, **sources):
+    return SimpleNamespace(id=rid, provider=provider, meta_json={"sources": sources})
+
+
+def test_ring_moves_only_part_of_keys_on_join():
+    keys = [f"r{i}" for i in range(1000)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    moved = [k for k in keys if before.owner(k) != after.owner(k)]
+    assert all(after.owner(k) == "d" for k in moved)
+    assert 100 < len(moved) < 450
+
+
+def test_ring_empty_has_no_owner():
+    assert HashRing([]).owner("x") is None
+
+
+def test_prompt_colocated_with_session_and_bot():
+    rows = [
+        _res("s1", "telegram"),
+        _res("b1", "telegram_bot"),
+        _res("p1", "prompt", telegram_session_rid="s1", telegram_bot_rid="b1"),
+        _res("s2", "telegram"),
+    ]
+    keys = colocation_keys(rows, colocate=True)
+    assert keys["p1"] == keys["s1"] == keys["b1"]
+    assert keys["s2"] == "s2"
+    assert colocation_keys(rows, colocate=False)["p1"] == "p1"
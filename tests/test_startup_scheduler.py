@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+from src.app.modules.bot.startup import (
+    StartupScheduler,
+    TokenBucket,
+    prompt_dependencies,
+    startup_order,
+)
+
+
+def test_token_bucket_rate(clock):
+    bucket = TokenBucket(rate=2, burst=2, clock=clock)
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+    clock.now = 0.5
+    assert bucket.try_acquire() is True
+    assert bucket.try_acquire() is False
+
+
+def test_prompt_dependencies_first():
+    prompts = [SimpleNamespace(meta_json={"sources": {"telegram_session_rid": "s9", "telegram_bot_rid": "b1"}})]
+    deps = prompt_dependencies(prompts)
+    assert deps == {"s9", "b1"}
+    assert startup_order({"s1", "s9", "s5"}, deps) == ["s9", "s1", "s5"]
+
+
+def test_scheduler_take_and_time_to_all_running(clock):
+    sched = StartupScheduler(rate=1, burst=2, jitter_sec=0, clock=clock)
+    assert sched.take(["a", "b", "c"]) == ["a", "b"]
+    sched.observe(desired=3, running=0)
+    clock.now = 4.0
+    sched.observe(desired=3, running=3)
+    assert sched.last_time_to_all_running == 4.0
@@ -0,0 +1,93 @@
+import asyncio
+
+from src.app.core.ai_transport import AIChatConfig, AIProvider, chat_stream
+from src.app.core.stream_reply import CURSOR, PLACEHOLDER, ProgressiveReply, split_text
+
+
+class FakeChat:
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+        self.fail_next = None
+
+    async def send(self, text):
+        self.sent.append(text)
+        return len(self.sent)
+
+    async def edit(self, mid, text):
+        if self.fail_next is not None:
+            e, self.fail_next = self.fail_next, None
+            raise e
+        self.edits.append((mid, text))
+
+
+class RetryAfter(Exception):
+    retry_after = 5
+
+
+def _reply(fake, now):
+    return ProgressiveReply(send=fake.send, edit=fake.edit, interval=1.0, min_chars=5, clock=lambda: now[0])
+
+
+def test_edits_are_throttled_and_final_text_replaces_placeholder():
+    async def run():
+        fake, now = FakeChat(), [0.0]
+        reply = _reply(fake, now)
+        await reply.start()
+        for i in range(25):          # 25 дельт за 2.5 секунды
+            now[0] = i * 0.1
+            await reply.push("слово ")
+        ids = await reply.finish("готовый ответ")
+        return fake, reply, ids
+
+    fake, reply, ids = asyncio.run(run())
+    assert fake.sent == [PLACEHOLDER] and ids == [1]
+    # правки не чаще раза в секунду + финальная
+    assert len(fake.edits) == 3
+    assert fake.edits[0][1].endswith(CURSOR)
+    assert fake.edits[-1] == (1, "готовый ответ")
+    assert reply.first_visible_at == 1.0
+
+
+def test_retry_after_postpones_next_edit():
+    async def run():
+        fake, now = FakeChat(), [0.0]
+        reply = _reply(fake, now)
+        await reply.start()
+        fake.fail_next = RetryAfter()
+        now[0] = 1.0
+        await reply.push("первая часть ответа")
+        now[0] = 3.0
+        await reply.push(" и ещё немного текста")
+        return fake, reply
+
+    fake, reply = asyncio.run(run())
+    assert fake.edits == [] and reply.edit_errors == 1
+
+
+def test_long_answer_split_and_failed_placeholder_falls_back_to_send():
+    async def run():
+        fake = FakeChat()
+
+        async def broken_send(text):
+            if text == PLACEHOLDER:
+                raise RuntimeError("network")
+            return await fake.send(text)
+
+        reply = ProgressiveReply(send=broken_send, edit=fake.edit)
+        await reply.start()
+        await reply.push("x")
+        return fake, await reply.finish("a" * 5000)
+
+    fake, ids = asyncio.run(run())
+    assert ids == [1, 2] and [len(t) for t in fake.sent] == [4096, 904]
+    assert split_text("ab\ncd", limit=3) == ["ab", "cd"]
+
+
+def test_chat_stream_falls_back_for_non_streaming_provider():
+    async def run():
+        cfg = AIChatConfig(provider=AIProvider.deepgram, api_key="k", model="m")
+        return [d async for d in chat_stream(cfg=cfg, messages=[{"role": "user", "content": "hi"}])]
+
+    deltas = asyncio.run(run())
+    assert len(deltas) == 1 and deltas[0].result is not None and not deltas[0].result.ok
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from src.app.core.entity_cache import EntityInfo
+from src.app.resources.telegram.dialogs import (
+    DIALOGS_FLUSH_SEC,
+    DialogSnapshotWriter,
+    dialog_from_info,
+    like_pattern,
+    refresh_pending,
+)
+
+
+def test_dialog_from_info_private_and_group():
+    user = EntityInfo(peer_id=5, username="ann", display_name="Анна")
+    row = dialog_from_info(user, peer_id=5, peer_type="private", at=None)
+    assert row.kind == "user"
+    assert row.name == "Анна"
+    assert row.as_api()["username"] == "@ann"
+
+    grp = EntityInfo(peer_id=-1001, title="Аренда", username="rent")
+    row = dialog_from_info(grp, peer_id=-1001, peer_type="channel", at=None)
+    assert row.kind == "channel"
+    assert row.as_api()["peer_id"] == "-1001"
+
+
+def test_dialog_from_info_skips_bots():
+    bot = EntityInfo(peer_id=7, username="x_bot", is_bot=True)
+    assert dialog_from_info(bot, peer_id=7, peer_type="private", at=None) is None
+
+
+def test_refresh_pending():
+    now = datetime.now(timezone.utc)
+    assert refresh_pending(None) is False
+    assert refresh_pending((now, None)) is False
+    assert refresh_pending((None, now)) is True
+    assert refresh_pending((now - timedelta(seconds=5), now)) is True
+    assert refresh_pending((now, now - timedelta(seconds=5))) is False
+
+
+def test_like_pattern_escapes_wildcards():
+    assert like_pattern("rent") == "%rent%"
+    assert like_pattern("50%_off\\x") == "%50\\%\\_off\\\\x%"
+
+
+def test_failed_refresh_backs_off_and_success_resets():
+    now = [0.0]
+    results = [False, False, True]
+    requested = [True]
+    calls = []
+
+    async def on_refresh():
+        calls.append(now[0])
+        requested[0] = not results[0]  # успех ставит refreshed_at — запрос снят
+        return results.pop(0)
+
+    w = DialogSnapshotWriter("rid", on_refresh, clock=lambda: now[0])
+    w._refresh_requested_sync = lambda: requested[0]
+
+    async def run():
+        for t in range(0, 60, 5):    # тик _run раз в DIALOGS_FLUSH_SEC
+            now[0] = float(t)
+            await w.check_refresh()
+
+    asyncio.run(run())
+    # 0 — неудача (пауза 2*5), 10 — неудача (пауза 4*5), 30 — успех
+    assert calls == [0.0, 2 * DIALOGS_FLUSH_SEC, 6 * DIALOGS_FLUSH_SEC]
+    assert w.refresh_failures == 0 and w._retry_at == 0.0
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram import Bot
+
+from src.app.resources.telegram_bot.webhook import WebhookHub, bot_secret
+
+
+def test_bot_secret_stable_and_token_bound():
+    s = bot_secret("rid-1", "123:abc")
+    assert s == bot_secret("rid-1", "123:abc")
+    assert len(s) == 48 and s.isalnum()
+    assert s != bot_secret("rid-1", "123:other")
+    assert s != bot_secret("rid-2", "123:abc")
+
+
+class _Worker:
+    def __init__(self, rid: str) -> None:
+        self.resource = SimpleNamespace(id=rid)
+        self.bot = Bot(token="123456:TEST")
+        self.messages = []
+
+    async def handle_message(self, message) -> None:
+        self.messages.append(message.text)
+
+    async def handle_chat_base_callback(self, cq) -> None:
+        self.messages.append(f"cb:{cq.data}")
+
+
+def test_shared_dispatcher_routes_to_worker():
+    update = {
+        "update_id": 1,
+        "message": {
+            "message_id": 7,
+            "date": 1700000000,
+            "chat": {"id": 42, "type": "private"},
+            "from": {"id": 42, "is_bot": False, "first_name": "A"},
+            "text": "привет",
+        },
+    }
+
+    async def run():
+        hub = WebhookHub()
+        a, b = _Worker("a"), _Worker("b")
+        hub.dp = hub._build_dispatcher()
+        await hub.dp.feed_raw_update(b.bot, update, worker=b)
+        await a.bot.session.close()
+        await b.bot.session.close()
+        return a, b
+
+    a, b = asyncio.run(run())
+    assert a.messages == []
+    assert b.messages == ["привет"]
+
+
+def test_drain_acks_each_update_only_after_its_handler(monkeypatch):
+    acked = []
+    rows = [(1, "a", {"n": 1}), (2, "a", {"n": 2}), (3, "a", {"n": 3})]
+
+    class _Dp:
+        async def feed_raw_update(self, bot, payload, worker):
+            if payload["n"] == 2:
+                raise RuntimeError("handler failed")
+            if payload["n"] == 3:
+                raise asyncio.CancelledError  # процесс остановили посреди пачки
+            assert acked == []  # строка ещё в таблице, пока обработчик работает
+
+    hub = WebhookHub()
+    hub.dp = _Dp()
+    hub._workers = {"a": SimpleNamespace(bot=object())}
+    claims = iter([rows, []])
+    monkeypatch.setattr(hub, "_claim_sync", lambda rids: next(claims))
+    monkeypatch.setattr(hub, "_ack_sync", acked.append)
+
+    try:
+        asyncio.run(hub._drain())
+    except asyncio.CancelledError:
+        pass
+    assert acked == [1, 2]  # 3 остаётся claimed и после lease заберётся снова
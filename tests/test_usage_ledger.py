@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from src.app.core.usage_ledger import UsageLedger
+from src.app.modules.usage.router import summarize_usage
+
+RID = uuid.uuid4()
+T = datetime(2026, 3, 1, 23, 59, tzinfo=timezone.utc)
+
+
+def _usage(p, c):
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+def test_deltas_aggregate_per_resource_model_day_and_flush_once():
+    stored = []
+
+    async def store(rows):
+        stored.append(rows)
+
+    async def run():
+        ledger = UsageLedger(store=store, flush_sec=3600)
+        for _ in range(3):
+            ledger.record(RID, _usage(1000, 500), model="gpt-4o-mini", at=T)
+        ledger.record(RID, _usage(10, 10), model="local-model", at=T)
+        ledger.record(RID, _usage(1, 1), model="gpt-4o-mini", at=datetime(2026, 3, 2, tzinfo=timezone.utc))
+        n = await ledger.flush()
+        await ledger.close()
+        return n
+
+    assert asyncio.run(run()) == 3
+    assert len(stored) == 1
+    rows = {(k[1], k[2].isoformat()): d for k, d in stored[0]}
+    mini = rows[("gpt-4o-mini", "2026-03-01")]
+    assert (mini.requests, mini.total_tokens) == (3, 4500)
+    assert abs(mini.cost_usd - 3 * (1000 * 0.15 + 500 * 0.60) / 1e6) < 1e-12
+    assert rows[("local-model", "2026-03-01")].cost_usd is None
+
+
+def test_failed_flush_keeps_deltas_for_next_attempt():
+    calls = []
+
+    async def store(rows):
+        calls.append(rows)
+        if len(calls) == 1:
+            raise RuntimeError("db down")
+
+    async def run():
+        ledger = UsageLedger(store=store, flush_sec=3600)
+        ledger.record(RID, _usage(5, 5), model="gpt-4o", at=T)
+        assert await ledger.flush() == 0
+        ledger.record(RID, _usage(5, 5), model="gpt-4o", at=T)
+        assert await ledger.flush() == 1
+        await ledger.close()
+        return ledger.stats()
+
+    stats = asyncio.run(run())
+    assert calls[1][0][1].requests == 2 and calls[1][0][1].total_tokens == 20
+    assert stats["errors"] == 1 and stats["pending"] == 0
+
+
+def test_summarize_usage_marks_unpriced_models():
+    rows = [
+        {"day": "2026-03-01", "model": "gpt-4o", "requests": 2, "prompt_tokens": 10,
+         "completion_tokens": 5, "total_tokens": 15, "cost_usd": 0.25},
+        {"day": "2026-03-01", "model": "local", "requests": 1, "prompt_tokens": 1,
+         "completion_tokens": 1, "total_tokens": 2, "cost_usd": None},
+    ]
+    out = summarize_usage(rows)
+    assert out["totals"]["total_tokens"] == 17 and out["totals"]["cost_usd"] == 0.25
+    assert out["totals"]["unpriced_models"] == ["local"]
+    assert out["by_day"] == [{"day": "2026-03-01", "total_tokens": 17, "cost_usd": 0.25}]
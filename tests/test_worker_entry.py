@@ -0,0 +1,24 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.app.modules.bot.worker_entry import _count_up
+from src.app.resources.telegram_bot.bot import TelegramBotWorker
+
+
+def test_count_up_skips_workers_that_exited():
+    async def run():
+        def worker(rid):
+            return TelegramBotWorker(SimpleNamespace(id=rid, label=rid, meta_json={}))
+
+        up, exited, pending = worker("up"), worker("exited"), worker("pending")
+        up._running, up._task = True, asyncio.create_task(asyncio.sleep(10))
+        exited._task = asyncio.create_task(asyncio.sleep(0))
+        await asyncio.sleep(0.01)
+        assert not exited.is_alive and pending.is_alive and up.is_alive
+
+        registry = {"up": up, "exited": exited, "pending": pending}
+        counts = _count_up(registry, {"up", "exited", "pending", "missing"})
+        up._task.cancel()
+        return counts
+
+    assert asyncio.run(run()) == (1, 3)
@@ -0,0 +1,115 @@
+"""
+tools/ingest_bench.py
+────────────────────────────────────────────────────────────
+Замер скорости вставки сообщений: построчно (insert_message) против
+bulk_ingest_messages (COPY + merge). Всё в транзакции с ROLLBACK — база
+не меняется.
+
+    python -m tools.ingest_bench --resource <uuid> [--rows 20000] [--dialogs 200] [--dup 0.1]
+
+--dup — доля повторов внешнего ключа (как при реплее событий).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from uuid import UUID
+
+from src.app.core.dialog_store import (
+    DuplicateExternalMessage,
+    bulk_ingest_messages,
+    get_or_create_dialog,
+    insert_message,
+    external_thread_key,
+)
+
+
+def synthetic_rows(resource_id: UUID, *, rows: int, dialogs: int, dup: float, seed: int = 1) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    out: List[Dict[str, Any]] = []
+    for i in range(rows):
+        if i and rnd.random() < dup:
+            prev = out[rnd.randrange(i)]  # повтор: тот же чат и внешний id
+            peer, n = prev["peer_id"], int(prev["external_msg_id"])
+        else:
+            peer, n = 1_000_000 + rnd.randrange(max(1, dialogs)), i
+        out.append({
+            "resource_id": resource_id,
+            "peer_type": "private",
+            "peer_id": peer,
+            "chat_id": peer,
+            "direction": "in" if i % 2 else "out",
+            "text": f"bench message {i} " + "lorem ipsum " * rnd.randrange(1, 20),
+            "provider": "bench",
+            "external_chat_id": str(peer),
+            "external_msg_id": str(n),
+            "created_at": start + timedelta(seconds=i),
+        })
+    return out
+
+
+def _bench_row_by_row(db, rows: List[Dict[str, Any]]) -> tuple[int, float]:
+    started = time.perf_counter()
+    inserted = 0
+    for r in rows:
+        d = get_or_create_dialog(
+            db,
+            resource_id=r["resource_id"],
+            thread_key=external_thread_key(provider=r["provider"], external_chat_id=r["external_chat_id"]),
+            peer_type=r["peer_type"],
+            peer_id=r["peer_id"],
+            chat_id=r["chat_id"],
+        )
+        fields = {k: v for k, v in r.items() if k not in ("text", "created_at")}
+        sp = db.begin_nested()
+        try:
+            insert_message(db, dialog_id=d.id, text_value=r["text"], **fields)
+            sp.commit()
+            inserted += 1
+        except DuplicateExternalMessage:
+            sp.rollback()
+    return inserted, time.perf_counter() - started
+
+
+def main() -> None:
+    from src.app.core.db import SessionLocal
+
+    ap = argparse.ArgumentParser(description="messages ingest benchmark (rolled back)")
+    ap.add_argument("--resource", required=True, type=UUID)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--dialogs", type=int, default=200)
+    ap.add_argument("--dup", type=float, default=0.1)
+    args = ap.parse_args()
+
+    rows = synthetic_rows(args.resource, rows=args.rows, dialogs=args.dialogs, dup=args.dup)
+
+    with SessionLocal() as db:
+        try:
+            res = bulk_ingest_messages(db, rows)
+        finally:
+            db.rollback()
+    print(
+        f"[INGEST_BENCH] bulk: {res.received} rows in {res.elapsed_sec:.2f}s "
+        f"= {res.rows_per_sec:.0f} rows/s (inserted={res.inserted} dup={res.duplicates})",
+        flush=True,
+    )
+
+    with SessionLocal() as db:
+        try:
+            inserted, elapsed = _bench_row_by_row(db, rows)
+        finally:
+            db.rollback()
+    rate = len(rows) / elapsed if elapsed > 0 else 0.0
+    print(
+        f"[INGEST_BENCH] row-by-row: {len(rows)} rows in {elapsed:.2f}s "
+        f"= {rate:.0f} rows/s (inserted={inserted}); bulk x{res.rows_per_sec / rate if rate else 0:.1f}",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    main()